@@ -225,7 +225,95 @@ class AssetCreatedEvent(AgentEvent):
     asset_url: str
 
 
-SUBSCRIBER_POOL: dict[str, redis.client.PubSub] = {}
+# Run events transport. With "pubsub" (the default) run logs channels are plain Redis
+# pub/sub: a subscriber only sees events published after it subscribed, and a slow
+# subscriber can lose events. With "streams", every event on a run logs channel
+# (logs:...) is also appended to a capped Redis Stream for that channel, and subscribers
+# of those channels read the stream instead. They get every event published after they
+# subscribed (or after a given event id, to replay), and can reconnect and resume where
+# they left off.
+# Pattern subscribers (like the ChatLogger on "logs*") still use pub/sub.
+RUN_EVENTS_TRANSPORT = config.get_option("RUN_EVENTS_TRANSPORT", default="pubsub")
+RUN_STREAM_CHANNEL_PREFIX = "logs:"
+RUN_STREAM_MAXLEN = int(config.get_option("RUN_STREAM_MAXLEN", default=10000))
+RUN_STREAM_TTL_SECS = int(config.get_option("RUN_STREAM_TTL_SECS", default=3600))
+STREAM_READ_COUNT = 100
+
+def uses_run_stream(channel: str) -> bool:
+    return (
+        RUN_EVENTS_TRANSPORT == "streams" and
+        channel.startswith(RUN_STREAM_CHANNEL_PREFIX) and
+        not any(c in channel for c in "*?[")
+    )
+
+def run_stream_key(channel: str) -> str:
+    return f"{channel}:stream"
+
+def run_stream_offset_key(channel: str, sub_id: str) -> str:
+    return f"{channel}:offset:{sub_id}"
+
+
+class StreamSubscriber:
+    """ Reads a run logs stream with the same get_message/unsubscribe interface as
+        redis PubSub. `last_id` is the id of the last event returned, so a new
+        subscriber created with from_id=last_id continues where this one stopped.
+        If `offset_key` is set, the offset is saved to Redis as events are consumed.
+    """
+    def __init__(
+            self,
+            client: redis.Redis,
+            channel: str,
+            from_id: str,
+            offset_key: Optional[str] = None):
+        self.client = client
+        self.channel = channel
+        self.stream = run_stream_key(channel)
+        self.last_id = from_id
+        self.offset_key = offset_key
+        self.saved_id = from_id
+        self.buffer: list[tuple[str, dict]] = []
+        self.subscribed = True
+
+    async def psubscribe(self, *args, **kwargs):
+        self.subscribed = True
+
+    async def get_message(self, ignore_subscribe_messages: bool = True, timeout: float = 0.0) -> Optional[dict]:
+        if not self.subscribed:
+            await asyncio.sleep(timeout)
+            return None
+        if not self.buffer:
+            # Everything read so far has been returned, so it's safe to commit the offset
+            await self.save_offset()
+            block = int(timeout * 1000) if timeout else None
+            result = await self.client.xread(
+                {self.stream: self.last_id}, count=STREAM_READ_COUNT, block=block,
+            )
+            for _stream, entries in result or []:
+                self.buffer.extend(entries)
+            if not self.buffer:
+                return None
+        event_id, fields = self.buffer.pop(0)
+        self.last_id = event_id
+        return {"type": "message", "channel": self.channel, "id": event_id, "data": fields["data"]}
+
+    async def save_offset(self):
+        if self.offset_key and self.last_id != self.saved_id:
+            await self.client.set(self.offset_key, self.last_id, ex=RUN_STREAM_TTL_SECS)
+            self.saved_id = self.last_id
+
+    async def unsubscribe(self, *args):
+        if self.subscribed:
+            self.buffer.clear()
+            await self.save_offset()
+        self.subscribed = False
+
+    async def aclose(self):
+        await self.unsubscribe()
+
+
+Subscriber = redis.client.PubSub | StreamSubscriber
+
+SUBSCRIBER_POOL: dict[str, Subscriber] = {}
 class AsyncPubSub:
     def __init__(self):
         self._client: redis.Redis = None
@@ -249,19 +337,52 @@ class AsyncPubSub:
             message = str(message)        
         client = await self.get_client()
         #print(f">> Publishing ({channel}): ", message)
-        await client.publish(channel, message)
+        if uses_run_stream(channel):
+            stream = run_stream_key(channel)
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.xadd(stream, {"data": message}, maxlen=RUN_STREAM_MAXLEN, approximate=True)
+                pipe.expire(stream, RUN_STREAM_TTL_SECS)
+                pipe.publish(channel, message)
+                await pipe.execute()
+        else:
+            await client.publish(channel, message)
 
     async def subscribe(
             self, 
             channel: str, 
-            callback: Optional[SubscribeCallback]=None) -> redis.client.PubSub:
+            callback: Optional[SubscribeCallback]=None,
+            from_id: Optional[str] = None,
+            offset_key: Optional[str] = None) -> Subscriber:
+        # For run stream channels, `from_id` is the event id to replay after ("0-0" for
+        # the whole stream). By default only events published from now on are read, as
+        # the channel is reused for each turn of a run.
         client = await self.get_client()
-        pub = client.pubsub()
-        await pub.psubscribe(channel)
+        if uses_run_stream(channel):
+            if from_id is None:
+                from_id = await self.last_event_id(channel)
+            pub = StreamSubscriber(client, channel, from_id=from_id, offset_key=offset_key)
+        else:
+            pub = client.pubsub()
+            await pub.psubscribe(channel)
         if callback:
             asyncio.create_task(self.reader(pub, channel, callback))
         return pub
 
+    async def last_event_id(self, channel: str) -> str:
+        # The id of the newest event in a run stream channel. Taken once, rather than
+        # reading from "$" each time, which would miss events published between reads.
+        client = await self.get_client()
+        entries = await client.xrevrange(run_stream_key(channel), count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def replay(self, channel: str, from_id: str = "-", count: Optional[int] = None) -> list[tuple[str, dict]]:
+        # Returns stored (event id, event) pairs of a run stream channel, starting at from_id
+        if not uses_run_stream(channel):
+            return []
+        client = await self.get_client()
+        entries = await client.xrange(run_stream_key(channel), min=from_id, count=count)
+        return [(event_id, json.loads(fields["data"])) for event_id, fields in entries]
+
     # Creates a subscriber keyed by the indicated ID, and maintains that object in a pool
     # The subscriber returned, but you can use ...
     async def create_subscriber(
@@ -269,13 +390,29 @@ class AsyncPubSub:
             sub_id: str,
             channel: str,
             recreate: bool=True,
-    ) -> redis.client.PubSub:
+            from_id: Optional[str] = None,
+    ) -> Subscriber:
+        # For run stream channels, `from_id` is the last event id the client has seen
+        # ("0-0" for a new run). Without it we resume from the saved offset, or else
+        # start at the newest event.
         if sub_id in SUBSCRIBER_POOL and not recreate:
             print("Returning existing channel for ", sub_id, " on topic ", channel)
             return SUBSCRIBER_POOL[sub_id]
         else:
             print("Subscribing channel for ", sub_id, " on topic ", channel)
-            sub = await self.subscribe(channel)
+            offset_key = None
+            if uses_run_stream(channel):
+                # A client reconnecting (say to another dashboard worker) resumes from
+                # the last event it consumed
+                client = await self.get_client()
+                offset_key = run_stream_offset_key(channel, sub_id)
+                if from_id is None and not recreate:
+                    from_id = await client.get(offset_key)
+                if from_id is None:
+                    from_id = await self.last_event_id(channel)
+                # Saved now, so a reconnect before anything is read starts here too
+                await client.set(offset_key, from_id, ex=RUN_STREAM_TTL_SECS)
+            sub = await self.subscribe(channel, from_id=from_id, offset_key=offset_key)
             SUBSCRIBER_POOL[sub_id] = sub
             return sub
         
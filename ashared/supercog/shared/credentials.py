@@ -4,14 +4,24 @@
 # in the main database.
 
 import os
+import threading
+import time
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from sqlmodel import Session, select
 
 from .services import db_connect, config
 
+# How long we cache secrets in process. Set to 0 to disable the cache.
+SECRETS_CACHE_TTL_SECS = float(config.get_option("SECRETS_CACHE_TTL_SECS", default=30))
+
 class CredentialSecret(SQLModel, table=True):
+    __table_args__ = (
+        # Every lookup is by owner + credential id
+        Index("ix_credentialsecret_owner_credential", "tenant_id", "user_id", "credential_id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     tenant_id: str
     user_id: Optional[str] = None
@@ -39,6 +49,95 @@ class EncryptionHelper:
         return self.fernet.decrypt(data)
 
 
+class SecretsCache:
+    """
+        Short-lived in-process cache of credential secrets, partitioned by tenant. We
+        only ever hold the encrypted secret (exactly as stored in the database), so
+        nothing is kept in memory in plaintext - values are decrypted as they are read.
+        Missing secrets are cached too (as None). Writes and deletes through the
+        SecretsService invalidate their entries.
+    """
+    def __init__(self, ttl_secs: float = SECRETS_CACHE_TTL_SECS):
+        self.ttl_secs = ttl_secs
+        # tenant_id -> {(user_id, credential_id): (encrypted secret, expires at)}
+        self._tenants: dict[str, dict[tuple, tuple[bytes|None, float]]] = {}
+        # Bumped on every invalidation, so a read that raced with a write doesn't
+        # put the old value back in the cache.
+        self._generations: dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_secs > 0
+
+    def generation(self, tenant_id: str) -> tuple[int, int]:
+        return (self._epoch, self._generations.get(tenant_id, 0))
+
+    def get_many(
+            self, 
+            tenant_id: str, 
+            user_id: Optional[str], 
+            credential_ids: list[str]
+        ) -> tuple[dict[str, bytes|None], list[str]]:
+        """ Returns the (encrypted) cached secrets, and the list of ids we don't have. """
+        found: dict[str, bytes|None] = {}
+        missing: list[str] = []
+        now = time.time()
+        with self._lock:
+            entries = self._tenants.get(tenant_id, {})
+            for credential_id in credential_ids:
+                entry = entries.get((user_id, credential_id))
+                if entry is not None and entry[1] > now:
+                    found[credential_id] = entry[0]
+                else:
+                    missing.append(credential_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(
+            self, 
+            tenant_id: str, 
+            user_id: Optional[str], 
+            secrets: dict[str, bytes|None],
+            generation: tuple[int, int],
+        ):
+        if not self.enabled:
+            return
+        expires = time.time() + self.ttl_secs
+        with self._lock:
+            if self.generation(tenant_id) != generation:
+                return
+            entries = self._tenants.setdefault(tenant_id, {})
+            # Drop expired entries as we go so idle tenants don't accumulate
+            now = time.time()
+            for key in [k for k, (_, exp) in entries.items() if exp <= now]:
+                del entries[key]
+            for credential_id, encrypted in secrets.items():
+                entries[(user_id, credential_id)] = (encrypted, expires)
+
+    def invalidate(self, tenant_id: str, user_id: Optional[str], credential_ids: list[str]):
+        with self._lock:
+            self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            entries = self._tenants.get(tenant_id)
+            if entries:
+                for credential_id in credential_ids:
+                    entries.pop((user_id, credential_id), None)
+
+    def invalidate_tenant(self, tenant_id: str):
+        with self._lock:
+            self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            self._tenants.pop(tenant_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._tenants.clear()
+
+
 class SecretsService:
     """
         The Secrets services stores credential secrets for us. The Credential model
@@ -52,11 +151,16 @@ class SecretsService:
     def __init__(self):
         self.engine = db_connect(SecretsService.SERVICE_NAME)
         SQLModel.metadata.create_all(self.engine)
+        # create_all won't add indexes to a table that already exists
+        for index in CredentialSecret.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
         self.encrypter = EncryptionHelper()
+        self.cache = SecretsCache()
 
     def reconnect(self):
         self.engine.dispose()
         self.engine = db_connect(SecretsService.SERVICE_NAME)
+        self.cache.clear()
 
     def set_credential(
             self, 
@@ -93,7 +197,8 @@ class SecretsService:
             session.add(cred_secret)
             session.commit()
             session.refresh(cred_secret)
-            return cred_secret
+        self.cache.invalidate(tenant_id, user_id, [credential_id])
+        return cred_secret
 
     def get_credential(
             self, 
@@ -113,15 +218,46 @@ class SecretsService:
         """ The key is that to retrieve a cred secret you must know the credential ID
             AND the tenant and user IDs.
         """
-        with Session(self.engine) as session:
-            query = select(CredentialSecret).where(
-                CredentialSecret.tenant_id == tenant_id,
-                CredentialSecret.user_id == user_id,
-                CredentialSecret.credential_id == credential_id)
-            credential = session.exec(query).first()
-            if credential:
-                return self.encrypter.decrypt(credential.secret)
-            return None
+        return self._get_credentials(tenant_id, user_id, [credential_id])[credential_id]
+
+    def get_credentials(
+            self,
+            tenant_id: str,
+            user_id: str,
+            credential_ids: list[str],
+        ) -> dict[str, Optional[str]]:
+        """ Bulk version of get_credential. Returns a dict of credential_id -> secret (or None
+            if the secret doesn't exist), fetching everything not cached in a single query.
+        """
+        return {
+            credential_id: (bval.decode() if bval else None)
+            for credential_id, bval in self._get_credentials(tenant_id, user_id, credential_ids).items()
+        }
+
+    def _get_credentials(
+            self,
+            tenant_id: str,
+            user_id: str,
+            credential_ids: list[str],
+        ) -> dict[str, Optional[bytes]]:
+        generation = self.cache.generation(tenant_id)
+        encrypted, missing = self.cache.get_many(tenant_id, user_id, credential_ids)
+        if missing:
+            fetched: dict[str, Optional[bytes]] = {credential_id: None for credential_id in missing}
+            with Session(self.engine) as session:
+                query = select(CredentialSecret).where(
+                    CredentialSecret.tenant_id == tenant_id,
+                    CredentialSecret.user_id == user_id,
+                    CredentialSecret.credential_id.in_(missing))
+                for credential in session.exec(query):
+                    fetched[credential.credential_id] = credential.secret
+            self.cache.put_many(tenant_id, user_id, fetched, generation)
+            encrypted |= fetched
+
+        return {
+            credential_id: (self.encrypter.decrypt(encrypted[credential_id]) if encrypted[credential_id] else None)
+            for credential_id in credential_ids
+        }
 
     def delete_credential(
             self, 
@@ -138,6 +274,7 @@ class SecretsService:
             if cred_secret:
                 session.delete(cred_secret)
                 session.commit()
+        self.cache.invalidate(tenant_id, user_id, [credential_id])
 
     def delete_credentials(
             self,
@@ -155,6 +292,7 @@ class SecretsService:
             for cred_secret in cred_secrets:
                 session.delete(cred_secret)
             session.commit()
+        self.cache.invalidate(tenant_id, user_id, credential_ids)
 
     def list_credentials(
             self,
@@ -0,0 +1,272 @@
+# Concurrent, resumable uploads of local files to S3.
+#
+#   manager = S3UploadManager(on_progress=print)
+#   results = manager.upload_files([
+#       UploadRequest(path="/data/t1/u1/report.csv", bucket="files", key="t1/u1/report.csv"),
+#       ...
+#   ])
+#
+# Files are uploaded in parallel (S3_UPLOAD_CONCURRENCY at a time) over the shared,
+# pooled S3 client. Every object carries the sha256 of its content in its metadata, so
+# a file whose content is already in S3 is skipped. Files over S3_MULTIPART_THRESHOLD
+# are sent as multipart uploads whose progress is saved locally: if an upload fails (or
+# the process dies), the next attempt to upload the same content continues with the
+# parts that are missing. Failed uploads are retried with exponential backoff.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from botocore.exceptions import ClientError
+
+from .services import config
+from .logging import logger
+from .utils import get_boto_client, get_file_mimetype
+
+S3_UPLOAD_CONCURRENCY = int(config.get_option("S3_UPLOAD_CONCURRENCY", default=8))
+S3_UPLOAD_PART_CONCURRENCY = int(config.get_option("S3_UPLOAD_PART_CONCURRENCY", default=8))
+S3_MULTIPART_THRESHOLD = int(config.get_option("S3_MULTIPART_THRESHOLD", default=16 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(config.get_option("S3_MULTIPART_CHUNKSIZE", default=8 * 1024 * 1024))
+S3_UPLOAD_RETRIES = int(config.get_option("S3_UPLOAD_RETRIES", default=3))
+S3_UPLOAD_STATE_DIR = config.get_option(
+    "S3_UPLOAD_STATE_DIR", default=os.path.join(tempfile.gettempdir(), "supercog_s3_uploads")
+)
+
+SHA256_METADATA_KEY = "sha256"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class UploadRequest:
+    path: str
+    bucket: str
+    key: str
+    mime_type: Optional[str] = None
+
+
+@dataclass
+class UploadProgress:
+    path: str
+    key: str
+    # started, progress, skipped, done or failed
+    status: str
+    bytes_sent: int = 0
+    total_bytes: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class UploadResult:
+    request: UploadRequest
+    status: str
+    sha256: str = ""
+    size: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class _PartsState:
+    upload_id: str
+    # part number -> ETag of the parts already uploaded
+    parts: dict[int, str] = field(default_factory=dict)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class S3UploadManager:
+    def __init__(
+            self,
+            on_progress: Optional[Callable[[UploadProgress], None]] = None,
+            s3_client=None,
+            concurrency: int = S3_UPLOAD_CONCURRENCY,
+            part_concurrency: int = S3_UPLOAD_PART_CONCURRENCY,
+            multipart_threshold: int = S3_MULTIPART_THRESHOLD,
+            chunksize: int = S3_MULTIPART_CHUNKSIZE,
+            retries: int = S3_UPLOAD_RETRIES,
+            state_dir: str = S3_UPLOAD_STATE_DIR,
+            retry_delay: float = 0.5,
+        ):
+        self.on_progress = on_progress
+        self.s3_client = s3_client or get_boto_client("s3")
+        self.concurrency = concurrency
+        self.part_concurrency = part_concurrency
+        self.multipart_threshold = multipart_threshold
+        self.chunksize = chunksize
+        self.retries = retries
+        self.state_dir = state_dir
+        self.retry_delay = retry_delay
+        self.progress_lock = threading.Lock()
+
+    def report(self, progress: UploadProgress):
+        if self.on_progress:
+            with self.progress_lock:
+                try:
+                    self.on_progress(progress)
+                except Exception as e:
+                    logger.warn(f"Upload progress callback failed: {e}")
+
+    def upload_files(self, requests: list[UploadRequest]) -> list[UploadResult]:
+        # Uploads the files concurrently. Returns a result per request, in order. Failed
+        # uploads are reported in their result rather than raised.
+        if not requests:
+            return []
+        # One pool for parts, shared by all multipart uploads. Part tasks never submit
+        # other tasks, so the two pools can't deadlock.
+        with ThreadPoolExecutor(max_workers=self.part_concurrency) as part_pool:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(requests))) as pool:
+                return list(pool.map(lambda r: self.upload_with_retries(r, part_pool), requests))
+
+    def upload_file(self, request: UploadRequest) -> UploadResult:
+        with ThreadPoolExecutor(max_workers=self.part_concurrency) as part_pool:
+            return self.upload_with_retries(request, part_pool)
+
+    def upload_with_retries(self, request: UploadRequest, part_pool: ThreadPoolExecutor) -> UploadResult:
+        result = UploadResult(request=request, status="failed")
+        for attempt in range(1, self.retries + 1):
+            result.attempts = attempt
+            try:
+                return self._upload(request, part_pool, result)
+            except Exception as e:
+                result.error = str(e)
+                logger.warn(f"Upload of {request.path} to {request.key} failed (attempt {attempt}): {e}")
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * (2 ** (attempt - 1)))
+        self.report(UploadProgress(
+            request.path, request.key, "failed", total_bytes=result.size, error=result.error,
+        ))
+        return result
+
+    def _upload(self, request: UploadRequest, part_pool: ThreadPoolExecutor, result: UploadResult) -> UploadResult:
+        result.size = os.path.getsize(request.path)
+        result.sha256 = file_sha256(request.path)
+        if self.remote_sha256(request) == result.sha256:
+            result.status = "skipped"
+            self.report(UploadProgress(request.path, request.key, "skipped", result.size, result.size))
+            return result
+
+        self.report(UploadProgress(request.path, request.key, "started", 0, result.size))
+        extra = {
+            "ContentType": request.mime_type or get_file_mimetype(request.path),
+            "Metadata": {SHA256_METADATA_KEY: result.sha256},
+        }
+        if result.size < self.multipart_threshold:
+            with open(request.path, "rb") as f:
+                self.s3_client.put_object(Bucket=request.bucket, Key=request.key, Body=f, **extra)
+        else:
+            self.multipart_upload(request, result, extra, part_pool)
+        result.status = "done"
+        result.error = None
+        self.report(UploadProgress(request.path, request.key, "done", result.size, result.size))
+        return result
+
+    def remote_sha256(self, request: UploadRequest) -> Optional[str]:
+        try:
+            head = self.s3_client.head_object(Bucket=request.bucket, Key=request.key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head.get("Metadata", {}).get(SHA256_METADATA_KEY)
+
+    ### Multipart uploads
+
+    def state_path(self, request: UploadRequest, sha256: str) -> str:
+        name = hashlib.sha256(f"{request.bucket}/{request.key}/{sha256}".encode()).hexdigest()
+        return os.path.join(self.state_dir, f"{name}.json")
+
+    def load_state(self, path: str) -> Optional[_PartsState]:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return _PartsState(data["upload_id"], {int(k): v for k, v in data["parts"].items()})
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def save_state(self, path: str, state: _PartsState):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"upload_id": state.upload_id, "parts": state.parts}, f)
+        os.replace(tmp_path, path)
+
+    def resume_state(self, request: UploadRequest, state_path: str) -> Optional[_PartsState]:
+        # Picks up an interrupted upload of the same content, checking with S3 which of
+        # its parts actually arrived
+        state = self.load_state(state_path)
+        if state is None:
+            return None
+        try:
+            parts = {}
+            paginator = self.s3_client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=request.bucket, Key=request.key, UploadId=state.upload_id):
+                for part in page.get("Parts", []):
+                    parts[part["PartNumber"]] = part["ETag"]
+            state.parts = parts
+            return state
+        except ClientError:
+            # The upload was completed, aborted or expired
+            os.remove(state_path)
+            return None
+
+    def multipart_upload(self, request: UploadRequest, result: UploadResult, extra: dict, part_pool: ThreadPoolExecutor):
+        state_path = self.state_path(request, result.sha256)
+        state = self.resume_state(request, state_path)
+        if state is None:
+            response = self.s3_client.create_multipart_upload(Bucket=request.bucket, Key=request.key, **extra)
+            state = _PartsState(upload_id=response["UploadId"])
+            self.save_state(state_path, state)
+
+        num_parts = (result.size + self.chunksize - 1) // self.chunksize
+        sent = sum(self.part_size(n, result.size) for n in state.parts)
+        if state.parts:
+            logger.info(f"Resuming upload of {request.path}: {len(state.parts)} of {num_parts} parts done")
+        state_lock = threading.Lock()
+
+        def upload_part(part_number: int):
+            nonlocal sent
+            with open(request.path, "rb") as f:
+                f.seek((part_number - 1) * self.chunksize)
+                body = f.read(self.chunksize)
+            response = self.s3_client.upload_part(
+                Bucket=request.bucket,
+                Key=request.key,
+                UploadId=state.upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            with state_lock:
+                state.parts[part_number] = response["ETag"]
+                self.save_state(state_path, state)
+                sent += len(body)
+                progress = UploadProgress(request.path, request.key, "progress", sent, result.size)
+            self.report(progress)
+
+        missing = [n for n in range(1, num_parts + 1) if n not in state.parts]
+        # Raises the first part failure. The parts that made it are kept for the retry.
+        list(part_pool.map(upload_part, missing))
+
+        self.s3_client.complete_multipart_upload(
+            Bucket=request.bucket,
+            Key=request.key,
+            UploadId=state.upload_id,
+            MultipartUpload={
+                "Parts": [{"PartNumber": n, "ETag": state.parts[n]} for n in sorted(state.parts)]
+            },
+        )
+        os.remove(state_path)
+
+    def part_size(self, part_number: int, total: int) -> int:
+        return max(0, min(self.chunksize, total - (part_number - 1) * self.chunksize))
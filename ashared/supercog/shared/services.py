@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from dotenv import dotenv_values
 from pathlib import Path
 from typing import Any
@@ -85,11 +87,133 @@ def db_connection_string(service_name: str) -> str:
         dburl = dburl[:idx+1]
         return dburl + dbname
 
+# Connection pool settings. Every call to db_connect or async_db_connect for the same
+# database returns the same engine, so these size the one pool each process has per
+# database (and per sync/async driver).
+DB_POOL_SIZE = int(config.get_option("DB_POOL_SIZE", default=5))
+DB_MAX_OVERFLOW = int(config.get_option("DB_MAX_OVERFLOW", default=10))
+DB_POOL_TIMEOUT = float(config.get_option("DB_POOL_TIMEOUT", default=30))
+DB_POOL_RECYCLE = int(config.get_option("DB_POOL_RECYCLE", default=1800))
+
+_DB_ENGINES: dict[str, Any] = {}
+
+class PoolMetrics:
+    """ Connection wait stats for a pool. `waiters` is the number of callers currently
+        waiting for a connection.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+        self.max_waiters = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def start_wait(self):
+        with self.lock:
+            self.waiters += 1
+            self.max_waiters = max(self.max_waiters, self.waiters)
+
+    def end_wait(self, wait_ms: float, timed_out: bool = False):
+        with self.lock:
+            self.waiters -= 1
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "waiters": self.waiters,
+            "max_waiters": self.max_waiters,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+def metered_pool_class(base: type) -> type:
+    # A QueuePool subclass that times every connection checkout. The metrics live on
+    # the class, since SQLAlchemy replaces the pool instance (with the same class) when
+    # the engine is disposed.
+    from sqlalchemy import exc
+
+    def _do_get(self):
+        metrics = type(self).metrics
+        metrics.start_wait()
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            metrics.end_wait((time.perf_counter() - start) * 1000, timed_out)
+
+    return type(f"Metered{base.__name__}", (base,), {"metrics": PoolMetrics(), "_do_get": _do_get})
+
+def _pool_args(url: str, base_pool: type) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    return {
+        "poolclass": metered_pool_class(base_pool),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
 def db_connect(service_name: str):
-    from sqlalchemy import create_engine
+    # Connect to postgres. Returns the shared engine for this database.
+    return db_engine_for_url(db_connection_string(service_name))
 
-    # Connect to postgres
-    return create_engine(db_connection_string(service_name), pool_size=2)
+def db_engine_for_url(url: str):
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+
+    # Returns the shared engine for a database URL, creating it on first use
+    if url not in _DB_ENGINES:
+        _DB_ENGINES[url] = create_engine(url, **_pool_args(url, QueuePool))
+    return _DB_ENGINES[url]
+
+def async_db_url(url: str) -> str:
+    # Switches a database URL to the asyncio driver for its backend
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend in ("postgres", "postgresql"):
+        return "postgresql+asyncpg" + sep + rest
+    if backend == "sqlite":
+        return "sqlite+aiosqlite" + sep + rest
+    return url
+
+def async_db_connect(service_name: str):
+    # Returns the shared asyncio (asyncpg) engine for this database
+    return async_db_engine_for_url(db_connection_string(service_name))
+
+def async_db_engine_for_url(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    url = async_db_url(url)
+    if url not in _DB_ENGINES:
+        _DB_ENGINES[url] = create_async_engine(url, **_pool_args(url, AsyncAdaptedQueuePool))
+    return _DB_ENGINES[url]
+
+def db_pool_stats() -> dict:
+    # Pool metrics for every engine in this process, keyed by URL (without the password)
+    result = {}
+    for engine in _DB_ENGINES.values():
+        pool = engine.pool
+        metrics = getattr(type(pool), "metrics", None)
+        if metrics is not None:
+            result[engine.url.render_as_string(hide_password=True)] = metrics.stats(pool)
+    return result
 
 def get_service_host(service_name: str) -> str:
     envval = config.get_global(f"{service_name.upper()}_URL", False)
@@ -4,6 +4,7 @@ import json
 from enum import StrEnum
 import mimetypes
 import re
+import threading
 import time
 from typing import Optional
 from enum import StrEnum
@@ -11,6 +12,7 @@ from enum import StrEnum
 import markdown2
 from bleach.sanitizer import Cleaner
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import NoCredentialsError
 
 from functools import reduce
@@ -18,16 +20,33 @@ from pathlib import Path
 
 from .services import config
 
+# boto3 clients are thread safe, and each holds its own connection pool, so we share
+# one client per service (and endpoint/credentials) instead of creating one per call.
+AWS_MAX_POOL_CONNECTIONS = int(config.get_option("AWS_MAX_POOL_CONNECTIONS", default=32))
+AWS_MAX_ATTEMPTS = int(config.get_option("AWS_MAX_ATTEMPTS", default=5))
+_boto_clients: dict[tuple, object] = {}
+_boto_clients_lock = threading.Lock()
+
 def get_boto_client(service):
     endpoint_url = config.get_global("AWS_ENDPOINT_WRITE_URL", required=False) or None
-    return boto3.client(
-        service,
-        endpoint_url=endpoint_url, # If None it defaults to default aws endpoint_url
-        aws_access_key_id=config.get_global("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=config.get_global("AWS_SECRET_KEY"),
-        region_name="us-east-1",
-        verify=(not bool(endpoint_url)) # Don't verify if there is an endpoint_url
-    )
+    access_key_id = config.get_global("AWS_ACCESS_KEY_ID")
+    secret_key = config.get_global("AWS_SECRET_KEY")
+    key = (service, endpoint_url, access_key_id, secret_key)
+    with _boto_clients_lock:
+        if key not in _boto_clients:
+            _boto_clients[key] = boto3.client(
+                service,
+                endpoint_url=endpoint_url, # If None it defaults to default aws endpoint_url
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_key,
+                region_name="us-east-1",
+                verify=(not bool(endpoint_url)), # Don't verify if there is an endpoint_url
+                config=BotoConfig(
+                    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+                ),
+            )
+        return _boto_clients[key]
 
 def dict_safe_get(src, *paths, default=None):
     """ Safely get a value from a nested dictionary. """
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+
+from supercog.shared import apubsub
+from supercog.shared.apubsub import AsyncPubSub, StreamSubscriber, run_stream_key
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def streams(monkeypatch):
+    monkeypatch.setattr(apubsub, "RUN_EVENTS_TRANSPORT", "streams")
+    ps = AsyncPubSub()
+    ps._client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return ps
+
+async def publish_events(ps: AsyncPubSub, channel: str, count: int, start: int = 0):
+    for i in range(start, start + count):
+        await ps.publish(channel, {"type": "output", "n": i})
+
+async def read_all(sub) -> list:
+    result = []
+    while (message := await sub.get_message(timeout=0)) is not None:
+        event = json.loads(message["data"])
+        result.append(event.get("n", event["type"]))
+    return result
+
+def test_subscribers_read_events_published_after_they_subscribe(streams):
+    async def run_test():
+        await publish_events(streams, "logs:run1", 5)
+        sub = await streams.subscribe("logs:run1")
+        assert isinstance(sub, StreamSubscriber)
+        assert await read_all(sub) == []
+        await publish_events(streams, "logs:run1", 2, start=5)
+        assert await read_all(sub) == [5, 6]
+
+        # The whole stream is replayed only when asked for
+        replayed = await streams.subscribe("logs:run1", from_id="0-0")
+        assert await read_all(replayed) == [0, 1, 2, 3, 4, 5, 6]
+
+        # Replay from an event id only returns the events after it
+        resumed = await streams.subscribe("logs:run1", from_id=sub.last_id)
+        await publish_events(streams, "logs:run1", 2, start=7)
+        assert await read_all(resumed) == [7, 8]
+        assert [e["n"] for _, e in await streams.replay("logs:run1", from_id=resumed.last_id)] == [8]
+
+    asyncio.run(run_test())
+
+def test_consecutive_turns_on_one_channel(streams):
+    async def turn(answer: str):
+        await streams.publish("logs:run3", {"type": answer})
+        await streams.publish("logs:run3", {"type": "end"})
+
+    async def run_test():
+        # As the dashboard does: subscribe, then send the input for the turn
+        sub = await streams.create_subscriber("client1", "logs:run3")
+        await turn("turn1")
+        assert await read_all(sub) == ["turn1", "end"]
+        await streams.cancel_subscriber("client1", "logs:run3")
+
+        sub = await streams.create_subscriber("client1", "logs:run3")
+        await turn("turn2")
+        assert await read_all(sub) == ["turn2", "end"]
+
+    asyncio.run(run_test())
+
+def test_turns_resume_after_the_last_event_seen(streams):
+    async def run_test():
+        # A new run reads its channel from the start, so events published before the
+        # subscription (say, by a fast agent) aren't missed
+        await publish_events(streams, "logs:run4", 2)
+        sub = await streams.create_subscriber("client1", "logs:run4", from_id="0-0")
+        assert await read_all(sub) == [0, 1]
+        last_seen = sub.last_id
+
+        # Events the client didn't read before the next turn are picked up then
+        await publish_events(streams, "logs:run4", 2, start=2)
+        await streams.cancel_subscriber("client1", "logs:run4")
+        sub = await streams.create_subscriber("client1", "logs:run4", from_id=last_seen)
+        await publish_events(streams, "logs:run4", 1, start=4)
+        assert await read_all(sub) == [2, 3, 4]
+
+        # ...and a reconnect resumes from there as well
+        apubsub.SUBSCRIBER_POOL.pop("client1")
+        sub = await streams.create_subscriber("client1", "logs:run4", recreate=False)
+        assert await read_all(sub) == []
+
+    asyncio.run(run_test())
+
+def test_reconnecting_subscriber_resumes_from_offset(streams):
+    async def run_test():
+        await publish_events(streams, "logs:run2", 3)
+        sub = await streams.create_subscriber("client1", "logs:run2")
+        await publish_events(streams, "logs:run2", 3, start=3)
+        assert await read_all(sub) == [3, 4, 5]
+        await streams.cancel_subscriber("client1", "logs:run2")
+
+        await publish_events(streams, "logs:run2", 2, start=6)
+        sub = await streams.create_subscriber("client1", "logs:run2", recreate=False)
+        assert await read_all(sub) == [6, 7]
+
+        # Reconnecting before reading anything starts from where it subscribed
+        await streams.create_subscriber("client2", "logs:run2")
+        await publish_events(streams, "logs:run2", 1, start=8)
+        apubsub.SUBSCRIBER_POOL.pop("client2")
+        sub = await streams.create_subscriber("client2", "logs:run2", recreate=False)
+        assert await read_all(sub) == [8]
+
+    asyncio.run(run_test())
+
+def test_pattern_subscribers_use_pubsub(streams):
+    async def run_test():
+        client = await streams.get_client()
+        logger = client.pubsub()
+        await logger.psubscribe("logs*")
+        await logger.get_message(timeout=0.1)
+
+        await publish_events(streams, "logs:run1", 2)
+        await streams.publish("logs", {"type": "output"})
+        channels = []
+        while (message := await logger.get_message(ignore_subscribe_messages=True, timeout=0.1)) is not None:
+            channels.append(message["channel"])
+        # The ChatLogger still gets every event over pub/sub
+        assert channels == ["logs:run1", "logs:run1", "logs"]
+
+        assert await client.exists(run_stream_key("logs:run1"))
+        assert not await client.exists(run_stream_key("logs"))
+
+    asyncio.run(run_test())
+    assert apubsub.uses_run_stream("logs:run1")
+    assert not apubsub.uses_run_stream("logs")
+    assert not apubsub.uses_run_stream("logs*")
+    assert not apubsub.uses_run_stream("agent_events")
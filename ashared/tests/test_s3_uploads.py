@@ -0,0 +1,96 @@
+import os
+
+import boto3
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from supercog.shared.s3_uploads import S3UploadManager, UploadRequest
+
+BUCKET = "files-bucket"
+MB = 1024 * 1024
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test",
+        )
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def make_file(path, size: int, fill: bytes = b"a") -> str:
+    with open(path, "wb") as f:
+        f.write(fill * size)
+    return str(path)
+
+def manager(s3, tmp_path, events=None, **kwargs) -> S3UploadManager:
+    return S3UploadManager(
+        on_progress=events.append if events is not None else None,
+        s3_client=s3,
+        multipart_threshold=6 * MB,
+        chunksize=5 * MB,
+        state_dir=str(tmp_path / "state"),
+        retry_delay=0,
+        **kwargs,
+    )
+
+def test_uploads_in_parallel_and_skips_unchanged(s3, tmp_path):
+    requests = [
+        UploadRequest(make_file(tmp_path / f"f{i}.csv", 1000 + i), BUCKET, f"t1/u1/f{i}.csv")
+        for i in range(5)
+    ]
+    events = []
+    results = manager(s3, tmp_path, events).upload_files(requests)
+    assert [r.status for r in results] == ["done"] * 5
+    head = s3.head_object(Bucket=BUCKET, Key="t1/u1/f3.csv")
+    assert head["ContentLength"] == 1003 and head["ContentType"] == "text/csv"
+    assert head["Metadata"]["sha256"] == results[3].sha256
+
+    # Unchanged content is skipped, changed content is sent again
+    make_file(tmp_path / "f0.csv", 1000, b"b")
+    results = manager(s3, tmp_path).upload_files(requests)
+    assert [r.status for r in results] == ["done"] + ["skipped"] * 4
+    assert s3.get_object(Bucket=BUCKET, Key="t1/u1/f0.csv")["Body"].read() == b"b" * 1000
+    assert {e.status for e in events} == {"started", "done"}
+
+def test_multipart_upload_resumes_after_failure(s3, tmp_path):
+    path = make_file(tmp_path / "big.parquet", 12 * MB)
+    request = UploadRequest(path, BUCKET, "t1/u1/big.parquet")
+
+    class FailingClient:
+        # Fails the third part, once
+        def __init__(self, client):
+            self.client = client
+            self.parts_sent = []
+
+        def upload_part(self, **kwargs):
+            if kwargs["PartNumber"] == 3 and 3 not in self.parts_sent:
+                self.parts_sent.append(3)
+                raise ConnectionError("connection reset")
+            self.parts_sent.append(kwargs["PartNumber"])
+            return self.client.upload_part(**kwargs)
+
+        def __getattr__(self, name):
+            return getattr(self.client, name)
+
+    client = FailingClient(s3)
+    events = []
+    uploader = manager(s3, tmp_path, events, part_concurrency=1)
+    uploader.s3_client = client
+    result = uploader.upload_file(request)
+
+    assert result.status == "done" and result.attempts == 2
+    # Parts 1 and 2 were not sent again on the retry
+    assert client.parts_sent == [1, 2, 3, 3]
+    body = s3.get_object(Bucket=BUCKET, Key="t1/u1/big.parquet")["Body"].read()
+    assert len(body) == 12 * MB
+    assert [e.bytes_sent for e in events if e.status == "progress"][-1] == 12 * MB
+    assert os.listdir(tmp_path / "state") == []
+
+def test_failures_are_reported(s3, tmp_path):
+    request = UploadRequest(make_file(tmp_path / "f.txt", 10), "missing-bucket", "f.txt")
+    events = []
+    result = manager(s3, tmp_path, events, retries=2).upload_files([request])[0]
+    assert result.status == "failed" and result.attempts == 2 and result.error
+    assert events[-1].status == "failed"
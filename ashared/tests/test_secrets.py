@@ -46,3 +46,44 @@ def test_delete_credential(setup_test_env, sample_credential):
     creds_service.delete_credential(cred.tenant_id, cred.user_id, cred.credential_id)
     stored_cred =  creds_service.get_credential(cred.tenant_id, cred.user_id, cred.credential_id)
     assert stored_cred is None, "Credential was not deleted successfully"
+
+def test_get_credentials_bulk(setup_test_env, sample_credential):
+    creds_service = setup_test_env
+    tenant_id, user_id = sample_credential['tenant_id'], sample_credential['user_id']
+    creds_service.set_credential(tenant_id, user_id, "bulkcred:key1", "value1")
+    creds_service.set_credential(tenant_id, user_id, "bulkcred:key2", "value2")
+
+    secrets = creds_service.get_credentials(tenant_id, user_id, ["bulkcred:key1", "bulkcred:key2", "bulkcred:nokey"])
+    assert secrets == {"bulkcred:key1": "value1", "bulkcred:key2": "value2", "bulkcred:nokey": None}
+
+    # Now served from the cache, which must see updates and deletes
+    creds_service.set_credential(tenant_id, user_id, "bulkcred:key1", "changed")
+    creds_service.delete_credential(tenant_id, user_id, "bulkcred:key2")
+    secrets = creds_service.get_credentials(tenant_id, user_id, ["bulkcred:key1", "bulkcred:key2"])
+    assert secrets == {"bulkcred:key1": "changed", "bulkcred:key2": None}
+
+def test_secrets_cache_holds_only_encrypted_values(setup_test_env, sample_credential):
+    creds_service = setup_test_env
+    creds_service.set_credential(**sample_credential)
+    creds_service.get_credential(
+        sample_credential['tenant_id'], 
+        sample_credential['user_id'], 
+        sample_credential['credential_id'])
+    cached = creds_service.cache._tenants[sample_credential['tenant_id']]
+    assert all(
+        value is None or sample_credential['secret'].encode() not in value
+        for value, _ in cached.values()
+    )
+
+def test_secrets_cache_ignores_stale_writes():
+    from supercog.shared.credentials import SecretsCache
+    cache = SecretsCache(ttl_secs=60)
+    generation = cache.generation("t1")
+    # A write lands while a read is in flight, so the read's (old) value must not be cached
+    cache.invalidate("t1", "u1", ["c1"])
+    cache.put_many("t1", "u1", {"c1": b"old"}, generation)
+    found, missing = cache.get_many("t1", "u1", ["c1"])
+    assert found == {} and missing == ["c1"]
+
+    cache.put_many("t1", "u1", {"c1": b"new"}, cache.generation("t1"))
+    assert cache.get_many("t1", "u1", ["c1"])[0] == {"c1": b"new"}
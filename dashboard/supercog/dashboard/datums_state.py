@@ -67,6 +67,12 @@ class DatumsState(GlobalState):
     
     # Content-specific attributes
     table_data: pd.DataFrame = pd.DataFrame([])
+    # The engine returns tables a page at a time
+    table_offset:    int = 0
+    table_limit:     int = 0
+    table_row_count: int = 0
+    _table_category: str = ""
+    _table_path:     str = ""
     text_data:  str = ""
     json_data:  dict = {}
     dir_data:   str = ""
@@ -84,6 +90,21 @@ class DatumsState(GlobalState):
     def item_count(self) -> int:
         return len(self.flat_structure)
 
+    @rx.var
+    def table_range(self) -> str:
+        if self.table_row_count <= len(self.table_data):
+            return ""
+        first = self.table_offset + 1 if len(self.table_data) else self.table_offset
+        return f"Showing rows {first}-{self.table_offset + len(self.table_data)} of {self.table_row_count}"
+
+    @rx.var
+    def has_prev_rows(self) -> bool:
+        return self.table_offset > 0
+
+    @rx.var
+    def has_next_rows(self) -> bool:
+        return self.table_offset + len(self.table_data) < self.table_row_count
+
     def on_mount(self):
         """
         Initialization routine to mount the component, fetch datums recursively
@@ -277,6 +298,9 @@ class DatumsState(GlobalState):
         # File path attributes
         self.file_path            = ""
         self.table_data           = pd.DataFrame([])
+        self.table_offset         = 0
+        self.table_limit          = 0
+        self.table_row_count      = 0
         self.text_data            = ""
         self.json_data            = {}
         self.dir_data             = ""
@@ -328,10 +352,9 @@ class DatumsState(GlobalState):
         if type in ["audio", "video", "image"]:
             self.process_media_content(content)
         elif type == "csv":
-            if isinstance(content, dict) and isinstance(content.get('raw_data'), pd.DataFrame):
-                self.table_data = content['raw_data']
-            else:
-                self.table_data = pd.DataFrame()
+            self._table_category = datum.category
+            self._table_path = datum.path
+            self.set_table_page(content)
         elif type in ["text", "pdf", "dir"]:
             self.text_data = content.get('raw_data', '') if isinstance(content, dict) else content
             self.datum_type = "text"
@@ -358,6 +381,40 @@ class DatumsState(GlobalState):
             self.text_data = f"Unhandled file type: {type}"
             self.datum_type = "text"
             
+    def set_table_page(self, content):
+        if isinstance(content, dict) and isinstance(content.get('raw_data'), pd.DataFrame):
+            self.table_data = content['raw_data']
+            self.table_offset = content.get('offset', 0)
+            self.table_limit = content.get('limit') or len(self.table_data)
+            self.table_row_count = content.get('row_count', len(self.table_data))
+        else:
+            self.table_data = pd.DataFrame()
+            self.table_offset = self.table_limit = self.table_row_count = 0
+
+    def load_table_page(self, offset: int):
+        try:
+            type, content = self._agentsvc.get_run_datum(
+                self.user.tenant_id,
+                self._agent_id,
+                self.user.id,
+                self._run_id,
+                self._table_category,
+                self._table_path,
+                offset=max(offset, 0),
+            )
+        except Exception as e:
+            type, content = "error", str(e)
+        if type == "csv":
+            self.set_table_page(content)
+        else:
+            return rx.toast.error(content if isinstance(content, str) else "Failed to load the rows")
+
+    def next_rows(self):
+        return self.load_table_page(self.table_offset + self.table_limit)
+
+    def prev_rows(self):
+        return self.load_table_page(self.table_offset - self.table_limit)
+
     def load_email_data(self, content: dict):
         email_data = json.loads(content.get('raw_data', '{}')) if isinstance(content.get('raw_data'), str) else content.get('raw_data', {})
         self.email_subject = email_data.get('subject') or 'N/A'
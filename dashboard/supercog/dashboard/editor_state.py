@@ -72,6 +72,9 @@ class EditorState(AgentsCommonState, PromptHelpers):
     _logs: list[str] = []
     avail_models: list[str] = []
     __run: dict = None
+    # Run logs channel -> id of the last event shown from it, to subscribe from there
+    # on the next turn. "0-0" for a new run, which is read from its first event.
+    _last_event_ids: dict[str, str] = {}
     # track the time that the last prompt started, so we can record elapsed time (and compare to created_at on events)
     _turn_started: datetime = datetime.now()
     run_model: str = ""
@@ -996,6 +999,7 @@ class EditorState(AgentsCommonState, PromptHelpers):
                     )
                     # A new run should take the tools from 
                     print("New run: ", self.__run)
+                    self._last_event_ids[self.__run["logs_channel"]] = "0-0"
                     self.run_tools = UITool.from_api_run_tools(self.__run.get("tools"))
                 except requests.exceptions.HTTPError as e:
                     if e.response.status_code == 401:
@@ -1033,7 +1037,8 @@ class EditorState(AgentsCommonState, PromptHelpers):
 
         await pubsub.create_subscriber(
             self.router.session.client_token,
-            self.__run["logs_channel"]
+            self.__run["logs_channel"],
+            from_id=self._last_event_ids.get(self.__run["logs_channel"]),
         )
 
         self._agentsvc.send_input(self.__run["id"], question, attached_file)
@@ -1055,8 +1060,10 @@ class EditorState(AgentsCommonState, PromptHelpers):
     @rx.background
     async def wait_for_agent_events(self):
         print("Starting background event listener: ", datetime.now())
-        async for event in self.read_engine_events(self.__run["logs_channel"]):
+        async for event_id, event in self.read_engine_events(self.__run["logs_channel"]):
             async with self:
+                if event_id:
+                    self._last_event_ids[self.__run["logs_channel"]] = event_id
                 runlog = RunLogBase.model_validate(event)
                 await self.render_run_event(runlog, live=True)
                 if self.processing == False:
@@ -2053,7 +2060,8 @@ class EditorState(AgentsCommonState, PromptHelpers):
         prompt = f"Values saved for vars: {', '.join(form_data.keys())}"
         return EditorState.handle_run_agent_with_input(prompt)
 
-    async def read_engine_events(self, channel, timeout=500) -> AsyncGenerator[dict, None]:
+    async def read_engine_events(self, channel, timeout=500) -> AsyncGenerator[tuple[str|None, dict], None]:
+        # Yields (event id, event). The id is only set for run stream channels.
         channel = await pubsub.create_subscriber(
             self.router.session.client_token,
             self.__run["logs_channel"],
@@ -2067,7 +2075,7 @@ class EditorState(AgentsCommonState, PromptHelpers):
             if message:
                 try:
                     data = json.loads(message['data'])
-                    yield data
+                    yield message.get("id"), data
                     if isinstance(data, dict) and data.get("type") == AgentLogEventTypes.END:
                         message = await channel.get_message(ignore_subscribe_messages=True, timeout=0.05)
                         if message is None:
@@ -2075,7 +2083,7 @@ class EditorState(AgentsCommonState, PromptHelpers):
                         else:
                             # Seems like more messages, so keep going
                             data = json.loads(message['data'])
-                            yield data
+                            yield message.get("id"), data
                 except Exception as e:
                     traceback.print_exc()
                     pass
@@ -2369,16 +2377,20 @@ class EditorState(AgentsCommonState, PromptHelpers):
         if 'model' in self.__run:
             self.run_model = self.__run['model']
         self.run_tools = UITool.from_api_run_tools(self.__run.get("tools"))
-        runlogs = self._agentsvc.get_run_logs(run_id, self._user_id)
         self._clear_chats()
         qa = QA(question="", user_name=self.authenticated_user.name)
         qa.answers.append(Answer())
         self.chats.append(qa)
 
-        for runlog in runlogs:
-            await self.render_run_event(runlog, live=False)
-        self.finish_chat_render()
-        self.loading_run_logs = False
+        # Fetch the logs a page at a time, rather than the whole run in one response.
+        # A page that can't be loaded raises, rather than showing part of the history.
+        try:
+            for runlogs, _ in self._agentsvc.iter_run_logs(run_id, self._user_id):
+                for runlog in runlogs:
+                    await self.render_run_event(runlog, live=False)
+        finally:
+            self.finish_chat_render()
+            self.loading_run_logs = False
 
     async def delete_run(self, run_id: str):
         # Delete run and its logs concurrently
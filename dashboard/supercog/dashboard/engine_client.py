@@ -4,6 +4,7 @@ import os
 import requests
 import re
 import json
+import time
 import traceback
 from typing import Callable
 
@@ -335,10 +336,20 @@ class EngineClient:
         r.raise_for_status()
         return r.json()
     
-    def send_input(self, run_id, question, attached_file: str|None=None, run_data: Optional[dict] = None):
+    def send_input(
+            self, 
+            run_id, 
+            question, 
+            attached_file: str|None=None, 
+            run_data: Optional[dict] = None,
+            stream_flush_ms: Optional[int] = None,
+        ):
         params = {}
         if attached_file:
             params["attached_file"] = attached_file
+        if stream_flush_ms is not None:
+            # How long the engine may buffer streamed LLM output before publishing it
+            params["stream_flush_ms"] = stream_flush_ms
 
         body = {"input": question or ""}
         if run_data:
@@ -386,18 +397,65 @@ class EngineClient:
         # FIXME: Update to RunOutput
         return r.json()
     
+    RUN_LOGS_PAGE_SIZE = 1000
+    # Times a page of run logs is retried after a connection error or a 5xx. After that
+    # the error is raised, since skipping a page would silently cut off the run's history.
+    RUN_LOGS_RETRIES = 2
+
     @safe_return()
     def get_run_logs(self, run_id: str, user_id: str) -> list[RunLogBase]:
+        logs = []
+        for page, _ in self.iter_run_logs(run_id, user_id):
+            logs.extend(page)
+        return logs
+
+    def iter_run_logs(self, run_id: str, user_id: str, after: str|None = None):
+        # Yields (page of run logs, cursor) oldest first, starting after the `after` cursor.
+        # Pass the last cursor back as `after` later to fetch just the new logs.
+        while True:
+            page, cursor = self.get_run_logs_page(run_id, user_id, after=after, limit=self.RUN_LOGS_PAGE_SIZE)
+            if page:
+                yield page, cursor
+            if len(page) < self.RUN_LOGS_PAGE_SIZE:
+                return
+            after = cursor
+
+    def get_run_logs_page(
+            self, 
+            run_id: str, 
+            user_id: str, 
+            after: str|None = None,
+            before: str|None = None,
+            limit: int|None = None,
+            types: list[str]|None = None,
+        ) -> tuple[list[RunLogBase], str|None]:
+        """ Returns one page of run logs and the cursor to pass as `after` to get the next page. """
         self.validate_user_id(user_id)
         self.debug(f"runs/{run_id}/run_logs")
-        r = self._get(f"/runs/{run_id}/run_logs", params={"user_id": user_id})
-        r.raise_for_status()
-        try:
-            return [RunLogBase.model_validate(rec) for rec in r.json()]
-        except Exception as e:
-            print("error parsing run logs: ", e)
-            print(r.text)
-            return []
+        params = {"user_id": user_id}
+        if after:
+            params["after"] = after
+        if before:
+            params["before"] = before
+        if limit:
+            params["limit"] = limit
+        if types:
+            params["types"] = types
+        for attempt in range(self.RUN_LOGS_RETRIES + 1):
+            try:
+                r = self._get(f"/runs/{run_id}/run_logs", params=params)
+                r.raise_for_status()
+                break
+            except requests.exceptions.RequestException as e:
+                retryable = e.response is None or e.response.status_code >= 500
+                if not retryable or attempt == self.RUN_LOGS_RETRIES:
+                    raise
+                print("error getting run logs, retrying: ", e)
+                time.sleep(0.5 * (attempt + 1))
+        return (
+            [RunLogBase.model_validate(rec) for rec in r.json()], 
+            r.headers.get("X-Next-Cursor"),
+        )
     
     @safe_return()
     async def delete_run_logs(self, run_id: str, user_id: str) -> None:
@@ -460,13 +518,16 @@ class EngineClient:
                       user_id: str,
                       run_id: str,
                       category: str,
-                      name: str) -> Tuple[str, Union[str, pd.DataFrame, dict, Any]]:
+                      name: str,
+                      offset: int = 0) -> Tuple[str, Union[str, pd.DataFrame, dict, Any]]:
+        """ Tables come back a page at a time, starting at row `offset`. Their content
+            says which page it is in 'offset', 'limit' and 'row_count'. """
         self.debug(f"/tenant/agent/run/datum")
         # FIXME: We should use response streaming to avoid too much buffering
         try:
             r = self._get(
                 f"/tenant/{tenant_id}/agents/{agent_id}/run/{run_id}/getdatum", 
-                params={"user_id": user_id, "category": category, "name": name}
+                params={"user_id": user_id, "category": category, "name": name, "offset": offset}
             )
             r.raise_for_status()
             response_json = r.json()
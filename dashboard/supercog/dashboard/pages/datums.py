@@ -100,20 +100,51 @@ def debug_info_box() -> rx.Component:
             ),
         ),
     )
+def table_pager() -> rx.Component:
+    # Only shown when the table doesn't fit in one page from the engine
+    return rx.cond(
+        DatumsState.table_range != "",
+        rx.hstack(
+            rx.text(DatumsState.table_range, size="2"),
+            rx.spacer(),
+            rx.button(
+                rx.icon("chevron-left"),
+                on_click=DatumsState.prev_rows,
+                disabled=~DatumsState.has_prev_rows,
+                size="1",
+                variant="ghost",
+            ),
+            rx.button(
+                rx.icon("chevron-right"),
+                on_click=DatumsState.next_rows,
+                disabled=~DatumsState.has_next_rows,
+                size="1",
+                variant="ghost",
+            ),
+            width="100%",
+            padding="4px",
+            align="center",
+        ),
+    )
+
 def viewer_pane(left_margin: int = 0, top_margin: int = 0) -> rx.Component:
     return rx.chakra.box(
         rx.heading(DatumsState.datum_name, size="3", padding="4px"),
         rx.chakra.box(
             rx.cond(
                 DatumsState.datum_type == "csv",
-                rx.data_table(
-                    data=DatumsState.table_data,
-                    pagination={"limit":"20"},
-                    search=True,
-                    sort=True,
-                    fixedHeader=True,
-                    resizable=True,
-                    style={"td": {"padding":"0"}},
+                rx.vstack(
+                    table_pager(),
+                    rx.data_table(
+                        data=DatumsState.table_data,
+                        pagination={"limit":"20"},
+                        search=True,
+                        sort=True,
+                        fixedHeader=True,
+                        resizable=True,
+                        style={"td": {"padding":"0"}},
+                    ),
+                    width="100%",
                 ),
             ),
             rx.cond(
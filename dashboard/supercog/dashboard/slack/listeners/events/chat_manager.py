@@ -184,7 +184,9 @@ class ChatManager:
         agentsvc.send_input(
             run_id,
             prompt,
-            run_data={"slackbot_token": client.token, "signing_secret": SLACK_SIGNING_SECRET}
+            run_data={"slackbot_token": client.token, "signing_secret": SLACK_SIGNING_SECRET},
+            # We post the whole reply at the end, so there's no need for fine-grained streaming
+            stream_flush_ms=500,
         )
 
         while time.time() - start < timeout:
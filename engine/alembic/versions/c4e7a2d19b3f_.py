@@ -0,0 +1,28 @@
+"""Index run_logs for keyset pagination
+
+Revision ID: c4e7a2d19b3f
+Revises: b89f2334cf2a
+Create Date: 2026-10-16 10:12:41.318227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel # added
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7a2d19b3f'
+down_revision: Union[str, None] = 'b89f2334cf2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Run logs are always read by run, in (created_at, id) order
+    op.create_index('ix_run_logs_run_id_created_at_id', 'run_logs', ['run_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_run_logs_run_id_created_at_id', table_name='run_logs')
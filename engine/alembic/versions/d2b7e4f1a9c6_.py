@@ -0,0 +1,46 @@
+"""Track indexed document hashes and persist indexing jobs
+
+Revision ID: d2b7e4f1a9c6
+Revises: c4e7a2d19b3f
+Create Date: 2026-10-16 15:41:07.520914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel # added
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7e4f1a9c6'
+down_revision: Union[str, None] = 'c4e7a2d19b3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('indexeddoc', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False, server_default=''))
+    op.add_column('indexeddoc', sa.Column('indexed_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_indexeddoc_index_id_doc_id', 'indexeddoc', ['index_id', 'doc_id'], unique=False)
+    op.create_table('indexing_jobs',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('index_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('doc_source_config_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('message', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('docs_seen', sa.Integer(), nullable=False),
+    sa.Column('docs_indexed', sa.Integer(), nullable=False),
+    sa.Column('docs_skipped', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['index_id'], ['doc_indexes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('indexing_jobs')
+    op.drop_index('ix_indexeddoc_index_id_doc_id', table_name='indexeddoc')
+    op.drop_column('indexeddoc', 'indexed_at')
+    op.drop_column('indexeddoc', 'content_hash')
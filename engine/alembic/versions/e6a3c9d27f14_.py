@@ -0,0 +1,28 @@
+"""Index run_logs by id for incremental fetches
+
+Revision ID: e6a3c9d27f14
+Revises: d2b7e4f1a9c6
+Create Date: 2026-10-17 09:26:53.104872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel # added
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a3c9d27f14'
+down_revision: Union[str, None] = 'd2b7e4f1a9c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Run logs are paged forwards (and polled for new ones) by id
+    op.create_index('ix_run_logs_run_id_id', 'run_logs', ['run_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_run_logs_run_id_id', table_name='run_logs')
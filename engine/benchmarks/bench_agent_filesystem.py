@@ -0,0 +1,86 @@
+# Measures the per-open overhead of the agent filesystem sandbox:
+#
+#   builtin  - plain open() of an absolute path, no sandbox
+#   patched  - the old sandbox: builtins.open patched with unittest.mock for the whole
+#              process, doing Path.resolve() and a debug print on every open
+#   facade   - AgentFilesystem.open() from current_filesystem(), with its cached
+#              path resolution
+#
+# Each mode opens and reads --files small files round-robin, --opens times, and reports
+# the mean cost per open and the overhead over the builtin open.
+#
+#   python -m benchmarks.bench_agent_filesystem --files 100 --opens 50000
+
+import argparse
+import builtins
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from supercog.engine import filesystem
+from supercog.engine.filesystem import current_filesystem, get_agent_filesystem
+
+
+def patched_open_function(user_dir: str):
+    # The sandbox as it was before AgentFilesystem
+    orig_open = builtins.open
+
+    def access_allowed(file_path, user_dir):
+        pres = str(Path(file_path).resolve())
+        return pres.startswith(user_dir) or file_path.startswith("/etc/")
+
+    def restricted_open(file, mode='r', *args, **kwargs):
+        print("Builtins open: ", file)
+        if access_allowed(file, user_dir):
+            return orig_open(file, mode, *args, **kwargs)
+        raise PermissionError(f"Access to the file '{file}' is denied")
+    return restricted_open
+
+
+def time_opens(open_file, names: list[str], opens: int) -> float:
+    # Returns microseconds per open
+    start = time.perf_counter()
+    for i in range(opens):
+        with open_file(names[i % len(names)]) as f:
+            f.read()
+    return (time.perf_counter() - start) * 1e6 / opens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--opens", type=int, default=50_000)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_agent_fs")
+    filesystem.SYSTEM_ROOT_PATH = root
+    try:
+        with get_agent_filesystem("tenant", "user") as fs:
+            names = [f"file{i}.txt" for i in range(args.files)]
+            for name in names:
+                with fs.open(name, "w") as f:
+                    f.write("x" * 100)
+            paths = [os.path.join(fs.user_dir, name) for name in names]
+
+            results = {}
+            results["builtin"] = time_opens(open, paths, args.opens)
+            # The old sandbox printed every open; send that to a buffer, not the terminal
+            with patch("builtins.open", patched_open_function(fs.user_dir)), \
+                 contextlib.redirect_stdout(io.StringIO()):
+                results["patched"] = time_opens(lambda p: builtins.open(p), paths, args.opens)
+            results["facade"] = time_opens(lambda n: current_filesystem().open(n), names, args.opens)
+    finally:
+        shutil.rmtree(root)
+
+    print(f"{'mode':>8} {'per open':>10} {'overhead':>10}")
+    for mode, usecs in results.items():
+        print(f"{mode:>8} {usecs:>8.2f}us {usecs - results['builtin']:>8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
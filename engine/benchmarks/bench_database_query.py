@@ -0,0 +1,80 @@
+# Benchmarks DatabaseTool.run_database_query's database work on a short and an
+# expensive query:
+#
+#   per_call - the old tool: a new engine per call, the query run with connection.execute
+#              and then again with pd.read_sql
+#   pooled   - the shared engine from EnginePool, the query run once with a server-side
+#              cursor and read in DATABASE_TOOL_FETCH_ROWS partitions
+#
+# Needs a Postgres database (PGVECTOR_DB_URL, or --db-url).
+#
+#   python -m benchmarks.bench_database_query --repeat 20
+
+import argparse
+import os
+import statistics
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from supercog.engine.database_engines import EnginePool, execute_streaming, rows_to_batch, statement_timeout
+
+QUERIES = {
+    "short": "SELECT 1 AS one",
+    "expensive": """
+        SELECT i % 1000 AS bucket, count(*) AS n, sum(length(md5(i::text))) AS total
+        FROM generate_series(1, {rows}) AS s(i)
+        GROUP BY bucket ORDER BY bucket
+    """,
+    "large_result": "SELECT i, md5(i::text) AS label FROM generate_series(1, {rows}) AS s(i)",
+}
+
+
+def per_call(db_url: str, sql: str) -> int:
+    engine = create_engine(db_url)
+    with engine.begin() as connection:
+        result = connection.execute(text(sql))
+        if result.returns_rows:
+            # text(), as a raw string trips over the % in the queries
+            df = pd.read_sql(text(sql), connection)
+    engine.dispose()
+    return len(df)
+
+
+def pooled(pool: EnginePool, db_url: str, sql: str) -> int:
+    with pool.get(db_url).begin() as connection, statement_timeout(connection):
+        result = execute_streaming(connection, sql)
+        columns = list(result.keys())
+        return sum(rows_to_batch(columns, rows).num_rows for rows in result.partitions(10000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default=os.environ.get("PGVECTOR_DB_URL"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("Set PGVECTOR_DB_URL or pass --db-url")
+
+    pool = EnginePool()
+    print(f"{'query':>13} {'mode':>9} {'median ms':>10} {'total s':>9}")
+    for name, sql in QUERIES.items():
+        sql = sql.format(rows=args.rows)
+        repeat = args.repeat if name == "short" else max(1, args.repeat // 5)
+        for mode in ["per_call", "pooled"]:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if mode == "per_call":
+                    per_call(args.db_url, sql)
+                else:
+                    pooled(pool, args.db_url, sql)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:>13} {mode:>9} {statistics.median(timings) * 1000:>10.1f} {sum(timings):>9.2f}")
+    pool.dispose_all()
+
+
+if __name__ == "__main__":
+    main()
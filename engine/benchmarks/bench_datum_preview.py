@@ -0,0 +1,77 @@
+# Benchmarks get_single_datum's preview of a large CSV file:
+#
+#   full    - the old endpoint: pd.read_csv of the whole file, then to_csv of all of it
+#   page    - DatumPreviewService.rows: the first DATUM_PREVIEW_ROWS rows, and the count
+#   deep    - a page near the end of the file, sorted and filtered
+#   summary - DatumPreviewService.summary, the first time and then from the cache
+#
+# Run with /usr/bin/time -v (or watch the process) to compare peak memory as well.
+#
+#   python -m benchmarks.bench_datum_preview --rows 5000000
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from supercog.engine.datum_preview import DatumPreviewService, DatumSource, RowQuery
+from supercog.engine.duckdb_sessions import DuckDBSessionPool
+
+
+def write_csv(path: str, rows: int):
+    chunk = 1_000_000
+    for start in range(0, rows, chunk):
+        count = min(chunk, rows - start)
+        pd.DataFrame({
+            "id": np.arange(start, start + count),
+            "city": np.random.choice(["Oslo", "Lima", "Pune", "Kyiv"], count),
+            "amount": np.random.rand(count) * 1000,
+        }).to_csv(path, index=False, header=start == 0, mode="w" if start == 0 else "a")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--skip-full", action="store_true")
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.csv")
+        write_csv(path, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1e6:.0f}MB")
+
+        results = {}
+        if not args.skip_full:
+            start = time.perf_counter()
+            content = pd.read_csv(path).to_csv()
+            results["full"] = (time.perf_counter() - start, len(content))
+
+        sessions = DuckDBSessionPool(max_sessions=1, temp_directory=os.path.join(tmp, "duckdb"))
+        service = DatumPreviewService(sessions=sessions, cache_path=os.path.join(tmp, "cache"))
+        source = DatumSource.for_file(path)
+        queries = {
+            "page": RowQuery(),
+            "deep": RowQuery(offset=args.rows // 8, sort="amount", filters=[("city", "eq", "Lima")]),
+        }
+        for mode, query in queries.items():
+            start = time.perf_counter()
+            page = service.rows("bench", source, query)
+            results[mode] = (time.perf_counter() - start, len(page.rows.to_csv(index=False)))
+
+        for mode in ["summary", "summary (cached)"]:
+            start = time.perf_counter()
+            summary = service.summary("bench", source)
+            results[mode] = (time.perf_counter() - start, len(str(summary)))
+        sessions.close_all()
+
+    print(f"{'mode':>16} {'seconds':>9} {'response MB':>12}")
+    for mode, (elapsed, size) in results.items():
+        print(f"{mode:>16} {elapsed:>9.3f} {size / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmarks repeated analytic queries over a large CSV (or Parquet) file, the way
+# DuckdbTool runs them:
+#
+#   per_call - the old tool: a new duckdb.connect per call, scanning the file each query
+#   session  - a pooled DuckDBSession: one connection per run, the file registered as a
+#              view once (CSV parsed into a TEMP table, Parquet footers cached)
+#
+# Generates a file of about --size-mb in a temporary directory, then runs each of the
+# queries --repeat times in both modes.
+#
+#   python -m benchmarks.bench_duckdb_sessions --size-mb 1024 --format csv
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import duckdb
+
+from supercog.engine.duckdb_sessions import DuckDBSessionPool, FILE_READERS
+
+QUERIES = [
+    "SELECT region, count(*), sum(amount) FROM {source} GROUP BY region ORDER BY region",
+    "SELECT product, avg(amount) FROM {source} WHERE quantity > 5 GROUP BY product ORDER BY 2 DESC LIMIT 10",
+    "SELECT date_trunc('month', ordered_at) AS month, sum(amount) FROM {source} GROUP BY month ORDER BY month",
+    "SELECT count(DISTINCT customer_id) FROM {source}",
+]
+
+
+def generate_file(path: str, file_format: str, size_mb: int):
+    # About 60 bytes per CSV row
+    rows = size_mb * 1024 * 1024 // 60
+    with duckdb.connect() as con:
+        con.execute(f"""
+        COPY (
+            SELECT
+                i AS order_id,
+                i % 200000 AS customer_id,
+                'product_' || (i % 500) AS product,
+                ['north', 'south', 'east', 'west'][i % 4 + 1] AS region,
+                (i % 10) + 1 AS quantity,
+                round((i % 9973) / 10.0, 2) AS amount,
+                TIMESTAMP '2023-01-01' + INTERVAL (i % 31536000) SECOND AS ordered_at
+            FROM range({rows}) t(i)
+        ) TO '{path}' (FORMAT {file_format})
+        """)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--memory-limit", default="4GB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"orders.{args.format}")
+        start = time.perf_counter()
+        generate_file(path, args.format, args.size_mb)
+        print(
+            f"Generated {os.path.getsize(path) / 1024 / 1024:.0f}MB {args.format} file "
+            f"in {time.perf_counter() - start:.1f}s, {args.threads} threads"
+        )
+        scan = f"{FILE_READERS[args.format]}('{path}')"
+        results = {}
+
+        timings = []
+        for _ in range(args.repeat):
+            for query in QUERIES:
+                start = time.perf_counter()
+                with duckdb.connect(os.path.join(tmp, "per_call.db")) as con:
+                    con.execute(f"SET threads = {args.threads}")
+                    con.execute(query.format(source=scan)).fetchall()
+                timings.append(time.perf_counter() - start)
+        results["per_call"] = timings
+
+        pool = DuckDBSessionPool(
+            memory_limit=args.memory_limit, threads=args.threads, temp_directory=os.path.join(tmp, "spill")
+        )
+        timings = []
+        for _ in range(args.repeat):
+            for query in QUERIES:
+                start = time.perf_counter()
+                with pool.session("bench", os.path.join(tmp, "session.db")) as session:
+                    view = session.register_file(path, args.format, "orders")
+                    session.execute(query.format(source=view)).fetchall()
+                timings.append(time.perf_counter() - start)
+        results["session"] = timings
+        pool.close_all()
+
+    print(f"{len(QUERIES)} queries x {args.repeat}")
+    print(f"{'mode':>10} {'first s':>9} {'median s':>9} {'total s':>9}")
+    for mode, timings in results.items():
+        print(f"{mode:>10} {timings[0]:>9.2f} {statistics.median(timings):>9.2f} {sum(timings):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Benchmarks finding the files an agent turn changed in a user's workspace:
+#
+#   walk      - os.walk + getmtime over the whole tree (the old list_modified_files)
+#   manifest  - ManifestChangeIndex (scandir pass diffed against a persisted manifest)
+#   inotify   - InotifyChangeIndex (only the changed files are looked at)
+#
+# Builds synthetic workspaces with 10k and 100k files (100 files per directory), then
+# runs --turns turns that each modify --changes files, and reports the median time per
+# turn to list the changed files. The first (bootstrap) turn is reported separately.
+#
+#   python -m benchmarks.bench_file_changes --sizes 10000 100000 --changes 5
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from supercog.engine.file_changes import ChangeIndexRegistry, Inotify
+
+
+def walk_modified_files(user_dir: str, from_time: datetime) -> list[str]:
+    recent_files = []
+    comp_time = from_time.timestamp()
+    for dirpath, dirnames, files in os.walk(user_dir):
+        for file in files:
+            file_path = os.path.join(dirpath, file)
+            if os.path.getmtime(file_path) > comp_time:
+                recent_files.append(file_path)
+    return recent_files
+
+
+def make_workspace(root: str, num_files: int) -> list[str]:
+    paths = []
+    past = time.time() - 3600
+    for i in range(num_files):
+        dirpath = os.path.join(root, f"d{i // 1000}", f"s{(i // 100) % 10}")
+        if i % 100 == 0:
+            os.makedirs(dirpath, exist_ok=True)
+        path = os.path.join(dirpath, f"file{i}.txt")
+        with open(path, "w") as f:
+            f.write("x")
+        os.utime(path, (past, past))
+        paths.append(path)
+    return paths
+
+
+def run_turns(list_changes, paths: list[str], turns: int, changes: int) -> tuple[float, list[float]]:
+    # Returns (bootstrap ms, [ms per turn])
+    rng = random.Random(42)
+    start = time.perf_counter()
+    list_changes(datetime.now())
+    bootstrap_ms = (time.perf_counter() - start) * 1000
+
+    times = []
+    for _ in range(turns):
+        turn_start = datetime.now()
+        time.sleep(0.01)
+        expected = set(rng.sample(paths, changes))
+        for path in expected:
+            with open(path, "a") as f:
+                f.write("y")
+        start = time.perf_counter()
+        found = set(list_changes(turn_start))
+        times.append((time.perf_counter() - start) * 1000)
+        assert found == expected, f"expected {len(expected)} changes, found {len(found)}"
+    return bootstrap_ms, times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=5, help="Files modified per turn")
+    args = parser.parse_args()
+
+    modes = ["manifest"] + (["inotify"] if Inotify.available() else [])
+    print(f"{'files':>8} {'method':>9} {'bootstrap':>11} {'per turn':>10}")
+    for size in args.sizes:
+        tmp = tempfile.mkdtemp(prefix="bench_file_changes")
+        try:
+            workspace = os.path.join(tmp, "workspace")
+            paths = make_workspace(workspace, size)
+            methods = {"walk": lambda from_time: walk_modified_files(workspace, from_time)}
+            for mode in modes:
+                registry = ChangeIndexRegistry(mode=mode)
+                manifest = os.path.join(tmp, f"{mode}.json")
+                methods[mode] = (
+                    lambda from_time, registry=registry, manifest=manifest:
+                        registry.changed_files(workspace, manifest, from_time)
+                )
+            for name, list_changes in methods.items():
+                bootstrap_ms, times = run_turns(list_changes, paths, args.turns, args.changes)
+                print(f"{size:>8} {name:>9} {bootstrap_ms:>9.1f}ms {statistics.median(times):>8.2f}ms")
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
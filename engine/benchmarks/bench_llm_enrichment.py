@@ -0,0 +1,116 @@
+# Benchmarks DuckdbTool.llm_enrich_column's LLM calls against a fake LLM that takes
+# --latency seconds per request plus --per-value-latency per value in it:
+#
+#   per_row  - the old tool: one blocking request per row, one after the other. Only the
+#              first --per-row-sample rows are run, and the total is extrapolated.
+#   batched  - LLMEnricher: distinct values, --batch-size per request, --concurrency
+#              requests at once, under --requests-per-minute
+#   cached   - the same enrichment again, answered from the cache
+#   resumed  - a run where --fail-rate of the requests fail, followed by a second run
+#              that only sends the values that failed
+#
+# Runs offline, with the cache in a temporary SQLite file.
+#
+#   python -m benchmarks.bench_llm_enrichment --rows 10000 --distinct 2000
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from supercog.engine.llm_enrichment import EnrichmentCache, LLMEnricher
+
+PROMPT = "Classify the sentiment of this review as positive, negative or neutral"
+
+
+class FakeLLM:
+    def __init__(self, latency: float, per_value_latency: float, fail_rate: float = 0.0):
+        self.latency = latency
+        self.per_value_latency = per_value_latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+
+    def answer(self, value: str) -> str:
+        return ["positive", "negative", "neutral"][len(value) % 3]
+
+    async def __call__(self, messages: list[dict], model: str) -> str:
+        self.requests += 1
+        content = messages[-1]["content"]
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        values = json.loads(match.group(0)) if match else None
+        await asyncio.sleep(self.latency + self.per_value_latency * (len(values) if values else 1))
+        if random.random() < self.fail_rate:
+            raise RuntimeError("429 Too Many Requests")
+        if values is None:
+            return self.answer(content)
+        return json.dumps({key: self.answer(value) for key, value in values.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--per-value-latency", type=float, default=0.02)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=int, default=600)
+    parser.add_argument("--per-row-sample", type=int, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    random.seed(0)
+    values = [f"Review {i % args.distinct}: " + "great product " * (i % args.distinct % 7) for i in range(args.rows)]
+    results = {}
+
+    async def bench():
+        llm = FakeLLM(args.latency, args.per_value_latency)
+        start = time.perf_counter()
+        for value in values[:args.per_row_sample]:
+            await llm([{"role": "user", "content": f"{PROMPT}: {value}"}], "fake")
+        elapsed = time.perf_counter() - start
+        results["per_row"] = (elapsed * args.rows / args.per_row_sample, args.rows, "estimated")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            options = dict(
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                requests_per_minute=args.requests_per_minute,
+                retry_delay=0.5,
+            )
+            cache = EnrichmentCache(f"sqlite:///{os.path.join(tmp, 'cache.db')}")
+            llm = FakeLLM(args.latency, args.per_value_latency)
+            enricher = LLMEnricher(llm, cache=cache, **options)
+            for mode in ["batched", "cached"]:
+                llm.requests = 0
+                start = time.perf_counter()
+                enrichment = await enricher.enrich(PROMPT, "fake", values)
+                results[mode] = (time.perf_counter() - start, llm.requests, str(enrichment.summary()))
+
+            cache = EnrichmentCache(f"sqlite:///{os.path.join(tmp, 'resume.db')}")
+            llm = FakeLLM(args.latency, args.per_value_latency, fail_rate=args.fail_rate)
+            enricher = LLMEnricher(llm, cache=cache, **(options | {"max_retries": 0}))
+            start = time.perf_counter()
+            first = await enricher.enrich(PROMPT, "fake", values)
+            llm.fail_rate = 0
+            second = await enricher.enrich(PROMPT, "fake", values)
+            results["resumed"] = (
+                time.perf_counter() - start, llm.requests, f"{first.failed} failed, then {second.summary()}"
+            )
+
+    asyncio.run(bench())
+    print(
+        f"{args.rows} rows, {args.distinct} distinct values, {args.latency * 1000:.0f}ms per request "
+        f"+ {args.per_value_latency * 1000:.0f}ms per value"
+    )
+    print(f"{'mode':>8} {'seconds':>9} {'requests':>9}  notes")
+    for mode, (elapsed, requests, notes) in results.items():
+        print(f"{mode:>8} {elapsed:>9.1f} {requests:>9}  {notes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Benchmarks publishing streamed agent output, comparing one message per LLM token
+# against the OutputCoalescer (time window + byte budget).
+#
+# The LLM is simulated by a generator yielding AgentOutputEvents with a fixed gap between
+# tokens, and "publishing" builds the RunLog-style JSON message we would send to Redis.
+# We report the number of published messages, published events/sec, and first-token
+# latency (time from the first token being generated to it being published).
+#
+#   python -m benchmarks.bench_output_coalescing --tokens 2000 --gap-ms 2
+
+import argparse
+import asyncio
+import json
+import time
+
+from supercog.shared.apubsub import AgentOutputEvent, ToolEvent
+from supercog.engine.output_coalescer import OutputCoalescer, coalesce_events
+
+
+async def fake_llm(num_tokens: int, gap_secs: float, first_token_at: list[float]):
+    meta = {"agent_id": "bench", "user_id": "bench", "lc_run_id": "bench"}
+    for i in range(num_tokens):
+        await asyncio.sleep(gap_secs)
+        if i == 0:
+            first_token_at.append(time.perf_counter())
+        if i == num_tokens // 2:
+            yield ToolEvent(**(meta | {"name": "search", "tool_params": {"q": "x"}}))
+        yield AgentOutputEvent(**(meta | {"str_result": f"tok{i} "}))
+
+
+async def run_mode(name: str, coalescer: OutputCoalescer|None, num_tokens: int, gap_secs: float):
+    first_token_at: list[float] = []
+    first_publish_at: list[float] = []
+    published = 0
+
+    async def publish(batch):
+        nonlocal published
+        for event in batch:
+            json.dumps(event.model_dump())
+            published += 1
+        if not first_publish_at:
+            first_publish_at.append(time.perf_counter())
+
+    start = time.perf_counter()
+    events = fake_llm(num_tokens, gap_secs, first_token_at)
+    if coalescer is None:
+        async for event in events:
+            await publish([event])
+    else:
+        async for batch in coalesce_events(events, coalescer):
+            await publish(batch)
+    elapsed = time.perf_counter() - start
+
+    latency_ms = (first_publish_at[0] - first_token_at[0]) * 1000
+    print(
+        f"{name:>24}: {published:6d} messages, {published / elapsed:8.0f} msgs/sec, "
+        f"first token {latency_ms:6.2f}ms, total {elapsed:.2f}s"
+    )
+    return published
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--gap-ms", type=float, default=2.0, help="simulated time between LLM tokens")
+    parser.add_argument("--flush-ms", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    gap = args.gap_ms / 1000.0
+    print(f"{args.tokens} tokens, {args.gap_ms}ms apart")
+    baseline = await run_mode("per-token", None, args.tokens, gap)
+    for flush_ms in args.flush_ms:
+        coalescer = OutputCoalescer(flush_ms=flush_ms, max_bytes=args.max_bytes)
+        published = await run_mode(f"coalesced {flush_ms}ms", coalescer, args.tokens, gap)
+        print(f"{'':>24}  {baseline / max(published, 1):.1f}x fewer messages")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
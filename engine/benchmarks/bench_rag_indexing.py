@@ -0,0 +1,100 @@
+# Benchmarks indexing text chunks into a RAGTool pgvector table:
+#
+#   per_chunk - the old RAGTool._process_documents: embed_query and one INSERT per
+#               chunk, committing at the end
+#   batched   - ChunkIndexer: batched embeddings with bounded concurrency, and one
+#               multi-row INSERT per batch
+#
+# Runs offline: embeddings come from a deterministic local stand-in that sleeps
+# --latency seconds per embedding request to simulate the round trip to the model.
+# Needs a Postgres with pgvector (PGVECTOR_DB_URL, or --db-url).
+#
+#   python -m benchmarks.bench_rag_indexing --chunks 2000 --latency 0.05
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import psycopg2
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from psycopg2 import sql
+
+from supercog.engine.rag_indexer import ChunkIndexer, create_chunk_table
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    latency: float = 0.05
+    requests: int = 0
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        time.sleep(self.latency)
+        # Plain floats, like the OpenAI embeddings return
+        return [[float(x) for x in vector] for vector in super().embed_documents(texts)]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def index_per_chunk(conn, table_name: str, embeddings, source: str, chunks: list[str]):
+    with conn.cursor() as cur:
+        for i, content in enumerate(chunks):
+            embedding = embeddings.embed_query(content)
+            cur.execute(sql.SQL("""
+            INSERT INTO {} (content, source, line_number, embedding)
+            VALUES (%s, %s, %s, %s::vector)
+            """).format(sql.Identifier(table_name)), (content, source, i, embedding))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default=os.environ.get("PGVECTOR_DB_URL"))
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("Set PGVECTOR_DB_URL or pass --db-url")
+
+    conn = psycopg2.connect(args.db_url)
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    conn.commit()
+
+    # ~1000 character chunks, like RAGTool._split_text makes
+    chunks = [f"Chunk {i}: " + "lorem ipsum dolor sit amet " * 37 for i in range(args.chunks)]
+    results = {}
+    for mode in ["per_chunk", "batched"]:
+        table_name = f"rag_bench_{uuid.uuid4().hex[:8]}"
+        with conn.cursor() as cur:
+            create_chunk_table(cur, table_name, args.dimensions)
+        conn.commit()
+        embeddings = SlowEmbeddings(size=args.dimensions, latency=args.latency)
+        try:
+            start = time.perf_counter()
+            if mode == "per_chunk":
+                index_per_chunk(conn, table_name, embeddings, "bench.pdf", chunks)
+            else:
+                indexer = ChunkIndexer(conn, table_name, embeddings, args.batch_size, args.concurrency)
+                asyncio.run(indexer.index("bench.pdf", chunks))
+            results[mode] = (time.perf_counter() - start, embeddings.requests)
+        finally:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(table_name)))
+            conn.commit()
+    conn.close()
+
+    print(f"{args.chunks} chunks, {args.dimensions} dimensions, {args.latency * 1000:.0f}ms per embedding request")
+    print(f"{'mode':>10} {'seconds':>9} {'chunks/s':>9} {'requests':>9}")
+    for mode, (elapsed, requests) in results.items():
+        print(f"{mode:>10} {elapsed:>9.2f} {args.chunks / elapsed:>9.0f} {requests:>9}")
+
+
+if __name__ == "__main__":
+    main()
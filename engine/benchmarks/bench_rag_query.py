@@ -0,0 +1,155 @@
+# Load test for RAG service queries: fires --concurrency queries at once, --rounds
+# times, and reports the latency percentiles.
+#
+#   per_request - the old ragservice.query_index: a new PGVectorStore (and connection
+#                 pool) and query engine per request, queried with the blocking .query
+#   pooled      - QueryService: shared connection pool, cached query engines, .aquery
+#   cached      - QueryService with the Redis result cache (in-process fakeredis), where
+#                 a quarter of the queries repeat
+#
+# Runs offline: embeddings and answers come from LlamaIndex's mock models, and the query
+# embedding sleeps --latency seconds to simulate the round trip to the model. Needs a
+# Postgres with pgvector (PGVECTOR_DB_URL, or --db-url).
+#
+#   python -m benchmarks.bench_rag_query --concurrency 50 --latency 0.05
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import fakeredis
+import psycopg2
+from llama_index.core import Document, StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.vector_stores.postgres import PGVectorStore
+from sqlalchemy import make_url
+
+from supercog.rag.query import QueryService, make_vector_store
+
+
+class SlowEmbedding(MockEmbedding):
+    latency: float = 0.05
+
+    def _get_query_embedding(self, query):
+        time.sleep(self.latency)
+        return super()._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query):
+        await asyncio.sleep(self.latency)
+        return super()._get_query_embedding(query)
+
+
+def query_per_request(db_url: str, table_name: str, embed_model, query: str, top_k: int):
+    url = make_url(db_url)
+    vector_store = PGVectorStore.from_params(
+        connection_string=url.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False),
+        async_connection_string=url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False),
+        table_name=table_name,
+        hybrid_search=True,
+        embed_dim=embed_model.embed_dim,
+        perform_setup=False,
+    )
+    index = VectorStoreIndex.from_vector_store(
+        vector_store, storage_context=StorageContext.from_defaults(vector_store=vector_store), embed_model=embed_model
+    )
+    query_engine = index.as_query_engine(vector_store_query_mode="hybrid", similarity_top_k=top_k, llm=MockLLM())
+    response = query_engine.query(query)
+    vector_store.close()
+    return str(response)
+
+
+async def run_load(query, queries: list[str], concurrency: int) -> tuple[list[float], float]:
+    latencies = []
+
+    async def timed(text: str, submitted: float):
+        # From when the round was submitted, so time spent waiting for the event loop counts
+        await query(text)
+        latencies.append(time.perf_counter() - submitted)
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), concurrency):
+        submitted = time.perf_counter()
+        await asyncio.gather(*[timed(text, submitted) for text in queries[i:i + concurrency]])
+    return latencies, time.perf_counter() - start
+
+
+def percentile(values: list[float], pct: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default=os.environ.get("PGVECTOR_DB_URL"))
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("Set PGVECTOR_DB_URL or pass --db-url")
+
+    index_id = f"rag_query_bench_{uuid.uuid4().hex[:8]}"
+    embed_model = SlowEmbedding(embed_dim=args.dimensions, latency=args.latency)
+    vector_store = make_vector_store(args.db_url, index_id, embed_dim=args.dimensions)
+    VectorStoreIndex.from_documents(
+        [Document(text=f"Document {i}: quarterly report on region {i % 40}") for i in range(args.documents)],
+        storage_context=StorageContext.from_defaults(vector_store=vector_store),
+        embed_model=MockEmbedding(embed_dim=args.dimensions),
+    )
+
+    total = args.concurrency * args.rounds
+    distinct = [f"region {i} revenue" for i in range(total)]
+    # A quarter of the queries repeat an earlier one
+    repeating = [distinct[i] if i % 4 else distinct[i // 2] for i in range(total)]
+
+    async def bench() -> dict:
+        results = {}
+
+        async def per_request(text):
+            return query_per_request(args.db_url, index_id, embed_model, text, args.top_k)
+
+        results["per_request"] = await run_load(per_request, distinct, args.concurrency)
+
+        pooled = QueryService(lambda _: vector_store, lambda: embed_model, llm=MockLLM())
+        await pooled.query(index_id, "warm up", args.top_k)
+        results["pooled"] = await run_load(lambda text: pooled.query(index_id, text, args.top_k), distinct, args.concurrency)
+
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+        async def get_client():
+            return client
+
+        cached = QueryService(lambda _: vector_store, lambda: embed_model, llm=MockLLM(), get_client=get_client, cache_ttl=300)
+        await cached.query(index_id, "warm up", args.top_k)
+        results["cached"] = await run_load(lambda text: cached.query(index_id, text, args.top_k), repeating, args.concurrency)
+        return results
+
+    try:
+        results = asyncio.run(bench())
+    finally:
+        conn = psycopg2.connect(args.db_url)
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS data_{index_id}")
+        conn.commit()
+        conn.close()
+
+    print(
+        f"{total} queries, {args.concurrency} at a time, {args.documents} documents, "
+        f"{args.latency * 1000:.0f}ms per query embedding"
+    )
+    print(f"{'mode':>12} {'p50 ms':>9} {'p99 ms':>9} {'queries/s':>10}")
+    for mode, (latencies, elapsed) in results.items():
+        print(
+            f"{mode:>12} {percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 99) * 1000:>9.1f} "
+            f"{total / elapsed:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
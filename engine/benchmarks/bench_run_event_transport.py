@@ -0,0 +1,105 @@
+# Compares the two run events transports in AsyncPubSub (RUN_EVENTS_TRANSPORT):
+#
+#   pubsub  - plain Redis pub/sub on the run's logs channel
+#   streams - a capped Redis Stream per run logs channel (plus pub/sub for pattern subscribers)
+#
+# For each transport we publish --events RunLog-sized events to a fresh logs:... channel
+# with one live subscriber, and report:
+#
+#   events/s   - end-to-end throughput, from the first publish to the subscriber reading the last event
+#   memory     - growth in Redis used_memory while the run's events are retained
+#   late       - events replayed (from_id="0-0") to a subscriber that joins after the run has finished
+#
+# Needs a running Redis (REDIS_URL, default redis://localhost):
+#
+#   python -m benchmarks.bench_run_event_transport --events 20000 --size 300
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from supercog.shared import apubsub
+from supercog.shared.apubsub import AsyncPubSub
+
+
+def make_event(i: int, size: int) -> dict:
+    return {
+        "type": "output",
+        "agent_id": "bench",
+        "user_id": "bench",
+        "role": "agent",
+        "version": 3,
+        "content": json.dumps({"type": "output", "str_result": f"{i} " + "x" * size}),
+    }
+
+
+async def consume(sub, count: int, idle_secs: float = 1.0) -> int:
+    # Reads until `count` events arrive or nothing arrives for idle_secs
+    received = 0
+    last_seen = time.perf_counter()
+    while received < count and time.perf_counter() - last_seen < idle_secs:
+        # (pub/sub returns None for its subscribe confirmation too)
+        message = await sub.get_message(ignore_subscribe_messages=True, timeout=0.1)
+        if message is not None:
+            json.loads(message["data"])
+            received += 1
+            last_seen = time.perf_counter()
+    return received
+
+
+async def used_memory(ps: AsyncPubSub) -> int:
+    client = await ps.get_client()
+    return (await client.info("memory"))["used_memory"]
+
+
+async def bench_transport(transport: str, num_events: int, size: int) -> dict:
+    apubsub.RUN_EVENTS_TRANSPORT = transport
+    ps = AsyncPubSub()
+    channel = f"logs:bench{uuid.uuid4().hex}"
+    events = [make_event(i, size) for i in range(num_events)]
+
+    sub = await ps.subscribe(channel)
+    mem_before = await used_memory(ps)
+    reader = asyncio.create_task(consume(sub, num_events))
+    start = time.perf_counter()
+    for event in events:
+        await ps.publish(channel, event)
+    received = await reader
+    elapsed = time.perf_counter() - start
+    mem_after = await used_memory(ps)
+    await sub.unsubscribe()
+
+    late = await ps.subscribe(channel, from_id="0-0")
+    late_received = await consume(late, num_events)
+    await late.unsubscribe()
+
+    client = await ps.get_client()
+    await client.delete(apubsub.run_stream_key(channel))
+    await client.close()
+    return {
+        "received": received,
+        "events/s": received / elapsed,
+        "memory": mem_after - mem_before,
+        "late": late_received,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=300, help="Bytes of output text per event")
+    args = parser.parse_args()
+
+    print(f"{'transport':>10} {'received':>9} {'events/s':>10} {'memory':>10} {'late':>7}")
+    for transport in ["pubsub", "streams"]:
+        r = await bench_transport(transport, args.events, args.size)
+        print(
+            f"{transport:>10} {r['received']:>9} {r['events/s']:>10.0f} "
+            f"{r['memory'] / 1024:>8.0f}KB {r['late']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
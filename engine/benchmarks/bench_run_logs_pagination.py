@@ -0,0 +1,104 @@
+# Load test for the run logs API queries. Creates runs of increasing length and times:
+#
+#   full      - the whole run in one query (what GET /runs/{id}/run_logs used to do)
+#   first     - the first page (limit N)
+#   middle    - a page from the middle of the run, via an `after` cursor
+#   tail      - the last page, via `before` (what a chat opens to)
+#   since     - an incremental fetch of the newest logs, via `after`
+#   by type   - the first page filtered to one event type
+#
+# With the (run_id, created_at, id) index, every paged query should stay flat as the
+# run grows, while `full` grows linearly.
+#
+#   python -m benchmarks.bench_run_logs_pagination --db-url postgresql://localhost/monster_bench
+#
+# Defaults to a local SQLite file. Rows are written to their own runs and removed afterwards.
+
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, delete, insert
+from sqlmodel import SQLModel, Session
+
+from supercog.engine.db import RunLog
+from supercog.engine.main import get_run_logs, encode_run_log_cursor, decode_run_log_cursor
+
+
+def populate(engine, run_id: str, num_logs: int):
+    start = datetime.utcnow() - timedelta(hours=1)
+    rows = [
+        {
+            "run_id": run_id,
+            "agent_id": "bench",
+            "user_id": "bench",
+            "scope": "shared",
+            "created_at": start + timedelta(milliseconds=i),
+            "content": f'{{"type": "output", "str_result": "token {i}"}}',
+            "type": "tool" if i % 50 == 0 else "output",
+            "role": "agent",
+            "version": 3,
+        }
+        for i in range(num_logs)
+    ]
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 5000):
+            conn.execute(insert(RunLog.__table__), rows[i:i+5000])
+
+
+def timed(engine, query, repeat: int) -> tuple[float, list]:
+    times = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            logs = session.exec(query).all()
+            times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), logs
+
+
+def bench_run(engine, run_id: str, page: int, repeat: int) -> dict:
+    results = {}
+    results["full"], logs = timed(engine, get_run_logs(run_id), repeat)
+    middle = decode_run_log_cursor(encode_run_log_cursor(logs[len(logs) // 2]))
+    near_end = decode_run_log_cursor(encode_run_log_cursor(logs[-10]))
+
+    results["first"], _ = timed(engine, get_run_logs(run_id).limit(page), repeat)
+    results["middle"], _ = timed(engine, get_run_logs(run_id, after=middle).limit(page), repeat)
+    tail_query = get_run_logs(run_id).order_by(None).order_by(
+        RunLog.created_at.desc(), RunLog.id.desc()
+    ).limit(page)
+    results["tail"], _ = timed(engine, tail_query, repeat)
+    results["since"], _ = timed(engine, get_run_logs(run_id, after=near_end).limit(page), repeat)
+    results["by type"], _ = timed(engine, get_run_logs(run_id, types=["tool"]).limit(page), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default="sqlite:///run_logs_bench.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--page", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    SQLModel.metadata.create_all(engine, tables=[RunLog.__table__])
+
+    run_ids = []
+    try:
+        print(f"{'logs':>8} " + " ".join(f"{name:>9}" for name in ["full", "first", "middle", "tail", "since", "by type"]))
+        for size in args.sizes:
+            run_id = f"bench-{uuid.uuid4()}"
+            run_ids.append(run_id)
+            populate(engine, run_id, size)
+            results = bench_run(engine, run_id, args.page, args.repeat)
+            print(f"{size:>8} " + " ".join(f"{ms:>7.1f}ms" for ms in results.values()))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(RunLog.__table__).where(RunLog.__table__.c.run_id.in_(run_ids)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Measures the peak memory (RSS) of reading a large file into a dataframe, the way the
+# tabular tools read it:
+#
+#   pandas   - the old tools: the whole file read with pandas (pd.read_csv, read_json,
+#              read_parquet), then a preview taken
+#   streamed - tabular_reader.stream_to_arrow_file: the file copied to an Arrow file a
+#              chunk at a time, keeping only the preview rows
+#
+# Generates a file of about --size-mb in a temporary directory, then reads it in a fresh
+# subprocess per mode, so each mode's peak RSS is measured on its own.
+#
+#   python -m benchmarks.bench_tabular_memory --size-mb 1024 --format csv
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import duckdb
+
+from benchmarks.bench_duckdb_sessions import generate_file
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read_file(mode: str, path: str, file_format: str, chunk_rows: int) -> dict:
+    import pandas as pd
+    from supercog.engine.tabular_reader import stream_to_arrow_file
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "pandas":
+        if file_format == "csv":
+            df = pd.read_csv(path)
+        elif file_format == "json":
+            df = pd.read_json(path, lines=True)
+        else:
+            df = pd.read_parquet(path)
+        rows = len(df)
+        preview = df.head(5).astype(str).values.tolist()
+    else:
+        table_file = stream_to_arrow_file(path, file_format, path + ".arrow", chunk_rows=chunk_rows)
+        rows = table_file.row_count
+        preview = table_file.preview.astype(str).values.tolist()
+    return {
+        "rows": rows,
+        "preview_rows": len(preview),
+        "seconds": time.perf_counter() - start,
+        "baseline_mb": baseline,
+        "peak_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--format", choices=["csv", "json", "parquet"], default="csv")
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    parser.add_argument("--modes", default="pandas,streamed")
+    # Internal: run one mode on an existing file and print its results
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "PATH"))
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(read_file(args.run[0], args.run[1], args.format, args.chunk_rows)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"orders.{args.format}")
+        start = time.perf_counter()
+        if args.format == "json":
+            generate_file(path, "csv", args.size_mb)
+            with duckdb.connect() as con:
+                con.execute(f"COPY (SELECT * FROM read_csv('{path}')) TO '{path}.json' (FORMAT json)")
+            os.replace(path + ".json", path)
+        else:
+            generate_file(path, args.format, args.size_mb)
+        print(
+            f"Generated {os.path.getsize(path) / 1024 / 1024:.0f}MB {args.format} file "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+        results = {}
+        for mode in args.modes.split(","):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_tabular_memory", "--format", args.format,
+                 "--chunk-rows", str(args.chunk_rows), "--run", mode, path],
+                capture_output=True, text=True,
+            )
+            if output.returncode != 0:
+                # Most likely killed for running out of memory
+                print(f"{mode} failed with exit code {output.returncode}: {output.stderr.strip()[-500:]}")
+                continue
+            results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    print(f"{'mode':>10} {'rows':>12} {'seconds':>9} {'base MB':>9} {'peak MB':>9}")
+    for mode, result in results.items():
+        print(
+            f"{mode:>10} {result['rows']:>12} {result['seconds']:>9.1f} "
+            f"{result['baseline_mb']:>9.0f} {result['peak_mb']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Benchmarks agent task throughput through the Redis worker stream, comparing
+# serial processing (AGENT_WORKER_CONCURRENCY=1) against concurrent processing.
+#
+# Agent execution is simulated with a fixed sleep so we only measure the worker
+# loop itself (stream reads, acks, scheduling). Needs a running Redis (REDIS_URL).
+#
+#   python -m benchmarks.bench_worker_concurrency --tasks 40 --latency 0.5
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from supercog.engine.enginemgr import EngineManager
+
+
+class SimulatedEngineManager(EngineManager):
+    def __init__(self, tenant_id_list: list[str], max_concurrency: int, latency: float):
+        super().__init__(tenant_id_list, max_concurrency=max_concurrency)
+        self.latency = latency
+        self.processed = 0
+
+    async def _process_task(self, task_data, synchronous=True):
+        await asyncio.sleep(self.latency)
+        self.processed += 1
+
+
+async def run_mode(concurrency: int, num_tasks: int, latency: float) -> float:
+    tenant_id = f"bench-{uuid.uuid4().hex[:8]}"
+    stream = f"agents:{tenant_id}"
+    mgr = SimulatedEngineManager([tenant_id], max_concurrency=concurrency, latency=latency)
+    await mgr.connect()
+
+    for i in range(num_tasks):
+        task = {"action": "prompt", "run": {"id": str(uuid.uuid4())}, "user": {}, "headers": {}, "query_params": {}}
+        await mgr.redis.xadd(stream, {"task": json.dumps(task)})
+
+    start = time.perf_counter()
+    loop_task = asyncio.create_task(mgr.process_tasks_until_canceled())
+    while mgr.processed < num_tasks:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    mgr.shutdown()
+    await loop_task
+    await mgr.redis.delete(stream)
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per agent task")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{args.tasks} tasks, {args.latency}s simulated agent time each")
+    baseline = None
+    for concurrency in args.concurrency:
+        elapsed = await run_mode(concurrency, args.tasks, args.latency)
+        baseline = baseline or elapsed
+        print(
+            f"concurrency={concurrency:<3} elapsed={elapsed:6.2f}s "
+            f"throughput={args.tasks / elapsed:6.2f} tasks/s speedup={baseline / elapsed:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
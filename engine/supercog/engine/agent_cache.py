@@ -0,0 +1,141 @@
+# Worker-wide cache for the expensive, shareable parts of compiling an agent.
+#
+# ChatEngine.create_agent runs on every run start, agent update, tool enable and API key
+# change. Most of its cost is not per-run state at all:
+#
+#   - building the pydantic args schema for every tool function (`tool(func)`)
+#   - converting each tool to its JSON tool definition for `bind_tools`
+#   - constructing the LLM client and binding the tool definitions to it
+#
+# Tool *functions* stay per-engine, since they close over the engine's RunContext and
+# the tool credentials. But their schemas only depend on the function's name, docstring
+# and signature, and a bound LLM only depends on the model settings, API key and the
+# tool definitions. So we cache those here, keyed on their content, and share them across
+# runs and across engines in the same worker. Changing an agent's model, temperature or
+# tools, or the user's API key, produces a different key (API keys are hashed, never stored).
+
+import hashlib
+import inspect
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from supercog.shared.services import config
+from supercog.shared.logging import logger
+
+MAX_BOUND_LLMS = int(config.get_option("AGENT_CACHE_MAX_LLMS", default=128))
+MAX_TOOL_SCHEMAS = int(config.get_option("AGENT_CACHE_MAX_TOOL_SCHEMAS", default=4096))
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        value = build()
+        self._items[key] = value
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+# function identity -> pydantic args schema
+_tool_args_schemas = LRUCache(MAX_TOOL_SCHEMAS)
+# (name, description, args schema) -> JSON tool definition
+_tool_definitions = LRUCache(MAX_TOOL_SCHEMAS)
+# (llm class, settings, API key hash, tool definitions) -> bound LLM
+_bound_llms = LRUCache(MAX_BOUND_LLMS)
+
+
+def tool_function_key(tool_func: Callable) -> tuple|None:
+    # The schema LangChain infers for a tool only depends on these
+    try:
+        signature = str(inspect.signature(tool_func))
+    except (TypeError, ValueError):
+        return None
+    return (
+        getattr(tool_func, "__module__", None),
+        getattr(tool_func, "__qualname__", None),
+        getattr(tool_func, "__name__", None),
+        tool_func.__doc__,
+        signature,
+    )
+
+def get_tool_args_schema(tool_func: Callable, build: Callable[[], Any]):
+    key = tool_function_key(tool_func)
+    if key is None:
+        return build()
+    return _tool_args_schemas.get_or_create(key, build)
+
+def get_tool_definitions(tools: list) -> list[dict]:
+    # JSON tool definitions for `bind_tools`, in OpenAI format (which the Anthropic
+    # and Groq clients accept too).
+    defs = []
+    for tool in tools:
+        args_schema = getattr(tool, "args_schema", None)
+        if args_schema is None:
+            defs.append(convert_to_openai_tool(tool))
+            continue
+        key = (tool.name, tool.description, args_schema)
+        defs.append(_tool_definitions.get_or_create(key, lambda: convert_to_openai_tool(tool)))
+    return defs
+
+def secret_fingerprint(secret: str|None) -> str|None:
+    if secret is None:
+        return None
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def get_bound_llm(
+        llm_class: type,
+        llm_kwargs: dict,
+        tools: list,
+        secret_kwargs: tuple[str, ...] = ("api_key",),
+        bind_tools: bool = True,
+    ):
+    # Returns a (shared) LLM client built with `llm_kwargs`, with `tools` bound to it
+    tool_defs = get_tool_definitions(tools) if bind_tools else []
+    settings = {
+        k: (secret_fingerprint(v) if k in secret_kwargs else v)
+        for k, v in llm_kwargs.items()
+    }
+    key = (
+        llm_class.__module__ + "." + llm_class.__qualname__,
+        json.dumps(settings, sort_keys=True, default=repr),
+        json.dumps(tool_defs, sort_keys=True, default=repr),
+    )
+
+    def build():
+        logger.debug(f"Compiling LLM {llm_class.__name__} with {len(tool_defs)} tools")
+        llm = llm_class(**llm_kwargs)
+        if tool_defs:
+            llm = llm.bind_tools(tool_defs)
+        return llm
+
+    return _bound_llms.get_or_create(key, build)
+
+def clear():
+    for cache in (_tool_args_schemas, _tool_definitions, _bound_llms):
+        cache.clear()
+
+def stats() -> dict:
+    return {
+        "tool_args_schemas": _tool_args_schemas.stats(),
+        "tool_definitions": _tool_definitions.stats(),
+        "bound_llms": _bound_llms.stats(),
+    }
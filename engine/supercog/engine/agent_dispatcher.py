@@ -7,6 +7,7 @@ import multiprocessing
 
 from supercog.shared.apubsub import pubsub
 from .enginemgr import AgentTask, EngineManager
+from .consumer_registry import ConsumerRegistry
 
 # This class takes incoming requests to the agentsvc
 # and dispatches them via a Redis based worker queue.
@@ -19,10 +20,15 @@ from .enginemgr import AgentTask, EngineManager
 class AgentDispatcher:
     def __init__(self, enginemgr):
         self.started_consumers = {}  # Dictionary to keep track of started consumers
+        self.redis = None
+        self.reaper_task = None
 
     async def connect(self):
         print("Agent dispatcher connecting to Redis")
         self.redis = await pubsub.get_client()
+        self.consumer_registry = ConsumerRegistry(self.redis)
+        if self.reaper_task is None:
+            self.reaper_task = asyncio.create_task(self.consumer_registry.reap_loop())
 
     async def enqueue_task(self, tenant_id: str, task_data: AgentTask) -> str:
         # Queues an agent task and returns the task ID for identifying it later
@@ -32,8 +38,8 @@ class AgentDispatcher:
         stream_name = f'agents:{tenant_id}'
 
         # Check for active consumers before publishing
-        active_consumers = await self.check_stream_consumers(stream_name)
-        if not active_consumers:
+        has_consumers = await self.check_stream_consumers(stream_name)
+        if not has_consumers:
             print(f"Warning: No active consumers for {stream_name}")
             # Execute a worker for this task type
             await self.exec_worker(tenant_id)
@@ -42,23 +48,15 @@ class AgentDispatcher:
         
         await self.redis.xadd(stream_name, {'task': task_data.json()})
 
-    async def check_stream_consumers(self, stream_name):
-        heartbeat_keys = await self.redis.keys("heartbeat:consumer_*")
-        active_consumers = []
+    async def check_stream_consumers(self, stream_name) -> bool:
+        # Returns True if some worker serving this tenant stream has heartbeated recently
+        tenant_id = stream_name.split(':')[1]
+        return await self.consumer_registry.has_live_consumer(tenant_id)
 
-        task_id = stream_name.split(':')[1]
-        for key in heartbeat_keys:
-            heartbeat_data = await self.redis.get(key)
-            if heartbeat_data:
-                data = json.loads(heartbeat_data)
-                print(data)
-                if task_id in data['streams']:
-                    consumer_name = key.split(':')[1]
-                    last_heartbeat = data['timestamp']
-                    if time.time() - last_heartbeat < 15:  # Consider consumer alive if heartbeat within last 15 seconds
-                        active_consumers.append(consumer_name)
-
-        return active_consumers
+    async def worker_stats(self) -> dict:
+        if not self.redis:
+            await self.connect()
+        return await self.consumer_registry.worker_counts()
 
     async def exec_worker(self, tenant_id: str):
         # This function will start a new worker process
@@ -77,8 +75,8 @@ class AgentDispatcher:
         # Wait for the worker to become active
         start_time = time.time()
         while time.time() - start_time < timeout:
-            active_consumers = await self.check_stream_consumers(stream_name)
-            if active_consumers:
+            has_consumers = await self.check_stream_consumers(stream_name)
+            if has_consumers:
                 print(f"Worker for {stream_name} is now active")
                 return True
             await asyncio.sleep(0.3)
@@ -86,6 +84,8 @@ class AgentDispatcher:
         return False
 
     def close(self):
+        if self.reaper_task:
+            self.reaper_task.cancel()
         self.cleanup_consumers()
 
     def cleanup_consumers(self):
@@ -107,6 +107,10 @@ class NoOpDispatch(AgentDispatcher):
     async def enqueue_task(self, tenant_id: str, task_data: AgentTask) -> str:
         await self.enginemgr._process_task(task_data.model_dump(), synchronous=False)
 
+    async def worker_stats(self) -> dict:
+        # Agents run in this process, there are no separate workers
+        return {}
+
     def close(self):
         pass
 
@@ -0,0 +1,218 @@
+# Content-addressed storage for the assets agents create while they run (dataframe
+# previews, long tool results).
+#
+# Asset content is kept as a blob on local disk or in S3 (ASSET_STORE_BACKEND), named
+# by the sha256 of the content, so the same content stored twice by a tenant is only
+# kept once. Redis only holds small descriptors:
+#
+#   {asset cache key}        -> {"tenant_id", "sha256", "size", "content_type"}, expires
+#                               after ASSET_DESCRIPTOR_TTL_SECS
+#   assets:{tenant}:lru      -> sorted set of the tenant's blobs by last access time
+#   assets:{tenant}:sizes    -> hash of blob sha256 -> size
+#   assets:{tenant}:bytes    -> total size of the tenant's blobs
+#
+# When a tenant's blobs grow past ASSET_TENANT_QUOTA_BYTES the least recently used
+# ones are deleted. An asset whose blob was evicted reads as missing.
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from supercog.shared.apubsub import pubsub
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+from supercog.shared.utils import get_boto_client
+
+from .filesystem import SYSTEM_ROOT_PATH
+
+ASSET_STORE_BACKEND = config.get_option("ASSET_STORE_BACKEND", default="local")
+ASSET_STORE_PATH = config.get_option("ASSET_STORE_PATH", default=os.path.join(SYSTEM_ROOT_PATH, ".assets"))
+ASSET_STORE_BUCKET = config.get_option("ASSET_STORE_BUCKET", default=config.get_global("S3_FILES_BUCKET_NAME", False))
+ASSET_TENANT_QUOTA_BYTES = int(config.get_option("ASSET_TENANT_QUOTA_BYTES", default=1024 * 1024 * 1024))
+ASSET_DESCRIPTOR_TTL_SECS = int(config.get_option("ASSET_DESCRIPTOR_TTL_SECS", default=60 * 60 * 24))
+
+
+class LocalBlobBackend:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                f.seek(start)
+                return f.read() if end is None else f.read(max(0, end - start))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobBackend:
+    def __init__(self, bucket: str, prefix: str = "assets/", s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3_client = s3_client or get_boto_client("s3")
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self.s3_client.exceptions.ClientError:
+            return False
+
+    def put(self, key: str, data: bytes):
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        kwargs = {}
+        if start or end is not None:
+            if end is not None and end <= start:
+                return b""
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end - 1}"
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + key, **kwargs)
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+class AssetStore:
+    def __init__(
+            self,
+            backend=None,
+            get_client=pubsub.get_client,
+            quota_bytes: int = ASSET_TENANT_QUOTA_BYTES,
+            descriptor_ttl: int = ASSET_DESCRIPTOR_TTL_SECS,
+        ):
+        self._backend = backend
+        self.get_client = get_client
+        self.quota_bytes = quota_bytes
+        self.descriptor_ttl = descriptor_ttl
+
+    @property
+    def backend(self):
+        # Created on first use, so importing this module doesn't need S3 credentials
+        if self._backend is None:
+            if ASSET_STORE_BACKEND == "s3":
+                self._backend = S3BlobBackend(ASSET_STORE_BUCKET)
+            else:
+                self._backend = LocalBlobBackend(ASSET_STORE_PATH)
+        return self._backend
+
+    @staticmethod
+    def blob_key(tenant_id: str, sha256: str) -> str:
+        return f"{tenant_id}/{sha256[:2]}/{sha256}"
+
+    @staticmethod
+    def _tenant_keys(tenant_id: str) -> tuple[str, str, str]:
+        return f"assets:{tenant_id}:lru", f"assets:{tenant_id}:sizes", f"assets:{tenant_id}:bytes"
+
+    async def put(self, tenant_id: str, cache_key: str, content: bytes|str, content_type: str) -> dict:
+        """ Stores the content (unless the tenant already has it) and points cache_key at
+            it. Returns the descriptor. """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        sha256 = hashlib.sha256(content).hexdigest()
+        descriptor = {
+            "tenant_id": tenant_id,
+            "sha256": sha256,
+            "size": len(content),
+            "content_type": content_type,
+        }
+        lru_key, sizes_key, bytes_key = self._tenant_keys(tenant_id)
+        client = await self.get_client()
+
+        # Claim the blob first, so concurrent puts of the same content write it once
+        if await client.hsetnx(sizes_key, sha256, len(content)):
+            try:
+                blob_key = self.blob_key(tenant_id, sha256)
+                await asyncio.to_thread(self.backend.put, blob_key, content)
+            except Exception:
+                await client.hdel(sizes_key, sha256)
+                raise
+            await client.incrby(bytes_key, len(content))
+
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zadd(lru_key, {sha256: time.time()})
+            pipe.set(cache_key, json.dumps(descriptor), ex=self.descriptor_ttl)
+            await pipe.execute()
+
+        await self.enforce_quota(tenant_id, keep=sha256)
+        return descriptor
+
+    async def get_descriptor(self, cache_key: str) -> Optional[dict]:
+        client = await self.get_client()
+        value = await client.get(cache_key)
+        return json.loads(value) if value else None
+
+    async def read(self, descriptor: dict, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        """ Returns the bytes [start, end) of the asset's content, or None if its blob
+            is gone. """
+        tenant_id, sha256 = descriptor["tenant_id"], descriptor["sha256"]
+        content = await asyncio.to_thread(
+            self.backend.read, self.blob_key(tenant_id, sha256), start, end
+        )
+        if content is not None:
+            lru_key, _, _ = self._tenant_keys(tenant_id)
+            client = await self.get_client()
+            await client.zadd(lru_key, {sha256: time.time()}, xx=True)
+        return content
+
+    async def get(self, cache_key: str) -> tuple[Optional[bytes], Optional[str]]:
+        # Returns (content, content_type) of the whole asset
+        descriptor = await self.get_descriptor(cache_key)
+        if descriptor is None:
+            return None, None
+        content = await self.read(descriptor)
+        return content, descriptor["content_type"] if content is not None else None
+
+    async def tenant_usage(self, tenant_id: str) -> int:
+        client = await self.get_client()
+        return int(await client.get(self._tenant_keys(tenant_id)[2]) or 0)
+
+    async def enforce_quota(self, tenant_id: str, keep: Optional[str] = None):
+        # Deletes the tenant's least recently used blobs until it is under its quota
+        lru_key, sizes_key, bytes_key = self._tenant_keys(tenant_id)
+        client = await self.get_client()
+        while await self.tenant_usage(tenant_id) > self.quota_bytes:
+            oldest = [sha for sha in await client.zrange(lru_key, 0, 9) if sha != keep]
+            if not oldest:
+                break
+            for sha256 in oldest:
+                size = await client.hget(sizes_key, sha256)
+                await asyncio.to_thread(self.backend.delete, self.blob_key(tenant_id, sha256))
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.zrem(lru_key, sha256)
+                    pipe.hdel(sizes_key, sha256)
+                    pipe.decrby(bytes_key, int(size or 0))
+                    await pipe.execute()
+                logger.info(f"Evicted asset blob {sha256} ({size} bytes) of tenant {tenant_id}")
+                if await self.tenant_usage(tenant_id) <= self.quota_bytes:
+                    break
+
+
+asset_store = AssetStore()
@@ -1,8 +1,16 @@
 import redis.asyncio as redis
 from typing import AsyncIterator, Optional, Sequence
+import asyncio
+import io
 import json
 import os
+import time
+import traceback
+from uuid import UUID
 
+import psycopg2
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy import exc as sa_exc
 from sqlmodel import Session, select
 
 from fastapi import FastAPI
@@ -11,7 +19,8 @@ from fastapi_lifespan_manager import LifespanManager, State
 from supercog.shared.pubsub import REDIS_HOST, REDIS_PORT
 from supercog.shared.apubsub import pubsub
 from supercog.shared.models import RunLogBase
-from supercog.shared.services import db_connect
+from supercog.shared.services import config, db_connect
+from supercog.shared.logging import logger
 from supercog.shared.apubsub import AgentLogEventTypes, EventRegistry, TokenUsageEvent
 
 from .db import lifespan_manager, RunLog, Run
@@ -19,48 +28,253 @@ from .db import lifespan_manager, RunLog, Run
 
 MYDEBUG = os.environ.get('CHAT_LOG_DEBUG')
 
+# The ChatLogger is write-behind: events are buffered in memory and written in batches
+# when the buffer reaches FLUSH_ROWS or every FLUSH_MS, whichever comes first.
+FLUSH_ROWS = int(config.get_option("CHAT_LOG_FLUSH_ROWS", default=500))
+FLUSH_MS = int(config.get_option("CHAT_LOG_FLUSH_MS", default=250))
+# If the database falls this far behind, we stop reading from pubsub until we catch up
+MAX_BUFFERED = int(config.get_option("CHAT_LOG_MAX_BUFFERED", default=20_000))
+# Use Postgres COPY for run_logs (otherwise multi-row INSERTs)
+USE_COPY = config.get_option("CHAT_LOG_USE_COPY", default="true").lower() == "true"
+
+RUN_LOG_COLUMNS = [
+    "run_id", "lc_run_id", "agent_id", "user_id", "scope",
+    "created_at", "content", "type", "role", "version",
+]
+
+# Errors that mean the database can't take any writes right now (it is down, or the
+# table is missing), as opposed to rows that it rejects. COPY raises psycopg2's own.
+DATABASE_UNAVAILABLE_ERRORS = (
+    sa_exc.OperationalError,
+    sa_exc.InterfaceError,
+    sa_exc.TimeoutError,
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    OSError,
+)
+
 class ChatLogger:
     def __init__(self):
         self.client = None
         self.next_logs: dict[str, RunLog] = {}
         self.engine = db_connect("engine") 
+        # Write-behind state. `buffer` holds run_logs rows waiting to be written, and
+        # `token_usage` holds the (input, output) token counts to add to each Run.
+        self.buffer: list[dict] = []
+        self.token_usage: dict[str, list[int]] = {}
+        self.flush_needed = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.flusher_task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "rows_written": 0,
+            "runs_updated": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "max_queue_depth": 0,
+        }
 
     def reconnect(self):
         self.engine.dispose()
         self.engine = db_connect("engine")
 
-    async def save_event(self, event, session: Session):
-        # Always saves a new run_log record
-        log = RunLog.model_validate(event)
-        session.add(log)
-        session.commit()
+    async def save_event(self, event, session: Session|None = None):
+        # Queues a new run_log record. `session` is unused now that writes are batched.
+        row = RunLog.model_validate(event).model_dump(include=set(RUN_LOG_COLUMNS))
+        self.buffer.append(row)
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(self.buffer))
+        if len(self.buffer) >= FLUSH_ROWS:
+            self.flush_needed.set()
 
-    async def update_token_usage(self, event, session: Session):
+    async def update_token_usage(self, event, session: Session|None = None):
+        # Aggregates token usage per run, applied to the Run at the next flush
         if 'run_id' not in event:
             return
-        # Might be worth just doing this as an update query
-        run = session.get(Run, event['run_id'])
         runlog = RunLogBase.model_validate(event)
         agevent = EventRegistry.get_event(runlog)
-        if run and isinstance(agevent, TokenUsageEvent):
-            run.input_tokens += int(agevent.usage_metadata.get("input_tokens", 0))
-            run.output_tokens += int(agevent.usage_metadata.get("output_tokens", 0))
-            session.add(run)
-            session.commit()
+        if isinstance(agevent, TokenUsageEvent):
+            try:
+                UUID(event['run_id'])
+            except (TypeError, ValueError):
+                return
+            usage = self.token_usage.setdefault(event['run_id'], [0, 0])
+            usage[0] += int(agevent.usage_metadata.get("input_tokens", 0))
+            usage[1] += int(agevent.usage_metadata.get("output_tokens", 0))
 
     async def start(self):
         print(f"########## STARTING CHAT LOGGER ############ {id(self)}")
+        self.flusher_task = asyncio.create_task(self.flush_loop())
         await pubsub.subscribe("logs*", self.receive_message)
 
+    async def stop(self):
+        # Write out everything still buffered
+        if self.flusher_task:
+            self.flusher_task.cancel()
+            try:
+                await self.flusher_task
+            except asyncio.CancelledError:
+                pass
+            self.flusher_task = None
+        await self.flush()
+
     async def receive_message(self, event_type: str, event: dict):
         if MYDEBUG:
             print(f"[CHAT LOGGER EVENT {id(self)}] ", event)
-        with Session(self.engine) as session:
-            await self.save_event(event, session)
+        try:
+            await self.save_event(event)
             if event_type == AgentLogEventTypes.TOKEN_USAGE:
-                await self.update_token_usage(event, session)
+                await self.update_token_usage(event)
+        except Exception as e:
+            logger.error(f"ChatLogger dropping invalid event: {e}")
+        if len(self.buffer) >= MAX_BUFFERED:
+            # Back pressure: pubsub won't deliver more until we return
+            try:
+                await self.flush()
+            except Exception:
+                # The database is failing. Rather than grow without bound, drop the oldest logs.
+                overflow = len(self.buffer) - MAX_BUFFERED
+                if overflow > 0:
+                    del self.buffer[:overflow]
+                    self.metrics["dropped"] += overflow
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_needed.wait(), timeout=FLUSH_MS / 1000.0)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"ChatLogger flush failed: {e}")
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.buffer and not self.token_usage:
+                return
+            rows, self.buffer = self.buffer, []
+            usage, self.token_usage = self.token_usage, {}
+            start = time.perf_counter()
+            written = len(rows)
+            try:
+                # Run the blocking DB work in a thread so we keep receiving events meanwhile
+                await asyncio.to_thread(self.write_batch, rows, usage)
+            except Exception as e:
+                self.metrics["flush_errors"] += 1
+                logger.error(f"ChatLogger failed to write {len(rows)} logs: {traceback.format_exc()}")
+                unwritten = rows
+                if not isinstance(e, DATABASE_UNAVAILABLE_ERRORS):
+                    # Some rows were rejected. Write the others, so the bad ones can't
+                    # hold up every later flush.
+                    try:
+                        unwritten, dropped = await asyncio.to_thread(self.write_isolating, rows, usage)
+                        usage = {}
+                        written = len(rows) - len(unwritten) - dropped
+                        self.metrics["dropped"] += dropped
+                    except Exception:
+                        logger.error(f"ChatLogger failed to write token usage: {traceback.format_exc()}")
+                if unwritten or usage:
+                    # Put the rest back so we retry it at the next flush
+                    self.buffer = unwritten + self.buffer
+                    for run_id, (input_tokens, output_tokens) in usage.items():
+                        pending = self.token_usage.setdefault(run_id, [0, 0])
+                        pending[0] += input_tokens
+                        pending[1] += output_tokens
+                    raise
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.metrics["flushes"] += 1
+            self.metrics["rows_written"] += written
+            self.metrics["runs_updated"] += len(usage)
+            self.metrics["last_flush_ms"] = elapsed_ms
+            self.metrics["total_flush_ms"] += elapsed_ms
+            self.metrics["max_flush_ms"] = max(self.metrics["max_flush_ms"], elapsed_ms)
+
+    def write_batch(self, rows: list[dict], usage: dict[str, list[int]]):
+        # Writes run_logs and token usage in one transaction
+        with self.engine.begin() as conn:
+            if rows:
+                if USE_COPY and conn.dialect.name == "postgresql":
+                    self.copy_run_logs(conn, rows)
+                else:
+                    conn.execute(insert(RunLog.__table__), rows)
+            if usage:
+                runs = Run.__table__
+                conn.execute(
+                    update(runs)
+                    .where(runs.c.id == bindparam("run_uuid"))
+                    .values(
+                        input_tokens=runs.c.input_tokens + bindparam("add_input"),
+                        output_tokens=runs.c.output_tokens + bindparam("add_output"),
+                    ),
+                    [
+                        {"run_uuid": UUID(run_id), "add_input": input_tokens, "add_output": output_tokens}
+                        for run_id, (input_tokens, output_tokens) in usage.items()
+                    ],
+                )
+
+    def write_isolating(self, rows: list[dict], usage: dict[str, list[int]]) -> tuple[list[dict], int]:
+        # After a batch failed: writes the token usage on its own, then the rows in halves
+        # of halves, dropping each row that the database rejects by itself. Returns the
+        # rows left unwritten because the database became unavailable, and the number of
+        # rows dropped.
+        if usage:
+            self.write_batch([], usage)
+        parts = [rows]
+        dropped = 0
+        while parts:
+            part = parts.pop()
+            try:
+                self.write_batch(part, {})
+            except DATABASE_UNAVAILABLE_ERRORS:
+                return part + [row for rest in reversed(parts) for row in rest], dropped
+            except Exception as e:
+                if len(part) == 1:
+                    dropped += 1
+                    logger.error(f"ChatLogger dropping a log the database rejected: {e} {str(part[0])[:500]}")
+                else:
+                    middle = len(part) // 2
+                    # The first half is written first, keeping the logs in order
+                    parts.extend([part[middle:], part[:middle]])
+        return [], dropped
+
+    def copy_run_logs(self, conn, rows: list[dict]):
+        # CSV for COPY. Values are always quoted, and NULLs are empty and unquoted, so an
+        # empty string and a NULL stay distinct.
+        def csv_value(value) -> str:
+            if value is None:
+                return ""
+            return '"' + str(value).replace('"', '""') + '"'
+
+        buf = io.StringIO()
+        for row in rows:
+            buf.write(",".join(csv_value(row.get(col)) for col in RUN_LOG_COLUMNS))
+            buf.write("\n")
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY run_logs ({', '.join(RUN_LOG_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        flushes = self.metrics["flushes"]
+        return self.metrics | {
+            "queue_depth": len(self.buffer),
+            "pending_token_runs": len(self.token_usage),
+            "avg_flush_ms": self.metrics["total_flush_ms"] / flushes if flushes else 0.0,
+        }
 
     async def retrieve_run_history(self, run_id: str) -> Sequence[RunLog]:
+        if any(row["run_id"] == run_id for row in self.buffer):
+            # Make sure we read our own writes
+            await self.flush()
         with Session(self.engine) as session:
             query = select(RunLog).where(
                 RunLog.run_id == run_id
@@ -107,5 +321,6 @@ def activate_chatlogger():
     async def startup(app: FastAPI) -> AsyncIterator[State]:
         await chat_logger.start()
         yield {"chat_logger": chat_logger}
+        await chat_logger.stop()
     
 
@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from pathlib import Path
 from pprint import pprint
 import json
+import pickle
 import time
 from typing import (
     Dict, Any, List, Generator, Optional, AsyncGenerator, Callable, Sequence,
@@ -86,8 +87,10 @@ from .tools.dynamic_agent_tool import DynamicAgentTool
 from .tools.basic_data import BasicDataTool
 from .run_context import RunContext, ContextInit
 from .history_compression_manager import HistoryCompressionManager
+from .dataframe_store import DataFrameStore
 from .tools.memory_compression_tool import MEMORY_COMPRESSION_TOOL_ID, MemoryCompressionTool
 from .rag_utils import get_available_indexes
+from . import agent_cache
 from .jwt_auth import User
 
 from langchain.chains import LLMChain
@@ -98,6 +101,23 @@ file_logger = FileLogHandler(logfile)
 AsyncCallback = Callable[[AgentEvent], Awaitable[None]]
 RunAbortedCallback = Callable[None, Awaitable[bool]]
 
+# The agent prompt template is the same for every agent, so we only build it once
+AGENT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system", "{system_prompt}",
+        ),
+        MessagesPlaceholder(variable_name="agent_memory"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        MessagesPlaceholder(variable_name="tools_state"),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ]
+)
+
+# How often we check for a cancel request while the LLM is streaming tokens
+ABORT_CHECK_SECS = 0.05
+
 GROQ_MODELS = [
     "llama-3.1-405b-reasoning",
     "llama-3.1-70b-versatile",
@@ -213,8 +233,8 @@ class ChatEngine(BaseCallbackHandler):
         self.llm: BaseChatModel = None
         self.parent_log_function: AsyncCallback = None
         # Follow dict holds things (currently DataFrames) in server memory that can be shared amongst
-        # the tools of an agent.
-        self.tools_inmem_state: dict = dict()
+        # the tools of an agent. Large DataFrames are spilled to disk, see dataframe_store.py
+        self.tools_inmem_state: DataFrameStore = DataFrameStore()
         self.required_token_var: str = ""
         self.pending_agent_updates = []
         self.max_history: int|None = None
@@ -330,6 +350,33 @@ class ChatEngine(BaseCallbackHandler):
             for rl in runlogs
         ]
 
+    def snapshot_state(self, files_dir: str) -> dict:
+        # Captures the per-run state that we can't rebuild from the Agent definition, so
+        # the EngineCache can evict us and rehydrate us later. Secrets are deliberately
+        # left out - they get reloaded from the secrets service by `set_agent`.
+        # Spilled DataFrames are kept as their Arrow files, moved into files_dir.
+        tools_state = self.tools_inmem_state.snapshot(files_dir)
+        inmem_state = {}
+        for key, value in tools_state["values"].items():
+            if isinstance(value, (pd.DataFrame, str, bytes, int, float)):
+                inmem_state[key] = value
+                continue
+            try:
+                pickle.dumps(value)
+                inmem_state[key] = value
+            except Exception:
+                logger.debug(f"Skipping unpicklable tool state '{key}' in snapshot")
+        return {
+            "chat_history": self.chat_history,
+            "tools_inmem_state": tools_state | {"values": inmem_state},
+        }
+
+    def restore_state(self, state: dict):
+        self.chat_history = state.get("chat_history", [])
+        # Tool factories hold a reference to the store, so restore into it in place
+        if "tools_inmem_state" in state:
+            self.tools_inmem_state.restore(state["tools_inmem_state"])
+
     def get_tool_credential(self, tool: ToolBase) -> Optional[Credential]:
         # Retrieve the Credential record referenced the Agent's tool. 
         if tool.credential_id is None:
@@ -345,6 +392,17 @@ class ChatEngine(BaseCallbackHandler):
                 return cred
         return None
 
+    def get_tool_credentials(self, tools: list[ToolBase]) -> dict[str, tuple[Credential, dict]]:
+        # Loads the Credentials referenced by a set of tools, and their secrets, in bulk.
+        # Returns credential_id -> (Credential, secrets).
+        cred_ids = list({tool.credential_id for tool in tools if tool.credential_id})
+        if not cred_ids:
+            return {}
+        with session_context() as session:
+            creds = session.exec(select(Credential).where(Credential.id.in_(cred_ids))).all()
+            secrets = Credential.retrieve_secrets_for(creds)
+            return {cred.id: (cred, secrets[cred.id]) for cred in creds}
+
     def make_agent_tool(self, tool: ToolBase) -> Callable:
         agentTool = AgentTool()
         agentTool.run_context = self.run_context
@@ -370,7 +428,10 @@ class ChatEngine(BaseCallbackHandler):
         ])
 
         self.inject_llm_context = None
-        for tool in ((self.run_tools or self.agent.tool_list) + preset_tools):
+        agent_tools = (self.run_tools or self.agent.tool_list) + preset_tools
+        # Fetch all the tool credentials and secrets up front, rather than one tool (and secret) at a time
+        tool_creds = self.get_tool_credentials(agent_tools)
+        for tool in agent_tools:
             if tool.tool_factory_id.startswith("agent:"):
                 llm_tools.append(self.make_agent_tool(tool))
             else:
@@ -395,10 +456,9 @@ class ChatEngine(BaseCallbackHandler):
                     # special case for tool that needs no creds
                     llm_tools.extend(self._markup(tool_fact._get_full_agent_tools(), tool_fact.system_name))
                 else:
-                    cred = self.get_tool_credential(tool)
-                    if cred is not None:
-                        secrets = cred.retrieve_secrets()
-                        secrets = tool_fact.prepare_creds(cred, secrets)
+                    if tool.credential_id in tool_creds:
+                        cred, secrets = tool_creds[tool.credential_id]
+                        secrets = tool_fact.prepare_creds(cred, dict(secrets))
                         tool_fact.credentials = secrets
                         llm_tools.extend(self._markup(tool_fact._get_full_agent_tools(), tool_fact.system_name))
                         if hasattr(factory, "get_llm_context"):
@@ -550,32 +610,37 @@ class ChatEngine(BaseCallbackHandler):
 
         api_key = self.run_context.secrets.get(self.required_token_var)
 
+        # LLM clients, tool schemas and bound tool definitions are shared across engines
+        # in the worker via the agent_cache. Tool functions are always our own.
         self.enabled_tool_funcs = []
         if self.agent.model and "mistral" in self.agent.model:
             # FIXME: Use the functions version
-            self.llm = ChatOllama(model="mistral:latest")
+            self.llm = agent_cache.get_bound_llm(ChatOllama, {"model": "mistral:latest"}, [], bind_tools=False)
         elif self.agent.model and 'claude' in self.agent.model and api_key is not None:
-            self.llm = ChatAnthropic(
-                model_name=self.agent.model,
-                temperature=self.agent.temperature or 0,
-                api_key=api_key,
-            ) # type: ignore
             self.enabled_tool_funcs = self.load_agent_tools()
             self.enabled_tool_funcs.extend(preset_tools)
-
-            if len(self.enabled_tool_funcs) > 0:
-                self.llm = self.llm.bind_tools(self.enabled_tool_funcs) # type: ignore
+            self.llm = agent_cache.get_bound_llm(
+                ChatAnthropic,
+                {
+                    "model_name": self.agent.model,
+                    "temperature": self.agent.temperature or 0,
+                    "api_key": api_key,
+                },
+                self.enabled_tool_funcs,
+            )
         elif self.agent.model in GROQ_MODELS and api_key is not None:
-            self.llm = ChatGroq(
-                api_key=api_key,
-                model=self.agent.model,
-                temperature=self.agent.temperature or 0,
-                streaming=False,
-            ) # type: ignore
             self.enabled_tool_funcs = self.load_agent_tools()
             self.enabled_tool_funcs.extend(preset_tools)
-            if len(self.enabled_tool_funcs) > 0:
-                self.llm = self.llm.bind_tools(self.enabled_tool_funcs) # type: ignore
+            self.llm = agent_cache.get_bound_llm(
+                ChatGroq,
+                {
+                    "api_key": api_key,
+                    "model": self.agent.model,
+                    "temperature": self.agent.temperature or 0,
+                    "streaming": False,
+                },
+                self.enabled_tool_funcs,
+            )
         else:
             # NOTE: We always allow a fallback to GPT4-mini so that people can run their agents.
             # At some level of usage we might decide not to offer this subsidy.
@@ -586,32 +651,23 @@ class ChatEngine(BaseCallbackHandler):
                 model_args = {"parallel_tool_calls":False}
             else:
                 model_args = {}
-            self.llm = ChatOpenAI(
-                api_key=api_key or self.DEFAULT_OPENAI_KEY,
-                model=self.agent.model if api_key else self.DEFAULT_MODEL, 
-                temperature=self.agent.temperature or 0,
-                streaming=True,
-                stream_usage=True,
-                #http_client=await async_logging_client(file_logger),
-                callbacks=[file_logger],
-                model_kwargs=model_args,
-            )
             self.enabled_tool_funcs.extend(preset_tools)
-            if len(self.enabled_tool_funcs) > 0:
-                self.llm = self.llm.bind_tools(self.enabled_tool_funcs) # type: ignore
+            self.llm = agent_cache.get_bound_llm(
+                ChatOpenAI,
+                {
+                    "api_key": api_key or self.DEFAULT_OPENAI_KEY,
+                    "model": self.agent.model if api_key else self.DEFAULT_MODEL, 
+                    "temperature": self.agent.temperature or 0,
+                    "streaming": True,
+                    "stream_usage": True,
+                    #"http_client": await async_logging_client(file_logger),
+                    "callbacks": [file_logger],
+                    "model_kwargs": model_args,
+                },
+                self.enabled_tool_funcs,
+            )
 
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system", "{system_prompt}",
-                ),
-                MessagesPlaceholder(variable_name="agent_memory"),
-                MessagesPlaceholder(variable_name="chat_history"),
-                MessagesPlaceholder(variable_name="tools_state"),
-                ("user", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ]
-        )
+        self.prompt = AGENT_PROMPT
 
         #print(self.prompt)
 
@@ -735,6 +791,8 @@ class ChatEngine(BaseCallbackHandler):
             def save_agent_response(content):
                 llm_responses[-1] += content
 
+            last_abort_check = 0.0
+
             # Hacky way to identify the human to the agent. I considered adding closer to the system
             # prompt, but we want to show how messages from different humans are alternating, so it 
             # makes sense to keep the identity with the prompt.
@@ -758,8 +816,12 @@ class ChatEngine(BaseCallbackHandler):
                 version="v2",
             ):
                 self.debug_lc_event(event)
-                if await run_aborted():
-                    break
+                # Checking for cancel on every streamed token is wasteful, so for tokens
+                # we only check every ABORT_CHECK_SECS.
+                if event['event'] != 'on_chat_model_stream' or time.monotonic() - last_abort_check > ABORT_CHECK_SECS:
+                    last_abort_check = time.monotonic()
+                    if await run_aborted():
+                        break
 
                 if event['event'] == 'on_chat_model_stream':
                     content = event['data']['chunk'].content
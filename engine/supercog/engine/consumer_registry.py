@@ -0,0 +1,110 @@
+# Tracks which agent workers ("consumers" of the agents:{tenant} streams) are alive.
+#
+# Workers call `heartbeat` every few seconds. We record the heartbeat time as the score
+# in two sorted sets:
+#
+#   consumers:alive             - every consumer, for monitoring and reaping
+#   consumers:tenant:{tenant}   - consumers serving that tenant's stream
+#
+# so "is there a live consumer for tenant X" is a single ZRANGEBYSCORE on a small
+# per-tenant set, instead of a KEYS scan over the whole keyspace. Dead consumers are
+# removed by `reap_dead_consumers`, which the dispatcher runs in the background.
+
+import asyncio
+import json
+import time
+
+import redis.asyncio as redis
+
+# Consider a consumer alive if it has heartbeated within this many seconds
+CONSUMER_ALIVE_SECS = 15
+
+ALL_CONSUMERS_KEY = "consumers:alive"
+CONSUMER_STREAMS_KEY = "consumers:streams"
+
+def tenant_consumers_key(tenant_id: str) -> str:
+    return f"consumers:tenant:{tenant_id}"
+
+
+class ConsumerRegistry:
+    def __init__(self, client: redis.Redis, alive_secs: int = CONSUMER_ALIVE_SECS):
+        self.redis = client
+        self.alive_secs = alive_secs
+
+    async def heartbeat(self, consumer_name: str, tenant_ids: list[str]):
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(ALL_CONSUMERS_KEY, {consumer_name: now})
+        pipe.hset(CONSUMER_STREAMS_KEY, consumer_name, json.dumps(tenant_ids))
+        for tenant_id in tenant_ids:
+            pipe.zadd(tenant_consumers_key(tenant_id), {consumer_name: now})
+        await pipe.execute()
+
+    async def remove(self, consumer_name: str, tenant_ids: list[str]):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(ALL_CONSUMERS_KEY, consumer_name)
+        pipe.hdel(CONSUMER_STREAMS_KEY, consumer_name)
+        for tenant_id in tenant_ids:
+            pipe.zrem(tenant_consumers_key(tenant_id), consumer_name)
+        await pipe.execute()
+
+    async def live_consumers(self, tenant_id: str) -> list[str]:
+        return await self.redis.zrangebyscore(
+            tenant_consumers_key(tenant_id), time.time() - self.alive_secs, "+inf"
+        )
+
+    async def has_live_consumer(self, tenant_id: str) -> bool:
+        found = await self.redis.zrangebyscore(
+            tenant_consumers_key(tenant_id), time.time() - self.alive_secs, "+inf", start=0, num=1
+        )
+        return len(found) > 0
+
+    async def reap_dead_consumers(self) -> int:
+        # Remove consumers which stopped heartbeating (probably crashed without cleaning up).
+        # Removal is by score, so a consumer that heartbeats while we run is left alone.
+        cutoff = time.time() - self.alive_secs
+        dead = await self.redis.zrangebyscore(ALL_CONSUMERS_KEY, "-inf", f"({cutoff}")
+        if not dead:
+            return 0
+        tenant_ids = set()
+        for streams in await self.redis.hmget(CONSUMER_STREAMS_KEY, dead):
+            tenant_ids.update(json.loads(streams) if streams else [])
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(ALL_CONSUMERS_KEY, "-inf", f"({cutoff}")
+        for tenant_id in tenant_ids:
+            pipe.zremrangebyscore(tenant_consumers_key(tenant_id), "-inf", f"({cutoff}")
+        for consumer_name in dead:
+            pipe.zscore(ALL_CONSUMERS_KEY, consumer_name)
+        results = await pipe.execute()
+
+        scores = results[-len(dead):]
+        gone = [name for name, score in zip(dead, scores) if score is None]
+        if gone:
+            await self.redis.hdel(CONSUMER_STREAMS_KEY, *gone)
+        return len(gone)
+
+    async def reap_loop(self, interval: float = CONSUMER_ALIVE_SECS):
+        while True:
+            try:
+                reaped = await self.reap_dead_consumers()
+                if reaped:
+                    print(f"Reaped {reaped} dead agent consumers")
+            except Exception as e:
+                print(f"Error reaping dead consumers: {e}")
+            await asyncio.sleep(interval)
+
+    async def worker_counts(self) -> dict:
+        # For monitoring: number of live consumers overall and per tenant
+        cutoff = time.time() - self.alive_secs
+        live = await self.redis.zrangebyscore(ALL_CONSUMERS_KEY, cutoff, "+inf")
+        per_tenant: dict[str, int] = {}
+        if live:
+            for streams in await self.redis.hmget(CONSUMER_STREAMS_KEY, live):
+                for tenant_id in json.loads(streams) if streams else []:
+                    per_tenant[tenant_id] = per_tenant.get(tenant_id, 0) + 1
+        return {
+            "live_consumers": len(live),
+            "total_registered": await self.redis.zcard(ALL_CONSUMERS_KEY),
+            "tenants": per_tenant,
+        }
@@ -0,0 +1,168 @@
+# Shared SQLAlchemy engines for DatabaseTool, and streaming of query results.
+#
+# Creating an engine per query meant a new connection (and often a TLS handshake and
+# login) for every call. `database_engines` keeps one engine, with a small connection
+# pool, per database URL (so per credential). Engines idle for
+# DATABASE_TOOL_ENGINE_IDLE_SECS are disposed, as are the least recently used ones past
+# DATABASE_TOOL_MAX_ENGINES.
+#
+# Queries run once, with `execute_streaming`: from a server-side cursor where the driver
+# has one (psycopg2, pymysql), so the rows can be fetched DATABASE_TOOL_FETCH_ROWS at a
+# time and turned into Arrow record batches (`rows_to_batch`) without holding a big
+# result in memory whole. Queries are stopped after DATABASE_TOOL_STATEMENT_TIMEOUT_SECS
+# where the database supports it.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pyarrow as pa
+from sqlalchemy import Connection, CursorResult, Engine, create_engine, text
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+
+DATABASE_TOOL_MAX_ENGINES = int(config.get_option("DATABASE_TOOL_MAX_ENGINES", default=32))
+DATABASE_TOOL_ENGINE_IDLE_SECS = int(config.get_option("DATABASE_TOOL_ENGINE_IDLE_SECS", default=600))
+DATABASE_TOOL_POOL_SIZE = int(config.get_option("DATABASE_TOOL_POOL_SIZE", default=2))
+DATABASE_TOOL_STATEMENT_TIMEOUT_SECS = int(config.get_option("DATABASE_TOOL_STATEMENT_TIMEOUT_SECS", default=300))
+DATABASE_TOOL_FETCH_ROWS = int(config.get_option("DATABASE_TOOL_FETCH_ROWS", default=10000))
+
+# Statements that are queries, after any leading comments
+QUERY_RE = re.compile(r"\s*(?:(?:--[^\n]*(?:\n|$)|/\*.*?\*/)\s*)*(?:SELECT|WITH|VALUES)\b", re.IGNORECASE | re.DOTALL)
+
+
+class EnginePool:
+    def __init__(
+            self,
+            max_engines: int = DATABASE_TOOL_MAX_ENGINES,
+            idle_secs: int = DATABASE_TOOL_ENGINE_IDLE_SECS,
+            pool_size: int = DATABASE_TOOL_POOL_SIZE,
+        ):
+        self.max_engines = max_engines
+        self.idle_secs = idle_secs
+        self.pool_size = pool_size
+        # url -> (engine, last used). Ordered least recently used first.
+        self._engines: OrderedDict[str, tuple[Engine, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, url: str) -> Engine:
+        """ Returns the shared engine for the database URL, creating it on first use. """
+        with self._lock:
+            entry = self._engines.pop(url, None)
+            if entry is None:
+                engine = create_engine(
+                    url,
+                    pool_size=self.pool_size,
+                    max_overflow=self.pool_size,
+                    # Connections can be dropped by the server (or a proxy) while idle
+                    pool_pre_ping=True,
+                    pool_recycle=self.idle_secs,
+                )
+                self.created += 1
+            else:
+                engine = entry[0]
+                self.reused += 1
+            self._engines[url] = (engine, time.time())
+            self._prune(keep=url)
+            return engine
+
+    def dispose(self, url: str):
+        with self._lock:
+            entry = self._engines.pop(url, None)
+        if entry:
+            entry[0].dispose()
+
+    def dispose_all(self):
+        with self._lock:
+            engines = [engine for engine, _ in self._engines.values()]
+            self._engines.clear()
+        for engine in engines:
+            engine.dispose()
+
+    def stats(self) -> dict:
+        return {"engines": len(self._engines), "created": self.created, "reused": self.reused}
+
+    def _prune(self, keep: str):
+        cutoff = time.time() - self.idle_secs
+        for url, (engine, last_used) in list(self._engines.items()):
+            if url == keep:
+                continue
+            if len(self._engines) > self.max_engines or last_used < cutoff:
+                del self._engines[url]
+                # Connections checked out by a running query are closed when it returns them
+                engine.dispose(close=False)
+                logger.info(f"Disposed idle database engine for {engine.url.render_as_string()}")
+
+
+@contextmanager
+def statement_timeout(connection: Connection, seconds: int = DATABASE_TOOL_STATEMENT_TIMEOUT_SECS):
+    """ Stops statements run on the connection in this block after `seconds`, where the
+        database supports it. Postgres needs the connection to be in a transaction. """
+    dialect = connection.dialect.name
+    millis = int(seconds * 1000)
+    if seconds <= 0:
+        yield
+    elif dialect == "postgresql":
+        # Reset when the transaction ends
+        connection.execute(text(f"SET LOCAL statement_timeout = {millis}"))
+        yield
+    elif dialect in ("mysql", "mariadb"):
+        # MySQL only limits SELECTs, MariaDB limits every statement
+        variable = "max_statement_time" if connection.dialect.is_mariadb else "max_execution_time"
+        value = seconds if connection.dialect.is_mariadb else millis
+        connection.execute(text(f"SET SESSION {variable} = {value}"))
+        try:
+            yield
+        finally:
+            connection.execute(text(f"SET SESSION {variable} = DEFAULT"))
+    elif dialect == "sqlite":
+        dbapi_connection = connection.connection.dbapi_connection
+        deadline = time.monotonic() + seconds
+        # Called every 10000 SQLite instructions. Returning True interrupts the statement.
+        dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            yield
+        finally:
+            dbapi_connection.set_progress_handler(None, 0)
+    else:
+        logger.info(f"No statement timeout for {dialect} databases")
+        yield
+
+
+def execute_streaming(connection: Connection, sql: str, fetch_rows: int = DATABASE_TOOL_FETCH_ROWS) -> CursorResult:
+    """ Executes the query, with a server-side cursor where the driver has one, so the
+        rows are fetched from the database as they are read. """
+    if not QUERY_RE.match(sql):
+        # Server-side cursors can only run queries (Postgres declares one FOR the statement)
+        return connection.execute(text(sql))
+    # For this statement only. Connection.execution_options would change the connection.
+    return connection.execute(text(sql), execution_options={"stream_results": True, "max_row_buffer": fetch_rows})
+
+
+def rows_to_batch(columns: list[str], rows: list) -> pa.RecordBatch:
+    """ Returns the result rows as a record batch. """
+    arrays = []
+    for i in range(len(columns)):
+        values = [row[i] for row in rows]
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Mixed types (as SQLite allows) or types Arrow doesn't know: keep them as text
+            array = pa.array([None if value is None else str(value) for value in values], pa.string())
+        if pa.types.is_decimal(array.type):
+            # As pd.read_sql does. Each batch would also get its own precision.
+            array = array.cast(pa.float64(), safe=False)
+        elif pa.types.is_null(array.type):
+            # No values to tell the type from. Text can hold whatever comes later.
+            array = array.cast(pa.string())
+        arrays.append(array)
+    # Duplicate column names (say from a join) are kept, as in pandas
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+database_engines = EnginePool()
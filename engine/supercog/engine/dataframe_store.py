@@ -0,0 +1,309 @@
+# The state that an agent's tools share (ChatEngine.tools_inmem_state), mostly the
+# DataFrames that tools produce.
+#
+# DataFrameStore is a dict-like store that keeps small frames in memory and spills
+# large ones to Arrow IPC files in a per-engine scratch directory:
+#
+# - a frame over DATAFRAME_SPILL_THRESHOLD_MB is spilled as soon as it is stored
+# - when the frames in memory add up to more than DATAFRAME_MEMORY_BUDGET_MB, the least
+#   recently used ones are spilled until the store is back under budget
+#
+# Reading a spilled frame memory-maps its file and brings it back into memory (where
+# it counts against the budget again, and tools can change it in place). A frame that
+# is still over the threshold stays spilled: the caller gets a copy read from the file.
+# `scan_source` instead returns the memory-mapped Arrow table without loading it, which
+# DuckDB can query directly, without the columns holding the frame's index. Values
+# that aren't DataFrames always stay in memory.
+#
+# Files too big to read into memory are streamed straight into an Arrow file, which
+# `put_arrow_file` adds to the store as an already spilled frame.
+#
+# When the EngineCache evicts an engine, `snapshot` hands the spilled frames over by
+# their files, which `restore` adopts again, so they are never read into memory for it.
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+
+DATAFRAME_MEMORY_BUDGET_MB = int(config.get_option("DATAFRAME_MEMORY_BUDGET_MB", default=512))
+DATAFRAME_SPILL_THRESHOLD_MB = int(config.get_option("DATAFRAME_SPILL_THRESHOLD_MB", default=128))
+DATAFRAME_SPILL_DIR = config.get_option(
+    "DATAFRAME_SPILL_DIR", default=os.path.join(tempfile.gettempdir(), "supercog_dataframes")
+)
+
+
+def dataframe_size(df: pd.DataFrame) -> int:
+    try:
+        return int(df.memory_usage(deep=True).sum())
+    except Exception:
+        return 0
+
+
+def write_arrow_file(path: str, df: pd.DataFrame):
+    # A RangeIndex is kept as metadata. Other indexes become columns, so to_pandas can
+    # restore them.
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow_file(path: str) -> pa.Table:
+    # The table's buffers point into the memory-mapped file
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def without_index_columns(table: pa.Table) -> pa.Table:
+    # The columns that hold a spilled frame's pandas index. Queries see the frame's
+    # columns only, as they do when DuckDB scans the DataFrame itself.
+    metadata = table.schema.pandas_metadata or {}
+    index_columns = [name for name in metadata.get("index_columns", []) if isinstance(name, str)]
+    return table.drop_columns(index_columns) if index_columns else table
+
+
+class DataFrameStore(MutableMapping):
+    def __init__(
+            self,
+            memory_budget: int = DATAFRAME_MEMORY_BUDGET_MB * 1024 * 1024,
+            spill_threshold: int = DATAFRAME_SPILL_THRESHOLD_MB * 1024 * 1024,
+            spill_root: str = DATAFRAME_SPILL_DIR,
+        ):
+        self.memory_budget = memory_budget
+        self.spill_threshold = spill_threshold
+        self.spill_root = spill_root
+        self.spill_dir: Optional[str] = None
+        # Every key, in insertion order
+        self._keys: dict[str, None] = {}
+        # Values held in memory, least recently used first
+        self._resident: OrderedDict[str, Any] = OrderedDict()
+        # Sizes of the DataFrames held in memory
+        self._sizes: dict[str, int] = {}
+        # Spilled DataFrames -> their Arrow files
+        self._spilled: dict[str, str] = {}
+        # key -> a number that changes each time the key is set
+        self._versions: dict[str, int] = {}
+        self._version_counter = itertools.count(1)
+        # Tools may run in worker threads
+        self._lock = threading.RLock()
+        self.spill_count = 0
+        self.load_count = 0
+
+    def __getstate__(self):
+        # Pickling would read every spilled frame into memory
+        raise TypeError("DataFrameStore can't be pickled, use snapshot() and restore()")
+
+    ### Mapping interface
+
+    def __setitem__(self, key: str, value: Any):
+        with self._lock:
+            self._discard(key)
+            self._keys[key] = None
+            self._versions[key] = next(self._version_counter)
+            self._resident[key] = value
+            if isinstance(value, pd.DataFrame):
+                size = dataframe_size(value)
+                self._sizes[key] = size
+                if size >= self.spill_threshold:
+                    self._spill(key)
+            self._enforce_budget(keep=key)
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key]
+            if key not in self._spilled:
+                raise KeyError(key)
+            df = self._load(key)
+            if dataframe_size(df) >= self.spill_threshold:
+                return df
+            self._resident[key] = df
+            self._sizes[key] = dataframe_size(df)
+            self._remove_file(self._spilled.pop(key))
+            self._enforce_budget(keep=key)
+            return df
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._discard(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def items(self):
+        # Spilled frames are read for the caller but not brought back into memory
+        for key in list(self._keys):
+            with self._lock:
+                if key in self._resident:
+                    value = self._resident[key]
+                elif key in self._spilled:
+                    value = self._load(key)
+                else:
+                    continue
+            yield key, value
+
+    def values(self):
+        for _, value in self.items():
+            yield value
+
+    ### Spilling
+
+    def scan_source(self, key: str) -> pd.DataFrame|pa.Table:
+        """ Returns something DuckDB can query for the frame: the DataFrame if it is in
+            memory, or its memory-mapped Arrow table if it was spilled. """
+        with self._lock:
+            if key in self._spilled:
+                return without_index_columns(read_arrow_file(self._spilled[key]))
+            return self[key]
+
+    def new_spill_path(self) -> str:
+        """ Returns a path in the store's scratch directory, for put_arrow_file. """
+        return os.path.join(self._ensure_spill_dir(), f"{uuid.uuid4().hex}.arrow")
+
+    def put_arrow_file(self, key: str, path: str):
+        """ Stores the frame in the Arrow IPC file at `path` (from new_spill_path) as a
+            spilled frame, without reading it into memory. The store owns the file. """
+        with self._lock:
+            self._discard(key)
+            self._keys[key] = None
+            self._versions[key] = next(self._version_counter)
+            self._spilled[key] = path
+
+    def snapshot(self, directory: str) -> dict:
+        """ Returns the store's contents for ChatEngine.snapshot_state: the values in
+            memory, and the spilled frames as their Arrow files, which are moved into
+            `directory` and leave the store. """
+        with self._lock:
+            values, spilled = {}, {}
+            for key in list(self._keys):
+                if key in self._spilled:
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, os.path.basename(self._spilled[key]))
+                    shutil.move(self._spilled.pop(key), path)
+                    self._discard(key)
+                    spilled[key] = path
+                elif key in self._resident:
+                    values[key] = self._resident[key]
+            return {"values": values, "spilled": spilled}
+
+    def restore(self, state: dict):
+        """ Adds back the contents of a snapshot, adopting the spilled frames' files. """
+        self.update(state["values"])
+        for key, path in state["spilled"].items():
+            spill_path = self.new_spill_path()
+            shutil.move(path, spill_path)
+            self.put_arrow_file(key, spill_path)
+        # The snapshot's directory is empty now
+        for directory in {os.path.dirname(path) for path in state["spilled"].values()}:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def version(self, key: str) -> Optional[int]:
+        """ Returns a number that changes whenever the key is set, for caching things
+            computed from its frame. Changes that tools make in place don't count. """
+        return self._versions.get(key)
+
+    def is_spilled(self, key: str) -> bool:
+        return key in self._spilled
+
+    def too_large_to_load(self, key: str) -> bool:
+        """ True if the frame was spilled and its file is over the spill threshold, so
+            reading it would take at least that much memory. """
+        with self._lock:
+            path = self._spilled.get(key)
+            return path is not None and os.path.getsize(path) >= self.spill_threshold
+
+    def resident_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def spilled_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self._spilled.values() if os.path.exists(path))
+
+    def close(self):
+        # Deletes the spilled files. The store is empty afterwards.
+        with self._lock:
+            self._keys.clear()
+            self._resident.clear()
+            self._sizes.clear()
+            self._spilled.clear()
+            if self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def _ensure_spill_dir(self) -> str:
+        with self._lock:
+            if self.spill_dir is None:
+                os.makedirs(self.spill_root, exist_ok=True)
+                self.spill_dir = tempfile.mkdtemp(prefix="engine_", dir=self.spill_root)
+                # Clean up the scratch space when the engine that owns the store goes away
+                weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+            return self.spill_dir
+
+    def _spill(self, key: str) -> bool:
+        path = self.new_spill_path()
+        try:
+            write_arrow_file(path, self._resident[key])
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            # Columns Arrow can't represent (like mixed-type objects): keep it in memory
+            logger.warn(f"DataFrameStore could not spill '{key}', keeping it in memory: {e}")
+            self._remove_file(path + ".tmp")
+            return False
+        del self._resident[key]
+        del self._sizes[key]
+        self._spilled[key] = path
+        self.spill_count += 1
+        return True
+
+    def _load(self, key: str) -> pd.DataFrame:
+        self.load_count += 1
+        return read_arrow_file(self._spilled[key]).to_pandas()
+
+    def _enforce_budget(self, keep: str):
+        # Spills the least recently used frames (but not `keep`) until we're under budget
+        if self.resident_bytes() <= self.memory_budget:
+            return
+        for key in [k for k in self._resident if k in self._sizes and k != keep]:
+            self._spill(key)
+            if self.resident_bytes() <= self.memory_budget:
+                break
+
+    def _discard(self, key: str):
+        self._keys.pop(key, None)
+        self._versions.pop(key, None)
+        self._resident.pop(key, None)
+        self._sizes.pop(key, None)
+        if key in self._spilled:
+            self._remove_file(self._spilled.pop(key))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
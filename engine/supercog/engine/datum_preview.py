@@ -0,0 +1,347 @@
+# Previews of run outputs ("datums") for the dashboard: tables, dataframes and
+# CSV/Excel/Parquet/JSON files, a page of rows at a time.
+#
+# Rather than turning a whole file or frame into CSV, `DatumPreviewService` queries it
+# with DuckDB, in a pooled session per user:
+#
+#   - only the requested rows (offset/limit, up to DATUM_PREVIEW_MAX_ROWS) and columns
+#   - sorted and filtered by DuckDB. Filters are "column:op:value" (see FILTER_OPS), with
+#     the column checked against the schema and the value passed as a parameter, so no
+#     SQL from the request reaches DuckDB. Values that don't convert to the column's type
+#     are a PreviewError, as are the other errors DuckDB raises for a query.
+#   - `iter_csv` produces the rows as CSV a batch at a time, so large slices can be
+#     streamed to the client
+#
+# CSV, Parquet and JSON files are scanned where they are (CSV parsed once per version of
+# the file, see duckdb_sessions.py). Excel files are converted to Arrow files once per
+# version, under DATUM_PREVIEW_CACHE_PATH. Dataframes are queried in place, from memory
+# or from their spill file.
+#
+# `summary` returns the schema, row count and per-column stats (DuckDB's SUMMARIZE),
+# cached by the datum's version: the file's size and mtime, or the dataframe's
+# DataFrameStore.version.
+
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from supercog.shared.services import config
+
+from .dataframe_store import read_arrow_file
+from .duckdb_sessions import DuckDBSession, DuckDBSessionPool, quote_identifier
+from .filesystem import SYSTEM_ROOT_PATH
+from .tabular_reader import arrow_batches, stream_to_arrow_file
+
+DATUM_PREVIEW_ROWS = int(config.get_option("DATUM_PREVIEW_ROWS", default=1000))
+DATUM_PREVIEW_MAX_ROWS = int(config.get_option("DATUM_PREVIEW_MAX_ROWS", default=1_000_000))
+# Slices with more rows than this are streamed
+DATUM_PREVIEW_STREAM_ROWS = int(config.get_option("DATUM_PREVIEW_STREAM_ROWS", default=10000))
+DATUM_PREVIEW_PDF_PAGES = int(config.get_option("DATUM_PREVIEW_PDF_PAGES", default=10))
+DATUM_SUMMARY_CACHE_SIZE = int(config.get_option("DATUM_SUMMARY_CACHE_SIZE", default=256))
+DATUM_PREVIEW_CACHE_PATH = config.get_option(
+    "DATUM_PREVIEW_CACHE_PATH", default=os.path.join(SYSTEM_ROOT_PATH, ".datum_preview")
+)
+
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".parquet": "parquet",
+    ".json": "json",
+    ".jsonl": "json",
+    ".ndjson": "json",
+    ".xlsx": "excel",
+    ".xls": "excel",
+}
+
+FILTER_OPS = {
+    "eq": "=",
+    "ne": "<>",
+    "lt": "<",
+    "le": "<=",
+    "gt": ">",
+    "ge": ">=",
+    "contains": "ILIKE",
+}
+
+
+class PreviewError(ValueError):
+    pass
+
+
+def file_format(path: str) -> Optional[str]:
+    return FILE_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def parse_filter(spec: str) -> tuple[str, str, str]:
+    """ Parses a "column:op:value" filter. The op is the first part after the column that
+        is one, so the value (a time, a URL) may contain colons, as may the column. """
+    parts = spec.split(":")
+    for index in range(1, len(parts) - 1):
+        if parts[index] in FILTER_OPS:
+            return ":".join(parts[:index]), parts[index], ":".join(parts[index + 1:])
+    raise PreviewError(f"Bad filter '{spec}', expected column:op:value with op one of {', '.join(FILTER_OPS)}")
+
+
+def parse_page_range(pages: Optional[str], default_count: int = DATUM_PREVIEW_PDF_PAGES) -> tuple[int, int]:
+    """ Parses "3" or "3-7" (1-based, inclusive) into (first page, last page). """
+    if not pages:
+        return 1, default_count
+    try:
+        first, _, last = pages.partition("-")
+        first_page = int(first)
+        last_page = int(last) if last else first_page
+    except ValueError:
+        raise PreviewError(f"Bad page range '{pages}', expected a page like 3 or a range like 3-7")
+    if first_page < 1 or last_page < first_page:
+        raise PreviewError(f"Bad page range '{pages}'")
+    return first_page, last_page
+
+
+@dataclass
+class RowQuery:
+    offset: int = 0
+    limit: int = DATUM_PREVIEW_ROWS
+    # None for all of them
+    columns: Optional[list[str]] = None
+    sort: Optional[str] = None
+    descending: bool = False
+    # (column, op, value)
+    filters: list[tuple[str, str, str]] = field(default_factory=list)
+
+
+@dataclass
+class RowPage:
+    columns: list[str]
+    rows: pd.DataFrame
+    offset: int
+    # Rows matching the filters, in all pages
+    total_rows: int
+
+
+@dataclass
+class DatumSource:
+    # What to query: a file path, or a DataFrame/Arrow table
+    path: Optional[str] = None
+    frame: Any = None
+    # For the summary cache. None means the summary isn't cached.
+    version: Optional[tuple] = None
+
+    @classmethod
+    def for_file(cls, path: str) -> "DatumSource":
+        stat = os.stat(path)
+        return cls(path=path, version=("file", os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+
+    @classmethod
+    def for_frame(cls, frame: Any, version: Optional[tuple] = None) -> "DatumSource":
+        if not isinstance(frame, (pd.DataFrame, pa.Table)):
+            raise PreviewError(f"Can't preview a {type(frame).__name__}")
+        return cls(frame=frame, version=version)
+
+
+class DatumPreviewService:
+    def __init__(
+            self,
+            sessions: Optional[DuckDBSessionPool] = None,
+            cache_path: str = DATUM_PREVIEW_CACHE_PATH,
+            summary_cache_size: int = DATUM_SUMMARY_CACHE_SIZE,
+            max_rows: int = DATUM_PREVIEW_MAX_ROWS,
+        ):
+        self.sessions = sessions or DuckDBSessionPool(max_sessions=8)
+        self.cache_path = cache_path
+        self.summary_cache_size = summary_cache_size
+        self.max_rows = max_rows
+        self._summaries: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._convert_lock = threading.Lock()
+        self.summary_hits = 0
+
+    def rows(self, owner: str, source: DatumSource, query: RowQuery) -> RowPage:
+        """ Returns the page of rows that the query selects. """
+        with self._view(owner, source) as (session, view), self._query_errors():
+            self._check_filters(session, view, query.filters)
+            sql, params, columns = self._select(session, view, query)
+            rows = session.execute(sql, params).df()
+            count_sql, count_params = self._count(session, view, query)
+            total_rows = session.execute(count_sql, count_params).fetchone()[0]
+        return RowPage(columns=columns, rows=rows, offset=query.offset, total_rows=total_rows)
+
+    def validate(self, owner: str, source: DatumSource, query: RowQuery):
+        """ Raises PreviewError if the query's columns, sort or filters don't fit the
+            datum, for checking a query before streaming its rows. """
+        with self._view(owner, source) as (session, view), self._query_errors():
+            self._check_filters(session, view, query.filters)
+            self._select(session, view, query)
+
+    def iter_csv(self, source: DatumSource, query: RowQuery, batch_rows: int = 10000) -> Iterator[str]:
+        """ Yields the rows that the query selects as CSV (with a header), a batch at a
+            time. """
+        # A session of its own rather than a pooled one: a streaming response iterates
+        # from whichever worker thread is free, and the pooled sessions' locks belong to
+        # the thread that took them
+        session = DuckDBSession(**self.sessions.session_options)
+        try:
+            # Read once, so a CSV file is scanned as it's streamed rather than parsed into
+            # a TEMP table first
+            view = self._register(session, source, cache=False)
+            sql, params, columns = self._select(session, view, query)
+            reader = arrow_batches(session.execute(sql, params), batch_rows)
+            header = True
+            for batch in reader:
+                yield batch.to_pandas().to_csv(index=False, header=header)
+                header = False
+            if header:
+                yield pd.DataFrame(columns=columns).to_csv(index=False)
+        finally:
+            session.close()
+
+    def summary(self, owner: str, source: DatumSource) -> dict:
+        """ Returns the datum's columns (with types and stats) and row count. """
+        if source.version is not None:
+            with self._lock:
+                cached = self._summaries.get(source.version)
+                if cached is not None:
+                    self._summaries.move_to_end(source.version)
+                    self.summary_hits += 1
+                    return cached
+        with self._view(owner, source) as (session, view), self._query_errors():
+            cursor = session.execute(f"SUMMARIZE SELECT * FROM {quote_identifier(view)}")
+            names = [description[0] for description in cursor.description]
+            stats = [dict(zip(names, row)) for row in cursor.fetchall()]
+            row_count = session.execute(f"SELECT count(*) FROM {quote_identifier(view)}").fetchone()[0]
+        summary = {
+            "row_count": row_count,
+            "columns": [
+                {
+                    "name": column["column_name"],
+                    "type": column["column_type"],
+                    "min": column["min"],
+                    "max": column["max"],
+                    "approx_unique": column["approx_unique"],
+                    "null_percentage": float(column["null_percentage"] or 0),
+                    "avg": column["avg"],
+                }
+                for column in stats
+            ],
+        }
+        if source.version is not None:
+            with self._lock:
+                self._summaries[source.version] = summary
+                while len(self._summaries) > self.summary_cache_size:
+                    self._summaries.popitem(last=False)
+        return summary
+
+    @staticmethod
+    @contextmanager
+    def _query_errors() -> Iterator[None]:
+        try:
+            yield
+        except duckdb.Error as e:
+            raise PreviewError(f"Can't query the rows: {e}") from e
+
+    @contextmanager
+    def _view(self, owner: str, source: DatumSource) -> Iterator[tuple[DuckDBSession, str]]:
+        with self.sessions.session(owner) as session:
+            view = self._register(session, source)
+            try:
+                yield session, view
+            finally:
+                if source.path is None:
+                    # Don't keep the frame alive in the pool
+                    session.unregister_frame(view)
+
+    def _register(self, session: DuckDBSession, source: DatumSource, cache: bool = True) -> str:
+        if source.path is None:
+            session.register_frame("datum_frame", source.frame)
+            return "datum_frame"
+        view = "datum_" + hashlib.sha256(os.path.abspath(source.path).encode()).hexdigest()[:16]
+        fmt = file_format(source.path)
+        if fmt is None:
+            raise PreviewError(f"Can't preview rows of '{os.path.basename(source.path)}'")
+        if fmt == "excel":
+            session.register_frame(view, read_arrow_file(self._excel_as_arrow(source.path)))
+        else:
+            session.register_file(source.path, fmt, view, cache=cache)
+        return view
+
+    def _excel_as_arrow(self, path: str) -> str:
+        # Converted once per version of the workbook
+        stat = os.stat(path)
+        path_key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+        version_key = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+        arrow_path = os.path.join(self.cache_path, f"{path_key}_{version_key}.arrow")
+        with self._convert_lock:
+            if not os.path.exists(arrow_path):
+                os.makedirs(self.cache_path, exist_ok=True)
+                # Earlier versions of the workbook aren't needed any more
+                for old_path in glob.glob(os.path.join(self.cache_path, f"{path_key}_*.arrow")):
+                    os.remove(old_path)
+                stream_to_arrow_file(path, "excel", arrow_path)
+        return arrow_path
+
+    def _select(self, session: DuckDBSession, view: str, query: RowQuery) -> tuple[str, list, list[str]]:
+        schema = self._columns(session, view)
+        columns = query.columns or schema
+        for column in columns + ([query.sort] if query.sort else []):
+            if column not in schema:
+                raise PreviewError(f"Unknown column '{column}'")
+        where, params = self._where(schema, query.filters)
+        sql = f"SELECT {', '.join(quote_identifier(column) for column in columns)} FROM {quote_identifier(view)}{where}"
+        if query.sort:
+            sql += f" ORDER BY {quote_identifier(query.sort)} {'DESC' if query.descending else 'ASC'} NULLS LAST"
+        limit = max(0, min(query.limit, self.max_rows))
+        sql += " LIMIT ? OFFSET ?"
+        return sql, params + [limit, max(0, query.offset)], columns
+
+    def _count(self, session: DuckDBSession, view: str, query: RowQuery) -> tuple[str, list]:
+        where, params = self._where(self._columns(session, view), query.filters)
+        return f"SELECT count(*) FROM {quote_identifier(view)}{where}", params
+
+    @staticmethod
+    def _check_filters(session: DuckDBSession, view: str, filters: list[tuple[str, str, str]]):
+        # A value that doesn't convert to the column's type only fails once DuckDB reads a
+        # row, so check the values up front
+        types = dict(
+            (name, column_type) for name, column_type, *_ in
+            session.execute(f"DESCRIBE SELECT * FROM {quote_identifier(view)}").fetchall()
+        )
+        for column, op, value in filters:
+            if op == "contains" or column not in types:
+                continue
+            try:
+                session.execute(f"SELECT CAST(? AS {types[column]})", [value])
+            except duckdb.Error:
+                raise PreviewError(f"Bad value '{value}' for column '{column}' of type {types[column]}")
+
+    @staticmethod
+    def _columns(session: DuckDBSession, view: str) -> list[str]:
+        return [description[0] for description in session.execute(
+            f"SELECT * FROM {quote_identifier(view)} LIMIT 0"
+        ).description]
+
+    @staticmethod
+    def _where(schema: list[str], filters: list[tuple[str, str, str]]) -> tuple[str, list]:
+        conditions = []
+        params = []
+        for column, op, value in filters:
+            if column not in schema:
+                raise PreviewError(f"Unknown column '{column}'")
+            if op == "contains":
+                conditions.append(f"CAST({quote_identifier(column)} AS VARCHAR) ILIKE ? ESCAPE '\\'")
+                params.append("%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+            else:
+                # Compared as the column's type
+                conditions.append(f"{quote_identifier(column)} {FILTER_OPS[op]} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+datum_previews = DatumPreviewService()
@@ -2,13 +2,15 @@ from hmac import new
 import json
 from contextlib import contextmanager
 from fastapi import FastAPI
-from sqlalchemy import Engine
+from sqlalchemy import Engine, func
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel import SQLModel, Session, Field, select, Relationship
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import object_session
-from sqlalchemy import Column, Integer, VARCHAR
+from sqlalchemy import Column, Integer, VARCHAR, Index
 from pydantic import BaseModel, computed_field, Json
 from uuid import UUID, uuid4
-from typing import Optional, Callable, AsyncIterator, List
+from typing import Optional, Callable, AsyncIterator, List, Sequence
 from datetime import datetime
 from sqlalchemy import JSON, Column
 
@@ -17,7 +19,7 @@ from fastapi_lifespan_manager import LifespanManager, State
 
 lifespan_manager = LifespanManager()
 
-from supercog.shared.services import config, db_connect
+from supercog.shared.services import config, db_connect, async_db_connect
 from supercog.shared.models import get_uuid4
 from supercog.shared.credentials import secrets_service, reset_secrets_connection
 from supercog.shared.logging import logger
@@ -35,6 +37,8 @@ from supercog.shared.models import (
 
 SERVICE_NAME = "engine"
 engine: Engine =  None
+# Used by the API handlers, so slow queries don't block the event loop
+async_engine: AsyncEngine = None
 
 
 class EmailMsgsProcessed(SQLModel, table=True):
@@ -48,6 +52,12 @@ class EmailMsgsProcessed(SQLModel, table=True):
 
 class RunLog(RunLogBase, table=True):
     __tablename__ = "run_logs"
+    __table_args__ = (
+        # Supports reading a run's logs in order, and keyset pagination on (created_at, id)
+        Index("ix_run_logs_run_id_created_at_id", "run_id", "created_at", "id"),
+        # Supports paging forwards (and fetching new logs) by id
+        Index("ix_run_logs_run_id_id", "run_id", "id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     # Event scheme versioning
@@ -86,6 +96,9 @@ class Run(RunCreate, table=True):
     @computed_field(return_type=Optional[RunLog])
     @property
     def run_log(self) -> Optional[RunLog]:
+        if "_first_run_log" in self.__dict__:
+            # Preloaded by load_first_run_logs
+            return self.__dict__["_first_run_log"]
         if session := object_session(self):
             return (
                 session.exec(
@@ -159,15 +172,28 @@ class Credential(CredentialBase, table=True):
             )            
 
     def retrieve_secrets(self) -> dict:
-        retrieved = {
-            key: secrets_service.get_credential(
-                tenant_id=self.tenant_id,
-                user_id=self.user_id,
-                credential_id=self._secret_key(key)
-            ) for key in self.secret_keys()
-        }
-        self.secrets_json = json.dumps(retrieved)
-        return retrieved
+        return Credential.retrieve_secrets_for([self])[self.id]
+
+    @staticmethod
+    def retrieve_secrets_for(creds: Sequence["Credential"]) -> dict[str, dict]:
+        # Retrieves the secrets for a set of Credentials, returning a dict of credential.id -> secrets.
+        # Secrets are fetched with one query per owner (tenant + user), rather than one per key.
+        by_owner: dict[tuple, list[Credential]] = {}
+        for cred in creds:
+            by_owner.setdefault((cred.tenant_id, cred.user_id), []).append(cred)
+
+        result = {}
+        for (tenant_id, user_id), owner_creds in by_owner.items():
+            values = secrets_service.get_credentials(
+                tenant_id,
+                user_id,
+                [cred._secret_key(key) for cred in owner_creds for key in cred.secret_keys()],
+            )
+            for cred in owner_creds:
+                retrieved = {key: values[cred._secret_key(key)] for key in cred.secret_keys()}
+                cred.secrets_json = json.dumps(retrieved)
+                result[cred.id] = retrieved
+        return result
 
     @classmethod
     def _export_cred(cls, credential_id: str|None=None, name: str|None=None) -> tuple[dict, "Credential"]:
@@ -243,22 +269,43 @@ class DocIndex(DocIndexBase, table=True):
 # @cihan - not sure if we want to use this IndexedDoc model or if LlamaIndex has
 # their own model we should use.
 class IndexedDoc(SQLModel, table=True):
+    __table_args__ = (
+        # The RAG service looks up a batch of documents by id to see if they changed
+        Index("ix_indexeddoc_index_id_doc_id", "index_id", "doc_id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     index_id: str = Field(foreign_key="doc_indexes.id", ondelete="CASCADE")
     doc_id: str = ""
     name: str = ""
+    # The LlamaIndex hash of the document's text and metadata when it was indexed
+    content_hash: str = ""
+    indexed_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+
+class IndexingJob(SQLModel, table=True):
+    __tablename__ = "indexing_jobs"
+    id: Optional[str] = Field(default_factory=get_uuid4, primary_key=True)
+    index_id: str = Field(foreign_key="doc_indexes.id", ondelete="CASCADE")
+    doc_source_config_id: Optional[str] = None
+    status: str = "started" # started, running, completed, error
+    message: str = ""
+    docs_seen: int = 0
+    docs_indexed: int = 0
+    docs_skipped: int = 0
+    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
 
 ### END MODELS
 
 
 @lifespan_manager.add
 async def lifespan(app: FastAPI) -> AsyncIterator[State]:
-    global engine #critical!
+    global engine, async_engine #critical!
     print("ENGINE LIFES SPAN. RESET CREDS and ENGINE db connections")
     reset_secrets_connection() # make sure SecretsService re-connects to its db
     if engine is not None:
         engine.dispose()
     engine = db_connect(SERVICE_NAME)
+    async_engine = async_db_connect(SERVICE_NAME)
 
     #@event.listens_for(engine, 'connect')
     #def receive_connect(dbapi_connection, connection_record):
@@ -267,6 +314,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[State]:
 
     yield {"engine": engine}
     engine.dispose()
+    await async_engine.dispose()
 
 def reset_db_connections():
     global engine #critical!
@@ -292,3 +340,28 @@ def session_context():
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    # Objects stay loaded after commit, since we can't lazy load them again outside
+    # of an await.
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def load_first_run_logs(session: AsyncSession, runs: Sequence[Run]):
+    # Loads Run.run_log for a set of runs with one query, and detaches the runs so that
+    # serializing them doesn't try to query through the session.
+    run_ids = [str(run.id) for run in runs]
+    first_logs = {}
+    if run_ids:
+        # Logs are written in order, so the lowest id is the first log of a run
+        first_ids = (
+            select(func.min(RunLog.id))
+            .where(RunLog.run_id.in_(run_ids))
+            .group_by(RunLog.run_id)
+        )
+        logs = await session.exec(select(RunLog).where(RunLog.id.in_(first_ids)))
+        first_logs = {log.run_id: log for log in logs.all()}
+    for run in runs:
+        session.expunge(run)
+        run.__dict__["_first_run_log"] = first_logs.get(str(run.id))
+    return runs
+
@@ -0,0 +1,291 @@
+# A pool of open DuckDB connections ("sessions") for the DuckDB tools, so tool calls in
+# a run reuse one connection instead of connecting (and re-reading files) every time.
+#
+# A session belongs to a (run, database) pair, where database is a DuckDB file or
+# ":memory:". Everything a session registers is scoped to its connection, so runs can't
+# see or replace each other's names:
+#
+#   frames - DataFrames (or Arrow tables) registered under their variable names, for
+#            the length of a tool call (see `DuckDBSession.frame`)
+#   files  - TEMP views over CSV/Parquet/JSON files. A CSV file under
+#            DUCKDB_CSV_CACHE_MAX_MB is parsed once into a TEMP table that the view
+#            reads, and Parquet footers are cached, until the file's size or mtime changes.
+#
+# Each session's connection is limited to DUCKDB_SESSION_MEMORY_LIMIT and
+# DUCKDB_SESSION_THREADS, spilling to a temp directory under SYSTEM_ROOT_PATH. DuckDB
+# applies these per database, so sessions on the same database file share them.
+# Sessions idle for DUCKDB_SESSION_IDLE_SECS are closed, as are the least recently
+# used ones past DUCKDB_MAX_SESSIONS. Sessions on a database file hold the file's lock
+# (so no other process can open it), so they are closed after just
+# DUCKDB_FILE_SESSION_IDLE_SECS; when the run uses the database again, its file views
+# are registered again. A background thread closes idle sessions, and the worker closes
+# a run's sessions when the run's engine leaves its cache.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import duckdb
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+
+from .filesystem import SYSTEM_ROOT_PATH, current_filesystem
+
+DUCKDB_MAX_SESSIONS = int(config.get_option("DUCKDB_MAX_SESSIONS", default=32))
+DUCKDB_SESSION_IDLE_SECS = int(config.get_option("DUCKDB_SESSION_IDLE_SECS", default=600))
+DUCKDB_FILE_SESSION_IDLE_SECS = int(config.get_option("DUCKDB_FILE_SESSION_IDLE_SECS", default=30))
+DUCKDB_SESSION_MEMORY_LIMIT = config.get_option("DUCKDB_SESSION_MEMORY_LIMIT", default="1GB")
+DUCKDB_SESSION_THREADS = int(config.get_option("DUCKDB_SESSION_THREADS", default=2))
+DUCKDB_CSV_CACHE_MAX_MB = int(config.get_option("DUCKDB_CSV_CACHE_MAX_MB", default=2048))
+DUCKDB_TEMP_PATH = config.get_option("DUCKDB_TEMP_PATH", default=os.path.join(SYSTEM_ROOT_PATH, ".duckdb_tmp"))
+
+FILE_READERS = {
+    "csv": "read_csv",
+    "parquet": "read_parquet",
+    "json": "read_json",
+}
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def agent_database_path(database_file: str|None = None) -> str:
+    """ Returns the running agent's DuckDB database: database_file (by default
+        "duckdb.db") resolved in the agent's directory, or ":memory:". """
+    database_file = database_file or "duckdb.db"
+    if database_file == ":memory:":
+        return database_file
+    return current_filesystem().path(database_file)
+
+
+class DuckDBSession:
+    def __init__(
+            self,
+            database: str = ":memory:",
+            memory_limit: str = DUCKDB_SESSION_MEMORY_LIMIT,
+            threads: int = DUCKDB_SESSION_THREADS,
+            temp_directory: str = DUCKDB_TEMP_PATH,
+            csv_cache_max_bytes: int = DUCKDB_CSV_CACHE_MAX_MB * 1024 * 1024,
+        ):
+        self.database = database
+        self.csv_cache_max_bytes = csv_cache_max_bytes
+        self.con = duckdb.connect(database)
+        os.makedirs(temp_directory, exist_ok=True)
+        self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        self.con.execute(f"SET threads = {int(threads)}")
+        self.con.execute("SET temp_directory = ?", [temp_directory])
+        self.con.execute("SET parquet_metadata_cache = true")
+        # Held while a tool uses the session, as a connection runs one query at a time
+        self.lock = threading.RLock()
+        self.in_use = 0
+        self.last_used = time.time()
+        # name -> registered object, kept so re-registering the same frame is skipped
+        self._frames: dict[str, Any] = {}
+        # view name -> ((path, format), (size, mtime)) of the file it reads
+        self._files: dict[str, tuple] = {}
+        # (path, format) -> (TEMP table, (size, mtime)) holding the parsed CSV
+        self._scan_tables: dict[tuple, tuple] = {}
+        self.scans = 0
+        self.scan_hits = 0
+
+    def execute(self, sql: str, params: Any = None) -> duckdb.DuckDBPyConnection:
+        return self.con.execute(sql, params)
+
+    def sql(self, sql: str) -> duckdb.DuckDBPyRelation:
+        return self.con.sql(sql)
+
+    def register_frame(self, name: str, source: Any):
+        """ Makes the DataFrame or Arrow table queryable as `name` in this session. """
+        if self._frames.get(name) is source:
+            return
+        self.con.register(name, source)
+        self._frames[name] = source
+
+    def unregister_frame(self, name: str):
+        if self._frames.pop(name, None) is not None:
+            self.con.unregister(name)
+
+    @contextmanager
+    def frame(self, name: str, source: Any) -> Iterator[str]:
+        """ Registers the frame as `name` for the duration, so the session doesn't keep
+            it alive after the tool call. """
+        self.register_frame(name, source)
+        try:
+            yield name
+        finally:
+            self.unregister_frame(name)
+
+    def file_views(self) -> dict[str, tuple[str, str]]:
+        """ Returns view name -> (path, format) of the registered files. """
+        return {view: file_key for view, (file_key, _) in self._files.items()}
+
+    def register_file(self, path: str, file_format: str, view_name: str, cache: bool = True) -> str:
+        """ Makes the file queryable as the TEMP view `view_name`. Returns the view name.
+            Without `cache`, a CSV file is scanned by each query rather than parsed into
+            a TEMP table, for reading it just once. """
+        if file_format not in FILE_READERS:
+            raise ValueError(f"Can't scan files of format '{file_format}'")
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), file_format)
+        version = (stat.st_size, stat.st_mtime_ns)
+        self.scans += 1
+        if self._files.get(view_name) == (file_key, version):
+            self.scan_hits += 1
+            return view_name
+
+        view = quote_identifier(view_name)
+        if cache and file_format == "csv" and stat.st_size <= self.csv_cache_max_bytes:
+            # Parse the CSV once. Parquet and JSON are cheap enough to scan again.
+            table, table_version = self._scan_tables.get(file_key, (None, None))
+            if table_version == version:
+                self.scan_hits += 1
+            else:
+                table = quote_identifier("scan_" + hashlib.sha256(repr(file_key).encode()).hexdigest()[:16])
+                self.con.execute(f"CREATE OR REPLACE TEMP TABLE {table} AS SELECT * FROM read_csv(?)", [path])
+                self._scan_tables[file_key] = (table, version)
+            self.con.execute(f"CREATE OR REPLACE TEMP VIEW {view} AS SELECT * FROM {table}")
+        else:
+            # Views can't take parameters, so the path is quoted into the SQL
+            literal = "'" + path.replace("'", "''") + "'"
+            self.con.execute(f"CREATE OR REPLACE TEMP VIEW {view} AS SELECT * FROM {FILE_READERS[file_format]}({literal})")
+        self._files[view_name] = (file_key, version)
+        return view_name
+
+    def close(self):
+        self._frames.clear()
+        self._files.clear()
+        self._scan_tables.clear()
+        try:
+            self.con.close()
+        except duckdb.Error as e:
+            logger.warn(f"Error closing DuckDB session on {self.database}: {e}")
+
+
+class DuckDBSessionPool:
+    def __init__(
+            self,
+            max_sessions: int = DUCKDB_MAX_SESSIONS,
+            idle_secs: int = DUCKDB_SESSION_IDLE_SECS,
+            file_idle_secs: int = DUCKDB_FILE_SESSION_IDLE_SECS,
+            **session_options,
+        ):
+        self.max_sessions = max_sessions
+        self.idle_secs = idle_secs
+        self.file_idle_secs = file_idle_secs
+        self.session_options = session_options
+        # (run id, database) -> session. Ordered least recently used first.
+        self._sessions: OrderedDict[tuple[str, str], DuckDBSession] = OrderedDict()
+        # (run id, database) -> file views of a session closed while idle, to register
+        # again when the run reopens it
+        self._closed_views: dict[tuple[str, str], dict[str, tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._reaper: threading.Thread|None = None
+        self.opened = 0
+        self.reused = 0
+
+    @contextmanager
+    def session(self, run_id: str, database: str = ":memory:") -> Iterator[DuckDBSession]:
+        """ Yields the run's session on the database, holding it for the duration. """
+        key = (run_id, database)
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is None:
+                session = DuckDBSession(database, **self.session_options)
+                self.opened += 1
+                self._restore_views(session, self._closed_views.pop(key, {}))
+            else:
+                self.reused += 1
+            session.last_used = time.time()
+            self._sessions[key] = session
+            self._prune(keep=key)
+            self._start_reaper()
+        with session.lock:
+            session.in_use += 1
+            try:
+                yield session
+            finally:
+                session.in_use -= 1
+                session.last_used = time.time()
+
+    def close_run(self, run_id: str):
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == run_id]:
+                self._close(key)
+            for key in [key for key in self._closed_views if key[0] == run_id]:
+                del self._closed_views[key]
+
+    def close_all(self):
+        with self._lock:
+            for key in list(self._sessions):
+                self._close(key)
+            self._closed_views.clear()
+
+    def close_idle(self):
+        with self._lock:
+            self._prune(keep=None)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "opened": self.opened, "reused": self.reused}
+
+    def _prune(self, keep: tuple|None):
+        now = time.time()
+        excess = len(self._sessions) - self.max_sessions
+        for key, session in list(self._sessions.items()):
+            if key == keep:
+                continue
+            idle_secs = self.idle_secs if key[1] == ":memory:" else self.file_idle_secs
+            if excess > 0 or session.last_used < now - idle_secs:
+                views = session.file_views()
+                # Sessions in use are left for a later prune
+                if self._close(key, blocking=False):
+                    excess -= 1
+                    if views and key[1] != ":memory:":
+                        self._closed_views[key] = views
+
+    def _close(self, key: tuple, blocking: bool = True) -> bool:
+        session = self._sessions[key]
+        if not session.lock.acquire(blocking=blocking):
+            return False
+        try:
+            if session.in_use and not blocking:
+                # Held by this thread, further up the stack
+                return False
+            del self._sessions[key]
+            session.close()
+        finally:
+            session.lock.release()
+        return True
+
+    def _restore_views(self, session: DuckDBSession, views: dict[str, tuple[str, str]]):
+        for view, (path, file_format) in views.items():
+            try:
+                session.register_file(path, file_format, view)
+            except (OSError, duckdb.Error) as e:
+                logger.warn(f"Can't restore DuckDB view '{view}' of {path}: {e}")
+
+    def _start_reaper(self):
+        # Closes idle sessions in the background, so a database file isn't held locked
+        # until the next tool call. Exits when the pool is empty.
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap, name="duckdb-sessions", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = max(1.0, min(self.idle_secs, self.file_idle_secs) / 2)
+        while True:
+            time.sleep(interval)
+            self.close_idle()
+            with self._lock:
+                if not self._sessions:
+                    self._reaper = None
+                    return
+
+
+duckdb_sessions = DuckDBSessionPool()
@@ -5,6 +5,8 @@ from typing import Dict, Any
 import os
 import re
 
+from supercog.engine.filesystem import current_filesystem
+
 def process_email(email_message: email.message.EmailMessage,
                   agent_dir: str,
                   run_context) -> Dict[str, Any]:
@@ -33,7 +35,7 @@ def process_email(email_message: email.message.EmailMessage,
                 attachment_data = part.get_payload(decode=True)
                 safe_filename = get_safe_filename(filename, agent_dir)
                 file_path = os.path.join(agent_dir, safe_filename)
-                with open(file_path, 'wb') as f:
+                with current_filesystem().open(file_path, 'wb') as f:
                     f.write(attachment_data)
                 
                 # Upload to S3 and get download URL
@@ -97,7 +99,7 @@ def get_safe_filename(filename, base_dir):
     safe_filename = re.sub(r'[^\w\-_\. ]', '_', filename)
     base, extension = os.path.splitext(safe_filename)
     counter = 1
-    while os.path.exists(os.path.join(base_dir, safe_filename)):
+    while current_filesystem().exists(os.path.join(base_dir, safe_filename)):
         safe_filename = f"{base}_{counter}{extension}"
         counter += 1
     return safe_filename
@@ -0,0 +1,225 @@
+# A persistent cache of text embeddings, shared by everything that embeds text (RAGTool,
+# PDFTool and the RAG service), so the same text is only sent to the embedding model
+# once.
+#
+# Embeddings are keyed by the sha256 of the text, within a namespace naming the model
+# and its dimensions, and stored as float32 bytes in the `embedding_cache` table of
+# EMBEDDING_CACHE_URL (see sql_cache.py). When the cached embeddings grow past
+# EMBEDDING_CACHE_MAX_MB the least recently used ones are deleted.
+#
+# CachedEmbeddings wraps a LangChain Embeddings with the cache. Other embedding APIs can
+# use `embed_with_cache` and `aembed_with_cache`.
+
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    select,
+    tuple_,
+)
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+
+from .filesystem import SYSTEM_ROOT_PATH
+from .sql_cache import SQLKeyedCache
+
+EMBEDDING_CACHE_URL = config.get_option(
+    "EMBEDDING_CACHE_URL",
+    default=os.environ.get("PGVECTOR_DB_URL") or f"sqlite:///{os.path.join(SYSTEM_ROOT_PATH, '.embedding_cache.db')}",
+)
+EMBEDDING_CACHE_MAX_MB = int(config.get_option("EMBEDDING_CACHE_MAX_MB", default=1024))
+# How many embeddings are written between checks of the cache size
+EMBEDDING_CACHE_EVICT_EVERY = int(config.get_option("EMBEDDING_CACHE_EVICT_EVERY", default=1000))
+
+metadata = MetaData()
+
+embedding_cache_table = Table(
+    "embedding_cache",
+    metadata,
+    Column("namespace", String, primary_key=True),
+    Column("content_hash", String, primary_key=True),
+    Column("embedding", LargeBinary, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("last_used", Float, nullable=False, index=True),
+)
+
+
+def embedding_namespace(model: str, dimensions: Optional[int] = None) -> str:
+    return f"{model}:{dimensions or 'default'}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLKeyedCache):
+    table = embedding_cache_table
+    key_column = "content_hash"
+    value_column = "embedding"
+
+    def __init__(
+            self,
+            url: str = EMBEDDING_CACHE_URL,
+            max_bytes: int = EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+            evict_every: int = EMBEDDING_CACHE_EVICT_EVERY,
+        ):
+        super().__init__(url, evict_every)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted": self.evicted,
+        }
+
+    def encode(self, vector: list[float]) -> dict:
+        data = np.asarray(vector, dtype=np.float32).tobytes()
+        return {"embedding": data, "size": len(data)}
+
+    def decode(self, data: bytes) -> list[float]:
+        return np.frombuffer(data, dtype=np.float32).tolist()
+
+    def get_many(self, namespace: str, hashes: list[str]) -> dict[str, list[float]]:
+        """ Returns the cached embeddings of the content hashes that are in the cache. """
+        if not hashes:
+            return {}
+        found = super().get_many(namespace, hashes)
+        hits = sum(1 for digest in hashes if digest in found)
+        self.hits += hits
+        self.misses += len(hashes) - hits
+        return found
+
+    def evict(self) -> int:
+        """ Deletes the least recently used embeddings until the cache is under
+            max_bytes. Returns the number deleted. """
+        table = embedding_cache_table
+        with self.engine.begin() as conn:
+            total = conn.execute(select(func.coalesce(func.sum(table.c.size), 0))).scalar()
+            excess = total - self.max_bytes
+            if excess <= 0:
+                return 0
+            running = select(
+                table.c.namespace,
+                table.c.content_hash,
+                table.c.size,
+                func.sum(table.c.size).over(order_by=(table.c.last_used, table.c.content_hash)).label("running"),
+            ).subquery()
+            # The oldest entries, up to and including the one that takes us under budget
+            oldest = select(running.c.namespace, running.c.content_hash).where(
+                running.c.running - running.c.size < excess
+            )
+            deleted = conn.execute(
+                delete(table).where(tuple_(table.c.namespace, table.c.content_hash).in_(oldest))
+            ).rowcount
+        self.evicted += deleted
+        logger.info(f"Evicted {deleted} embeddings from the embedding cache, stats: {self.stats()}")
+        return deleted
+
+    def embed_with_cache(
+            self,
+            namespace: str,
+            texts: list[str],
+            embed: Callable[[list[str]], list[list[float]]],
+        ) -> list[list[float]]:
+        """ Returns the embeddings of the texts, calling `embed` with just the texts
+            that aren't cached (each distinct text once). """
+        hashes = [content_hash(text) for text in texts]
+        found = self._cached(namespace, hashes)
+        missing = self._missing(texts, hashes, found)
+        if missing:
+            vectors = embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(namespace, computed)
+            found.update(computed)
+        return [found[digest] for digest in hashes]
+
+    async def aembed_with_cache(
+            self,
+            namespace: str,
+            texts: list[str],
+            aembed: Callable[[list[str]], Awaitable[list[list[float]]]],
+        ) -> list[list[float]]:
+        hashes = [content_hash(text) for text in texts]
+        found = await asyncio.to_thread(self._cached, namespace, hashes)
+        missing = self._missing(texts, hashes, found)
+        if missing:
+            vectors = await aembed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store, namespace, computed)
+            found.update(computed)
+        return [found[digest] for digest in hashes]
+
+    @staticmethod
+    def _missing(texts: list[str], hashes: list[str], found: dict) -> dict[str, str]:
+        missing = {}
+        for text, digest in zip(texts, hashes):
+            if digest not in found:
+                missing[digest] = text
+        return missing
+
+    def _cached(self, namespace: str, hashes: list[str]) -> dict[str, list[float]]:
+        # The cache only saves work, so it being unavailable mustn't stop us embedding
+        try:
+            return self.get_many(namespace, hashes)
+        except Exception as e:
+            logger.warn(f"Embedding cache lookup failed: {e}")
+            self.misses += len(hashes)
+            return {}
+
+    def _store(self, namespace: str, embeddings: dict[str, list[float]]):
+        try:
+            self.put_many(namespace, embeddings)
+        except Exception as e:
+            logger.warn(f"Embedding cache write failed: {e}")
+
+
+class CachedEmbeddings(Embeddings):
+    """ A LangChain Embeddings that looks up embeddings in the cache before asking the
+        wrapped model. """
+
+    def __init__(self, embeddings: Embeddings, namespace: Optional[str] = None, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.namespace = namespace or embedding_namespace(
+            getattr(embeddings, "model", type(embeddings).__name__),
+            getattr(embeddings, "dimensions", None),
+        )
+        self.cache = cache or embedding_cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.cache.embed_with_cache(self.namespace, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.cache.embed_with_cache(
+            self.namespace, [text], lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.cache.aembed_with_cache(self.namespace, texts, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        async def embed(texts: list[str]) -> list[list[float]]:
+            return [await self.embeddings.aembed_query(texts[0])]
+        return (await self.cache.aembed_with_cache(self.namespace, [text], embed))[0]
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,277 @@
+# The EngineCache holds the ChatEngine instances that are live inside a worker.
+#
+# It used to be a plain dict on EngineManager, which meant every engine (with its
+# LangChain executor, chat history and tool DataFrames) lived for the life of the
+# worker. Now we keep an LRU ordered map that is bounded three ways:
+#
+#   ENGINE_CACHE_MAX_ENGINES - max number of engines kept in memory
+#   ENGINE_CACHE_IDLE_SECS   - engines untouched for this long are evicted
+#   ENGINE_CACHE_MAX_MB      - approximate memory budget across all engines
+#
+# When an engine is evicted we write a snapshot (chat history + in-memory tool state)
+# to local disk, so the next `continue_run` for that run can rehydrate the engine
+# without losing context. Snapshots are pickles, so they're kept in a directory only
+# the worker's user can use, and aren't loaded unless that user owns them and nobody
+# else could have written them. DataFrames the engine had spilled to disk are moved into a
+# directory next to the snapshot instead of being pickled. Engines that are
+# mid-generation are never evicted.
+
+import os
+import pickle
+import shutil
+import stat
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+from uuid import UUID
+
+import pandas as pd
+
+from supercog.shared.services import config
+from supercog.shared.logging import logger
+
+from .filesystem import SYSTEM_ROOT_PATH
+
+MAX_ENGINES = int(config.get_option("ENGINE_CACHE_MAX_ENGINES", default=50))
+IDLE_SECS = int(config.get_option("ENGINE_CACHE_IDLE_SECS", default=60*30))
+MAX_MEMORY_MB = int(config.get_option("ENGINE_CACHE_MAX_MB", default=1024))
+SNAPSHOT_DIR = config.get_option(
+    "ENGINE_SNAPSHOT_DIR",
+    default=os.path.join(SYSTEM_ROOT_PATH, ".engine_snapshots"),
+)
+# Snapshots older than this are assumed abandoned and are pruned
+SNAPSHOT_TTL_SECS = int(config.get_option("ENGINE_SNAPSHOT_TTL_SECS", default=60*60*24))
+
+
+def estimate_engine_memory(chatengine) -> int:
+    # Rough byte estimate of what an engine holds onto. We only count the things
+    # that grow over a run: chat history and the tools' in-memory state (mostly DataFrames).
+    total = sys.getsizeof(chatengine)
+    for msg in getattr(chatengine, "chat_history", []):
+        content = msg.content
+        if isinstance(content, str):
+            total += len(content)
+        else:
+            total += len(str(content))
+    tools_state = getattr(chatengine, "tools_inmem_state", {})
+    if hasattr(tools_state, "resident_bytes"):
+        # A DataFrameStore: spilled frames don't take up memory
+        total += tools_state.resident_bytes()
+    else:
+        for value in tools_state.values():
+            total += _estimate_value_size(value)
+    return total
+
+def _estimate_value_size(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        try:
+            return int(value.memory_usage(deep=True).sum())
+        except Exception:
+            return sys.getsizeof(value)
+    elif isinstance(value, (str, bytes)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class EngineCache:
+    def __init__(
+            self,
+            max_engines: int = MAX_ENGINES,
+            idle_secs: int = IDLE_SECS,
+            max_memory_bytes: int = MAX_MEMORY_MB * 1024 * 1024,
+            snapshot_dir: str|None = SNAPSHOT_DIR,
+        ):
+        self.max_engines = max_engines
+        self.idle_secs = idle_secs
+        self.max_memory_bytes = max_memory_bytes
+        self.snapshot_dir = snapshot_dir
+        # engine id -> (engine, last access time). Ordered least-recent first.
+        self._engines: OrderedDict[UUID, tuple] = OrderedDict()
+        # Called with the engine id and engine whenever an engine leaves the cache
+        self.on_evict: Optional[Callable[[UUID, object], None]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rehydrations = 0
+        self._last_prune = 0.0
+
+    # dict compatible access, so callers can treat this like the old RUNNING_ENGINES dict.
+    # Note that `in` and iteration do not count as a hit or refresh the LRU order.
+    def __contains__(self, engine_id) -> bool:
+        return engine_id in self._engines
+
+    def __getitem__(self, engine_id):
+        engine = self.get(engine_id)
+        if engine is None:
+            raise KeyError(engine_id)
+        return engine
+
+    def __setitem__(self, engine_id, chatengine):
+        self.put(engine_id, chatengine)
+
+    def __delitem__(self, engine_id):
+        self.pop(engine_id)
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def __iter__(self) -> Iterator[UUID]:
+        return iter(list(self._engines.keys()))
+
+    def keys(self) -> list[UUID]:
+        return list(self._engines.keys())
+
+    def values(self) -> list:
+        return [engine for engine, _ in self._engines.values()]
+
+    def get(self, engine_id, default=None):
+        if engine_id in self._engines:
+            engine, _ = self._engines.pop(engine_id)
+            self._engines[engine_id] = (engine, time.time())
+            self.hits += 1
+            return engine
+        self.misses += 1
+        return default
+
+    def put(self, engine_id, chatengine):
+        self._engines.pop(engine_id, None)
+        self._engines[engine_id] = (chatengine, time.time())
+        self.enforce_limits(keep=engine_id)
+
+    def pop(self, engine_id, default=None):
+        entry = self._engines.pop(engine_id, None)
+        if entry is None:
+            return default
+        if self.on_evict:
+            self.on_evict(engine_id, entry[0])
+        return entry[0]
+
+    def is_evictable(self, chatengine) -> bool:
+        return not getattr(chatengine, "generating", False)
+
+    def evict(self, engine_id, snapshot: bool=True) -> bool:
+        entry = self._engines.get(engine_id)
+        if entry is None:
+            return False
+        chatengine, _ = entry
+        if not self.is_evictable(chatengine):
+            return False
+        if snapshot:
+            self.save_snapshot(engine_id, chatengine)
+        self.pop(engine_id)
+        self.evictions += 1
+        logger.info(f"EngineCache evicted engine {engine_id}")
+        return True
+
+    def evict_idle(self) -> int:
+        # Evict engines that have not been touched within the idle window
+        cutoff = time.time() - self.idle_secs
+        evicted = 0
+        for engine_id, (_, last_used) in list(self._engines.items()):
+            if last_used < cutoff and self.evict(engine_id):
+                evicted += 1
+        self.prune_snapshots()
+        return evicted
+
+    def enforce_limits(self, keep=None):
+        self.evict_idle()
+        sizes = {
+            engine_id: estimate_engine_memory(engine)
+            for engine_id, (engine, _) in self._engines.items()
+        }
+        total = sum(sizes.values())
+        # Walk from least recently used, skipping the entry we just added and any busy engines
+        for engine_id in list(self._engines.keys()):
+            if len(self._engines) <= self.max_engines and total <= self.max_memory_bytes:
+                break
+            if engine_id != keep and self.evict(engine_id):
+                total -= sizes[engine_id]
+
+    def memory_usage(self) -> int:
+        return sum(estimate_engine_memory(engine) for engine, _ in self._engines.values())
+
+    ## Snapshots
+
+    def _snapshot_path(self, engine_id) -> str:
+        return os.path.join(self.snapshot_dir, f"{engine_id}.pkl")
+
+    def _snapshot_files_dir(self, engine_id) -> str:
+        # Where the engine's spilled DataFrames wait until the snapshot is restored
+        return os.path.join(self.snapshot_dir, f"{engine_id}.frames")
+
+    def save_snapshot(self, engine_id, chatengine):
+        if not self.snapshot_dir or not hasattr(chatengine, "snapshot_state"):
+            return
+        try:
+            os.makedirs(self.snapshot_dir, mode=0o700, exist_ok=True)
+            if os.stat(self.snapshot_dir).st_uid == os.getuid():
+                os.chmod(self.snapshot_dir, 0o700)
+            if not self._is_private(self.snapshot_dir):
+                raise PermissionError(f"{self.snapshot_dir} must be owned by this user with mode 0700")
+            path = self._snapshot_path(engine_id)
+            with os.fdopen(os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                pickle.dump(chatengine.snapshot_state(self._snapshot_files_dir(engine_id)), f)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.error(f"EngineCache failed to snapshot engine {engine_id}: {e}")
+
+    def has_snapshot(self, engine_id) -> bool:
+        return bool(self.snapshot_dir) and os.path.exists(self._snapshot_path(engine_id))
+
+    def pop_snapshot(self, engine_id) -> dict|None:
+        # Returns and removes the snapshot for an evicted engine, if we have one
+        if engine_id is None or not self.has_snapshot(engine_id):
+            return None
+        path = self._snapshot_path(engine_id)
+        try:
+            if not (self._is_private(self.snapshot_dir) and self._is_private(path)):
+                raise PermissionError(f"{path} could have been written by another user")
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            self.rehydrations += 1
+            return state
+        except Exception as e:
+            logger.error(f"EngineCache failed to load snapshot {engine_id}: {e}")
+            return None
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _is_private(path: str) -> bool:
+        # Owned by us, and not writable by anyone else
+        info = os.lstat(path)
+        return info.st_uid == os.getuid() and not stat.S_ISLNK(info.st_mode) and not info.st_mode & 0o077
+
+    def prune_snapshots(self):
+        # Rate limited since we get called on every idle sweep
+        if time.time() - self._last_prune < 60:
+            return
+        self._last_prune = time.time()
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return
+        cutoff = time.time() - SNAPSHOT_TTL_SECS
+        for entry in os.scandir(self.snapshot_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "engines": len(self._engines),
+            "max_engines": self.max_engines,
+            "memory_bytes": self.memory_usage(),
+            "max_memory_bytes": self.max_memory_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
@@ -13,7 +13,7 @@ from datetime import datetime, timedelta
 from uuid import UUID
 import os
 import time
-from typing import Optional, Callable
+from typing import Any, Optional, Callable
 import traceback
 import asyncio
 import redis.asyncio as redis
@@ -23,7 +23,7 @@ import sys
 import time
 import signal
 from typing import ClassVar, Literal
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
 
 from pydantic import BaseModel, Field
 import pandas as pd
@@ -51,6 +51,7 @@ from supercog.shared.apubsub import (
 )
 
 from supercog.shared.logging import logger
+from supercog.shared.s3_uploads import S3UploadManager, UploadRequest, UploadProgress
 from supercog.shared.utils import (
     upload_file_to_s3, 
     get_file_mimetype, 
@@ -58,6 +59,10 @@ from supercog.shared.utils import (
 
 from .chatengine import ChatEngine
 from .chat_logger import chat_logger
+from .engine_cache import EngineCache
+from .duckdb_sessions import duckdb_sessions
+from .consumer_registry import ConsumerRegistry
+from .output_coalescer import OutputCoalescer, coalesce_events
 
 from .db import Run, RunLog, Agent, session_context
 from .db import lifespan as db_lifespan, reset_db_connections
@@ -73,6 +78,12 @@ from .filesystem import (
 EventCallback = Callable[[AgentEvent], None]
 
 IDLE_TIMEOUT = int(config.get_option("AGENT_WORKER_IDLE", default=120))  # Seconds before we exit from no activity
+# Max agent tasks a worker runs at once for each tenant stream. Set to 1 for the old serial behavior.
+WORKER_CONCURRENCY = int(config.get_option("AGENT_WORKER_CONCURRENCY", default=4))
+# A task that has sat un-acked in a dead consumer's pending list this long gets re-claimed
+TASK_CLAIM_IDLE_MS = int(config.get_option("AGENT_TASK_CLAIM_IDLE_MS", default=60_000))
+# Give up on a task (ack it and report an error) after it has been delivered this many times
+TASK_MAX_DELIVERIES = int(config.get_option("AGENT_TASK_MAX_DELIVERIES", default=3))
 
 class AgentTask(BaseModel):
     action: str
@@ -91,12 +102,12 @@ class EngineManager:
     # Manages creating and running ChatEngine instances which are instances of
     # executing agents.
 
-    # Map of user id's to running engines. We should clone this map via Redis, but note
-    # that requires we can pickle the full ChatEngine object.
-    RUNNING_ENGINES: dict[UUID, ChatEngine] = {} 
+    # Map of chatengine id's to running engines. This is a bounded LRU cache which evicts
+    # idle engines (snapshotting their state) so long-lived workers don't grow forever.
+    RUNNING_ENGINES: EngineCache = EngineCache()
     END_EVENT = {"type": "end"}
 
-    def __init__(self, tenant_id_list: list[str]):
+    def __init__(self, tenant_id_list: list[str], max_concurrency: int = WORKER_CONCURRENCY):
         self.tenant_id_list = tenant_id_list
         self.group_name = 'consumer_group'
         self.consumer_name = f'consumer_{"-".join(tenant_id_list)}'
@@ -109,6 +120,23 @@ class EngineManager:
         # Locks for each chatengine to prevent concurrent access, which can happen if you
         # modify an agent while it is running a request.
         self.chatengine_mod_locks: dict[str, asyncio.Lock] = {}
+        self.RUNNING_ENGINES.on_evict = self.forget_chatengine
+        # Concurrent task processing state. We keep a count of running tasks per tenant
+        # stream, and the stream entry id of every in-flight task so we can keep our
+        # claim on it fresh (otherwise another worker would XCLAIM a long running agent).
+        self.max_concurrency = max(1, max_concurrency)
+        self.inflight_tasks: dict[asyncio.Task, tuple[str, str]] = {}
+        self.tenant_running: dict[str, int] = {}
+        # Tasks for the same run must execute in order (eg. create_run before the first prompt).
+        # Maps run_id to [lock, number of tasks using it].
+        self.run_task_locks: dict[str, list] = {}
+        self.last_claim_check = 0.0
+
+    def forget_chatengine(self, chatengine_id: UUID, chatengine: ChatEngine):
+        self.chatengine_mod_locks.pop(str(chatengine_id), None)
+        # The run is done in this worker, so release its DuckDB connections and frames
+        if chatengine.run_context is not None and chatengine.run_context.run_id:
+            duckdb_sessions.close_run(chatengine.run_context.run_id)
 
     @asynccontextmanager
     async def acquire_chatengine_lock(self, chatengine: ChatEngine):
@@ -160,7 +188,8 @@ class EngineManager:
             agent: Agent, 
             run_db: Run, 
             user: User,
-            synchronous: bool=False) -> Run:
+            synchronous: bool=False,
+            stream_options: Optional[dict] = None) -> Run:
         await self.subscribe_meta_events()
         # ! need the new run_id to create the ChatEngine (which stores it in the RunContext)
         chatengine = ChatEngine()
@@ -188,9 +217,9 @@ class EngineManager:
         print("********** SAVED CHATENGINE UNDER ID: ", chatengine.id)
         if run_db.input is not None:
             if synchronous:
-                await self.dispatch_input(run_db, chatengine, run_db.input, user)
+                await self.dispatch_input(run_db, chatengine, run_db.input, user, stream_options)
             else:
-                asyncio.create_task(self.dispatch_input(run_db, chatengine, run_db.input, user))
+                asyncio.create_task(self.dispatch_input(run_db, chatengine, run_db.input, user, stream_options))
 
         return run_db
 
@@ -203,15 +232,18 @@ class EngineManager:
             run_data: Optional[dict] = None,
             attached_file: Optional[str|None] = None,
             synchronous: bool = False,
+            stream_options: Optional[dict] = None,
         ):
         await self.subscribe_meta_events()
 
         print("Continuing Run with chatengine ID: ", rundb.chatengine_id)
             
-        if rundb.chatengine_id is None or rundb.chatengine_id not in self.RUNNING_ENGINES:
+        chatengine = self.RUNNING_ENGINES.get(rundb.chatengine_id) if rundb.chatengine_id else None
+        if chatengine is None:
             # There is no ChatEngine in memory for this run, but maybe we ran
-            # the chat before. Let's load any chat history and refresh the
-            # chatengine with it.
+            # the chat before, or the engine was evicted from the cache. Restore
+            # the evicted snapshot if we have one, otherwise reload chat history
+            # from the run logs.
             chatengine = ChatEngine()
             agent = session.get(Agent, rundb.agent_id)
             if agent is None:
@@ -225,8 +257,12 @@ class EngineManager:
                 rundb.logs_channel,
                 rundb.tools,
             )
-            logs = await chat_logger.retrieve_run_history(str(rundb.id))
-            chatengine.reload_chat_history(logs)
+            snapshot = self.RUNNING_ENGINES.pop_snapshot(rundb.chatengine_id)
+            if snapshot is not None:
+                chatengine.restore_state(snapshot)
+            else:
+                logs = await chat_logger.retrieve_run_history(str(rundb.id))
+                chatengine.reload_chat_history(logs)
             rundb.chatengine_id = chatengine.id
             self.RUNNING_ENGINES[chatengine.id] = chatengine
             session.add(rundb)
@@ -234,7 +270,6 @@ class EngineManager:
             session.refresh(rundb)
         else:
             print("------------- ChatEngine already exists")
-            chatengine: ChatEngine = self.RUNNING_ENGINES[rundb.chatengine_id]
 
         if attached_file:
             # Make sure the agent has a tool to read the file uploaded in the chat
@@ -244,9 +279,9 @@ class EngineManager:
             chatengine.run_context.update_env_vars(run_data)
 
         if synchronous:
-            await self.dispatch_input(rundb, chatengine, run_input, user)
+            await self.dispatch_input(rundb, chatengine, run_input, user, stream_options)
         else:
-            asyncio.create_task(self.dispatch_input(rundb, chatengine, run_input, user))
+            asyncio.create_task(self.dispatch_input(rundb, chatengine, run_input, user, stream_options))
 
     async def cancel_run(
             self,
@@ -291,6 +326,19 @@ class EngineManager:
                 return chatengine.tools_inmem_state[df_name]
         return None
 
+    async def get_dataframe_source(self, rundb: Run, df_name: str) -> tuple[Any, Optional[tuple]]:
+        # Like get_dataframe, but a spilled frame comes back as its memory-mapped Arrow
+        # table instead of being loaded into memory, along with a version for caching
+        if rundb.chatengine_id and rundb.chatengine_id in self.RUNNING_ENGINES:
+            chatengine = self.RUNNING_ENGINES[rundb.chatengine_id]
+            state = chatengine.tools_inmem_state
+            if df_name in state:
+                if hasattr(state, "scan_source"):
+                    version = ("dataframe", rundb.chatengine_id, df_name, state.version(df_name))
+                    return state.scan_source(df_name), version
+                return state[df_name], None
+        return None, None
+
     async def delete_dataframe(self, rundb: Run, df_name: str):
         if rundb.chatengine_id and rundb.chatengine_id in self.RUNNING_ENGINES:
             chatengine = self.RUNNING_ENGINES[rundb.chatengine_id]
@@ -348,10 +396,11 @@ class EngineManager:
             chatengine: ChatEngine, 
             question: str,
             user: User,
+            stream_options: Optional[dict] = None,
         ):
         # Make sure no previous cancel flag is set
         async with self.acquire_chatengine_lock(chatengine):
-            await self.dispatch_input_with_lock(run, chatengine, question, user)
+            await self.dispatch_input_with_lock(run, chatengine, question, user, stream_options)
 
     async def dispatch_input_with_lock(
             self, 
@@ -359,7 +408,9 @@ class EngineManager:
             chatengine: ChatEngine, 
             question: str,
             user: User,
+            stream_options: Optional[dict] = None,
         ):
+        # stream_options are the client's request params, which can tune output coalescing
         await chatengine.process_pending_agent_updates()
         
         mypublish = self.create_publish_function(run, user.user_id)
@@ -385,7 +436,7 @@ class EngineManager:
                 # abort our tool function
                 raise RuntimeError("Function aborted by cancel request")
             
-            if len(batch) > 1 and batch[0].type == AgentLogEventTypes.OUTPUT:
+            if len(batch) > 1 and all(e.type == AgentLogEventTypes.OUTPUT for e in batch):
                 batch = AgentOutputEvent.coalese_output_events(batch)
 
             for event in batch:
@@ -397,35 +448,28 @@ class EngineManager:
 
         print("###### Setup Agent filesystem")
         with get_agent_filesystem(run.tenant_id, run.user_id):
-            output_events: list[AgentOutputEvent] = []
-            batch_size = 25
-            async for event in chatengine.respond(question, log_function, check_run_canceled, user):
-                # Add the question and answer to the current chat.
-                if await check_run_canceled():
-                    break
-                if event.type == AgentLogEventTypes.OUTPUT:
-                    output_events.append(event)
-                if event.type != AgentLogEventTypes.OUTPUT or len(output_events) > batch_size:
-                    if output_events:
-                        await log_function(output_events)
-                        output_events = []
-                    if event.type != AgentLogEventTypes.OUTPUT:
-                        await log_function([event])
-
-            if output_events:
-                await log_function(batch=output_events)
+            # Streamed LLM tokens are coalesced by time window and size before publishing
+            coalescer = OutputCoalescer.from_query_params(stream_options)
+            events = chatengine.respond(question, log_function, check_run_canceled, user)
+            async with aclosing(coalesce_events(events, coalescer)) as batches:
+                async for batch in batches:
+                    if await check_run_canceled():
+                        break
+                    await log_function(batch)
+            logger.debug(f"Coalesced {coalescer.events_in} agent events into {coalescer.batches_out} output batches")
 
         logger.debug("channel ", run.logs_channel, " **EVENT** ")
         logger.info(f"[{run.logs_channel}] -> END")
 
         # Send asset created events for any files created
-        self.gather_file_assets(chatengine.run_context, run.tenant_id, run.user_id, start_time)
+        modified_files = list_modified_files(start_time, run.tenant_id, run.user_id)
+        self.gather_file_assets(chatengine.run_context, run.tenant_id, run.user_id, modified_files)
         async for asset_event in chatengine.run_context.get_queued_asset_events():
             await log_function(asset_event)
 
         await mypublish(AgentEndEvent)
         
-        self.upload_agent_files(run.tenant_id, run.user_id, start_time)
+        await asyncio.to_thread(self.upload_agent_files, run.tenant_id, run.user_id, modified_files)
         print("###### AGENT DONE FOR question: ", question)
 
 
@@ -447,25 +491,39 @@ class EngineManager:
     def get_file_asset_type(self, file):
         return AssetTypeEnum.TABLE
 
-    def gather_file_assets(self, run_context: RunContext, tenant_id, user_id, start_time):
+    def gather_file_assets(self, run_context: RunContext, tenant_id, user_id, modified_files: list[str]):
         # Send Asset events for any files created by the agent
         user_dir = get_user_directory(tenant_id, user_id)
-        for file in list_modified_files(start_time, tenant_id, user_id):
+        for file in modified_files:
             folder = os.path.dirname(file)
             folder = os.path.relpath(folder, user_dir)
             name = os.path.basename(file)
             full_name = os.path.join(folder, name)
             run_context.queue_asset_event(full_name, self.get_file_asset_type(file), name)
 
-    def upload_agent_files(self, tenant_id, user_id, start_time):
-        # Upload any files created by the agent to the user's directory
+    def upload_agent_files(self, tenant_id, user_id, modified_files: list[str]):
+        # Upload any files created by the agent to the user's directory. Files are sent
+        # in parallel, and files whose content is already in S3 are skipped.
         user_dir = get_user_directory(tenant_id, user_id)
-        for file in list_modified_files(start_time, tenant_id, user_id):
-            folder = os.path.dirname(file)
-            folder = os.path.relpath(folder, user_dir)
-            if folder == ".":
-                folder = ""
-            self.upload_user_file_to_s3(tenant_id, user_id, file, folder=folder)
+        bucket = config.get_global("S3_FILES_BUCKET_NAME")
+        requests = []
+        for file in modified_files:
+            folder = os.path.relpath(os.path.dirname(file), user_dir)
+            folder = "" if folder == "." else f"{folder}/"
+            object_name = f"{tenant_id}/{user_id}/{folder}{os.path.basename(file)}"
+            requests.append(UploadRequest(path=file, bucket=bucket, key=object_name))
+
+        def log_progress(progress: UploadProgress):
+            if progress.status == "progress":
+                logger.debug(f"Uploading {progress.key}: {progress.bytes_sent}/{progress.total_bytes} bytes")
+            else:
+                logger.info(f"Upload {progress.status}: {progress.path} as {progress.key} {progress.error or ''}")
+
+        results = S3UploadManager(on_progress=log_progress).upload_files(requests)
+        failed = [r.request.path for r in results if r.status == "failed"]
+        if failed:
+            logger.error(f"Failed to upload agent files: {failed}")
+        return results
 
     def upload_user_file_to_s3(self, tenant_id, user_id, file_path, folder=""):
         bucket = config.get_global("S3_FILES_BUCKET_NAME")
@@ -485,6 +543,7 @@ class EngineManager:
 
     async def connect(self):
         self.redis = await pubsub.get_client()
+        self.consumer_registry = ConsumerRegistry(self.redis)
 
         for tenant_id in self.tenant_id_list:
             stream_name = f'agents:{tenant_id}'
@@ -496,11 +555,8 @@ class EngineManager:
 
     async def send_heartbeat(self):
         while not self.shutdown_event.is_set():
-            heartbeat_key = f"heartbeat:{self.consumer_name}"
-            await self.redis.setex(heartbeat_key, 10, json.dumps({
-                'timestamp': time.time(),
-                'streams': self.tenant_id_list
-            }))
+            await self.consumer_registry.heartbeat(self.consumer_name, self.tenant_id_list)
+            await self.refresh_inflight_claims()
             try:
                 #print("SENDING HEARTBEAT", self)
                 await asyncio.wait_for(self.shutdown_event.wait(), timeout=self.heartbeat_interval)
@@ -509,10 +565,141 @@ class EngineManager:
         await self.redis.close()
 
     async def remove_heartbeat(self):
-        heartbeat_key = f"heartbeat:{self.consumer_name}"
-        await self.redis.delete(heartbeat_key)
+        await self.consumer_registry.remove(self.consumer_name, self.tenant_id_list)
         print(f"Removed heartbeat for {self.consumer_name}")
 
+    async def refresh_inflight_claims(self):
+        # Re-claiming our own pending entries resets their idle time, which tells other
+        # workers that these tasks are still alive and shouldn't be taken over.
+        by_stream: dict[str, list[str]] = {}
+        for stream, task_id in self.inflight_tasks.values():
+            by_stream.setdefault(stream, []).append(task_id)
+        for stream, task_ids in by_stream.items():
+            try:
+                await self.redis.xclaim(
+                    stream, self.group_name, self.consumer_name, 
+                    min_idle_time=0, message_ids=task_ids, justid=True,
+                )
+            except Exception as e:
+                print(f"Error refreshing task claims on {stream}: {e}")
+
+    def tenant_from_stream(self, stream: str) -> str:
+        return stream.split(":", 1)[1]
+
+    def free_slots(self, tenant_id: str) -> int:
+        return self.max_concurrency - self.tenant_running.get(tenant_id, 0)
+
+    def start_stream_task(self, stream: str, task_id: str, task: dict, claimed: bool=False):
+        tenant_id = self.tenant_from_stream(stream)
+        self.tenant_running[tenant_id] = self.tenant_running.get(tenant_id, 0) + 1
+        self.last_event = time.time()
+        atask = asyncio.create_task(self.run_stream_task(stream, task_id, task, claimed))
+        self.inflight_tasks[atask] = (stream, task_id)
+        atask.add_done_callback(self._stream_task_done)
+
+    def _stream_task_done(self, atask: asyncio.Task):
+        stream, _ = self.inflight_tasks.pop(atask, (None, None))
+        if stream:
+            tenant_id = self.tenant_from_stream(stream)
+            self.tenant_running[tenant_id] = max(0, self.tenant_running.get(tenant_id, 1) - 1)
+        self.last_event = time.time()
+
+    async def run_stream_task(self, stream: str, task_id: str, task: dict, claimed: bool=False):
+        # Runs one task from the stream in isolation. Any failure is reported to the run
+        # and the entry is acked, so a bad task can't wedge the stream. If the whole worker
+        # dies instead, the entry stays pending and another worker will claim it.
+        try:
+            task_data = json.loads(task["task"])
+            if claimed:
+                print(f"Resuming task {task_id} claimed from a dead consumer on {stream}")
+            run_id = str(task_data.get("run", {}).get("id", task_id))
+            run_lock = self.run_task_locks.setdefault(run_id, [asyncio.Lock(), 0])
+            run_lock[1] += 1
+            try:
+                async with run_lock[0]:
+                    await self._process_task(task_data)
+            finally:
+                run_lock[1] -= 1
+                if run_lock[1] == 0:
+                    del self.run_task_locks[run_id]
+        except asyncio.CancelledError:
+            # Worker is shutting down. Leave the entry pending so another worker claims it.
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error processing task {task_id}: {e}")
+
+        try:
+            await self.redis.xack(stream, self.group_name, task_id)
+        except Exception as e:
+            print(f"Error acking task {task_id}: {e}")
+
+    async def claim_abandoned_tasks(self):
+        # Look for tasks that were delivered to some consumer but never acked, and have been
+        # idle long enough that their worker must have died. Claim them for ourselves, or
+        # give up on them if they keep crashing workers.
+        for tenant_id in self.tenant_id_list:
+            slots = self.free_slots(tenant_id)
+            if slots <= 0:
+                continue
+            stream = f'agents:{tenant_id}'
+            try:
+                pending = await self.redis.xpending_range(
+                    stream, self.group_name, min="-", max="+", count=slots, idle=TASK_CLAIM_IDLE_MS,
+                )
+            except redis.ResponseError:
+                continue
+            inflight_ids = {task_id for _, task_id in self.inflight_tasks.values()}
+            for entry in pending:
+                task_id = entry["message_id"]
+                if task_id in inflight_ids:
+                    continue
+                claimed = await self.redis.xclaim(
+                    stream, self.group_name, self.consumer_name, 
+                    min_idle_time=TASK_CLAIM_IDLE_MS, message_ids=[task_id],
+                )
+                for claimed_id, task in claimed:
+                    if entry["times_delivered"] >= TASK_MAX_DELIVERIES:
+                        await self.abandon_stream_task(stream, claimed_id, task)
+                    elif task:
+                        self.start_stream_task(stream, claimed_id, task, claimed=True)
+                    else:
+                        # entry was trimmed from the stream
+                        await self.redis.xack(stream, self.group_name, claimed_id)
+
+    async def abandon_stream_task(self, stream: str, task_id: str, task: dict):
+        print(f"Giving up on task {task_id} from {stream} after {TASK_MAX_DELIVERIES} deliveries")
+        try:
+            agent_task = AgentTask.model_validate(json.loads(task["task"]))
+            await self.report_unhandled_error(
+                agent_task, RuntimeError("The agent worker crashed while running this request")
+            )
+        except Exception as e:
+            print(f"Error reporting abandoned task {task_id}: {e}")
+        await self.redis.xack(stream, self.group_name, task_id)
+
+    async def read_stream_tasks(self) -> bool:
+        # Prefetch as many tasks as we have free slots for. Tenants at their concurrency
+        # limit are left out of the read, so their tasks wait in the stream (backpressure).
+        streams = {
+            f'agents:{t}': '>' for t in self.tenant_id_list if self.free_slots(t) > 0
+        }
+        if not streams:
+            # Every tenant is at capacity, wait for something to finish
+            if self.inflight_tasks:
+                await asyncio.wait(list(self.inflight_tasks.keys()), timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(1.0)
+            return False
+        count = min(self.free_slots(self.tenant_from_stream(stream)) for stream in streams)
+        messages = await self.redis.xreadgroup(
+            self.group_name, self.consumer_name, streams, count=count, block=1000,
+        )
+        for stream, tasks in messages or []:
+            for task_id, task in tasks:
+                self.start_stream_task(stream, task_id, task)
+        return bool(messages)
+
     async def process_tasks_until_canceled(self):
         if not self.redis:
             await self.connect()
@@ -520,24 +707,15 @@ class EngineManager:
         heartbeat_task = asyncio.create_task(self.send_heartbeat())
 
         try:
-            while not self.shutdown_event.is_set() and (self.last_event + IDLE_TIMEOUT) > time.time():
+            while not self.shutdown_event.is_set() and (
+                self.inflight_tasks or (self.last_event + IDLE_TIMEOUT) > time.time()
+            ):
                 try:
-                    streams = {f'agents:{t}': '>' for t in self.tenant_id_list}
-                    messages = await asyncio.wait_for(
-                        self.redis.xreadgroup(self.group_name, self.consumer_name, streams, count=1),
-                        timeout=1.0
-                    )
-                    
-                    for stream, tasks in messages:
-                        for task_id, task in tasks:
-                            task_data = json.loads(task["task"])
-                            self.last_event = time.time()
-                            await self._process_task(task_data)
-                            self.last_event = time.time()
-                            await self.redis.xack(stream, self.group_name, task_id)
-                
-                except asyncio.TimeoutError:
-                    continue
+                    if time.time() - self.last_claim_check > TASK_CLAIM_IDLE_MS / 1000 / 2:
+                        self.last_claim_check = time.time()
+                        await self.claim_abandoned_tasks()
+                    if not await self.read_stream_tasks():
+                        self.RUNNING_ENGINES.evict_idle()
                 except Exception as e:
                     print(f"Error processing task: {e}")
                     await asyncio.sleep(0.2)
@@ -548,6 +726,9 @@ class EngineManager:
                 await heartbeat_task
             except asyncio.CancelledError:
                 pass
+            # Tasks still running are left un-acked, so another worker will claim them
+            for atask in list(self.inflight_tasks.keys()):
+                atask.cancel()
             await self.remove_heartbeat()
 
     async def _process_task(self, task_data, synchronous=True):
@@ -566,7 +747,8 @@ class EngineManager:
                                 agent, 
                                 run_db, 
                                 task.get_user(), 
-                                synchronous=synchronous
+                                synchronous=synchronous,
+                                stream_options=task.query_params,
                             )
                     elif task.action == AgentTask.ACTION_PROMPT:
                         run_db = session.get(Run, task.run["id"])
@@ -578,6 +760,7 @@ class EngineManager:
                             task.get_user(),
                             task.run_input.get("run_data", {}),
                             synchronous=synchronous,
+                            stream_options=task.query_params,
                         )
                     else:
                         raise RuntimeError(f"Unknown task action: {task.action} and task: {task}")
@@ -591,8 +774,6 @@ class EngineManager:
             traceback.print_exc()
             await self.report_unhandled_error(task, e)
 
-        await asyncio.sleep(1)
-
     def shutdown(self):
         print("Shutting down...")
         self.shutdown_event.set()
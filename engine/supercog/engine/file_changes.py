@@ -0,0 +1,383 @@
+# Tracks which files changed in a user's workspace, so that after each agent turn we
+# can send asset events and upload just the files the turn touched, without walking
+# and stat'ing the whole workspace.
+#
+# Two implementations:
+#
+#   InotifyChangeIndex  - (Linux) watches every directory in the workspace with one
+#                         process-wide inotify instance. Reporting the changes of a turn
+#                         is O(changes).
+#   ManifestChangeIndex - the fallback. Keeps a persisted manifest of (mtime, size) per
+#                         file, and diffs a scandir pass of the workspace against it.
+#
+# Several runs of the same user can be in flight at once, so there is no shared "since
+# the last call" state: each index remembers when it saw every change, and a run asks for
+# the changes seen after its own start time (`from_time`). When the index has no complete
+# history back to `from_time` - the first time a workspace is seen by a process, or after
+# the inotify queue overflows - we fall back to the old rule: files modified after
+# `from_time`.
+
+import abc
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from supercog.shared.services import config
+from supercog.shared.logging import logger
+
+# "auto" uses inotify where available, "inotify" or "manifest" force one or the other
+FILE_CHANGES_MODE = config.get_option("FILE_CHANGES_MODE", default="auto")
+# How many workspaces a process keeps inotify watches on (LRU)
+MAX_WATCHED_WORKSPACES = int(config.get_option("FILE_CHANGES_MAX_WORKSPACES", default=32))
+# How often a changed manifest is written back to disk. Between saves the manifest is
+# kept in memory; after a restart, a stale manifest only means reporting some files again.
+MANIFEST_SAVE_SECS = float(config.get_option("FILE_CHANGES_MANIFEST_SAVE_SECS", default=60))
+# How long inotify indexes remember a change. Runs that started longer ago than this
+# fall back to a scan of modification times.
+CHANGE_HISTORY_SECS = float(config.get_option("FILE_CHANGES_HISTORY_SECS", default=3600))
+
+
+def scan_files(root: str) -> Iterator[os.DirEntry]:
+    # Yields every regular file under root, without following symlinks (so the
+    # tenant's "shared" folder is not part of a user's workspace)
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+def files_modified_after(root: str, from_time: datetime) -> list[str]:
+    comp_time = from_time.timestamp()
+    result = []
+    for entry in scan_files(root):
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > comp_time:
+                result.append(entry.path)
+        except FileNotFoundError:
+            pass
+    return result
+
+
+class ChangeIndex(abc.ABC):
+    def __init__(self, root: str):
+        self.root = root
+
+    @abc.abstractmethod
+    def changed_files(self, from_time: datetime) -> list[str]:
+        """ Returns the files changed since from_time (the start of the run asking). """
+
+    def close(self):
+        pass
+
+
+class ManifestChangeIndex(ChangeIndex):
+    def __init__(self, root: str, manifest_path: str):
+        super().__init__(root)
+        self.manifest_path = manifest_path
+        # The current manifest, so we only read the file once per process
+        self.manifest: Optional[dict] = None
+        self.dirty = False
+        self.saved_at = 0.0
+
+    def load_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save_manifest(self, manifest: dict):
+        Path(self.manifest_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, self.manifest_path)
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    def changed_files(self, from_time: datetime) -> list[str]:
+        # Manifest entries are [mtime_ns, size, seen], where `seen` is the time of the
+        # scan that first saw the file in that state
+        previous = self.manifest if self.manifest is not None else self.load_manifest()
+        comp_time = from_time.timestamp()
+        now = time.time()
+        prefix_len = len(os.path.join(self.root, ""))
+        manifest = {}
+        changed = []
+        updated = False
+        for entry in scan_files(self.root):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            rel_path = entry.path[prefix_len:]
+            state = [st.st_mtime_ns, st.st_size]
+            if previous is None:
+                manifest[rel_path] = state + [now]
+                if st.st_mtime > comp_time:
+                    changed.append(entry.path)
+                continue
+            old = previous.get(rel_path)
+            if old is None or old[:2] != state:
+                manifest[rel_path] = state + [now]
+                changed.append(entry.path)
+                updated = True
+            else:
+                manifest[rel_path] = old
+                # Changed by a scan during this run (for another run of this user)
+                if len(old) > 2 and old[2] > comp_time:
+                    changed.append(entry.path)
+        self.manifest = manifest
+        self.dirty = self.dirty or updated or previous is None or len(manifest) != len(previous)
+        if self.dirty and (previous is None or time.monotonic() - self.saved_at > MANIFEST_SAVE_SECS):
+            self.save_manifest(manifest)
+        return changed
+
+    def close(self):
+        if self.dirty and self.manifest is not None:
+            self.save_manifest(self.manifest)
+
+
+class Inotify:
+    """ Minimal ctypes binding for the Linux inotify API. """
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR | IN_DONT_FOLLOW
+    EVENT_HEADER = struct.Struct("iIII")
+
+    _libc = None
+
+    @classmethod
+    def libc(cls):
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            cls._libc = libc
+        return cls._libc
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            return hasattr(cls.libc(), "inotify_init1")
+        except OSError:
+            return False
+
+    def __init__(self):
+        self.fd = self.libc().inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self.libc().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self.libc().inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        # Returns the pending (wd, mask, name) events, without blocking
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                events.append((wd, mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InotifyChangeIndex(ChangeIndex):
+    def __init__(self, root: str, registry: "ChangeIndexRegistry"):
+        super().__init__(root)
+        self.registry = registry
+        self.watches: dict[int, str] = {}
+        # When we saw each changed file
+        self.changed: dict[str, float] = {}
+        # `changed` is complete from this time on. None until we've watched the workspace
+        # (or after we missed events).
+        self.since: Optional[float] = None
+
+    def watch_tree(self, top: str, collect: bool):
+        # Watches `top` and every directory below it. With `collect`, also records their
+        # files as changed (they may have been written before the watch was added).
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                wd = self.registry.inotify.add_watch(dirpath)
+            except OSError as e:
+                logger.warn(f"Can't watch {dirpath}: {e}")
+                self.since = None
+                continue
+            self.watches[wd] = dirpath
+            self.registry.watch_owners[wd] = self
+            try:
+                with os.scandir(dirpath) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif collect and entry.is_file(follow_symlinks=False):
+                            self.changed[entry.path] = time.time()
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    def handle_event(self, wd: int, mask: int, name: str):
+        if mask & Inotify.IN_IGNORED:
+            # The directory was removed
+            self.watches.pop(wd, None)
+            self.registry.watch_owners.pop(wd, None)
+            return
+        dirpath = self.watches.get(wd)
+        if dirpath is None:
+            return
+        path = os.path.join(dirpath, name)
+        if mask & Inotify.IN_ISDIR:
+            if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                self.watch_tree(path, collect=True)
+        else:
+            self.changed[path] = time.time()
+
+    def changed_files(self, from_time: datetime) -> list[str]:
+        self.registry.read_events()
+        now = time.time()
+        if self.since is None:
+            self.since = now
+            if not self.watches:
+                self.watch_tree(self.root, collect=False)
+
+        # Forget changes that no run could still ask about
+        horizon = now - CHANGE_HISTORY_SECS
+        if self.since is not None and self.since < horizon:
+            self.changed = {path: seen for path, seen in self.changed.items() if seen >= horizon}
+            self.since = horizon
+
+        comp_time = from_time.timestamp()
+        if self.since is None or comp_time < self.since:
+            return files_modified_after(self.root, from_time)
+        return sorted(
+            path for path, seen in self.changed.items()
+            if seen > comp_time and os.path.isfile(path) and not os.path.islink(path)
+        )
+
+    def close(self):
+        for wd in self.watches:
+            self.registry.watch_owners.pop(wd, None)
+            try:
+                self.registry.inotify.rm_watch(wd)
+            except OSError:
+                pass
+        self.watches.clear()
+
+
+class ChangeIndexRegistry:
+    """ The change indexes in this process, one per workspace. Inotify indexes share
+        one inotify instance, and the least recently used are closed past
+        MAX_WATCHED_WORKSPACES.
+    """
+    def __init__(self, mode: str = FILE_CHANGES_MODE, max_workspaces: int = MAX_WATCHED_WORKSPACES):
+        self.use_inotify = mode == "inotify" or (mode == "auto" and Inotify.available())
+        self.max_workspaces = max_workspaces
+        self.indexes: OrderedDict[str, ChangeIndex] = OrderedDict()
+        self.inotify: Optional[Inotify] = None
+        self.watch_owners: dict[int, InotifyChangeIndex] = {}
+        self.lock = threading.Lock()
+
+    def get_index(self, root: str, manifest_path: str) -> ChangeIndex:
+        if root in self.indexes:
+            self.indexes.move_to_end(root)
+            return self.indexes[root]
+
+        index = None
+        if self.use_inotify:
+            try:
+                if self.inotify is None:
+                    self.inotify = Inotify()
+                index = InotifyChangeIndex(root, self)
+            except OSError as e:
+                logger.warn(f"inotify unavailable, using file manifests: {e}")
+                self.use_inotify = False
+        if index is None:
+            index = ManifestChangeIndex(root, manifest_path)
+
+        self.indexes[root] = index
+        while len(self.indexes) > self.max_workspaces:
+            _, evicted = self.indexes.popitem(last=False)
+            evicted.close()
+        return index
+
+    def read_events(self):
+        if self.inotify is None:
+            return
+        for wd, mask, name in self.inotify.read_events():
+            if mask & Inotify.IN_Q_OVERFLOW:
+                # We lost events, so runs that started before now have to rescan
+                for index in self.indexes.values():
+                    if isinstance(index, InotifyChangeIndex):
+                        index.since = None
+                continue
+            owner = self.watch_owners.get(wd)
+            if owner is not None:
+                owner.handle_event(wd, mask, name)
+
+    def changed_files(self, root: str, manifest_path: str, from_time: datetime) -> list[str]:
+        with self.lock:
+            return self.get_index(root, manifest_path).changed_files(from_time)
+
+    def close(self):
+        for index in self.indexes.values():
+            index.close()
+        self.indexes.clear()
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+_registry: Optional[ChangeIndexRegistry] = None
+_registry_pid: Optional[int] = None
+
+def get_registry() -> ChangeIndexRegistry:
+    # Worker processes are forked, so each process makes its own registry
+    global _registry, _registry_pid
+    if _registry is None or _registry_pid != os.getpid():
+        _registry = ChangeIndexRegistry()
+        _registry_pid = os.getpid()
+    return _registry
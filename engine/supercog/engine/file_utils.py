@@ -13,6 +13,7 @@ import email
 from email import policy
 from email.parser import BytesParser
 from supercog.engine.email_utils import process_email
+from supercog.engine.filesystem import current_filesystem
 
 def read_eml(file: Union[str, BytesIO], agent_dir: str, run_context) -> Dict[str, Any]:
     """
@@ -27,7 +28,7 @@ def read_eml(file: Union[str, BytesIO], agent_dir: str, run_context) -> Dict[str
         Dict[str, Any]: A dictionary containing the parsed email content and information about saved attachments.
     """
     if isinstance(file, str):
-        with open(file, 'rb') as file_obj:
+        with current_filesystem().open(file, 'rb') as file_obj:
             email_message = email.message_from_binary_file(file_obj)
     elif isinstance(file, BytesIO):
         email_message = email.message_from_binary_file(file)
@@ -47,7 +48,7 @@ def read_pdf(file: Union[str, BytesIO]) -> str:
         str: The extracted text from all pages of the PDF.
     """
     if isinstance(file, str):
-        with open(file, 'rb') as file_obj:
+        with current_filesystem().open(file, 'rb') as file_obj:
             pdf_reader = PyPDF2.PdfReader(file_obj)
             text = ""
             for page in pdf_reader.pages:
@@ -62,6 +63,26 @@ def read_pdf(file: Union[str, BytesIO]) -> str:
     
     return text
 
+def read_pdf_pages(file: str, first_page: int, last_page: int) -> tuple[str, int]:
+    """
+    Extracts text from a range of pages of a PDF file, without reading the other pages.
+
+    Args:
+        file (str): The file path.
+        first_page (int): The first page to read, counting from 1.
+        last_page (int): The last page to read. Past the end of the PDF means to the end.
+
+    Returns:
+        tuple[str, int]: The extracted text of the pages, and the number of pages in the PDF.
+    """
+    with current_filesystem().open(file, 'rb') as file_obj:
+        pdf_reader = PyPDF2.PdfReader(file_obj)
+        page_count = len(pdf_reader.pages)
+        text = ""
+        for index in range(first_page - 1, min(last_page, page_count)):
+            text += pdf_reader.pages[index].extract_text() + "\n"
+    return text, page_count
+
 def is_image_file(file_path: str):
     # Function to check if a file is an image
 
@@ -1,20 +1,22 @@
-import os
 import builtins
+import io
+import os
 import sys
+import threading
+import types
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from datetime import datetime
-from unittest.mock import patch
 
 from supercog.shared.services import config
+from . import file_changes
 
 SYSTEM_ROOT_PATH = config.get_global("SYSTEM_ROOT_PATH", False) or "/var/lib/supercog/data"
 print("using system root: ", SYSTEM_ROOT_PATH)
-orig_open = builtins.open
-orig_os_open = os.open
-orig_listdir = os.listdir
-orig_exists = os.path.exists
-orig_makedirs = os.makedirs
+# Number of resolved paths remembered by each run's filesystem
+AGENT_FS_PATH_CACHE_SIZE = int(config.get_option("AGENT_FS_PATH_CACHE_SIZE", default=1024))
 
 WHITELIST_PATHS = [
     "/usr/lib/os-release",
@@ -43,8 +45,16 @@ if site_packages:
 # their *running user's* directory. They can also see files in "../shared" meaning
 # the shared folder inside the tenant.
 #
-# Security is enforced by patching the system `open` call to enfore the
-# permissions, and to treat the user's directory as the root. 
+# Security is enforced by the AgentFilesystem of the running agent, which tools get
+# from `current_filesystem()` and use for all of their file access. It treats the
+# user's directory as the root for relative paths, and refuses paths that resolve
+# outside of it. The filesystem is held in a context variable, so concurrent runs in
+# one worker (and the threads they start with asyncio.to_thread) each see their own.
+# Outside of a run there is no filesystem: code that needs file access there must ask
+# for it explicitly, with `unrestricted_filesystem()` or a user's `get_agent_filesystem`.
+#
+# Python code written by the agent (the native interpreter) runs with `agent_builtins()`,
+# so its `open`, `io.open`, `os.open`, `os.listdir` and `os.path.exists` are confined too.
 
 def setup_filesystem():
     if not os.path.exists(SYSTEM_ROOT_PATH):
@@ -58,50 +68,145 @@ def setup_filesystem():
             )
     os.chdir(SYSTEM_ROOT_PATH)
 
-def access_allowed(file_path, user_dir):
-    p = Path(file_path)
-    pres = str(p.resolve())
-    if pres.startswith(user_dir) or file_path.startswith("/etc/"):
-        return True
-    for whitep in WHITELIST_PATHS:
-        if pres.startswith(whitep):
+class AgentFilesystem:
+    """ File access confined to one user's directory. Relative paths are relative to
+        that directory. Every path is resolved (following symlinks, so the user's
+        "shared" link reaches the tenant's shared folder) and checked once, then the
+        answer is cached.
+    """
+    def __init__(self, user_dir: str, allowed_dirs: list[str]|None = None, cache_size: int = AGENT_FS_PATH_CACHE_SIZE):
+        self.user_dir = os.path.realpath(user_dir)
+        self.allowed_dirs = [self.user_dir] + [os.path.realpath(d) for d in allowed_dirs or []]
+        self.cache_size = cache_size
+        # path -> resolved path, or None when access is denied
+        self._resolved: OrderedDict[str, str|None] = OrderedDict()
+        # A run's tools may use the filesystem from several threads
+        self._lock = threading.Lock()
+
+    def _check(self, file_path: str) -> str|None:
+        full_path = os.path.realpath(os.path.join(self.user_dir, file_path))
+        if file_path.startswith("/etc/"):
+            return full_path
+        for allowed in self.allowed_dirs:
+            if full_path == allowed or full_path.startswith(allowed + os.sep):
+                return full_path
+        for whitep in WHITELIST_PATHS:
+            if full_path.startswith(whitep):
+                return full_path
+        return None
+
+    def path(self, file_path) -> str:
+        """ Returns the real path of file_path, or raises PermissionError if the agent
+            can't access it. """
+        file_path = os.fsdecode(file_path)
+        with self._lock:
+            try:
+                resolved = self._resolved[file_path]
+                self._resolved.move_to_end(file_path)
+            except KeyError:
+                resolved = self._check(file_path)
+                self._resolved[file_path] = resolved
+                if len(self._resolved) > self.cache_size:
+                    self._resolved.popitem(last=False)
+        if resolved is None:
+            raise PermissionError(f"Access to the file '{file_path}' is denied")
+        return resolved
+
+    def is_allowed(self, file_path) -> bool:
+        try:
+            self.path(file_path)
             return True
-    return False
-
-def get_open_function(user_dir):
-    def restricted_open(file, mode='r', *args, **kwargs):
-        if isinstance(file, bytes):
-            file = file.decode("utf-8")
-        print("Builtins open: ", file)
-        if access_allowed(file, user_dir):
-            return orig_open(file, mode, *args, **kwargs)  # Use the real open function here
-        else:
-            raise PermissionError(f"Access to the file '{file}' is denied")
-    return restricted_open
-
-def get_os_open_function(user_dir):
-    def restricted_os_open(file, flags, mode=0o777, *args, **kwargs):
-        if access_allowed(file, user_dir):
-            return orig_os_open(file, flags, mode, *args, **kwargs)  # Use the real open function here
-        else:
-            raise PermissionError(f"Access to the file '{file}' is denied")
-    return restricted_os_open
-
-def get_listdir_function(user_dir):
-    def internal_listdir(dir):
-        return orig_listdir(os.path.join(user_dir, dir))
-    return internal_listdir
-
-def get_makedirs_function(user_dir):
-    def internal_makedirs(dir):
-        return orig_makedirs(os.path.join(user_dir, dir))
-    return internal_makedirs
-
-
-def get_exists_function(user_dir):
-    def internal_exists(dir):
-        return orig_exists(os.path.join(user_dir, dir))
-    return internal_exists
+        except PermissionError:
+            return False
+
+    def open(self, file, mode='r', *args, **kwargs):
+        return open(self.path(file), mode, *args, **kwargs)
+
+    def os_open(self, file, flags, mode=0o777, *args, **kwargs):
+        return os.open(self.path(file), flags, mode, *args, **kwargs)
+
+    def exists(self, file_path) -> bool:
+        return self.is_allowed(file_path) and os.path.exists(self.path(file_path))
+
+    def isfile(self, file_path) -> bool:
+        return self.is_allowed(file_path) and os.path.isfile(self.path(file_path))
+
+    def getsize(self, file_path) -> int:
+        return os.path.getsize(self.path(file_path))
+
+    def listdir(self, dir=".") -> list[str]:
+        return os.listdir(self.path(dir))
+
+    def makedirs(self, dir, exist_ok: bool = False):
+        os.makedirs(self.path(dir), exist_ok=exist_ok)
+
+    def remove(self, file_path):
+        os.remove(self.path(file_path))
+
+
+class UnrestrictedFilesystem(AgentFilesystem):
+    """ Used (through unrestricted_filesystem) by system code that needs to reach past
+        the user's directory. Nothing is refused. Relative paths are relative to user_dir
+        if given, else to the process working directory. """
+    def __init__(self, user_dir: str|None = None):
+        self.user_dir = user_dir or os.getcwd()
+        self.allowed_dirs = []
+
+    def path(self, file_path) -> str:
+        return os.path.abspath(os.path.join(self.user_dir, os.fsdecode(file_path)))
+
+
+_agent_filesystem: ContextVar[AgentFilesystem|None] = ContextVar("agent_filesystem", default=None)
+
+def current_filesystem() -> AgentFilesystem:
+    """ Returns the filesystem of the running agent. Raises PermissionError outside of a
+        run (or unrestricted_filesystem), so code that loses the run's context can't
+        reach past the sandbox. """
+    fs = _agent_filesystem.get()
+    if fs is None:
+        raise PermissionError("No agent filesystem: file access outside of a run needs unrestricted_filesystem()")
+    return fs
+
+def _confined_module(module: types.ModuleType, **overrides) -> types.ModuleType:
+    confined = types.ModuleType(module.__name__, module.__doc__)
+    confined.__dict__.update(module.__dict__)
+    confined.__dict__.update(overrides)
+    return confined
+
+def agent_builtins() -> dict:
+    """ Returns builtins for running the agent's own Python code, where opening, listing
+        and checking files goes through the running agent's filesystem, also when the
+        code imports os or io. """
+    def agent_open(file, mode='r', *args, **kwargs):
+        if isinstance(file, int):
+            raise PermissionError("Opening file descriptors is not allowed")
+        return current_filesystem().open(file, mode, *args, **kwargs)
+
+    def agent_os_open(file, flags, mode=0o777, *args, **kwargs):
+        return current_filesystem().os_open(file, flags, mode, *args, **kwargs)
+
+    def agent_listdir(path="."):
+        return current_filesystem().listdir(path)
+
+    def agent_exists(path) -> bool:
+        return current_filesystem().exists(path)
+
+    confined_path = _confined_module(os.path, exists=agent_exists)
+    confined_os = _confined_module(os, open=agent_os_open, listdir=agent_listdir, path=confined_path)
+    confined_io = _confined_module(io, open=agent_open)
+
+    def agent_import(name, globals=None, locals=None, fromlist=(), level=0):
+        module = builtins.__import__(name, globals, locals, fromlist, level)
+        if level == 0:
+            if name == "os.path" and fromlist:
+                return confined_path
+            if name == "os" or (name == "os.path" and not fromlist):
+                return confined_os
+            if name == "io":
+                return confined_io
+        return module
+
+    return builtins.__dict__ | {"open": agent_open, "__import__": agent_import}
 
 def get_user_directory(tenant_id, user_id) -> str:
     path = os.path.join(SYSTEM_ROOT_PATH, tenant_id, user_id)
@@ -141,38 +246,48 @@ def get_agent_filesystem(tenant_id, user_id):
     shared_dir = os.path.join(user_dir, "shared")
     if not os.path.exists(shared_dir):
         os.symlink(common_shared, shared_dir)
-       
-    # Change to the user's directory
-    os.chdir(user_dir)
-
-    with patch("builtins.open", get_open_function(user_dir)):
-        with patch.multiple(
-            "os", 
-            open=get_os_open_function(user_dir), listdir=get_listdir_function(user_dir)
-        ):
-            with patch("os.path.exists", get_exists_function(user_dir)):
-                yield
+
+    fs = AgentFilesystem(user_dir, allowed_dirs=[common_shared])
+    token = _agent_filesystem.set(fs)
+    try:
+        yield fs
+    finally:
+        _agent_filesystem.reset(token)
+
+# Held while a run borrows the process working directory
+_working_directory_lock = threading.RLock()
+
+@contextmanager
+def user_working_directory():
+    # Makes the running agent's directory the process working directory for the block,
+    # for code that resolves relative paths itself: the agent's own Python code, and
+    # libraries that don't take a path. The working directory is shared by every run in
+    # the worker, so runs take turns.
+    with _working_directory_lock:
+        previous = os.getcwd()
+        os.chdir(current_filesystem().user_dir)
+        try:
+            yield
+        finally:
+            os.chdir(previous)
 
 @contextmanager
 def unrestricted_filesystem():
-    with patch("builtins.open", orig_open), \
-         patch("os.open", orig_os_open), \
-         patch("os.listdir", orig_listdir), \
-         patch("os.makedirs", orig_makedirs), \
-         patch("os.path.exists", orig_exists):
+    # Lifts the access checks, but relative paths still refer to the running agent's
+    # directory
+    current = _agent_filesystem.get()
+    token = _agent_filesystem.set(UnrestrictedFilesystem(current.user_dir if current else None))
+    try:
         yield
+    finally:
+        _agent_filesystem.reset(token)
         
 def list_modified_files(from_time: datetime, tenant_id, user_id):
+    # Returns the files in the user's directory that changed since from_time, the start of
+    # the run. See file_changes.py
     user_dir = get_user_directory(tenant_id, user_id)
-    recent_files = []
-    comp_time = from_time.timestamp()
-    for dirpath, dirnames, files in os.walk(user_dir):
-        for file in files:
-            file_path = os.path.join(dirpath, file)
-            # Get the last modification time and compare
-            if os.path.getmtime(file_path) > comp_time:
-                recent_files.append(file_path)
-    return recent_files
+    manifest_path = os.path.join(SYSTEM_ROOT_PATH, ".file_manifests", tenant_id, f"{user_id}.json")
+    return file_changes.get_registry().changed_files(user_dir, manifest_path, from_time)
 
 def delete_user_file(tenant_id, user_id, file_name, folder:str="") -> bool:
     user_dir = get_user_directory(tenant_id, user_id)
@@ -0,0 +1,309 @@
+# Enriches a column of values with an LLM (DuckdbTool.llm_enrich_column), without a
+# request per row:
+#
+#   - each distinct value is only enriched once
+#   - values are sent ENRICHMENT_BATCH_SIZE at a time, asking for a JSON object of
+#     answers. A batch whose reply can't be parsed is split in half and sent again, down
+#     to single values, which are asked in the original "{prompt}: {value}" form.
+#   - up to ENRICHMENT_CONCURRENCY requests run at once, started no faster than
+#     ENRICHMENT_REQUESTS_PER_MINUTE, and failed requests are retried with backoff
+#   - answers are cached by (prompt, model, value) in the `llm_enrichment_cache` table of
+#     ENRICHMENT_CACHE_URL, as each batch finishes. Values whose requests failed are
+#     left empty, so running the same enrichment again only sends those.
+#
+# The cache is a SQLKeyedCache (see sql_cache.py). When it grows past
+# ENRICHMENT_CACHE_MAX_ROWS answers the least recently used ones are deleted.
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import pandas as pd
+from sqlalchemy import (
+    Column,
+    Float,
+    MetaData,
+    String,
+    Table,
+    Text,
+    delete,
+    func,
+    select,
+    tuple_,
+)
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+
+from .filesystem import SYSTEM_ROOT_PATH
+from .sql_cache import SQLKeyedCache
+
+ENRICHMENT_CACHE_URL = config.get_option(
+    "ENRICHMENT_CACHE_URL",
+    default=os.environ.get("PGVECTOR_DB_URL") or f"sqlite:///{os.path.join(SYSTEM_ROOT_PATH, '.enrichment_cache.db')}",
+)
+ENRICHMENT_CACHE_MAX_ROWS = int(config.get_option("ENRICHMENT_CACHE_MAX_ROWS", default=1_000_000))
+# How many answers are written between checks of the cache size
+ENRICHMENT_CACHE_EVICT_EVERY = int(config.get_option("ENRICHMENT_CACHE_EVICT_EVERY", default=5000))
+ENRICHMENT_BATCH_SIZE = int(config.get_option("ENRICHMENT_BATCH_SIZE", default=20))
+ENRICHMENT_CONCURRENCY = int(config.get_option("ENRICHMENT_CONCURRENCY", default=8))
+ENRICHMENT_REQUESTS_PER_MINUTE = int(config.get_option("ENRICHMENT_REQUESTS_PER_MINUTE", default=300))
+ENRICHMENT_MAX_RETRIES = int(config.get_option("ENRICHMENT_MAX_RETRIES", default=3))
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+BATCH_INSTRUCTIONS = (
+    "Answer separately for each of the values in this JSON object. Reply with only a JSON "
+    "object with the same keys, where each key's value is your answer (as a string) for "
+    "that key's value."
+)
+
+# A completion function: (messages, model) -> the reply's text
+Complete = Callable[[list[dict], str], Awaitable[str]]
+
+metadata = MetaData()
+
+enrichment_cache_table = Table(
+    "llm_enrichment_cache",
+    metadata,
+    Column("namespace", String, primary_key=True),
+    Column("value_hash", String, primary_key=True),
+    Column("result", Text, nullable=False),
+    Column("last_used", Float, nullable=False, index=True),
+)
+
+
+def enrichment_namespace(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def value_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class EnrichmentCache(SQLKeyedCache):
+    table = enrichment_cache_table
+    key_column = "value_hash"
+    value_column = "result"
+
+    def __init__(
+            self,
+            url: str = ENRICHMENT_CACHE_URL,
+            max_rows: int = ENRICHMENT_CACHE_MAX_ROWS,
+            evict_every: int = ENRICHMENT_CACHE_EVICT_EVERY,
+        ):
+        super().__init__(url, evict_every)
+        self.max_rows = max_rows
+
+    def evict(self) -> int:
+        """ Deletes the least recently used answers past max_rows. Returns the number
+            deleted. """
+        table = enrichment_cache_table
+        with self.engine.begin() as conn:
+            excess = conn.execute(select(func.count()).select_from(table)).scalar() - self.max_rows
+            if excess <= 0:
+                return 0
+            oldest = select(table.c.namespace, table.c.value_hash).order_by(
+                table.c.last_used, table.c.value_hash
+            ).limit(excess)
+            deleted = conn.execute(
+                delete(table).where(tuple_(table.c.namespace, table.c.value_hash).in_(oldest))
+            ).rowcount
+        logger.info(f"Evicted {deleted} answers from the LLM enrichment cache")
+        return deleted
+
+
+class RateLimiter:
+    """ Spaces out the starts of requests to at most `requests_per_minute`. """
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+@dataclass
+class EnrichmentResult:
+    # The answer for each value, or None where the value was null or its request failed
+    results: list[Optional[str]]
+    distinct: int = 0
+    cached: int = 0
+    enriched: int = 0
+    failed: int = 0
+    requests: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "distinct_values": self.distinct,
+            "cached": self.cached,
+            "enriched": self.enriched,
+            "failed": self.failed,
+            "llm_requests": self.requests,
+        }
+
+
+class _BadReply(Exception):
+    pass
+
+
+def openai_complete(api_key: str) -> Complete:
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(api_key=api_key)
+
+    async def complete(messages: list[dict], model: str) -> str:
+        response = await client.chat.completions.create(model=model, messages=messages)
+        if response.choices:
+            return response.choices[0].message.content or ""
+        return "LLM result missing"
+
+    return complete
+
+
+class LLMEnricher:
+    def __init__(
+            self,
+            complete: Complete,
+            cache: Optional[EnrichmentCache] = None,
+            batch_size: int = ENRICHMENT_BATCH_SIZE,
+            concurrency: int = ENRICHMENT_CONCURRENCY,
+            requests_per_minute: int = ENRICHMENT_REQUESTS_PER_MINUTE,
+            max_retries: int = ENRICHMENT_MAX_RETRIES,
+            retry_delay: float = 1.0,
+        ):
+        self.complete = complete
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    async def enrich(self, prompt: str, model: str, values: list) -> EnrichmentResult:
+        """ Returns the LLM's answer to the prompt for each of the values. """
+        texts = [None if _is_null(value) else str(value) for value in values]
+        distinct = list(dict.fromkeys(text for text in texts if text is not None))
+        namespace = enrichment_namespace(prompt, model)
+        hashes = {text: value_hash(text) for text in distinct}
+        answers = await self._cached(namespace, list(hashes.values()))
+        result = EnrichmentResult(results=[], distinct=len(distinct), cached=len(answers))
+
+        missing = [text for text in distinct if hashes[text] not in answers]
+        if missing:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            limiter = RateLimiter(self.requests_per_minute)
+
+            async def run_batch(batch: list[str]):
+                async with semaphore:
+                    batch_answers = await self._enrich_batch(prompt, model, batch, limiter, result)
+                computed = {hashes[text]: answer for text, answer in batch_answers.items()}
+                answers.update(computed)
+                result.enriched += len(computed)
+                # Saved as each batch finishes, so a failed run can be resumed
+                await self._store(namespace, computed)
+
+            await asyncio.gather(*[
+                run_batch(missing[i:i + self.batch_size]) for i in range(0, len(missing), self.batch_size)
+            ])
+            result.failed = len(missing) - sum(1 for text in missing if hashes[text] in answers)
+
+        result.results = [None if text is None else answers.get(hashes[text]) for text in texts]
+        return result
+
+    async def _enrich_batch(
+            self, prompt: str, model: str, batch: list[str], limiter: RateLimiter, result: EnrichmentResult,
+        ) -> dict[str, str]:
+        if len(batch) == 1:
+            messages = _messages(f"{prompt}: {batch[0]}")
+        else:
+            keyed = {str(i + 1): text for i, text in enumerate(batch)}
+            messages = _messages(f"{prompt}\n\n{BATCH_INSTRUCTIONS}\n\n{json.dumps(keyed, ensure_ascii=False)}")
+
+        for attempt in range(self.max_retries + 1):
+            await limiter.wait()
+            result.requests += 1
+            try:
+                reply = await self.complete(messages, model)
+                if len(batch) == 1:
+                    return {batch[0]: reply}
+                return _parse_batch_reply(reply, keyed)
+            except _BadReply as e:
+                # Often a batch too big for the model to answer in one go: try the halves
+                logger.warn(f"Unusable reply for a batch of {len(batch)} values, splitting it: {e}")
+                # One after the other, as this batch holds one of the concurrent slots
+                half = len(batch) // 2
+                first = await self._enrich_batch(prompt, model, batch[:half], limiter, result)
+                return first | await self._enrich_batch(prompt, model, batch[half:], limiter, result)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.warn(f"LLM enrichment of {len(batch)} values failed: {e}")
+                    result.errors.append(str(e))
+                    return {}
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        return {}
+
+    async def _cached(self, namespace: str, hashes: list[str]) -> dict[str, str]:
+        if self.cache is None or not hashes:
+            return {}
+        # The cache only saves work, so it being unavailable mustn't stop the enrichment
+        try:
+            return await asyncio.to_thread(self.cache.get_many, namespace, hashes)
+        except Exception as e:
+            logger.warn(f"LLM enrichment cache lookup failed: {e}")
+            return {}
+
+    async def _store(self, namespace: str, results: dict[str, str]):
+        if self.cache is None or not results:
+            return
+        try:
+            await asyncio.to_thread(self.cache.put_many, namespace, results)
+        except Exception as e:
+            logger.warn(f"LLM enrichment cache write failed: {e}")
+
+
+def _is_null(value) -> bool:
+    # None, NaN, NaT and pd.NA
+    return pd.api.types.is_scalar(value) and bool(pd.isna(value))
+
+
+def _messages(content: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def _parse_batch_reply(reply: str, keyed: dict[str, str]) -> dict[str, str]:
+    # Models like to wrap JSON in a code fence
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    try:
+        parsed = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError as e:
+        raise _BadReply(f"invalid JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise _BadReply("not a JSON object")
+    missing = [key for key in keyed if key not in parsed]
+    if missing:
+        raise _BadReply(f"{len(missing)} of the values weren't answered")
+    answers = {}
+    for key, text in keyed.items():
+        answer = parsed[key]
+        answers[text] = answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+    return answers
+
+
+enrichment_cache = EnrichmentCache()
@@ -24,7 +24,7 @@ import inspect
 from typing import Callable, Dict, Any, Optional
 from pprint import pprint
 import traceback
-from fastapi import FastAPI, Depends, HTTPException, Path, status, Request, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Path, status, Request, UploadFile, File, BackgroundTasks, Query
 from flask import redirect
 from pydantic import BaseModel
 from typing import List, Optional
@@ -33,11 +33,11 @@ from uuid import UUID, uuid4
 from sqlalchemy.sql import func
 from datetime import datetime
 import mimetypes
-from sqlalchemy import text
+from sqlalchemy import text, tuple_
 
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 import pandas as pd
 
 # Allow us to mount a Flask app for FlaskDance oauth
@@ -46,7 +46,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import rollbar
 from rollbar.contrib.fastapi import add_to as rollbar_add_to
 
-from supercog.shared.services import config, serve, db_connect
+from supercog.shared.services import config, serve, db_connect, db_pool_stats
 from supercog.shared.models import (
     RunCreate, 
     RunUpdate,
@@ -74,14 +74,38 @@ from supercog.shared.logging import logger
 
 from .oauth_flask import oauth_app
 import supercog.engine.oauth_flask
-from .file_utils import read_pdf, read_eml, is_audio_file
+from .file_utils import read_pdf, read_pdf_pages, read_eml, is_audio_file
+from .datum_preview import (
+    DATUM_PREVIEW_ROWS,
+    DATUM_PREVIEW_STREAM_ROWS,
+    DatumSource,
+    PreviewError,
+    RowQuery,
+    datum_previews,
+    file_format,
+    parse_filter,
+    parse_page_range,
+)
 
-from .db import get_session, get_noexpiry_session, Agent, Run, RunLog, lifespan_manager, DocSourceConfig
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .db import (
+    get_session,
+    get_noexpiry_session,
+    get_async_session,
+    load_first_run_logs,
+    Agent,
+    Run,
+    RunLog,
+    lifespan_manager,
+    DocSourceConfig,
+)
 import supercog.engine.db as db
 from .enginemgr import EngineManager
+from . import agent_cache
 from .jwt_auth import requires_jwt, requires_jwt_or_triggersvc, User
 from .agent_dispatcher import AgentDispatcherClass, AgentTask
 from .run_context import RunContext
+from .asset_store import asset_store
 from .rag_utils import get_user_personal_index, get_ragie_partition
 
 # This import is really slow. Probably langchain?
@@ -91,6 +115,7 @@ from .filesystem import (
     get_user_directory,
     delete_user_file,
     get_agent_filesystem,
+    unrestricted_filesystem,
 )
 from .tool_factory import TOOL_REGISTRY
 
@@ -99,7 +124,7 @@ from supercog.engine.tools.google_drive import GoogleDriveDocSource
 from supercog.engine.doc_source_factory import DocSourceFactory
 
 # Need this import to register chat_logger with the FastAPI app
-from .chat_logger import activate_chatlogger
+from .chat_logger import activate_chatlogger, chat_logger
 activate_chatlogger()
 
 from .agent_learning import AgentLearning
@@ -221,6 +246,11 @@ async def admin_list_runs(
     return {
         "agents": agents, 
         "runs": run_res, 
+        "engine_cache": enginemgr.RUNNING_ENGINES.stats(),
+        "agent_cache": agent_cache.stats(),
+        "chat_logger": chat_logger.stats(),
+        "workers": await dispatcher.worker_stats(),
+        "db_pools": db_pool_stats(),
         "info": {
             "git_sha": sha, 
             "start_time": STARTUP_TIME, 
@@ -241,7 +271,7 @@ async def get_models():
 
 @app.post("/agents", response_model=AgentBase)
 async def save_agent(*, 
-                     session: Session = Depends(get_session), 
+                     session: AsyncSession = Depends(get_async_session), 
                      user: User = Depends(requires_jwt_or_triggersvc),
                      run_id: Optional[str] = None,
                      agent_base: AgentBase):
@@ -254,14 +284,14 @@ async def save_agent(*,
     print(vals)
     agent_db = db.Agent.model_validate(vals)
     logger.info("Received POST agent: ", agent_db)
-    existing = session.get(db.Agent, agent_db.id)
+    existing = await session.get(db.Agent, agent_db.id)
     if existing:
         for key, value in agent_db.model_dump().items():
             setattr(existing, key, value)
         agent_db = existing
     session.add(agent_db)
-    session.commit()
-    session.refresh(agent_db)
+    await session.commit()
+    await session.refresh(agent_db)
     await pubsub.publish(
         AGENT_EVENTS_CHANNEL, 
         AgentSavedEvent(agent_id=agent_db.id, user_id=agent_db.user_id, run_id=run_id),
@@ -274,23 +304,23 @@ async def save_agent(*,
 # to send the definition for the agent before you run it.
 @app.post("/runs", response_model=Run)
 async def create_run(*, 
-                session: Session = Depends(get_session), 
+                session: AsyncSession = Depends(get_async_session), 
                 user: User = Depends(requires_jwt_or_triggersvc),
                 run: RunCreate,
                 request: Request):
     
     # First check if there is an existing run based on the conversation_id
     if run.conversation_id:
-        existing_run = session.exec(
+        existing_run = (await session.exec(
             select(Run).where(Run.conversation_id == run.conversation_id)
-        ).one_or_none()
+        )).one_or_none()
 
         if existing_run:
-            return existing_run
+            return (await load_first_run_logs(session, [existing_run]))[0]
 
     run_db = Run.model_validate(run)
 
-    agent = session.get(db.Agent, run_db.agent_id)
+    agent = await session.get(db.Agent, run_db.agent_id)
     if agent is None:
         raise HTTPException(status_code=404, detail=f"Agent {run_db.agent_id} not found")
 
@@ -298,8 +328,9 @@ async def create_run(*,
     run_db.tools = [t.model_dump() for t in agent.tool_list]
 
     session.add(run_db)
-    session.commit()
-    session.refresh(run_db)
+    await session.commit()
+    await session.refresh(run_db)
+    await load_first_run_logs(session, [run_db])
 
     job = AgentTask(
         action=AgentTask.ACTION_CREATE_RUN,
@@ -315,15 +346,16 @@ async def create_run(*,
 
 @app.post("/runs/{run_id}/input")
 async def run_input(*, 
-                    session: Session = Depends(get_noexpiry_session), 
+                    session: AsyncSession = Depends(get_async_session), 
                     user: User = Depends(requires_jwt_or_triggersvc),
                     run_id: UUID, 
                     attached_file: Optional[str|None] = None,
                     run_input: RunInput,
                     request: Request):
-    run_db = session.get(Run, run_id)
+    run_db = await session.get(Run, run_id)
     if run_db is None:
         raise HTTPException(status_code=404, detail="Run not found")
+    await load_first_run_logs(session, [run_db])
 
     job = AgentTask(
         action=AgentTask.ACTION_PROMPT,
@@ -340,7 +372,7 @@ async def run_input(*,
 
 @app.get("/tenant/{tenant_id}/runs", response_model=List[Run])
 async def list_runs(*, 
-                    session: Session = Depends(get_session), 
+                    session: AsyncSession = Depends(get_async_session), 
                     user: User = Depends(requires_jwt),
                     tenant_id: str):
     today_date = datetime.now().date()
@@ -349,17 +381,18 @@ async def list_runs(*,
         Run.tenant_id == tenant_id,
         func.date(Run.created_at) == today_date
     )
-    return session.exec(query).all()
+    runs = (await session.exec(query)).all()
+    return await load_first_run_logs(session, runs)
 
 @app.get("/tenant/{tenant_id}/agents/{agent_id}/runs", response_model=List[Run])
 async def list_agent_runs(*, 
-        session: Session = Depends(get_session), 
+        session: AsyncSession = Depends(get_async_session), 
         user: User = Depends(requires_jwt),
         tenant_id: str,
         agent_id: str,
         user_id: str):
 
-    agent = session.get(Agent, agent_id)
+    agent = await session.get(Agent, agent_id)
     if agent is None:
         raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
     
@@ -368,7 +401,8 @@ async def list_agent_runs(*,
         Run.agent_id == agent_id,
         or_(Run.scope == "shared", Run.user_id == user_id)
     ).limit(100).order_by(Run.created_at.desc())
-    return session.exec(query).all()
+    runs = (await session.exec(query)).all()
+    return await load_first_run_logs(session, runs)
 
 # Agent usage stats
 @app.get("/tenant/{tenant_id}/daily_stats")
@@ -665,7 +699,8 @@ def get_file_info_supercogFS(file_path: str) -> dict:
 def handle_pdf_file(file_path: str) -> dict:
     """Handle PDF file and return its content."""
     try:
-        pdf_text = read_pdf(file_path)
+        with unrestricted_filesystem():
+            pdf_text = read_pdf(file_path)
         return {"type": "pdf", "content": pdf_text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading PDF: {str(e)}")
@@ -673,7 +708,8 @@ def handle_pdf_file(file_path: str) -> dict:
 def handle_email_file(file_path: str) -> dict:
     """Handle email file and return its content."""
     try:
-        email_data = read_eml(file_path, "", None)  # Adjust parameters as needed
+        with unrestricted_filesystem():
+            email_data = read_eml(file_path, "", None)  # Adjust parameters as needed
         return {"type": "email", "content": email_data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading email: {str(e)}")
@@ -899,6 +935,58 @@ def handle_other_files(file_path: str, raw_data: str, file_type: str) -> dict:
 
 
 
+def find_datum_run(session: Session, tenant_id: str, agent_id: str, run_id: str, user_id: str) -> Optional[Run]:
+    if run_id == "0" or agent_id == "0":
+        logger.debug("Skipping run query, using rundb=None")
+        return None
+    logger.debug("Querying for run in database")
+    rundb = session.exec(
+        select(Run).where(
+            Run.tenant_id == tenant_id,
+            Run.agent_id == agent_id,
+            Run.user_id == user_id,
+            Run.id == run_id,
+        )
+    ).first()
+    if rundb is None:
+        logger.warn(f"Run not found for run_id={run_id}")
+        raise HTTPException(status_code=404, detail="Run not found")
+    return rundb
+
+async def find_datum_rows(session: Session, rundb: Optional[Run], category: str, name: str, file_path: str) -> Optional[DatumSource]:
+    # The rows of a table, dataframe or tabular file, or None if the datum isn't one
+    if category == "tables":
+        logger.debug("Querying table")
+        table_df = await enginemgr.query_table(session, rundb, name)
+        if table_df is None:
+            raise HTTPException(status_code=404, detail=f"Table {name} not found")
+        return DatumSource.for_frame(table_df)
+    elif category == "dataframes":
+        logger.debug("Retrieving dataframe")
+        frame, version = await enginemgr.get_dataframe_source(rundb, name) if rundb else (None, None)
+        if frame is None:
+            logger.warn(f"Dataframe {name} not found")
+            raise HTTPException(status_code=404, detail=f"Dataframe {name} not found")
+        return DatumSource.for_frame(frame, version)
+    elif category == "files" and os.path.isfile(file_path) and file_format(file_path) in ("csv", "excel", "parquet"):
+        return DatumSource.for_file(file_path)
+    return None
+
+async def preview_datum_rows(owner: str, file_path: str, source: DatumSource, query: RowQuery, stream: bool):
+    if stream or query.limit > DATUM_PREVIEW_STREAM_ROWS:
+        # Large slices are sent as CSV while they are read, so a bad query has to be
+        # reported before the response starts
+        await asyncio.to_thread(datum_previews.validate, owner, source, query)
+        return StreamingResponse(datum_previews.iter_csv(source, query), media_type="text/csv")
+    page = await asyncio.to_thread(datum_previews.rows, owner, source, query)
+    result = handle_other_files(file_path, page.rows.to_csv(index=False), "csv") | {
+        "columns": page.columns,
+        "offset": page.offset,
+        "limit": query.limit,
+        "row_count": page.total_rows,
+    }
+    return JSONResponse(content={"type": "csv", "content": result})
+
 @app.get("/tenant/{tenant_id}/agents/{agent_id}/run/{run_id}/getdatum")
 async def get_single_datum(*, 
         session: Session = Depends(get_session), 
@@ -908,48 +996,42 @@ async def get_single_datum(*,
         run_id: str,
         user_id: str,
         category: str,
-        name: str):
+        name: str,
+        offset: int = 0,
+        limit: int = DATUM_PREVIEW_ROWS,
+        columns: Optional[str] = None,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        filters: List[str] = Query(default=[], alias="filter"),
+        pages: Optional[str] = None,
+        stream: bool = False):
+    """ Returns a preview of a run's table, dataframe or file. For tabular data: `limit`
+        rows from `offset`, of the comma separated `columns`, sorted by the `sort` column
+        and filtered by any `filter`s ("column:op:value"). Slices bigger than
+        DATUM_PREVIEW_STREAM_ROWS, or any with `stream`, are streamed as CSV. For PDFs:
+        the text of `pages` ("3" or "3-7"). """
     logger.info(f"get_single_datum called with tenant_id={tenant_id}, \
                 agent_id={agent_id}, run_id={run_id}, user_id={user_id}, \
                 category={category}, name={name}")
     try:
-        if run_id != "0" and agent_id != "0":
-            logger.debug("Querying for run in database")
-            rundb = session.exec(
-                select(Run).where(
-                    Run.tenant_id == tenant_id,
-                    Run.agent_id == agent_id,
-                    Run.user_id == user_id,
-                    Run.id == run_id,
-                )
-            ).first()
-            if rundb is None:
-                logger.warn(f"Run not found for run_id={run_id}")
-                raise HTTPException(status_code=404, detail="Run not found")
-        else:
-            logger.debug("Skipping run query, using rundb=None")
-            rundb = None
+        rundb = find_datum_run(session, tenant_id, agent_id, run_id, user_id)
 
         logger.debug(f"Processing category: {category}")
         file_path = os.path.join(get_user_directory(tenant_id, user_id), name)
-        
-        if category == "tables":
-            logger.debug("Querying table")
-            table_df = await enginemgr.query_table(session, rundb, name)
-            result = handle_other_files(file_path, table_df.to_csv(), "csv")
-            return JSONResponse(content={"type": "csv", "content": result})
-
-        elif category == "dataframes":
-            logger.debug("Retrieving dataframe")
-            df = await enginemgr.get_dataframe(rundb, name)
-            if df is not None:
-                result = handle_other_files(file_path, df.to_csv(), "csv")
-                return JSONResponse(content={"type": "csv", "content": result})
-            else:
-                logger.warn(f"Dataframe {name} not found")
-                raise HTTPException(status_code=404, detail=f"Dataframe {name} not found")
 
-        elif category == "files":
+        source = await find_datum_rows(session, rundb, category, name, file_path)
+        if source is not None:
+            query = RowQuery(
+                offset=offset,
+                limit=limit,
+                columns=[column.strip() for column in columns.split(",")] if columns else None,
+                sort=sort,
+                descending=descending,
+                filters=[parse_filter(spec) for spec in filters],
+            )
+            return await preview_datum_rows(user_id, file_path, source, query, stream)
+
+        if category == "files":
 
             logger.debug(f"File path: {file_path}")
             if os.path.exists(file_path):
@@ -967,12 +1049,20 @@ async def get_single_datum(*,
                         media_content = handle_media_file(tenant_id, user_id, file_path, name)
                         return JSONResponse(content={"type": media_content["type"], "content": media_content})
                     elif mime_type == 'application/pdf':
-                        raw_data = read_pdf(file_path)
-                        result = handle_other_files(file_path, raw_data, "pdf")
+                        first_page, last_page = parse_page_range(pages)
+                        with get_agent_filesystem(tenant_id, user_id):
+                            raw_data, page_count = await asyncio.to_thread(read_pdf_pages, file_path, first_page, last_page)
+                        result = handle_other_files(file_path, raw_data, "pdf") | {
+                            "page_count": page_count,
+                            "first_page": first_page,
+                            "last_page": min(last_page, page_count),
+                        }
                         return JSONResponse(content={"type": "pdf", "content": result})
 
                     elif mime_type == 'message/rfc822':
-                        raw_data = read_eml(file_path, "", None)
+                        # Attachments are saved in the user's directory
+                        with get_agent_filesystem(tenant_id, user_id):
+                            raw_data = read_eml(file_path, "", None)
                         result = handle_other_files(file_path, json.dumps(raw_data), "email")
                         return JSONResponse(content={"type": "email", "content": result})
                     elif mime_type == "application/json":
@@ -1004,18 +1094,6 @@ async def get_single_datum(*,
                         result = handle_other_files(file_path, raw_data, "text")
                         return JSONResponse(content={"type": "text", "content": result})
 
-                    elif mime_type == "text/csv":
-                        df = pd.read_csv(file_path)
-                        result = handle_other_files(file_path, df.to_csv(), "csv")
-                        return JSONResponse(content={"type": "csv", "content": result})
-                    elif mime_type in ["application/vnd.ms-excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"]:
-                        df = pd.read_excel(file_path)
-                        result = handle_other_files(file_path, df.to_csv(), "csv")
-                        return JSONResponse(content={"type": "csv", "content": result})
-                    elif mime_type == "application/x-parquet":
-                        df = pd.read_parquet(file_path)
-                        result = handle_other_files(file_path, df.to_csv(), "csv")
-                        return JSONResponse(content={"type": "csv", "content": result})
 
                 # If we reach here, it's an unknown type
                 with open(file_path, 'rb') as file:
@@ -1032,12 +1110,37 @@ async def get_single_datum(*,
     except HTTPException as http_exc:
         # Re-raise HTTP exceptions (like 404) to be handled by FastAPI
         raise http_exc
+    except PreviewError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in get_single_datum: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.get("/tenant/{tenant_id}/agents/{agent_id}/run/{run_id}/getdatum/summary")
+async def get_datum_summary(*,
+        session: Session = Depends(get_session),
+        user: User = Depends(requires_jwt),
+        tenant_id: str,
+        agent_id: str,
+        run_id: str,
+        user_id: str,
+        category: str,
+        name: str):
+    """ Returns the columns (with types and stats) and row count of a run's table,
+        dataframe or tabular file. """
+    rundb = find_datum_run(session, tenant_id, agent_id, run_id, user_id)
+    file_path = os.path.join(get_user_directory(tenant_id, user_id), name)
+    source = await find_datum_rows(session, rundb, category, name, file_path)
+    if source is None:
+        raise HTTPException(status_code=404, detail=f"No rows to summarize in {name}")
+    try:
+        summary = await asyncio.to_thread(datum_previews.summary, user_id, source)
+    except PreviewError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=summary)
+
 @app.delete("/tenant/{tenant_id}/agents/{agent_id}/run/{run_id}/getdatum")
 async def delete_single_datum(*, 
         session: Session = Depends(get_session), 
@@ -1067,46 +1170,119 @@ async def delete_single_datum(*,
     else:
         print("Unknown category: ", category)
 
-# Assets are generated as the agent is running, and they are cached into Redis.
+def parse_byte_range(range_header: str, size: int) -> tuple[int, int]:
+    # Returns [start, end) for a single "bytes=" range, raising 416 if it can't be served
+    try:
+        unit, spec = range_header.split("=", 1)
+        first, last = spec.strip().split("-", 1)
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError(range_header)
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Invalid range")
+    if start >= end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+# Assets are generated as the agent is running. Their content is kept in the asset
+# store, with a descriptor in Redis. Supports single byte ranges.
 @app.get("/asset/{tenant_id}/{user_id}/{asset_id}")
 async def get_asset(*, 
-        session: Session = Depends(get_session), 
         user: User = Depends(requires_jwt),
+        request: Request,
         tenant_id: str,
         user_id: str,
         asset_id: str):
-    content, content_type = await RunContext.get_asset(tenant_id, user_id, asset_id)
+    descriptor = await asset_store.get_descriptor(f"{tenant_id}/{user_id}/{asset_id}")
+    if descriptor is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+
+    size = descriptor["size"]
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{descriptor["sha256"]}"'}
+    range_header = request.headers.get("range")
+    if range_header:
+        start, end = parse_byte_range(range_header, size)
+        content = await asset_store.read(descriptor, start, end)
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        status_code = 206
+    else:
+        content = await asset_store.read(descriptor)
+        status_code = 200
     if content is None:
         raise HTTPException(status_code=404, detail="Asset not found")
-    return Response(content=content, media_type=content_type)
+    return Response(content=content, media_type=descriptor["content_type"], headers=headers, status_code=status_code)
+
+MAX_RUN_LOGS_PAGE = 5000
 
 @app.get("/runs/{run_id}/run_logs", response_model=List[RunLogBase])
 async def list_run_logs(*,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
         user: User = Depends(requires_jwt),
         run_id: str,
-        user_id: Optional[str] = None):
-    
-    query = get_run_logs(run_id, user_id)
-    return session.exec(query).all()
+        user_id: Optional[str] = None,
+        response: Response,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = Query(default=None, ge=1, le=MAX_RUN_LOGS_PAGE),
+        types: Optional[List[str]] = Query(default=None)):
+    """ Returns the logs for a run, oldest first. Pages are selected by cursor:
+        `after` returns logs following that cursor (use it to page forwards, or to
+        incrementally fetch new logs), `before` returns the `limit` logs preceding it
+        (use it to page backwards from the end). `types` filters by event type.
+
+        Paging forwards follows the order logs were stored in (their id), so a log
+        stored late with an older timestamp still comes after the cursor. Pages
+        before a cursor are in (created_at, id) order.
+
+        The X-Next-Cursor header is the cursor of the last log returned (or the
+        `after` cursor if nothing was), and X-Prev-Cursor the cursor of the first.
+    """
+    try:
+        after_key = decode_run_log_cursor(after) if after else None
+        before_key = decode_run_log_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run logs cursor")
+
+    query = get_run_logs(run_id, user_id, after=after_key, before=before_key, types=types)
+    if before_key:
+        # Take the rows nearest the cursor, then return them in time order
+        query = query.order_by(None).order_by(RunLog.created_at.desc(), RunLog.id.desc())
+    if limit:
+        query = query.limit(limit)
+    logs = (await session.exec(query)).all()
+    if before_key:
+        logs = list(reversed(logs))
+
+    if logs:
+        response.headers["X-Next-Cursor"] = encode_run_log_cursor(logs[-1])
+        response.headers["X-Prev-Cursor"] = encode_run_log_cursor(logs[0])
+    elif after:
+        response.headers["X-Next-Cursor"] = after
+    return logs
 
 @app.delete("/runs/{run_id}/run_logs")
 async def delete_run_logs(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user: User = Depends(requires_jwt),
     run_id: str,
     user_id: Optional[str] = None
 ):
-    run = session.exec(select(Run).where(Run.id == run_id)).first()
+    run = (await session.exec(select(Run).where(Run.id == run_id))).first()
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
     
     query = get_run_logs(run_id, user_id)
-    logs = session.exec(query).all()
+    logs = (await session.exec(query)).all()
     
-    [session.delete(log) for log in logs] if logs else None
-    session.commit()
+    for log in logs:
+        await session.delete(log)
+    await session.commit()
 
 @app.get("/runs/{run_id}/reflect", response_model=ReflectionResponse)
 async def reflect(*,
@@ -1128,18 +1304,36 @@ async def reflect(*,
 @app.get("/runs/{run_id}", response_model=Run)
 async def get_run(
     *, 
-    session: Session = Depends(get_session), 
+    session: AsyncSession = Depends(get_async_session), 
     user: User = Depends(requires_jwt),
     run_id: UUID
 ):
     print("JWT user: ", user)
-    run = session.exec(select(Run).where(Run.id == run_id)).first()
+    run = (await session.exec(select(Run).where(Run.id == run_id))).first()
     if run is None:
         raise HTTPException(status_code=404, detail="Run not found")
     else:
-        return run
+        return (await load_first_run_logs(session, [run]))[0]
     
-def get_run_logs(run_id: str, user_id: Optional[str] = None):
+def encode_run_log_cursor(log: RunLog) -> str:
+    # Opaque keyset cursor on (created_at, id)
+    key = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_run_log_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(log_id)
+    except Exception as e:
+        raise ValueError(f"Bad cursor: {cursor}") from e
+
+def get_run_logs(
+        run_id: str, 
+        user_id: Optional[str] = None,
+        after: Optional[tuple[datetime, int]] = None,
+        before: Optional[tuple[datetime, int]] = None,
+        types: Optional[list[str]] = None,
+    ):
     query = select(RunLog)
     if user_id:
         query = query.where(
@@ -1154,27 +1348,41 @@ def get_run_logs(run_id: str, user_id: Optional[str] = None):
             RunLog.run_id == run_id,
             RunLog.scope == "shared"
         )
-    query = query.order_by(RunLog.created_at.asc())
+    if after:
+        # By id alone: logs are written behind, from several workers, so a log can be
+        # stored after the client polled with a created_at older than its cursor
+        query = query.where(RunLog.id > after[1])
+    if before:
+        query = query.where(tuple_(RunLog.created_at, RunLog.id) < tuple_(*before))
+    if types:
+        query = query.where(RunLog.type.in_(types))
+    if before:
+        # Order by id as well so the order (and our cursors) are stable for equal timestamps
+        query = query.order_by(RunLog.created_at.asc(), RunLog.id.asc())
+    else:
+        # In the order they were stored, which `after` cursors follow
+        query = query.order_by(RunLog.id.asc())
     return query
 
 @app.patch("/runs/{run_id}", response_model=Run)
 async def update_run(*, 
-    session: Session = Depends(get_session), 
+    session: AsyncSession = Depends(get_async_session), 
     user: User = Depends(requires_jwt),
     run_id: UUID, 
     run_update: RunUpdate,
     request: Request,
     ):
     logger.info("Patching Run: ", await request.json())
-    run = session.get(Run, run_id)
+    run = await session.get(Run, run_id)
     if run is None:
         raise HTTPException(status_code=404, detail="Run not found")
     run_data = run_update.model_dump(exclude_unset=True)
     for key, value in run_data.items():
         setattr(run, key, value)
     session.add(run)
-    session.commit()
-    session.refresh(run)
+    await session.commit()
+    await session.refresh(run)
+    await load_first_run_logs(session, [run])
 
     await pubsub.publish(
         AGENT_EVENTS_CHANNEL, 
@@ -1203,21 +1411,21 @@ async def cancel_run(
 @app.delete("/runs/{run_id}")
 async def delete_run(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user: User = Depends(requires_jwt),
     run_id: UUID
 ):
-    run = session.exec(select(Run).where(Run.id == run_id)).first() 
+    run = (await session.exec(select(Run).where(Run.id == run_id))).first() 
     if run:
-        session.delete(run)
-        session.commit()
+        await session.delete(run)
+        await session.commit()
     else:
         raise HTTPException(status_code=404, detail="Run not found")
 
 
 @app.post("/tenant/{tenant_id}/credentials")
 async def set_cred(*,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
         user: User = Depends(requires_jwt),
         cred_input: CredentialBase,
         ) -> db.Credential:
@@ -1228,14 +1436,14 @@ async def set_cred(*,
             cred = db.DocSource.model_validate(cred_input)
 
     session.add(cred) #need the Cred ID in order to store the secrets
-    session.commit()
-    session.refresh(cred)
+    await session.commit()
+    await session.refresh(cred)
 
     # Now redact the secrets and send them to the secrets store
-    cred.stuff_secrets(cred_input.secrets_json)
+    await asyncio.to_thread(cred.stuff_secrets, cred_input.secrets_json)
     session.add(cred)
-    session.commit()
-    session.refresh(cred)
+    await session.commit()
+    await session.refresh(cred)
 
     # Return new Credential with secrets redacted
     return cred
@@ -1291,7 +1499,7 @@ async def test_cred(*,
 
 @app.get("/tenant/{tenant_id}/credentials")
 async def list_creds(*,
-          session: Session = Depends(get_session),
+          session: AsyncSession = Depends(get_async_session),
           user: User = Depends(requires_jwt),
           tenant_id: str,
           user_id: Optional[str] = None,
@@ -1306,11 +1514,11 @@ async def list_creds(*,
             db.Credential.tenant_id == tenant_id,
             db.Credential.scope == 'shared')
 
-    return [r.model_dump() for r in session.exec(query).all()]
+    return [r.model_dump() for r in (await session.exec(query)).all()]
 
 @app.get("/tenant/{tenant_id}/credentials/{credential_id}")
 async def get_cred(*,
-          session: Session = Depends(get_session),
+          session: AsyncSession = Depends(get_async_session),
           user: User = Depends(requires_jwt),
           tenant_id: str,
           user_id: str,
@@ -1320,7 +1528,7 @@ async def get_cred(*,
         db.Credential.tenant_id == tenant_id,
         db.Credential.user_id == user_id,
         db.Credential.id == credential_id)
-    cred = session.exec(query).first()
+    cred = (await session.exec(query)).first()
     if cred is not None:
         return cred
     else:
@@ -1328,12 +1536,12 @@ async def get_cred(*,
 
 @app.patch("/tenant/{tenant_id}/credentials/{credential_id}")
 async def update_cred(*,
-          session: Session = Depends(get_session),
+          session: AsyncSession = Depends(get_async_session),
           user: User = Depends(requires_jwt),
           credential_id: str,
           cred_input: CredentialBase
           ) -> db.Credential:
-    cred: db.Credential = session.get(db.Credential, credential_id)
+    cred: db.Credential = await session.get(db.Credential, credential_id)
 
     if cred:
         for k, v in cred_input.model_dump().items():
@@ -1345,20 +1553,20 @@ async def update_cred(*,
         new_secrets = json.loads(cred_input.secrets_json or '{}')
 
         if new_secrets:
-            secrets = cred.retrieve_secrets()
+            secrets = await asyncio.to_thread(cred.retrieve_secrets)
             secrets.update(new_secrets)
-            cred.stuff_secrets(json.dumps(secrets))
+            await asyncio.to_thread(cred.stuff_secrets, json.dumps(secrets))
 
         session.add(cred) #need the Cred ID in order to store the secrets
-        session.commit()
-        session.refresh(cred)
+        await session.commit()
+        await session.refresh(cred)
 
         # Return new Credential with secrets redacted
         return cred
 
 @app.delete("/tenant/{tenant_id}/credentials/{credential_id}")
 async def delete_cred(*,
-          session: Session = Depends(get_session),
+          session: AsyncSession = Depends(get_async_session),
           user: User = Depends(requires_jwt),
           tenant_id: str,
           credential_id: str,
@@ -1368,11 +1576,11 @@ async def delete_cred(*,
         db.Credential.tenant_id == tenant_id,
         db.Credential.user_id == user_id,
         db.Credential.id == credential_id)
-    cred = session.exec(query).first()
+    cred = (await session.exec(query)).first()
     if cred:
-        cred.delete_secrets()
-        session.delete(cred)
-        session.commit()
+        await asyncio.to_thread(cred.delete_secrets)
+        await session.delete(cred)
+        await session.commit()
     else:
         raise HTTPException(status_code=404, detail=f"Credential {credential_id} not found")
 
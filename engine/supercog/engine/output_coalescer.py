@@ -0,0 +1,137 @@
+# Coalesces the streamed LLM output of an agent before we publish it.
+#
+# ChatEngine.respond yields one AgentOutputEvent per LLM token. Publishing each one
+# means a RunLog, a JSON encode and a Redis publish per token, and a state update per
+# token in the dashboard. Instead we buffer output tokens and flush them as one event when:
+#
+#   - the buffer has been open for `flush_ms` (the time window), or
+#   - the buffered text reaches `max_bytes` (the byte budget), or
+#   - any non-output event arrives (tool call, model end, ...), so ordering is preserved.
+#
+# The window is measured from the last flush, so it adapts to the token rate: a slow
+# stream (or the first token of a response) is flushed immediately, and only fast
+# streams get batched. If the LLM stalls mid-response we flush when the window expires
+# rather than waiting for the next token.
+#
+# Clients can tune the window per request with the `stream_flush_ms` and `stream_max_bytes`
+# query params (eg. the Slack bot only needs the final text, so it uses a wide window).
+
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+from supercog.shared.apubsub import AgentEvent, AgentOutputEvent
+from supercog.shared.services import config
+
+OUTPUT_FLUSH_MS = int(config.get_option("AGENT_OUTPUT_FLUSH_MS", default=50))
+OUTPUT_MAX_BYTES = int(config.get_option("AGENT_OUTPUT_MAX_BYTES", default=1024))
+
+# Bounds for client supplied settings
+MIN_FLUSH_MS, MAX_FLUSH_MS = 0, 2000
+MIN_MAX_BYTES, MAX_MAX_BYTES = 1, 64 * 1024
+
+
+class OutputCoalescer:
+    def __init__(self, flush_ms: int = OUTPUT_FLUSH_MS, max_bytes: int = OUTPUT_MAX_BYTES):
+        self.flush_secs = flush_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.pending: list[AgentOutputEvent] = []
+        self.pending_bytes = 0
+        self.last_flush = 0.0
+        # counters, for benchmarks and debugging
+        self.events_in = 0
+        self.batches_out = 0
+
+    @classmethod
+    def from_query_params(cls, query_params: Optional[dict]) -> "OutputCoalescer":
+        # Per-client tuning, passed through from the API request
+        query_params = query_params or {}
+
+        def _int_param(name: str, default: int, low: int, high: int) -> int:
+            try:
+                return min(max(int(query_params[name]), low), high)
+            except (KeyError, TypeError, ValueError):
+                return default
+
+        return cls(
+            flush_ms=_int_param("stream_flush_ms", OUTPUT_FLUSH_MS, MIN_FLUSH_MS, MAX_FLUSH_MS),
+            max_bytes=_int_param("stream_max_bytes", OUTPUT_MAX_BYTES, MIN_MAX_BYTES, MAX_MAX_BYTES),
+        )
+
+    def time_left(self) -> float:
+        # Seconds until the pending buffer is due to be flushed
+        return max(0.0, self.last_flush + self.flush_secs - time.monotonic())
+
+    def add(self, event: AgentEvent) -> list[AgentEvent]:
+        # Add an event, returning whatever is ready to be published now
+        self.events_in += 1
+        if not isinstance(event, AgentOutputEvent) or event.object_result:
+            return self.flush() + [event]
+
+        self.pending.append(event)
+        self.pending_bytes += len(event.str_result or "")
+        if self.pending_bytes >= self.max_bytes or self.time_left() <= 0:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[AgentEvent]:
+        if not self.pending:
+            return []
+        batch = AgentOutputEvent.coalese_output_events(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+        self.batches_out += 1
+        return batch
+
+
+_END_OF_STREAM = object()
+
+async def coalesce_events(
+        events: AsyncIterator[AgentEvent],
+        coalescer: OutputCoalescer,
+        max_queued: int = 256,
+    ) -> AsyncIterator[list[AgentEvent]]:
+    # Wraps an agent event stream, yielding lists of events ready to publish.
+    #
+    # The source generator is drained by a single producer task into a bounded queue.
+    # Running it in one task (rather than one task per __anext__) keeps any context vars
+    # the agent sets consistent across steps, and lets us wait for the next event with a
+    # timeout without ever cancelling the generator mid-step.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_END_OF_STREAM)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            if coalescer.pending:
+                # Wait for the next event, but only until the buffer is due
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=coalescer.time_left())
+                except asyncio.TimeoutError:
+                    yield coalescer.flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            batch = coalescer.add(item)
+            if batch:
+                yield batch
+
+        batch = coalescer.flush()
+        if batch:
+            yield batch
+    finally:
+        if not producer.done():
+            producer.cancel()
@@ -0,0 +1,283 @@
+# Storage for RAGTool's pgvector tables.
+#
+# ChunkIndexer writes text chunks and their embeddings. Chunks are embedded in batches
+# of RAG_EMBED_BATCH_SIZE, with up to RAG_EMBED_CONCURRENCY batches in flight against
+# the embedding model. Each batch is written with a single multi-row INSERT
+# (execute_values) and committed, as soon as its embeddings come back.
+#
+# Every row carries a hash of its position and content, unique per source, so indexing
+# a source again after a failure only embeds and inserts the chunks that are missing.
+#
+# Searches use cosine distance, served by an HNSW or ivfflat index (RAG_VECTOR_INDEX)
+# on the embeddings, and full text search on a generated tsvector column with a GIN
+# index. The vector index is built by ensure_vector_index once the data is loaded:
+# ivfflat can't be trained on an empty table, and HNSW builds faster in bulk.
+
+import asyncio
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from supercog.shared.services import config
+
+RAG_EMBED_BATCH_SIZE = int(config.get_option("RAG_EMBED_BATCH_SIZE", default=64))
+RAG_EMBED_CONCURRENCY = int(config.get_option("RAG_EMBED_CONCURRENCY", default=4))
+# "hnsw" or "ivfflat"
+RAG_VECTOR_INDEX = config.get_option("RAG_VECTOR_INDEX", default="hnsw")
+RAG_HNSW_M = int(config.get_option("RAG_HNSW_M", default=16))
+RAG_HNSW_EF_CONSTRUCTION = int(config.get_option("RAG_HNSW_EF_CONSTRUCTION", default=64))
+RAG_HNSW_EF_SEARCH = int(config.get_option("RAG_HNSW_EF_SEARCH", default=40))
+RAG_IVFFLAT_PROBES = int(config.get_option("RAG_IVFFLAT_PROBES", default=10))
+
+
+def index_name(table_name: str, suffix: str) -> str:
+    # Postgres truncates identifiers to 63 characters, so shorten the table name part
+    # rather than let two of a table's indexes end up with the same name
+    return f"{table_name[:62 - len(suffix)]}_{suffix}"
+
+
+def create_chunk_table(cur, table_name: str, dimensions: int = 1536):
+    """ Creates the table for a RAG index if it doesn't exist, and adds the columns and
+        indexes that tables created by older versions are missing. """
+    table = sql.Identifier(table_name)
+    cur.execute(sql.SQL("""
+    CREATE TABLE IF NOT EXISTS {} (
+        id SERIAL PRIMARY KEY,
+        content TEXT,
+        source TEXT,
+        line_number INTEGER,
+        embedding vector({}),
+        chunk_hash TEXT,
+        content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    )
+    """).format(table, sql.Literal(dimensions)))
+
+    # ALTER TABLE locks the table even when there is nothing to add, so check first
+    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", (table_name,))
+    columns = {row[0] for row in cur.fetchall()}
+    if "chunk_hash" not in columns:
+        cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN chunk_hash TEXT").format(table))
+    if "content_tsv" not in columns:
+        cur.execute(sql.SQL("""
+        ALTER TABLE {} ADD COLUMN content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+        """).format(table))
+
+    cur.execute(sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} (source, chunk_hash)").format(
+        sql.Identifier(index_name(table_name, "chunk_idx")), table
+    ))
+    cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING gin (content_tsv)").format(
+        sql.Identifier(index_name(table_name, "tsv_idx")), table
+    ))
+
+
+def ensure_vector_index(cur, table_name: str, method: str = RAG_VECTOR_INDEX) -> bool:
+    """ Builds the cosine distance index on the embeddings if the table doesn't have
+        one (or, for ivfflat, if the table has outgrown it). Call it after loading
+        data. Returns True if an index was built. """
+    table = sql.Identifier(table_name)
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", (table_name,))
+    indexes = dict(cur.fetchall())
+
+    # Tables used to get an untrained L2 index, which cosine distance searches don't use.
+    # (pg_indexes leaves out vector_l2_ops, it's the default operator class.)
+    for name, definition in indexes.items():
+        if re.search(r"USING (ivfflat|hnsw)", definition) and "vector_cosine_ops" not in definition:
+            cur.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(name)))
+
+    name = index_name(table_name, "cosine_idx")
+    cur.execute(sql.SQL("SELECT count(*) FROM {}").format(table))
+    rows = cur.fetchone()[0]
+    if method == "ivfflat":
+        if rows == 0:
+            return False
+        # pgvector's guidance: rows / 1000 lists up to 1M rows, sqrt(rows) beyond
+        lists = max(1, rows // 1000) if rows <= 1_000_000 else int(math.sqrt(rows))
+        if name in indexes:
+            match = re.search(r"lists='?(\d+)", indexes[name])
+            built_lists = int(match.group(1)) if match else lists
+            if "ivfflat" in indexes[name] and lists < 4 * built_lists:
+                return False
+            cur.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+        cur.execute(sql.SQL("CREATE INDEX {} ON {} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {})").format(
+            sql.Identifier(name), table, sql.Literal(lists)
+        ))
+    else:
+        if name in indexes:
+            if "hnsw" in indexes[name]:
+                return False
+            cur.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+        cur.execute(sql.SQL("CREATE INDEX {} ON {} USING hnsw (embedding vector_cosine_ops) WITH (m = {}, ef_construction = {})").format(
+            sql.Identifier(name), table, sql.Literal(RAG_HNSW_M), sql.Literal(RAG_HNSW_EF_CONSTRUCTION)
+        ))
+    return True
+
+
+def vector_search_query(table_name: str) -> sql.Composed:
+    # Params: (embedding, limit)
+    return sql.SQL("""
+    SELECT content, source, line_number, embedding <=> %s::vector AS distance
+    FROM {}
+    ORDER BY distance
+    LIMIT %s
+    """).format(sql.Identifier(table_name))
+
+
+def keyword_search_query(table_name: str) -> sql.Composed:
+    # Params: (query, limit)
+    return sql.SQL("""
+    SELECT content, source, line_number, ts_rank_cd(content_tsv, query) AS rank
+    FROM {}, plainto_tsquery('english', %s) query
+    WHERE content_tsv @@ query
+    ORDER BY rank DESC
+    LIMIT %s
+    """).format(sql.Identifier(table_name))
+
+
+def vector_search(
+        cur,
+        table_name: str,
+        embedding: list[float],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> list[tuple]:
+    """ Returns (content, source, line_number, distance) of the chunks closest to the
+        embedding. ef_search (HNSW) and probes (ivfflat) trade speed for recall, and
+        only apply to the current transaction. """
+    # HNSW returns at most ef_search rows
+    cur.execute("SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true)", (
+        str(max(ef_search or RAG_HNSW_EF_SEARCH, limit)), str(probes or RAG_IVFFLAT_PROBES)
+    ))
+    cur.execute(vector_search_query(table_name), ([float(x) for x in embedding], limit))
+    return cur.fetchall()
+
+
+def keyword_search(cur, table_name: str, query: str, limit: int) -> list[tuple]:
+    # Returns (content, source, line_number, rank) of the best full text matches
+    cur.execute(keyword_search_query(table_name), (query, limit))
+    return cur.fetchall()
+
+
+def chunk_hash(line_number: int, content: str) -> str:
+    return hashlib.sha256(f"{line_number}\0{content}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class IndexResult:
+    added: int
+    skipped: int
+
+
+class ChunkIndexer:
+    def __init__(
+            self,
+            conn,
+            table_name: str,
+            embeddings: Any,
+            batch_size: int = RAG_EMBED_BATCH_SIZE,
+            concurrency: int = RAG_EMBED_CONCURRENCY,
+            progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+            vector_index: str = RAG_VECTOR_INDEX,
+        ):
+        # `embeddings` is a LangChain Embeddings (anything with embed_documents, and
+        # optionally aembed_documents). `progress` is called with (chunks done, total
+        # chunks) after each batch is written.
+        self.conn = conn
+        self.table_name = table_name
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.progress = progress
+        self.vector_index = vector_index
+
+    async def index(self, source: str, chunks: list[str]) -> IndexResult:
+        """ Embeds and stores the chunks of the source. Chunks that are already stored
+            for the source are skipped. """
+        rows = [
+            (line_number, content, chunk_hash(line_number, content))
+            for line_number, content in enumerate(chunks) if content.strip()
+        ]
+        existing = await asyncio.to_thread(self._existing_hashes, source)
+        pending = [row for row in rows if row[2] not in existing]
+        done = len(rows) - len(pending)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def embed_batch(batch: list[tuple]) -> tuple[list[tuple], list[list[float]]]:
+            async with semaphore:
+                return batch, await self._embed([content for _, content, _ in batch])
+
+        tasks = [
+            asyncio.create_task(embed_batch(pending[i:i + self.batch_size]))
+            for i in range(0, len(pending), self.batch_size)
+        ]
+        added = 0
+        try:
+            for next_batch in asyncio.as_completed(tasks):
+                batch, vectors = await next_batch
+                added += await asyncio.to_thread(self._insert, source, batch, vectors)
+                done += len(batch)
+                if self.progress:
+                    await self.progress(done, len(rows))
+        finally:
+            for task in tasks:
+                task.cancel()
+        if added:
+            await asyncio.to_thread(self._ensure_vector_index)
+        return IndexResult(added=added, skipped=len(rows) - len(pending))
+
+    async def _embed(self, texts: list[str]) -> list[list[float]]:
+        if hasattr(self.embeddings, "aembed_documents"):
+            return await self.embeddings.aembed_documents(texts)
+        return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+
+    def _existing_hashes(self, source: str) -> set[str]:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("SELECT chunk_hash FROM {} WHERE source = %s AND chunk_hash IS NOT NULL").format(
+                    sql.Identifier(self.table_name)
+                ),
+                (source,),
+            )
+            return {row[0] for row in cur.fetchall()}
+
+    def _ensure_vector_index(self):
+        try:
+            with self.conn.cursor() as cur:
+                ensure_vector_index(cur, self.table_name, self.vector_index)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _insert(self, source: str, batch: list[tuple], vectors: list[list[float]]) -> int:
+        values = [
+            (content, source, line_number, [float(x) for x in vector], digest)
+            for (line_number, content, digest), vector in zip(batch, vectors)
+        ]
+        try:
+            with self.conn.cursor() as cur:
+                inserted = execute_values(
+                    cur,
+                    sql.SQL("""
+                    INSERT INTO {} (content, source, line_number, embedding, chunk_hash)
+                    VALUES %s
+                    ON CONFLICT (source, chunk_hash) DO NOTHING
+                    RETURNING 1
+                    """).format(sql.Identifier(self.table_name)).as_string(cur),
+                    values,
+                    template="(%s, %s, %s, %s::vector, %s)",
+                    page_size=len(values),
+                    fetch=True,
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(inserted)
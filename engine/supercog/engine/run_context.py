@@ -30,7 +30,8 @@ from supercog.shared.models import DocIndexReference
 
 from .db import session_context, Agent, Run, DocIndex
 from .jwt_auth import User as JWTUser
-from .filesystem import get_user_directory
+from .filesystem import get_user_directory, current_filesystem
+from .asset_store import asset_store
 
 from supercog.shared.utils import (
     get_boto_client, 
@@ -141,7 +142,7 @@ class RunContext:
                 mime_type = "application/octet-stream"
 
         try:
-            with open(file_path, 'rb') as file_obj:
+            with current_filesystem().open(file_path, 'rb') as file_obj:
                 private_url = upload_file_to_s3(
                     file_obj, 
                     bucket, 
@@ -180,10 +181,8 @@ class RunContext:
             content: Optional[bytes] = None,
             content_type: Optional[str] = None) -> AgentEvent:
         
-        cache_key = self.calculate_cache_key(asset_id)
-
         if content and content_type:
-            self.asset_contents[cache_key] = [content, content_type]
+            self.asset_contents[asset_id] = [content, content_type]
 
         self.asset_events.append(
             self.create_asset_event(asset_id, asset_type, asset_name)
@@ -194,19 +193,16 @@ class RunContext:
         while self.asset_events:
             agevent: AssetCreatedEvent = self.asset_events.pop(0)
             if agevent.asset_id in self.asset_contents:
-                content, content_type = self.asset_contents[agevent.asset_id]
+                content, content_type = self.asset_contents.pop(agevent.asset_id)
                 cache_key = self.calculate_cache_key(agevent.asset_id)
-                # keeping assets for 24 hours, but we should probably store them in a persistent store
-                await pubsub.set(cache_key, content, ttl=60*60*24)
-                await pubsub.set(cache_key + "/content_type", content_type, ttl=60*60*24)
+                # The content goes to the asset store, Redis only keeps a descriptor
+                await asset_store.put(self.tenant_id, cache_key, content, content_type)
             yield agevent
 
     @staticmethod
     async def get_asset(tenant_id: str, user_id: str, asset_id: str) -> tuple[bytes, str]:
         cache_key = f"{tenant_id}/{user_id}/{asset_id}"
-        content = await pubsub.get(cache_key)
-        content_type = await pubsub.get(cache_key + "/content_type")
-        return content, content_type
+        return await asset_store.get(cache_key)
 
     def create_asset_event(
             self, 
@@ -274,7 +270,7 @@ class RunContext:
         safe_agent_name = re.sub(r'[^\w\-_\. ]', '_', self.agent_name)
         agent_dir_name = f"{safe_agent_name}_{self.agent_id}"
         agent_dir = agent_dir_name
-        os.makedirs(agent_dir, exist_ok=True)
+        current_filesystem().makedirs(agent_dir, exist_ok=True)
         return agent_dir
 
     def resolve_secrets(self, text: Any, require_value: bool=False) -> Any:
@@ -0,0 +1,100 @@
+# A persistent cache of values by (namespace, key) in a SQL table, for the caches that
+# save work across runs (the embedding cache and the LLM enrichment cache). They live
+# in the pgvector database by default, or a SQLite file on local disk when there isn't
+# one.
+#
+# Subclasses give the table, which has `namespace`, the key column, the value column
+# and `last_used`, and say how values are stored and which entries `evict` deletes.
+# Every `evict_every` values written, the cache calls `evict`.
+
+import os
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import Table, create_engine, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Rows per statement, to stay well under the bind parameter limits
+BATCH_ROWS = 500
+
+
+class SQLKeyedCache:
+    table: Table
+    key_column: str
+    value_column: str
+
+    def __init__(self, url: str, evict_every: int):
+        self.url = url
+        self.evict_every = evict_every
+        self._engine = None
+        self._lock = threading.Lock()
+        self._written_since_evict = 0
+
+    @property
+    def engine(self):
+        # Created on first use, so importing the cache doesn't connect to the database
+        with self._lock:
+            if self._engine is None:
+                if self.url.startswith("sqlite:///"):
+                    os.makedirs(os.path.dirname(os.path.abspath(self.url[len("sqlite:///"):])), exist_ok=True)
+                self._engine = create_engine(self.url, pool_pre_ping=True)
+                self.table.create(self._engine, checkfirst=True)
+            return self._engine
+
+    def encode(self, value: Any) -> dict:
+        """ Returns the columns that store the value. """
+        return {self.value_column: value}
+
+    def decode(self, data: Any) -> Any:
+        """ Returns the value stored in the value column. """
+        return data
+
+    def evict(self) -> int:
+        """ Deletes entries to keep the cache within its budget. Returns the number
+            deleted. """
+        raise NotImplementedError
+
+    def get_many(self, namespace: str, keys: list[str]) -> dict[str, Any]:
+        """ Returns the cached values of the keys that are in the cache. """
+        table = self.table
+        key = table.c[self.key_column]
+        found = {}
+        with self.engine.begin() as conn:
+            unique = list(set(keys))
+            for i in range(0, len(unique), BATCH_ROWS):
+                rows = conn.execute(
+                    select(key, table.c[self.value_column]).where(
+                        table.c.namespace == namespace, key.in_(unique[i:i + BATCH_ROWS])
+                    )
+                )
+                hits = {digest: self.decode(data) for digest, data in rows}
+                if hits:
+                    conn.execute(
+                        update(table)
+                        .where(table.c.namespace == namespace, key.in_(list(hits)))
+                        .values(last_used=time.time())
+                    )
+                found.update(hits)
+        return found
+
+    def put_many(self, namespace: str, values: dict[str, Any]):
+        if not values:
+            return
+        now = time.time()
+        rows = [
+            {"namespace": namespace, self.key_column: digest, "last_used": now} | self.encode(value)
+            for digest, value in values.items()
+        ]
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        with self.engine.begin() as conn:
+            for i in range(0, len(rows), BATCH_ROWS):
+                insert = dialect.insert(self.table).values(rows[i:i + BATCH_ROWS])
+                conn.execute(insert.on_conflict_do_update(
+                    index_elements=["namespace", self.key_column],
+                    set_={column: insert.excluded[column] for column in rows[0] if column not in ("namespace", self.key_column)},
+                ))
+        self._written_since_evict += len(rows)
+        if self._written_since_evict >= self.evict_every:
+            self._written_since_evict = 0
+            self.evict()
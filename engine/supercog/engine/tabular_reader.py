@@ -0,0 +1,234 @@
+# Streams tabular files (CSV, JSON, Parquet and Excel) in bounded chunks, so the data
+# tools can read files much larger than memory.
+#
+# `iter_record_batches` yields the rows of a file as Arrow record batches of at most
+# chunk_rows rows. CSV and JSON are scanned by DuckDB (as DuckdbTool reads them, and
+# with its memory capped at TABULAR_READER_MEMORY_LIMIT), Parquet a row group at a time
+# by pyarrow, and Excel row by row with openpyxl's read-only mode.
+#
+# `stream_to_arrow_file` writes the batches to an Arrow IPC file as they arrive (with
+# `write_arrow_batches`, which also takes other sources of batches, like query results)
+# and keeps the first rows as a preview, so only one chunk is in memory at a time. The
+# tools hand the file to their DataFrameStore as a spilled frame (see
+# ToolFactory.get_streamed_dataframe_preview), which DuckDB can query memory-mapped.
+#
+# Files under TABULAR_STREAMING_THRESHOLD_MB are still read whole with pandas, so small
+# files get pandas' type inference as before.
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from supercog.shared.services import config
+
+TABULAR_STREAMING_THRESHOLD_MB = int(config.get_option("TABULAR_STREAMING_THRESHOLD_MB", default=64))
+TABULAR_CHUNK_ROWS = int(config.get_option("TABULAR_CHUNK_ROWS", default=65536))
+TABULAR_READER_MEMORY_LIMIT = config.get_option("TABULAR_READER_MEMORY_LIMIT", default="512MB")
+
+DUCKDB_READERS = {
+    "csv": "read_csv",
+    "json": "read_json",
+}
+
+
+def should_stream(path: str) -> bool:
+    """ True if the file is big enough that it should be streamed rather than read whole. """
+    try:
+        return os.path.getsize(path) >= TABULAR_STREAMING_THRESHOLD_MB * 1024 * 1024
+    except OSError:
+        return False
+
+
+def iter_record_batches(
+        path: str,
+        file_format: str,
+        chunk_rows: int = TABULAR_CHUNK_ROWS,
+        sheet_name: int|str = 0,
+        skip_rows: int = 0,
+    ) -> Iterator[pa.RecordBatch]:
+    if file_format in DUCKDB_READERS:
+        yield from _duckdb_batches(path, DUCKDB_READERS[file_format], chunk_rows, skip_rows)
+    elif file_format == "parquet":
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    elif file_format == "excel":
+        yield from _excel_batches(path, chunk_rows, sheet_name, skip_rows)
+    else:
+        raise ValueError(f"Can't stream files of format '{file_format}'")
+
+
+def arrow_batches(result: duckdb.DuckDBPyConnection, batch_rows: int) -> pa.RecordBatchReader:
+    """ Returns a reader of the query result's rows, `batch_rows` at a time. """
+    # DuckDB 1.4 renamed fetch_record_batch to to_arrow_reader, and deprecated the old name
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(batch_rows)
+    return result.fetch_record_batch(batch_rows)
+
+
+def _duckdb_batches(path: str, reader: str, chunk_rows: int, skip_rows: int) -> Iterator[pa.RecordBatch]:
+    with duckdb.connect() as con:
+        con.execute(f"SET memory_limit = '{TABULAR_READER_MEMORY_LIMIT}'")
+        options = f", skip = {int(skip_rows)}" if skip_rows and reader == "read_csv" else ""
+        yield from arrow_batches(con.execute(f"SELECT * FROM {reader}(?{options})", [path]), chunk_rows)
+
+
+def _unique_columns(header: tuple) -> list[str]:
+    # Named like pandas names blank and repeated headers
+    columns = []
+    seen: dict[str, int] = {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _rows_to_table(rows: list[tuple], columns: list[str]) -> pa.Table:
+    df = pd.DataFrame(rows, columns=columns)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # A column mixing numbers and text: keep its values as text
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].map(lambda value: None if value is None else str(value))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _concat_tables(tables: list[pa.Table]) -> pa.Table:
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns whose types disagree between chunks (say numbers, then text) become text
+        names = tables[0].schema.names
+        mixed = [
+            name for name in names
+            if len({str(t.schema.field(name).type) for t in tables if t.schema.field(name).type != pa.null()}) > 1
+        ]
+        return pa.concat_tables([_cast_to_string(t, mixed) for t in tables], promote_options="permissive")
+
+
+def _cast_to_string(table: pa.Table, columns: list[str]) -> pa.Table:
+    for name in columns:
+        index = table.schema.get_field_index(name)
+        table = table.set_column(index, name, pc.cast(table[name], pa.string()))
+    return table
+
+
+def _excel_batches(path: str, chunk_rows: int, sheet_name: int|str, skip_rows: int) -> Iterator[pa.RecordBatch]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        for _ in range(skip_rows):
+            next(rows, None)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _unique_columns(header)
+        # Cell types can change from chunk to chunk, so the chunks are kept (as Arrow,
+        # which is compact) and given one schema at the end. Sheets are limited to about
+        # a million rows, so this stays bounded.
+        tables = []
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[:len(columns)] + (None,) * (len(columns) - len(row)))
+            if len(chunk) >= chunk_rows:
+                tables.append(_rows_to_table(chunk, columns))
+                chunk = []
+        if chunk or not tables:
+            tables.append(_rows_to_table(chunk, columns))
+        table = _concat_tables(tables)
+        # An empty table has no batches, but the columns are still wanted
+        yield from table.to_batches(max_chunksize=chunk_rows) or [pa.RecordBatch.from_pylist([], schema=table.schema)]
+    finally:
+        workbook.close()
+
+
+@dataclass
+class TabularFile:
+    # Arrow IPC file holding every row
+    path: str
+    schema: pa.Schema
+    row_count: int
+    # The first rows, as a DataFrame
+    preview: pd.DataFrame
+
+    @property
+    def columns(self) -> list[str]:
+        return self.schema.names
+
+
+def stream_to_arrow_file(
+        path: str,
+        file_format: str,
+        dest_path: str,
+        preview_rows: int = 5,
+        column_name: Optional[Callable[[str], str]] = None,
+        chunk_rows: int = TABULAR_CHUNK_ROWS,
+        **reader_options,
+    ) -> TabularFile:
+    """ Copies the rows of the file to an Arrow IPC file at dest_path, a chunk at a time.
+        `column_name` maps the file's column names to the ones to store. """
+    batches = iter_record_batches(path, file_format, chunk_rows=chunk_rows, **reader_options)
+    try:
+        return write_arrow_batches(batches, dest_path, preview_rows=preview_rows, column_name=column_name)
+    except ValueError as e:
+        raise ValueError(f"{e} in '{path}'")
+
+
+def write_arrow_batches(
+        batches: Iterable[pa.RecordBatch],
+        dest_path: str,
+        preview_rows: int = 5,
+        column_name: Optional[Callable[[str], str]] = None,
+    ) -> TabularFile:
+    """ Writes the batches to an Arrow IPC file at dest_path as they arrive, keeping the
+        first `preview_rows` rows. Later batches are cast to the first one's schema. """
+    writer = None
+    schema = None
+    row_count = 0
+    preview: list[pa.RecordBatch] = []
+    tmp_path = dest_path + ".tmp"
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            for batch in batches:
+                if writer is None:
+                    schema = batch.schema
+                    if column_name:
+                        schema = pa.schema([field.with_name(column_name(field.name)) for field in schema])
+                    writer = pa.ipc.new_file(sink, schema)
+                    batch = pa.RecordBatch.from_arrays(batch.columns, schema=schema)
+                else:
+                    batch = pa.RecordBatch.from_arrays(batch.columns, names=schema.names)
+                    if batch.schema != schema:
+                        batch = batch.cast(schema)
+                writer.write_batch(batch)
+                if row_count < preview_rows:
+                    preview.append(batch.slice(0, preview_rows - row_count))
+                row_count += batch.num_rows
+            if writer is None:
+                raise ValueError("No rows or columns found")
+            writer.close()
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return TabularFile(
+        path=dest_path,
+        schema=schema,
+        row_count=row_count,
+        preview=pa.Table.from_batches(preview, schema=schema).to_pandas(),
+    )
@@ -3,12 +3,15 @@ from typing import get_type_hints
 import re
 import traceback
 from functools import wraps, partial
-from typing import Callable, Optional, final
+from typing import Callable, Iterable, Optional, final
 from pydantic import Field, computed_field
+import os
 import random
 import pickle
+import tempfile
 
 import pandas as pd
+import pyarrow as pa
 import rollbar
 
 from pydantic import BaseModel
@@ -22,6 +25,9 @@ from supercog.shared.services import config, get_public_service_host
 from supercog.shared.apubsub import RequestVarsEvent, ToolLogEvent, AssetTypeEnum
 
 from .run_context import RunContext, LangChainCallback
+from .agent_cache import get_tool_args_schema
+from .tabular_reader import iter_record_batches, write_arrow_batches
+from .dataframe_store import read_arrow_file
 
 # **The ToolFactory contract**
 #
@@ -144,7 +150,10 @@ class ToolFactory(BaseModel):
             new_params = list(old_sig.parameters.values()) + [new_param]
             myfunc.__signature__ = old_sig.replace(parameters=new_params)
 
-        t = tool(myfunc)
+        # Inferring the args schema is slow, and only depends on the function signature
+        # and docstring, so we share it across tool instances.
+        args_schema = get_tool_args_schema(tool_func, lambda: tool(myfunc).args_schema)
+        t = tool(myfunc, args_schema=args_schema)
         t.handle_validation_error = True
         return t
 
@@ -268,8 +277,7 @@ class ToolFactory(BaseModel):
         if sanitize_column_names:
             newnames = {}
             for col in df.columns.tolist():
-                newname = col.lower().replace(r"\s+", "_")
-                newnames[col] = newname
+                newnames[col] = self._sanitize_column_name(col)
             df.rename(columns=newnames, inplace=True)
         
         if not name_hint:
@@ -298,14 +306,93 @@ class ToolFactory(BaseModel):
             
         } | hint
 
+    @staticmethod
+    def _sanitize_column_name(col: str) -> str:
+        return col.lower().replace(r"\s+", "_")
+
+    def get_streamed_dataframe_preview(self, path: str, file_format: str, max_rows=5, name_hint: str|None=None,
+                                       sanitize_column_names=True, column_name: Callable[[str], str]|None=None,
+                                       **reader_options) -> dict:
+        # Like get_dataframe_preview, for a file too big to read into memory: the rows are
+        # streamed into an Arrow file which is stored as a spilled frame (see tabular_reader.py)
+        return self.get_batches_dataframe_preview(
+            iter_record_batches(path, file_format, **reader_options),
+            max_rows=max_rows,
+            name_hint=name_hint,
+            sanitize_column_names=sanitize_column_names,
+            column_name=column_name,
+        )
+
+    def get_batches_dataframe_preview(self, batches: Iterable[pa.RecordBatch], max_rows=5, name_hint: str|None=None,
+                                      sanitize_column_names=True, column_name: Callable[[str], str]|None=None) -> dict:
+        # Like get_dataframe_preview, for a dataframe that arrives as Arrow record batches
+        name = self.make_dataframe_name(name_hint)
+
+        def rename(col: str) -> str:
+            if column_name:
+                col = column_name(col)
+            return self._sanitize_column_name(col) if sanitize_column_names else col
+
+        if hasattr(self.inmem_state, "put_arrow_file"):
+            table_file = write_arrow_batches(
+                batches, self.inmem_state.new_spill_path(), preview_rows=max_rows, column_name=rename,
+            )
+            self.inmem_state.put_arrow_file(name, table_file.path)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                table_file = write_arrow_batches(
+                    batches, os.path.join(tmp, "frame.arrow"), preview_rows=max_rows, column_name=rename,
+                )
+                # A plain dict has nowhere to spill to
+                self.inmem_state[name] = read_arrow_file(table_file.path).to_pandas()
+
+        # The asset only carries the preview rows
+        self.run_context.queue_asset_event(
+            "dataframe:" + name,
+            AssetTypeEnum.TABLE,
+            name,
+            pickle.dumps(table_file.preview),
+            content_type="application/pickle",
+        )
+        includes_all = table_file.row_count <= max_rows
+        return {
+            "type":"dataframe",
+            "name": name,
+            "source_file": name_hint or "",
+            "columns": table_file.columns,
+            "row_count": table_file.row_count,
+            "all_rows" if includes_all else "preview": table_file.preview.astype(str).values.tolist(),
+        } | ({} if includes_all else {"hint": "On request, use load_full_preview_content to get all rows"})
+
     def get_dataframe_from_handle(self, handle: any) -> tuple[pd.DataFrame, str]:
         if isinstance(handle, str) and handle in self.inmem_state:
-            return self.inmem_state[handle], handle
+            name = handle
+        elif isinstance(handle, dict) and 'name' in handle:
+            name = handle['name']
+        else:
+            raise RuntimeError(f"Could not find dataframe '{handle}'")
+        # A spilled frame over the spill threshold is only read through DuckDB, see
+        # get_dataframe_scan_source
+        if hasattr(self.inmem_state, "too_large_to_load") and self.inmem_state.too_large_to_load(name):
+            raise RuntimeError(
+                f"Dataframe '{name}' is too large to load into memory. Use query_dataframe to "
+                "query it with SQL, or to select a smaller part of it."
+            )
+        return self.inmem_state[name], name
+
+    def get_dataframe_scan_source(self, handle: any) -> tuple[pd.DataFrame|pa.Table, str]:
+        # Like get_dataframe_from_handle, but a dataframe that was spilled to disk comes
+        # back as its memory-mapped Arrow table (which DuckDB can query directly) instead
+        # of being loaded back into memory
+        if isinstance(handle, str) and handle in self.inmem_state:
+            name = handle
         elif isinstance(handle, dict) and 'name' in handle:
             name = handle['name']
-            return self.inmem_state[name], name
         else:
             raise RuntimeError(f"Could not find dataframe '{handle}'")
+        if hasattr(self.inmem_state, "scan_source"):
+            return self.inmem_state.scan_source(name), name
+        return self.inmem_state[name], name
 
     def get_data_from_handle(self, handle: any) -> any:
         if isinstance(handle, str) and handle in self.inmem_state:
@@ -1,4 +1,5 @@
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from contextlib import contextmanager
 import json
 import requests
@@ -72,7 +73,7 @@ Use this tool to manage agent schedules.
             "Hostname": socket.gethostname(),
             "IP Address": socket.gethostbyname(socket.gethostname()),
             "User": os.getlogin(),
-            "Current Working Directory": os.getcwd(),
+            "Current Working Directory": current_filesystem().user_dir,
             "System Load": os.getloadavg(),
             "Python Executable": sys.executable
         }
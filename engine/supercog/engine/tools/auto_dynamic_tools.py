@@ -12,6 +12,7 @@ from PyPDF2 import PdfReader
 from supercog.shared.services import config, db_connect
 from supercog.shared.apubsub import EnableToolEvent
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback, LLMFullResult
+from supercog.engine.filesystem import current_filesystem
 
 from supercog.engine.db import Credential
 from .ragie_tool import RagieTool
@@ -185,17 +186,20 @@ class AutoDynamicTools(RagieTool):
                 return csvtool.read_csv_file(file_name)
             
             elif mime_type in ["text/plain", "application/json", "application/xml"] or mime_type.startswith("text/"):
-                return open(file_name, 'r').read()
+                with current_filesystem().open(file_name, 'r') as f:
+                    return f.read()
         
             elif 'html' in mime_type:
                 # Use beautifulsoup to extract text
-                return html2text.html2text(open(file_name).read())
+                with current_filesystem().open(file_name) as f:
+                    return html2text.html2text(f.read())
             
             elif mime_type == "application/pdf":
-                pdf_reader = PdfReader(open(file_name, "rb"))
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                with current_filesystem().open(file_name, "rb") as f:
+                    pdf_reader = PdfReader(f)
+                    text = ""
+                    for page in pdf_reader.pages:
+                        text += page.extract_text() + "\n"
                 
                 return LLMFullResult(text)
 
@@ -205,7 +209,7 @@ class AutoDynamicTools(RagieTool):
 
                 return tool.read_excel_file(file_name)
             else:
-                return pytextract.process(file_name)
+                return pytextract.process(current_filesystem().path(file_name))
 
         except Exception as e:
 
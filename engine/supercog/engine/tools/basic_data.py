@@ -48,10 +48,10 @@ class BasicDataTool(ToolFactory):
             from the query result. Use this function to rename columns, or add or
             drop columns from a dataframe.
         """
-        df, df_name = self.get_dataframe_from_handle(dataframe_var)
-        globals()[df_name] = df
+        source, df_name = self.get_dataframe_scan_source(dataframe_var)
         await self.log(f"Querying DataFrame {df_name} with query: '{sql_query}'")
-        result = duckdb.sql(sql_query)
-        df = result.df()
+        with duckdb.connect() as con:
+            con.register(df_name, source)
+            df = con.sql(sql_query).df()
         return self.get_dataframe_preview(df, name_hint=result_name or df_name, sanitize_column_names=False)
     
@@ -1,6 +1,8 @@
 import os
 import random
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
+from supercog.engine.tabular_reader import should_stream
 import pandas as pd
 import numpy as np
 
@@ -44,11 +46,16 @@ Read and write CSV files.
         A dictionary with status, message, and dataframe.
         """
         try:
-            df = pd.read_csv(file_name)
+            path = current_filesystem().path(file_name)
+            if should_stream(path):
+                # Too big to read into memory
+                preview = self.get_streamed_dataframe_preview(path, "csv")
+            else:
+                preview = self.get_dataframe_preview(pd.read_csv(path))
             return {
                 "status": "success",
                 "message": "File read successfully",
-                "dataframe": self.get_dataframe_preview(df)
+                "dataframe": preview
             }
         except Exception as e:
             return {
@@ -77,11 +84,12 @@ Read and write CSV files.
         A dictionary with status and message.
         """
         try:
+            fs = current_filesystem()
             if dataframe_var:
                 df, _ = self.get_dataframe_from_handle(dataframe_var)
-                df.to_csv(file_name, index=False, encoding=encoding, quoting=csv.QUOTE_ALL)
+                df.to_csv(fs.path(file_name), index=False, encoding=encoding, quoting=csv.QUOTE_ALL)
             elif rows:
-                with open(file_name, 'w', newline='', encoding=encoding) as f:
+                with fs.open(file_name, 'w', newline='', encoding=encoding) as f:
                     writer = csv.writer(f, quoting=csv.QUOTE_ALL)
                     writer.writerows(rows)
             else:
@@ -129,7 +137,8 @@ Read and write CSV files.
             mode = 'a'  # Open file in append mode
 
             # Check if file exists and is not empty
-            file_exists = os.path.isfile(file_name) and os.path.getsize(file_name) > 0
+            fs = current_filesystem()
+            file_exists = fs.isfile(file_name) and fs.getsize(file_name) > 0
 
             if dataframe_var:
                 # Get the dataframe from the provided variable
@@ -137,7 +146,7 @@ Read and write CSV files.
 
                 # Open the file in append mode and do not write the header if the file already exists
                 df.to_csv(
-                    file_name, 
+                    fs.path(file_name), 
                     mode=mode, 
                     index=False, 
                     encoding=encoding, 
@@ -146,7 +155,7 @@ Read and write CSV files.
                 )
             elif rows:
                 # Append rows to the CSV file
-                with open(file_name, mode, newline='', encoding=encoding) as f:
+                with fs.open(file_name, mode, newline='', encoding=encoding) as f:
                     writer = csv.writer(f, quoting=csv.QUOTE_ALL)
 
                     if file_exists and rows:
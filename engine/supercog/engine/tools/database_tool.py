@@ -1,5 +1,6 @@
 import asyncio
 import io
+import itertools
 from typing import Any, Callable
 import re
 
@@ -9,10 +10,17 @@ from psycopg2.extras import DictCursor
 import psycopg2.extras
 
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.database_engines import (
+    DATABASE_TOOL_FETCH_ROWS,
+    database_engines,
+    execute_streaming,
+    rows_to_batch,
+    statement_timeout,
+)
 from supercog.engine.triggerable import Triggerable
 from supercog.shared.logging import logger
 
@@ -189,10 +197,10 @@ General access to most types of databases.
         raise ValueError("Unable to parse connection string")
 
     def create_engine(self, connection_string: str):
-        """Create a SQLAlchemy engine from the connection string or CLI command."""
+        """Returns the shared SQLAlchemy engine for the connection string or CLI command."""
         try:
             parsed_connection_string = self.parse_connection_string(connection_string)
-            return create_engine(parsed_connection_string)
+            return database_engines.get(parsed_connection_string)
         except LocalhostConnectionError as e:
             raise e
         except Exception as e:
@@ -205,19 +213,22 @@ General access to most types of databases.
             return {"status": "Connection string is missing"}
         try:
             engine = self.create_engine(connection_string)
-            with engine.begin() as connection:
-                # Execute the query
-                result = connection.execute(text(sql_query))
+            with engine.begin() as connection, statement_timeout(connection):
+                # Execute the query, once
+                result = execute_streaming(connection, sql_query)
                 
                 # Check if the query returns rows
                 if result.returns_rows:
-                    # Try to read it into a DataFrame
-                    try:
-                        df = pd.read_sql(sql_query, connection)
+                    columns = list(result.keys())
+                    partitions = result.partitions(DATABASE_TOOL_FETCH_ROWS)
+                    first = next(partitions, [])
+                    if len(first) < DATABASE_TOOL_FETCH_ROWS:
+                        # All of it came in one fetch, so it's small enough for a DataFrame
+                        df = pd.DataFrame.from_records(first, columns=columns, coerce_float=True)
                         return self.get_dataframe_preview(df)
-                    except:
-                        # If it can't be read into a DataFrame, return as list of dicts
-                        return {"result": [dict(row) for row in result.mappings()]}
+                    # Stream the rest into the dataframe store, as it may not fit in memory
+                    batches = (rows_to_batch(columns, rows) for rows in itertools.chain([first], partitions))
+                    return self.get_batches_dataframe_preview(batches)
                 else:
                     # Query didn't return any rows
                     if result.rowcount is not None and result.rowcount >= 0:
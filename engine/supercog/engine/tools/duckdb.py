@@ -4,9 +4,11 @@ from typing import Any, Callable
 from io import StringIO
 from contextlib import contextmanager
 
-from openai import OpenAI
-
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback
+from supercog.engine.filesystem import current_filesystem
+from supercog.engine.duckdb_sessions import agent_database_path, duckdb_sessions, quote_identifier
+from supercog.engine.tabular_reader import should_stream
+from supercog.engine.llm_enrichment import LLMEnricher, enrichment_cache, openai_complete
 from supercog.shared.utils import sanitize_string
 from supercog.shared.services import config
 
@@ -35,6 +37,7 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
         """Returns a list of callable methods for the DuckDB tool."""
         return self.wrap_tool_functions([
             self.read_file_as_dataframe,
+            self.create_file_view,
             self.add_column_to_dataframe,
             self.write_dataframe_to_file,
             self.convert_text_to_dataframe,
@@ -51,7 +54,7 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
         """Tests the provided credentials by attempting to connect to the database."""
         if 'database_file' in secrets:
             try:
-                con = duckdb.connect(secrets["database_file"])
+                con = duckdb.connect(agent_database_path(secrets["database_file"]))
                 con.execute("SELECT 1")
                 con.close()
             except Exception as e:
@@ -71,20 +74,43 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
             raise RuntimeError(f"Can't infer format from file name '{file_name}'")
 
     def _get_db_file(self):
-        """Returns the database file path from credentials or a default value."""
-        if 'database_file' in self.credentials:
-            return self.credentials['database_file']
-        else:
-            return "duckdb.db"
+        """Returns the database file path from credentials or a default value, in the user's directory."""
+        return agent_database_path(self.credentials.get('database_file'))
+
+    def _session_run_id(self) -> str:
+        # Sessions belong to the run, so tool calls in a run share them
+        if self.run_context is not None and self.run_context.run_id:
+            return self.run_context.run_id
+        return f"tool_{id(self)}"
+
+    @contextmanager
+    def duckdb_session(self, database: str|None = None):
+        """Yields the run's pooled DuckDB session on the database file (or ":memory:")."""
+        with duckdb_sessions.session(self._session_run_id(), database or self._get_db_file()) as session:
+            yield session
 
     @contextmanager
     def duckdb_connection(self):
         """Context manager for handling DuckDB connections."""
-        con = duckdb.connect(self._get_db_file())
-        try:
-            yield con
-        finally:
-            con.close()
+        with self.duckdb_session() as session:
+            yield session.con
+
+    def _resolve_file(self, file_uri: str) -> str|None:
+        if file_uri.startswith("http"):
+            return file_uri
+        fs = current_filesystem()
+        if not fs.exists(file_uri):
+            return None
+        return fs.path(file_uri)
+
+    def _view_name_for_file(self, file_uri: str) -> str:
+        name = os.path.basename(file_uri).split(".")[0]
+        return re.sub(r'\W|^(?=\d)', '_', name).lower()
+
+    @staticmethod
+    def _cleanup_column_name(col: str) -> str:
+        # Strip whitespace, lowercase, replace special characters, remove trailing underscore
+        return re.sub(r'_$', '', re.sub(r'\W+', '_', str(col).strip().lower()))
 
     def read_file_as_dataframe(
         self,
@@ -98,35 +124,63 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
             'ignore_rows' to a positive number if you want to ignore rows at the
             top of the file.
         """
-        if not file_uri.startswith("http") and not os.path.exists(file_uri):
+        path = self._resolve_file(file_uri)
+        if path is None:
             return f"Error: file not found '{file_uri}'"
         
         if file_format == "infer":
             file_format = self._infer_format_from_name(file_uri)
 
-        with self.duckdb_connection() as con:
-            if file_format == "csv":
-                sql = f"SELECT * FROM read_csv('{file_uri}');"
-                print("SQL: ", sql)
-                df = con.execute(sql).df()
-            elif file_format == "parquet":
-                sql = f"SELECT * FROM read_parquet('{file_uri}');"
-                print("SQL: ", sql)
-                df = con.execute(sql).df()
-            elif file_format == "json":
-                df = con.execute(f"SELECT * FROM read_json('{file_uri}');").df()
-            elif file_format == "excel":
-                df = pd.read_excel(file_uri, skiprows=skip_rows)
-            else:
-                return {"status": "error", "message": "File format not recognized"}
+        if file_format in ("csv", "parquet", "json", "excel") and should_stream(path):
+            # Too big to read into memory: stream it into the run's columnar store instead
+            return self.get_streamed_dataframe_preview(
+                path,
+                file_format,
+                name_hint=file_uri,
+                column_name=self._cleanup_column_name if cleanup_col_names else None,
+                **({"skip_rows": skip_rows} if file_format == "excel" else {}),
+            )
+
+        if file_format == "excel":
+            df = pd.read_excel(path, skiprows=skip_rows)
+        elif file_format not in ("csv", "parquet", "json"):
+            return {"status": "error", "message": "File format not recognized"}
+        elif path.startswith("http"):
+            with self.duckdb_connection() as con:
+                df = con.execute(f"SELECT * FROM read_{file_format}(?)", [path]).df()
+        else:
+            # Read through a view of the file, which caches the parsed scan. The view name is
+            # private so it can't shadow the agent's tables.
+            with self.duckdb_session() as session:
+                view = session.register_file(path, file_format, "_file_" + self._view_name_for_file(file_uri))
+                df = session.execute(f"SELECT * FROM {quote_identifier(view)}").df()
 
         if cleanup_col_names:
-            df.columns = (
-                df.columns.str.strip().str.lower().str.replace(r'\W+', '_', regex=True).str.replace(r'_$', '', regex=True)
-            )
+            df.columns = [self._cleanup_column_name(col) for col in df.columns]
         
         return self.get_dataframe_preview(df, name_hint=file_uri)
 
+    def create_file_view(
+        self,
+        file_uri: str,
+        view_name: str|None = None,
+        file_format: str = "infer",
+    ) -> str:
+        """ Makes a CSV, Parquet or JSON file queryable with query_duckdb_tables, as a view
+            named 'view_name' (by default the file name), without loading it into a DataFrame.
+            File format should be "infer", "csv", "parquet", or "json". The view lasts
+            for this run.
+        """
+        path = self._resolve_file(file_uri)
+        if path is None or path.startswith("http"):
+            return f"Error: file not found '{file_uri}'"
+        if file_format == "infer":
+            file_format = self._infer_format_from_name(file_uri)
+        with self.duckdb_session() as session:
+            view = session.register_file(path, file_format, view_name or self._view_name_for_file(file_uri))
+            columns = session.execute(f"DESCRIBE {quote_identifier(view)}").fetchall()
+        return f"Created view '{view}' with columns: " + ", ".join(f"{name} ({type})" for name, type, *_ in columns)
+
     def convert_text_to_dataframe(
             self,
             text: str,
@@ -173,20 +227,22 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
         """ Writes the indicated DataFrame to the indicated file. File_format
             can be one of: "infer", "csv", "parquet", or "excel".
         """
-        supercog_df, df_name = self.get_dataframe_from_handle(dataframe_var)
-        duckdb.register('supercog_df', supercog_df)
-
         if file_format == "infer":
             file_format = self._infer_format_from_name(file_name)
 
-        if file_format == "csv":
-            duckdb.sql("SELECT * from supercog_df").write_csv(file_name)
-            mime_type = "text/csv"
-        elif file_format == "parquet":
-            duckdb.sql("SELECT * from supercog_df").write_parquet(file_name)
-            mime_type = "application/parquet"
+        path = current_filesystem().path(file_name)
+        if file_format in ("csv", "parquet"):
+            source, df_name = self.get_dataframe_scan_source(dataframe_var)
+            with self.duckdb_session(":memory:") as session, session.frame(df_name, source):
+                relation = session.sql(f"SELECT * FROM {quote_identifier(df_name)}")
+                if file_format == "csv":
+                    relation.write_csv(path)
+                else:
+                    relation.write_parquet(path)
+            mime_type = "text/csv" if file_format == "csv" else "application/parquet"
         elif file_format == "excel":
-            supercog_df.to_excel(file_name, index=False)
+            supercog_df, df_name = self.get_dataframe_from_handle(dataframe_var)
+            supercog_df.to_excel(path, index=False)
             mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         else:
             return {"status": "error", "message": f"File format '{file_format}' not recognized"}
@@ -207,12 +263,13 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
         """ Stores the data from the indicated dataframe to a duckdb table with the given name. 
             Will replace any existing table if 'force_overwrite' is True.
         """
-        df, df_name = self.get_dataframe_from_handle(dataframe_var)
-        with self.duckdb_connection() as con:
-            name = sanitize_string(table_name)
+        source, df_name = self.get_dataframe_scan_source(dataframe_var)
+        name = sanitize_string(table_name)
+        with self.duckdb_session() as session:
             if force_overwrite:
-                con.execute(f"DROP TABLE IF EXISTS {name}")
-            con.execute(f"CREATE TABLE {name} AS SELECT * FROM df")
+                session.execute(f"DROP TABLE IF EXISTS {name}")
+            with session.frame(df_name, source):
+                session.execute(f"CREATE TABLE {name} AS SELECT * FROM {quote_identifier(df_name)}")
 
         return f"Saved table: '{name}'"
 
@@ -308,14 +365,14 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
             Remember to use single quotes to quote column names.
             Returns a new dataframe, and uses 'result_name' as the variable name if provided.
         """
-        df, df_name = self.get_dataframe_from_handle(dataframe_var)
-        globals()[df_name] = df
+        source, df_name = self.get_dataframe_scan_source(dataframe_var)
         await self.log(f"Querying DataFrame {df_name} with query: '{query}'", callbacks=callbacks)
-        result = duckdb.sql(query)
-        df = result.df()
+        # The frame is only registered for this query, so the pooled session doesn't keep it alive
+        with self.duckdb_session(":memory:") as session, session.frame(df_name, source):
+            df = session.sql(query).df()
         return self.get_dataframe_preview(df, name_hint=result_name or df_name, sanitize_column_names=False)
     
-    def llm_enrich_column(
+    async def llm_enrich_column(
             self, 
             dataframe_var: str, 
             source_column: str, 
@@ -327,35 +384,22 @@ Use DuckDB to load and store tabular data, and manipulate it with SQL.
             prompt and the source_column value for each row. Returns a new dataframe with the
             additional column added. 
         """
-        client = OpenAI(api_key=config.get_global("OPENAI_API_KEY"))
-
-        with self.duckdb_connection() as con:
-            df, df_name = self.get_dataframe_from_handle(dataframe_var)
-
-            def llm_enricher(target_val: str) -> str:
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": f"{prompt}: {target_val}"}
-                ]
-                print("Running LLM enricher with messages: ", messages)
-                response = client.chat.completions.create(
-                    model=llm_model,
-                    messages=messages,
-                )
-                if hasattr(response, 'choices') and len(response.choices) > 0:
-                    result = response.choices[0].message.content or ""
-                    print(f"Result: {result}", callbacks)
-                else:
-                    result = "LLM result missing"
-                return result
-            
-            con.create_function("llm_enricher", llm_enricher)
-            
-            globals()[df_name] = df
-            result = con.execute(f"SELECT *, llm_enricher({source_column}) AS {result_column} FROM {df_name}")
-            df = result.df()
-
-        return self.get_dataframe_preview(df, name_hint=dataframe_var)
+        # A copy, as the result is a new dataframe
+        df = self.get_dataframe_from_handle(dataframe_var)[0].copy()
+
+        # Distinct values are sent in batches, concurrently, and answers are cached (see llm_enrichment.py)
+        enricher = LLMEnricher(openai_complete(config.get_global("OPENAI_API_KEY")), cache=enrichment_cache)
+        enrichment = await enricher.enrich(prompt, llm_model, df[source_column].tolist())
+        await self.log(f"LLM enrichment of {source_column}: {enrichment.summary()}", callbacks=callbacks)
+        df[result_column] = enrichment.results
+
+        preview = self.get_dataframe_preview(df, name_hint=dataframe_var)
+        if enrichment.failed:
+            preview["enrichment_errors"] = (
+                f"{enrichment.failed} values could not be enriched ({enrichment.errors[-1] if enrichment.errors else 'unknown error'}) "
+                f"and were left empty. Running the same enrichment again retries just those."
+            )
+        return preview
 
 
 
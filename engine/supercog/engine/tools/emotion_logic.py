@@ -4,6 +4,7 @@ from datetime import datetime
 import os
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LLMFullResult, LangChainCallback
+from supercog.engine.filesystem import current_filesystem
 
 
 class EmotionLogicTool(ToolFactory):
@@ -46,14 +47,16 @@ Use the Emotion Logic speech sentiment analysis API
             "requestId": f"msa_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         }
 
-        if not os.path.exists(filename):
+        fs = current_filesystem()
+        if not fs.exists(filename):
             return f"Error: File '{filename}' not found."
 
-        files = {
-            "file": (filename, open(filename, "rb"))
-        }        
+        with fs.open(filename, "rb") as f:
+            files = {
+                "file": (filename, f)
+            }        
 
-        response = requests.post(url, params=params, auth=auth, data=data, files=files)
+            response = requests.post(url, params=params, auth=auth, data=data, files=files)
 
         await self.log(f"Status Code: {response.status_code}\n", callbacks)
         await self.log(f"Response Content: {response.text}\n", callbacks)
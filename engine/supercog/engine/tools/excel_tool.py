@@ -7,7 +7,8 @@ import re
 
 from typing import Any, Callable
 
-from supercog.engine.filesystem   import unrestricted_filesystem
+from supercog.engine.filesystem   import current_filesystem
+from supercog.engine.tabular_reader import should_stream
 
 
 class ExcelTool(ToolFactory):
@@ -46,7 +47,12 @@ Read and write Excel files
         if re.match(r'\d+', sheet_name):
             sheet_name = int(sheet_name)-1
 
-        df = pd.read_excel(file_name, sheet_name=sheet_name, engine='openpyxl')
+        path = current_filesystem().path(file_name)
+        if should_stream(path):
+            # Too big to read into memory
+            return self.get_streamed_dataframe_preview(path, "excel", sheet_name=sheet_name)
+
+        df = pd.read_excel(path, sheet_name=sheet_name, engine='openpyxl')
 
         return self.get_dataframe_preview(df)
 
@@ -60,11 +66,11 @@ Read and write Excel files
         :return: A dictionary with status and message
         """
         try:
-            with unrestricted_filesystem():
-                df = pd.read_csv(csv_filename)
-                with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                return {"status": "success", "message": f"Created {excel_filename} from {csv_filename}"}
+            fs = current_filesystem()
+            df = pd.read_csv(fs.path(csv_filename))
+            with pd.ExcelWriter(fs.path(excel_filename), engine='openpyxl') as writer:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+            return {"status": "success", "message": f"Created {excel_filename} from {csv_filename}"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -78,7 +84,7 @@ Read and write Excel files
         """ insert passed in rpws to sheet at start_index row
         file_name  -- full excel path
         """
-        workbook = load_workbook(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
         sheet = workbook[worksheet]
         rows_inserted = 0
         for index, row in enumerate(rows_cols_to_write, start=start_index):  # Start from desired insertion point
@@ -86,8 +92,7 @@ Read and write Excel files
             rows_inserted += 1
             for col, value in enumerate(row, start=1):  # Column indexing starts at 1
                 sheet.cell(row=index, column=col, value=value)
-        with unrestricted_filesystem():
-            workbook.save(file_name)
+        workbook.save(current_filesystem().path(file_name))
         print(f"Inserted {rows_inserted} rows to {file_name}.")
         return {"status": "success", "message": f"Inserted {rows_inserted} rows to {file_name}."}
 
@@ -101,7 +106,7 @@ Read and write Excel files
         """ insert passed in columns to sheet at start_index col
         file_name  -- full excel path
         """
-        workbook = load_workbook(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
         sheet = workbook[worksheet]
         # Number of columns to insert
         num_columns = len(rows_cols_to_write)
@@ -114,8 +119,7 @@ Read and write Excel files
             for row_index, value in enumerate(column, start=1):
                 cell = sheet.cell(row=row_index, column=col_index)
                 cell.value = value
-        with unrestricted_filesystem():
-            workbook.save(file_name)
+        workbook.save(current_filesystem().path(file_name))
         print(f"Inserted {num_columns} cols to {file_name}.")
         return {"status": "success", "message": f"Inserted {num_columns} cols to {file_name}."}
     
@@ -126,7 +130,7 @@ Read and write Excel files
         """ Return back a list of worksheets in the excel file
         file_name  -- full excel path
         """
-        workbook = load_workbook(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
         data = workbook.sheetnames
         return {"status": "success", "message": data}
 
@@ -139,10 +143,9 @@ Read and write Excel files
         file_name          -- full excel path
         worksheet='Sheet1' -- default to sheet1
         """
-        workbook = load_workbook(file_name)
-        with unrestricted_filesystem():
-            workbook.create_sheet(title=worksheet)
-            workbook.save(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
+        workbook.create_sheet(title=worksheet)
+        workbook.save(current_filesystem().path(file_name))
         return {"status": "success", "message": f"added sheet {worksheet} to file {file_name}."}
     
     def delete_rows(
@@ -155,7 +158,7 @@ Read and write Excel files
         """  delete rows from an excel file start at start_index with amount to delete
         file_name  -- full excel path
         """
-        workbook = load_workbook(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
         sheet = workbook[worksheet]
         sheet.delete_rows(start_index, amount)
         return {"status": "success", "message": f"deleted {amount} rows from {worksheet} in file {file_name}."}
@@ -183,7 +186,7 @@ Read and write Excel files
 
         Returns a preview of the dataframe which will hold the data.
         """
-        workbook = load_workbook(file_name)
+        workbook = load_workbook(current_filesystem().path(file_name))
         
         #sheet = workbook.active  # This selects the active sheet. Alternatively: workbook['SheetName']
         if command  == 'read':
@@ -5,6 +5,8 @@ import html2text
 import requests
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
+from supercog.engine.tools.utils import HTML_MAX_BYTES, read_response_prefix
 
 class FileDownloadTool(ToolFactory):
     def __init__(self):
@@ -27,11 +29,11 @@ class FileDownloadTool(ToolFactory):
         """ Downloads a file from the web and stores it locally. Returns the
             file name. 
         """
-        r = requests.get(url)
+        r = requests.get(url, stream=True)
         save_file = file_name_hint or self.get_last_path_component(url)
 
         if r.status_code == 200:
-            with open(save_file, 'wb') as f:
+            with current_filesystem().open(save_file, 'wb') as f:
                 for chunk in r.iter_content(chunk_size=8192):
                     if chunk:
                         f.write(chunk)
@@ -51,14 +53,15 @@ class FileDownloadTool(ToolFactory):
     def download_file_content(self, url: str, limit: int=4000) -> str:
         """ Downloads a file from the web and returns its contents directly.
         """
-        r = requests.get(url)
+        r = requests.get(url, stream=True)
 
         if r.status_code == 200:
             mime_type = r.headers.get('content-type') or ""
             if 'html' in mime_type:
                 # Use beautifulsoup to extract text
-                return html2text.html2text(r.text)[0:limit]
+                return html2text.html2text(read_response_prefix(r, HTML_MAX_BYTES))[0:limit]
             else:
-                return r.text[0:limit]
+                # At most 4 bytes per character
+                return read_response_prefix(r, limit * 4)[0:limit]
         else:
             return f"Error: {r.status_code} {r.reason}"
@@ -1,5 +1,6 @@
 import os
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from ftplib import FTP
 from typing import Any, Callable, Optional
 from pydantic import Field
@@ -51,7 +52,7 @@ and managing FTP files and directories.
         """Download a file from the FTP server."""
         if not self.ftp:
             return {"status": "error", "message": "Not connected to FTP server"}
-        with open(local_path, 'wb') as fp:
+        with current_filesystem().open(local_path, 'wb') as fp:
             self.ftp.retrbinary(f'RETR {remote_path}', fp.write)
         return {"status": "success", "message": f"Downloaded {remote_path} to {local_path}"}
 
@@ -59,7 +60,7 @@ and managing FTP files and directories.
         """Upload a file to the FTP server."""
         if not self.ftp:
             return {"status": "error", "message": "Not connected to FTP server"}
-        with open(local_path, 'rb') as fp:
+        with current_filesystem().open(local_path, 'rb') as fp:
             self.ftp.storbinary(f'STOR {remote_path}', fp)
         return {"status": "success", "message": f"Uploaded {local_path} to {remote_path}"}
 
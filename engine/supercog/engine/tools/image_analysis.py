@@ -7,6 +7,7 @@ from typing import Optional
 from PIL import Image
 from io import BytesIO
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LLMFullResult
+from supercog.engine.filesystem import current_filesystem
 from supercog.shared.services import config
 
 from typing import Callable
@@ -55,7 +56,7 @@ Use LLM vision to analyze images
             if not mime_type or not mime_type.startswith("image/"):
                 return "Error, input file {image_url} is not an image"
             
-            with open(image_url, "rb") as image_file:
+            with current_filesystem().open(image_url, "rb") as image_file:
                 image_data = image_file.read()
             print(type(image_data))
             download_url: dict = self.run_context.get_file_url(image_url)
@@ -22,6 +22,7 @@ from supercog.shared.logging import logger
 from supercog.shared.services import get_service_host
 
 from supercog.engine.db import session_context
+from supercog.engine.filesystem import get_user_directory
 from supercog.shared.services import config, db_connect
 from sqlmodel import Session
 
@@ -163,7 +164,7 @@ async def pollForGmail(filter: str,
     delay = 60
 
     # Create agent-specific directory
-    agent_dir = create_agent_directory(agent_name, agent_id)
+    agent_dir = create_agent_directory(tenant_id, user_id, agent_name, agent_id)
 
 
     engine = db_connect("engine")
@@ -235,7 +236,7 @@ async def pollForGmail(filter: str,
     mail.close()
     mail.logout()
 
-def create_agent_directory(agent_name: str, agent_id: str) -> str:
+def create_agent_directory(tenant_id: str, user_id: str, agent_name: str, agent_id: str) -> str:
     """
     Create and return the path to an agent-specific directory.
 
@@ -243,6 +244,8 @@ def create_agent_directory(agent_name: str, agent_id: str) -> str:
     It ensures the directory name is safe for file systems by sanitizing the agent name.
 
     Args:
+        tenant_id (str): The tenant of the agent's user.
+        user_id (str): The agent's user. The directory is in the user's directory.
         agent_name (str): The name of the agent.
         agent_id (str): The unique identifier of the agent.
 
@@ -255,7 +258,7 @@ def create_agent_directory(agent_name: str, agent_id: str) -> str:
     """
     safe_agent_name = re.sub(r'[^\w\-_\. ]', '_', agent_name)
     agent_dir_name = f"{safe_agent_name}_{agent_id}"
-    agent_dir = os.path.join(os.getcwd(), agent_dir_name)
+    agent_dir = os.path.join(get_user_directory(tenant_id, user_id), agent_dir_name)
     os.makedirs(agent_dir, exist_ok=True)
     return agent_dir
 
@@ -15,6 +15,7 @@ from supercog.shared.utils   import Colors
 
 from supercog.engine.triggerable  import Triggerable
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LLMFullResult
+from supercog.engine.filesystem import current_filesystem
 from supercog.engine.email_utils  import process_email, decode_email_header
 
 from supercog.shared.services import db_connect
@@ -364,7 +365,7 @@ to learn how to create an app password. You need to supply this password to use
         safe_agent_name = re.sub(r'[^\w\-_\. ]', '_', agent_name)
         agent_dir_name = f"{safe_agent_name}_{agent_id}"
         agent_dir = agent_dir_name #os.path.join(os.getcwd(), agent_dir_name)
-        os.makedirs(agent_dir, exist_ok=True)
+        current_filesystem().makedirs(agent_dir, exist_ok=True)
         return agent_dir
 
     @staticmethod
@@ -492,7 +493,7 @@ to learn how to create an app password. You need to supply this password to use
                     attachment_data = part.get_payload(decode=True)
                     safe_filename = IMAPTool.get_safe_filename(filename, agent_dir)
                     file_path = os.path.join(agent_dir, safe_filename)
-                    with open(file_path, 'wb') as f:
+                    with current_filesystem().open(file_path, 'wb') as f:
                         f.write(attachment_data)
                     attachments.append({
                         'filename': safe_filename,
@@ -537,7 +538,7 @@ to learn how to create an app password. You need to supply this password to use
         safe_filename = re.sub(r'[^\w\-_\. ]', '_', filename)
         base, extension = os.path.splitext(safe_filename)
         counter = 1
-        while os.path.exists(os.path.join(base_dir, safe_filename)):
+        while current_filesystem().exists(os.path.join(base_dir, safe_filename)):
             safe_filename = f"{base}_{counter}{extension}"
             counter += 1
         return safe_filename
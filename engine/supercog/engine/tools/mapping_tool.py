@@ -5,6 +5,7 @@ import datetime
 from typing import Any, Callable, Optional
 import pandas as pd
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 
 class MappingTool(ToolFactory):
     def __init__(self):
@@ -59,17 +60,18 @@ Move data between multiple systems
         target_csv: -- the file name of the tyarget file
         mappings:   -- A dictionary with the mapping definitions in two or three columns
         """            
-        if not os.path.exists(source_csv):
+        fs = current_filesystem()
+        if not fs.exists(source_csv):
             return f"Error: cannot find input file {source_csv}"
         
-        source_df = pd.read_csv(source_csv)
+        source_df = pd.read_csv(fs.path(source_csv))
         # Map the columns in to the columns out
         target_df = source_df.rename(columns=mappings)
         
         #target_df = source_df.apply(MappingTool.rename_field, axis=1, args=(mappings,))
         
         # Save the target dataframe
-        target_df.to_csv(target_csv, index=False)
+        target_df.to_csv(fs.path(target_csv), index=False)
 
         return "Mapping complete"
         # Note: The script assumes that the input CSV file has the same column names as the
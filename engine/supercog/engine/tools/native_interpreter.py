@@ -9,6 +9,7 @@ from contextlib import asynccontextmanager
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback
 from supercog.engine.run_context import RunContext
+from supercog.engine.filesystem import agent_builtins, current_filesystem, user_working_directory
 
 import code
 import textwrap
@@ -65,7 +66,11 @@ Use this tool to allow the agent to execute sandboxed code
     @asynccontextmanager
     async def get_interp(self):
         if self._interp is None:
-            self._interp = InteractiveInterpreter()
+            # The code's file access is confined to the running agent's filesystem
+            self._interp = InteractiveInterpreter(locals={
+                "__name__": "__console__",
+                "__builtins__": agent_builtins(),
+            })
         yield self._interp
 
     def catch_code(self, code_to_run, single: bool = False) -> str:
@@ -73,7 +78,9 @@ Use this tool to allow the agent to execute sandboxed code
             return ""
         try:
             compiled_code = compile(code_to_run, "<string>", "single" if single else "exec")
-            return self._interp.runcode(compiled_code)
+            # So the code's relative paths are in the user's directory
+            with user_working_directory():
+                return self._interp.runcode(compiled_code)
         except Exception as e:
             return f"Error running code: {e}"
 
@@ -105,7 +112,10 @@ Use this tool to allow the agent to execute sandboxed code
                 try:
                     await self.log(cmd + "\n", callbacks)
 
-                    process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                    process = subprocess.Popen(
+                        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                        cwd=current_filesystem().user_dir,
+                    )
                     stdout, stderr = process.communicate()
 
                     # Log and accumulate stdout
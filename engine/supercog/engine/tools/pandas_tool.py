@@ -1,4 +1,6 @@
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
+from supercog.engine.tabular_reader import should_stream
 import pandas as pd
 import numpy as np
 
@@ -46,12 +48,16 @@ Manipulate dataframes, and convert file formats into dataframes.
         if file_format == "infer":
             file_format = self._infer_format_from_name(file_name)
 
+        path = current_filesystem().path(file_name)
+        if file_format in ("csv", "parquet", "excel") and should_stream(path):
+            # Too big to read into memory
+            return self.get_streamed_dataframe_preview(path, file_format, name_hint=file_name)
         if file_format == "csv":
-            df = pd.read_csv(file_name)
+            df = pd.read_csv(path)
         elif file_format == "parquet":
-            df = pd.read_parquet(file_name)
+            df = pd.read_parquet(path)
         elif file_format == "excel":
-            df = pd.read_excel(file_name, engine='openpyxl')
+            df = pd.read_excel(path, engine='openpyxl')
         else:
             return {"status": "error", "message": "File format not recognized"}    
         
@@ -65,7 +71,8 @@ Manipulate dataframes, and convert file formats into dataframes.
             use this function if the file doesn't seem to be in a format that
             can be read as a DataFrame.
         """
-        return open(file_name).read()
+        with current_filesystem().open(file_name) as f:
+            return f.read()
 
     def add_column_to_dataframe(
         self,
@@ -117,12 +124,13 @@ Manipulate dataframes, and convert file formats into dataframes.
         if file_format == "infer":
             file_format = self._infer_format_from_name(file_name)
 
+        path = current_filesystem().path(file_name)
         if file_format == "csv":
-            df.to_csv(file_name, index=False)
+            df.to_csv(path, index=False)
         elif file_format == "parquet":
-            df.to_parquet(file_name)
+            df.to_parquet(path)
         elif file_format == "excel":
-            df.to_excel(file_name, index=False)
+            df.to_excel(path, index=False)
         else:
             return {"status": "error", "message": f"File format '{file_format}' not recognized"}
 
@@ -23,13 +23,14 @@ import fitz
 from PIL import Image
 import pandas as pd
 import base64
-from supercog.engine.filesystem import unrestricted_filesystem
+from supercog.engine.filesystem import unrestricted_filesystem, current_filesystem
+from supercog.engine.embedding_cache import CachedEmbeddings
 from supercog.shared.utils import upload_file_to_s3
 import uuid
 
 class PDFTool(ToolFactory):
     conn: Optional[psycopg2.extensions.connection] = Field(default=None)
-    embeddings: Optional[OpenAIEmbeddings] = Field(default=None)
+    embeddings: Optional[CachedEmbeddings] = Field(default=None)
     openai_client: Optional[AsyncOpenAI] = Field(default=None)
 
     def __init__(self, **data):
@@ -45,7 +46,7 @@ Interact with PDF files: read, write content, index PDFs, and perform hybrid sea
             **data
         )
         self.conn = self._create_db_connection()
-        self.embeddings = OpenAIEmbeddings(openai_api_key=config.get_global("OPENAI_API_KEY"))
+        self.embeddings = CachedEmbeddings(OpenAIEmbeddings(openai_api_key=config.get_global("OPENAI_API_KEY")))
         self.openai_client = AsyncOpenAI(api_key=config.get_global("OPENAI_API_KEY"))
 
     def get_tools(self) -> list[Callable]:
@@ -189,7 +190,7 @@ Interact with PDF files: read, write content, index PDFs, and perform hybrid sea
             download_url: dict = self.run_context.get_file_url(filename)
 
             # Extract text from the generated PDF
-            with open(filename, 'rb') as file:
+            with current_filesystem().open(filename, 'rb') as file:
                 pdf_reader = PdfReader(file)
                 text = ""
                 for page in pdf_reader.pages:
@@ -425,7 +426,7 @@ Interact with PDF files: read, write content, index PDFs, and perform hybrid sea
                     
                     # Create a meaningful filename for the image
                     image_filename = f"{pdf_base_name}_page_{page_num + 1}.png"
-                    img.save(image_filename, format='PNG')
+                    img.save(current_filesystem().path(image_filename), format='PNG')
                     
                     # Upload image to S3 with the new filename
                     self.run_context.upload_user_file_to_s3(
@@ -443,7 +444,7 @@ Interact with PDF files: read, write content, index PDFs, and perform hybrid sea
                     })
 
                     # Remove the temporary file
-                    os.remove(image_filename)
+                    current_filesystem().remove(image_filename)
 
             # Close the PDF document
             pdf_document.close()
@@ -1,5 +1,6 @@
 from playwright.sync_api import sync_playwright
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from contextlib import contextmanager
 
 import json
@@ -56,11 +57,11 @@ Use this tool to manipulate and test websites.
             raise ValueError("File name is not provided.")
         
         # Create the full path for the script file
-        script_path = os.path.join(os.getcwd(), 'playwright', file_name)
+        script_path = os.path.join('playwright', file_name)
         
         # Read the script from the file
         try:
-            with open(script_path, 'r') as f:
+            with current_filesystem().open(script_path, 'r') as f:
                 script_content = f.read()
             print(f"Script read from {script_path}")
             return script_content
@@ -77,14 +78,15 @@ Use this tool to manipulate and test websites.
         :return: Captured stdout and stderr output
         """
         is_temp_file: bool = False
-        playwright_dir = os.path.join(os.getcwd(), 'playwright')
+        fs = current_filesystem()
+        fs.makedirs('playwright', exist_ok=True)
         
         if file_name:
             print(f"Setting script file to {file_name}")
-            script_file = os.path.join(playwright_dir, file_name)
+            script_file = fs.path(os.path.join('playwright', file_name))
         else:
             # Create a temporary file to save the script
-            script_file = os.path.join(playwright_dir, 'temp_script.py')
+            script_file = fs.path(os.path.join('playwright', 'temp_script.py'))
             is_temp_file = True
             with open(script_file, 'w') as f:
                 f.write(script_text)
@@ -94,7 +96,8 @@ Use this tool to manipulate and test websites.
             process = await asyncio.create_subprocess_exec(
                 'python', script_file,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stderr=subprocess.PIPE,
+                cwd=fs.user_dir,
             )
             
             stdout, stderr = await process.communicate()
@@ -129,11 +132,11 @@ Use this tool to manipulate and test websites.
             raise ValueError("File name is not provided.")
         
         # Ensure the playwright directory exists
-        playwright_dir = os.path.join(os.getcwd(), 'playwright')
-        os.makedirs(playwright_dir, exist_ok=True)
+        fs = current_filesystem()
+        fs.makedirs('playwright', exist_ok=True)
         
         # Create the full path for the script file
-        script_path = os.path.join(playwright_dir, file_name)
+        script_path = fs.path(os.path.join('playwright', file_name))
         
         # Write the script to the file
         try:
@@ -22,6 +22,9 @@ from pgvector.psycopg2 import register_vector
 from psycopg2 import sql
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, ToolConfigError, LangChainCallback
+from supercog.engine.filesystem import current_filesystem
+from supercog.engine.embedding_cache import CachedEmbeddings
+from supercog.engine.rag_indexer import ChunkIndexer, create_chunk_table, keyword_search, vector_search
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
@@ -46,7 +49,7 @@ class Document:
 
 @dataclass
 class RAGTool(ToolFactory):
-    embeddings: Optional[OpenAIEmbeddings] = None
+    embeddings: Optional[CachedEmbeddings] = None
     conn: Optional[psycopg2.extensions.connection] = None
     credentials: Dict[str, str] = field(default_factory=dict)
     firecrawl: Optional[FirecrawlApp] = None
@@ -81,7 +84,7 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
         self.is_available = self._check_availability()
 
         if self.is_available:
-            self.embeddings = OpenAIEmbeddings(openai_api_key=config.get_global("OPENAI_API_KEY"))
+            self.embeddings = CachedEmbeddings(OpenAIEmbeddings(openai_api_key=config.get_global("OPENAI_API_KEY")))
             self.conn = self._create_db_connection()
             if self.conn:
                 self._setup_database()
@@ -178,10 +181,10 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
                 if file_format == "url":
                     return await self._add_url_to_index(source)
                 elif file_format in ["csv", "excel", "json", "parquet"]:
-                    df = self._get_dataframe(source, file_format, skip_rows, cleanup_col_names)
+                    df = self._get_dataframe(current_filesystem().path(source), file_format, skip_rows, cleanup_col_names)
                     documents = self._dataframe_to_documents(df, source)
                 elif file_format in ["text", "pdf"]:
-                    content = self._read_file(source)
+                    content = self._read_file(current_filesystem().path(source))
                     documents = self._split_text(content, source)
                 else:
                     return {"status": "error", "message": f"Unsupported file format: {file_format}"}
@@ -250,21 +253,23 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
             return content.decode(detected_encoding or 'utf-8', errors='replace')
 
     async def _process_documents(self, documents: List[LangchainDocument], source: str) -> str:
-        # Process and store documents in the database
+        # Embed and store documents in the database, in batches (see rag_indexer.py)
         self._setup_database()
-        embedding_table_name = self._get_safe_table_name()
-        total_docs = len(documents)
-        with self.conn.cursor() as cur:
-            for i, doc in enumerate(documents):
-                await self.log(f"Adding doc {i + 1}/{total_docs} to index")
-                clean_content = self._clean_text(doc.page_content)
-                embedding = self.embeddings.embed_query(clean_content)
-                cur.execute(sql.SQL("""
-                INSERT INTO {} (content, source, line_number, embedding)
-                VALUES (%s, %s, %s, %s::vector)
-                """).format(sql.Identifier(embedding_table_name)), (clean_content, source, i, embedding))
-        self.conn.commit()
-        return f"Added {len(documents)} text chunks from {source} to the index."
+
+        async def report_progress(done: int, total: int):
+            await self.log(f"Indexed {done}/{total} chunks from {source}")
+
+        indexer = ChunkIndexer(
+            self.conn,
+            self._get_safe_table_name(),
+            self.embeddings,
+            progress=report_progress,
+        )
+        result = await indexer.index(source, [self._clean_text(doc.page_content) for doc in documents])
+        message = f"Added {result.added} text chunks from {source} to the index."
+        if result.skipped:
+            message += f" {result.skipped} chunks were already indexed."
+        return message
 
     def _get_dataframe(self, data_source: str, file_format: str, skip_rows: int, cleanup_col_names: bool) -> pd.DataFrame:
         # Load data into a DataFrame based on the file format
@@ -340,13 +345,8 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
             embedding_table_name = self._get_safe_table_name()
             
             with self.conn.cursor() as cur:
-                cur.execute(sql.SQL("""
-                SELECT content, source, line_number, embedding <=> %s::vector AS distance
-                FROM {}
-                ORDER BY distance
-                LIMIT %s
-                """).format(sql.Identifier(embedding_table_name)), (query_embedding, num_results))
-                results = cur.fetchall()
+                results = vector_search(cur, embedding_table_name, query_embedding, num_results)
+            self.conn.commit()
 
             output = []
             for content, source, line_number, distance in results:
@@ -650,20 +650,10 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
                 """, (embedding_table_name,))
                 table_exists = cur.fetchone()[0]
 
+                # The vector index is built once there is data, see rag_indexer.py
+                create_chunk_table(cur, embedding_table_name)
                 if not table_exists:
-                    cur.execute(f"""
-                    CREATE TABLE {embedding_table_name} (
-                        id SERIAL PRIMARY KEY,
-                        content TEXT,
-                        source TEXT,
-                        line_number INTEGER,
-                        embedding vector(1536)
-                    )
-                    """)
-                    cur.execute(f"CREATE INDEX {embedding_table_name}_embedding_idx ON {embedding_table_name} USING ivfflat (embedding vector_l2_ops)")
                     print(f"Created new table: {embedding_table_name}")
-                else:
-                    print(f"Table {embedding_table_name} already exists")
 
             self.conn.commit()
         except Exception as e:
@@ -797,14 +787,9 @@ Perform Retrieval-Augmented Generation tasks using pgvector for storage.
         embedding_table_name = self._get_safe_table_name()
         
         with self.conn.cursor() as cur:
-            cur.execute(sql.SQL("""
-            SELECT content, source, line_number, ts_rank_cd(to_tsvector('english', content), plainto_tsquery('english', %s)) AS rank
-            FROM {}
-            WHERE to_tsvector('english', content) @@ plainto_tsquery('english', %s)
-            ORDER BY rank DESC
-            LIMIT %s
-            """).format(sql.Identifier(embedding_table_name)), (query, query, num_results))
-            return cur.fetchall()
+            results = keyword_search(cur, embedding_table_name, query, num_results)
+        self.conn.commit()
+        return results
 
     async def _rerank(self, query: str, results: List[Tuple[str, str, int, float]]) -> List[Tuple[str, str, int, float]]:
         """
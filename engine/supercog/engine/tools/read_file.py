@@ -14,6 +14,9 @@ from fpdf import FPDF
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback
 from supercog.engine.email_utils  import process_email
 from supercog.engine.file_utils   import read_eml, read_pdf
+from supercog.engine.filesystem   import current_filesystem
+from supercog.engine.tabular_reader import should_stream
+from supercog.engine.tools.utils  import HTML_MAX_BYTES, read_response_prefix
 
 class ReadFileTool(ToolFactory):
     credentials: dict = {}
@@ -70,14 +73,19 @@ Read, save, list, and extract content from files.
         """
         if file_name.startswith("http"):
             return self._file_download(file_name)
+        fs = current_filesystem()
         if file_name.endswith(".xlsx") or file_name.endswith(".xls"):
-            df = pd.read_excel(file_name, engine='openpyxl')
+            if should_stream(fs.path(file_name)):
+                return self.get_streamed_dataframe_preview(fs.path(file_name), "excel")
+            df = pd.read_excel(fs.path(file_name), engine='openpyxl')
             return self.get_dataframe_preview(df)
         elif file_name.endswith(".csv"):
-            df = pd.read_csv(file_name)
+            if should_stream(fs.path(file_name)):
+                return self.get_streamed_dataframe_preview(fs.path(file_name), "csv")
+            df = pd.read_csv(fs.path(file_name))
             return self.get_dataframe_preview(df)
         elif file_name.endswith(".cbl") or file_name.endswith(".CBL"):
-            with open(file_name, 'r') as f:
+            with fs.open(file_name, 'r') as f:
                 return f.read()
         elif file_name.endswith(".pdf"):
             return read_pdf(file_name)
@@ -85,10 +93,10 @@ Read, save, list, and extract content from files.
             agent_dir = self.run_context.create_agent_directory()
             return read_eml(file_name, agent_dir, self.run_context)
         try:
-            return pytextract.process(file_name)
+            return pytextract.process(fs.path(file_name))
         except:
             # Detect the encoding of the file
-            with open(file_name, 'rb') as f:
+            with fs.open(file_name, 'rb') as f:
                 raw_content = f.read()
 
             result = chardet.detect(raw_content)
@@ -109,21 +117,22 @@ Read, save, list, and extract content from files.
         """ Downloads a file from the web and returns the contents as text, not
             more than `limit` characters. 
         """
-        r = requests.get(url)
+        r = requests.get(url, stream=True)
 
         if r.status_code == 200:
             mime_type = r.headers.get('content-type') or ""
             if 'html' in mime_type:
                 # Use beautifulsoup to extract text
-                return html2text.html2text(r.text)[0:limit]
+                return html2text.html2text(read_response_prefix(r, HTML_MAX_BYTES))[0:limit]
             else:
-                return r.text[0:limit]
+                # At most 4 bytes per character
+                return read_response_prefix(r, limit * 4)[0:limit]
         else:
             return f"Error: {r.status_code} {r.reason}"
         
     def save_file(self, filename: str, content: str):
         """ Saves the given text content using the provided filename. """
-        with open(filename, 'w') as f:
+        with current_filesystem().open(filename, 'w') as f:
             f.write(content)
         return "file saved"
     
@@ -140,7 +149,7 @@ Read, save, list, and extract content from files.
         pdf.add_page()
         pdf.set_font("Arial", size=12)
         pdf.write_html(html)
-        pdf.output(filename)
+        pdf.output(current_filesystem().path(filename))
 
         self.run_context.upload_user_file_to_s3(
             file_name=filename,
@@ -152,7 +161,7 @@ Read, save, list, and extract content from files.
 
     def mkdir(self, path: str):
         """Create a directory."""
-        os.makedirs(path, exist_ok=True)  # Create directory if it doesn't exist
+        current_filesystem().makedirs(path, exist_ok=True)  # Create directory if it doesn't exist
         return "driectory created"
         
     async def list_filesystem_files(self, folder: str=".", callbacks: LangChainCallback=None) -> list[tuple]:
@@ -165,7 +174,11 @@ Read, save, list, and extract content from files.
             folder = ""
     
         glob_pat = os.path.join(folder, "*")
-        files_with_sizes = [(filename, os.path.getsize(filename)) for filename in glob.glob(glob_pat)]
+        fs = current_filesystem()
+        files_with_sizes = [
+            (filename, os.path.getsize(os.path.join(fs.user_dir, filename)))
+            for filename in glob.glob(glob_pat, root_dir=fs.user_dir)
+        ]
         return files_with_sizes
         #await self._delay_for_testing(callbacks)
         #return os.listdir(path)
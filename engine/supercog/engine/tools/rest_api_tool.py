@@ -9,6 +9,7 @@ import uuid
 import pandas as pd
 import aiohttp
 import aiofiles
+import os
 from aiohttp import FormData
 import pandas as pd
 import math
@@ -23,6 +24,7 @@ from supercog.engine.tool_factory import (
 )
 from supercog.shared.utils import upload_file_to_s3
 from supercog.engine.tools.s3_utils import public_image_bucket
+from supercog.engine.filesystem import current_filesystem
 
 class RESTAPITool(ToolFactory):
     return_dataframe: bool=False
@@ -109,8 +111,9 @@ Call any REST API endpoints.
                         for key, value in form_data.items():
                             form.add_field(key, str(value))
                     if file_path:
-                        async with aiofiles.open(file_path, 'rb') as f:
-                            form.add_field('file', f, filename=file_path.split('/')[-1])
+                        # Read it here, as the form is sent after the file would be closed
+                        async with aiofiles.open(current_filesystem().path(file_path), 'rb') as f:
+                            form.add_field('file', await f.read(), filename=os.path.basename(file_path))
                     async with session.post(endpoint_url, data=form, headers=headers) as response:
                         return await self.process_response(response)
                 else:
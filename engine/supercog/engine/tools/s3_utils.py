@@ -5,24 +5,22 @@ from supercog.shared.services import config
 from supercog.shared.utils import upload_file_to_s3, get_boto_client, calc_s3_url
 
 def get_file_from_s3(tenant_id, folder_name, file_name):
-    os.chdir('/tmp')
     s3_client = get_boto_client('s3')
 
     bucket_name = config.get_global("S3_FILES_BUCKET_NAME")
     object_name = f"{tenant_id}/{folder_name}/{file_name}"
 
     try:
-        s3_client.download_file(bucket_name, object_name, file_name)
+        s3_client.download_file(bucket_name, object_name, os.path.join('/tmp', file_name))
     except Exception as e:
         raise RuntimeError(f"File not found in S3: {e}")
 
 def put_file_to_s3(tenant_id, folder_name, file_name):
-    os.chdir('/tmp')
     bucket_name = config.get_global("S3_FILES_BUCKET_NAME")
     object_name = f"{tenant_id}/{folder_name}/{file_name}"
 
     upload_file_to_s3(
-        file_name, 
+        os.path.join('/tmp', file_name), 
         bucket_name,
         object_name
     )
@@ -26,6 +26,7 @@ from supercog.shared.logging import logger
 from supercog.shared.services import config 
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback
+from supercog.engine.filesystem import current_filesystem
 from supercog.shared.oauth_utils import salesforce_refresh_token
 
 from simple_salesforce import Salesforce
@@ -568,15 +569,16 @@ class SalesforceTool(ToolFactory):
         if mappings_data:
             mappings = await read_mappings_csv(io.StringIO(mappings_data))
         elif mappings_csv_file:
-            if not os.path.exists(mappings_csv_file):
+            if not current_filesystem().exists(mappings_csv_file):
                 return f"Error: file not found '{mappings_csv_file}'"
-            with open(mappings_csv_file, mode='r', encoding='utf-8') as f:
+            with current_filesystem().open(mappings_csv_file, mode='r', encoding='utf-8') as f:
                 mappings = await read_mappings_csv(f)
 
         # have to set data_only to true. values_only is not enough.
-        if not os.path.exists(excel_source_file):
+        fs = current_filesystem()
+        if not fs.exists(excel_source_file):
             return f"Error: Excel file not found '{excel_source_file}'"
-        workbook = load_workbook(excel_source_file,data_only=True)
+        workbook = load_workbook(fs.path(excel_source_file),data_only=True)
         sheet = workbook[worksheet]
 
         headers = [
@@ -695,7 +697,7 @@ class SalesforceTool(ToolFactory):
         for row, data in enumerate(sheet_updates, start=2):  # skip the header
             sheet.cell(row=row, column=next_col, value=data.messages)
         # Save the workbook
-        workbook.save(excel_source_file)
+        workbook.save(current_filesystem().path(excel_source_file))
         return "Success"
 
     @staticmethod
@@ -3,6 +3,7 @@ import csv
 import os
 from typing import List, Any, Callable
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from supercog.shared.services import config
 from openai import OpenAI
 
@@ -39,7 +40,7 @@ The tool creates intelligent, realistic sample data.
             temp_path = f"{filename}"
 
             # Create and write the CSV file locally
-            with open(temp_path, 'w', newline='') as csvfile:
+            with current_filesystem().open(temp_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
                 writer.writerow(column_names)
                 writer.writerows(rows)
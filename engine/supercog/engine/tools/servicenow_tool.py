@@ -1,4 +1,5 @@
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from typing import List, Callable, Optional, Dict, Any
 import json
 import requests
@@ -211,7 +212,7 @@ Use this tool to interact with ServiceNow using custom REST API calls.
             return "Please initialize ServiceNow session first."
         
         try:
-            with open(file_path, 'rb') as file:
+            with current_filesystem().open(file_path, 'rb') as file:
                 files = {'file': file}
                 response = self.session.post(f"{self.instance_url}/api/now/attachment/file?table_name={table}&table_sys_id={sys_id}", files=files)
             response.raise_for_status()
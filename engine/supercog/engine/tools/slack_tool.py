@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 import re
 from datetime import datetime
 import os
@@ -144,7 +145,7 @@ class SlackTool(ToolFactory):
     async def _post_file_to_slack(self, slack_app, channel_id, file_url, comment="") -> dict:
         # Use urlparse to extact file name from the URL
         parsed_url = urlparse(file_url)
-        local_file = os.path.basename(parsed_url.path)
+        local_file = current_filesystem().path(os.path.basename(parsed_url.path))
         # Gotta download the file first, using async httpx
         client = httpx.AsyncClient()
         with open(local_file, 'wb') as f:
@@ -3,6 +3,7 @@ from contextlib import contextmanager
 import pandas as pd
 from typing import Callable, Any, Optional
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, LangChainCallback
+from supercog.engine.filesystem import current_filesystem
 import snowflake.connector
 
 from langchain.callbacks.manager import (
@@ -146,7 +147,7 @@ Access Snowflake data
                 await self.runsql(cursor, table_create_statement)
 
             df, df_name = self.get_dataframe_from_handle(dataframe_var)
-            filename = "upload1.parquet"
+            filename = current_filesystem().path("upload1.parquet")
             df.to_parquet(filename, index=False)
 
             await self.runsql(cursor, "CREATE FILE FORMAT IF NOT EXISTS sc_parquet_format;");
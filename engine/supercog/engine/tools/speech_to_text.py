@@ -1,6 +1,6 @@
 from supercog.engine.tool_factory import ToolFactory, ToolCategory, TOOL_REGISTRY
 from supercog.shared.services     import config
-from supercog.engine.filesystem   import unrestricted_filesystem
+from supercog.engine.filesystem   import unrestricted_filesystem, current_filesystem
 from supercog.shared.logging      import logger
 from supercog.engine.db           import session_context
 from supercog.shared.services     import config, db_connect
@@ -91,7 +91,7 @@ Use this tool to convert speech to text using OpenAI's Whisper API
             wave BytesIo object.
         """
         # Load the audio file
-        audio_segment = AudioSegment.from_file(file_name)
+        audio_segment = AudioSegment.from_file(current_filesystem().path(file_name))
 
         # Calculate start and end times in milliseconds
         start_ms = start_pos_in_secs * 1000
@@ -209,7 +209,7 @@ Use this tool to convert speech to text using OpenAI's Whisper API
         print(f"Audio file path: {save_path}")
 
         # Ensure the directory exists
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        current_filesystem().makedirs(os.path.dirname(save_path), exist_ok=True)
         return filename, save_path
     
     def _save_audio_to_s3(self, audio_data, filename, save_path) -> str:
@@ -236,12 +236,13 @@ Use this tool to convert speech to text using OpenAI's Whisper API
                 raw_data = audio_data.read()
 
             # Write the raw audio data directly to file
-            with open(save_path, 'wb') as f:
+            fs = current_filesystem()
+            with fs.open(save_path, 'wb') as f:
                 f.write(raw_data)
 
             # Verify file existence and size
-            if os.path.exists(save_path):
-                file_size = os.path.getsize(save_path)
+            if fs.exists(save_path):
+                file_size = fs.getsize(save_path)
                 print(f"File exists. Size: {file_size} bytes")
 
                 # Upload to S3
@@ -391,7 +392,7 @@ Use this tool to convert speech to text using OpenAI's Whisper API
         """
         try:
             # Load the audio file into a byte stream
-            audio_segment = AudioSegment.from_file(file_name)
+            audio_segment = AudioSegment.from_file(current_filesystem().path(file_name))
 
             # Convert start and end positions to float if they're not None
             start_pos_in_secs = float(start_pos_in_secs) if start_pos_in_secs is not None else 0
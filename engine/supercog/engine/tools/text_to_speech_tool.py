@@ -15,7 +15,7 @@ import httpx
 import json
 import time
 #import sounddevice as sd
-from supercog.engine.filesystem import unrestricted_filesystem
+from supercog.engine.filesystem import unrestricted_filesystem, current_filesystem
 from datetime import datetime
 
 class TextToSpeechTool(ToolFactory):
@@ -148,15 +148,16 @@ Use this tool to convert text to speech using OpenAI's API
             print(f"Audio file path: {save_path}")
 
             # Ensure the directory exists
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            fs = current_filesystem()
+            fs.makedirs(os.path.dirname(save_path), exist_ok=True)
 
             # Write the raw audio data directly to file
-            with open(save_path, 'wb') as f:
+            with fs.open(save_path, 'wb') as f:
                 f.write(audio_data)
 
             # Verify file existence and size
-            if os.path.exists(save_path):
-                file_size = os.path.getsize(save_path)
+            if fs.exists(save_path):
+                file_size = fs.getsize(save_path)
                 print(f"File exists. Size: {file_size} bytes")
 
                 if file_size == 0:
@@ -174,7 +175,7 @@ Use this tool to convert text to speech using OpenAI's API
                 print(f"generate_speech_file_from_text: correct URL -> {audio_url}")
 
                 # Clean up the local file after successful upload
-                os.remove(save_path)
+                fs.remove(save_path)
                 print(f"generate_speech_file_from_text:Local file removed -> {save_path}")
 
                 # Return the URL as a JSON string
@@ -7,6 +7,20 @@ import re
 
 from supercog.engine.logging_handler import FileLogHandler
 
+# Pages larger than this are cut off before converting them to text
+HTML_MAX_BYTES = 10 * 1024 * 1024
+
+def read_response_prefix(response, max_bytes: int) -> str:
+    # Reads at most max_bytes of a streamed (stream=True) requests response as text, so a
+    # large download isn't held in memory to return the start of it
+    data = bytearray()
+    for chunk in response.iter_content(chunk_size=65536):
+        data.extend(chunk)
+        if len(data) >= max_bytes:
+            break
+    response.close()
+    return bytes(data[:max_bytes]).decode(response.encoding or "utf-8", errors="replace")
+
 def markdown_to_html(markdown_content: str) -> str:
     # Convert Markdown to HTML
     html_content = markdown2.markdown(markdown_content)
@@ -6,6 +6,7 @@ import yt_dlp
 import importlib
 
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 from supercog.shared.services import config
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -155,7 +156,7 @@ Transcribe YouTube videos and add them to the RAG database.
         raise ValueError('Invalid YouTube URL')
 
     def _download_audio(self, youtube_url: str) -> str:
-        temp_dir = os.path.join(os.getcwd(), 'temp_audio')
+        temp_dir = os.path.join(current_filesystem().user_dir, 'temp_audio')
         os.makedirs(temp_dir, exist_ok=True)
         
         self.ydl_opts['outtmpl'] = os.path.join(temp_dir, '%(id)s.%(ext)s')
@@ -260,7 +261,7 @@ Transcribe YouTube videos and add them to the RAG database.
             if self.is_available and hasattr(self, 'conn') and self.conn is not None:
                 self.conn.close()
             
-            temp_dir = os.path.join(os.getcwd(), 'temp_audio')
+            temp_dir = os.path.join(current_filesystem().user_dir, 'temp_audio')
             if os.path.exists(temp_dir):
                 for file in os.listdir(temp_dir):
                     file_path = os.path.join(temp_dir, file)
@@ -1,4 +1,5 @@
 from supercog.engine.tool_factory import ToolFactory, ToolCategory
+from supercog.engine.filesystem import current_filesystem
 import json
 import time
 from bs4 import BeautifulSoup
@@ -81,7 +82,7 @@ Use this tool to test the security of web applications.
         findings_json = json.dumps(findings, indent=4)
     
         # Write the JSON string to the specified file path
-        with open(file_path, 'w') as file:
+        with current_filesystem().open(file_path, 'w') as file:
             file.write(findings_json)
 
     def get_high_risk_alerts(self, count=None):
@@ -16,7 +16,7 @@ from supercog.shared.services import db_connect, get_service_host
 from supercog.shared.models import RunLogBase
 from supercog.shared.apubsub import EventRegistry, AgentEvent, AgentOutputEvent
 
-engine = db_connect("engine") # ick - 2 different engines!
+engine = db_connect("engine") # the same engine (and pool) as supercog.engine.db
 BASE = get_service_host("engine")
 
 class RunningState:
@@ -28,7 +28,7 @@ from supercog.engine.tools.scheduler import internal_get_jobs, internal_cancel_j
 
 from supercog.shared.services import config
 
-engine = db_connect("engine") # ick - 2 different engines!
+engine = db_connect("engine") # the same engine (and pool) as supercog.engine.db
 SERVICE = "triggersvc"
 fastapi_app = FastAPI(lifespan=lifespan_manager)
 rb_token = os.environ.get("ROLLBAR_TOKEN")
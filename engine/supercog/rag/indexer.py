@@ -0,0 +1,128 @@
+# Streams the documents of a doc source into a LlamaIndex vector store index.
+#
+# Documents are indexed in batches of RAG_INDEXING_BATCH_SIZE as the source yields them,
+# so memory use doesn't grow with the size of the source. Each document is recorded as
+# an IndexedDoc with the hash of its content, and a document whose hash hasn't changed
+# since the last run is skipped. Documents are matched to earlier runs by doc_id, so
+# sources should give their documents stable ids.
+#
+# The job's status and progress are saved in its IndexingJob row after every batch.
+
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.ingestion import run_transformations
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from supercog.shared.logging import logger
+from supercog.shared.services import config
+from supercog.engine.db import IndexedDoc, IndexingJob
+
+RAG_INDEXING_BATCH_SIZE = int(config.get_option("RAG_INDEXING_BATCH_SIZE", default=32))
+
+
+def as_documents(item: Any) -> Iterator[Document]:
+    # Sources yield Documents, lists of Documents, or plain text
+    if isinstance(item, Document):
+        yield item
+    elif isinstance(item, (list, tuple)):
+        for doc in item:
+            yield from as_documents(doc)
+    elif isinstance(item, str):
+        # Plain text has no id of its own, so it is identified by its content
+        yield Document(text=item, id_=hashlib.sha256(item.encode("utf-8")).hexdigest())
+    else:
+        raise TypeError(f"Can't index a {type(item).__name__}")
+
+
+class StreamingIndexer:
+    def __init__(
+            self,
+            db_engine: Engine,
+            index: VectorStoreIndex,
+            job_id: str,
+            batch_size: int = RAG_INDEXING_BATCH_SIZE,
+            transformations: Optional[list] = None,
+        ):
+        self.db_engine = db_engine
+        self.index = index
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.transformations = transformations or Settings.transformations
+
+    async def run(self, items: AsyncIterator[Any]) -> IndexingJob:
+        """ Indexes the documents the source yields, and returns the finished job. """
+        self._update_job(status="running", message="Indexing documents")
+        try:
+            batch: dict[str, Document] = {}
+            async for item in items:
+                for doc in as_documents(item):
+                    batch[doc.doc_id] = doc
+                    if len(batch) >= self.batch_size:
+                        await self._index_batch(list(batch.values()))
+                        batch = {}
+            if batch:
+                await self._index_batch(list(batch.values()))
+        except Exception as e:
+            self._update_job(status="error", message=f"Error during indexing: {e}")
+            raise
+        return self._update_job(status="completed", message="Indexing completed")
+
+    async def _index_batch(self, batch: list[Document]):
+        with Session(self.db_engine) as session:
+            job = session.get(IndexingJob, self.job_id)
+            known = {
+                indexed.doc_id: indexed
+                for indexed in session.exec(
+                    select(IndexedDoc).where(
+                        IndexedDoc.index_id == job.index_id,
+                        IndexedDoc.doc_id.in_([doc.doc_id for doc in batch]),
+                    )
+                )
+            }
+            changed = [
+                doc for doc in batch
+                if doc.doc_id not in known or known[doc.doc_id].content_hash != doc.hash
+            ]
+            if changed:
+                await asyncio.to_thread(self._replace_documents, changed)
+                for doc in changed:
+                    indexed = known.get(doc.doc_id) or IndexedDoc(index_id=job.index_id, doc_id=doc.doc_id)
+                    indexed.name = doc.metadata.get("file_name") or doc.metadata.get("title") or doc.doc_id
+                    indexed.content_hash = doc.hash
+                    indexed.indexed_at = datetime.utcnow()
+                    session.add(indexed)
+
+            job.docs_seen += len(batch)
+            job.docs_indexed += len(changed)
+            job.docs_skipped += len(batch) - len(changed)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            logger.info(
+                f"Indexing job {self.job_id}: {job.docs_seen} documents seen, "
+                f"{job.docs_indexed} indexed, {job.docs_skipped} unchanged"
+            )
+
+    def _replace_documents(self, docs: list[Document]):
+        # Removing the document's nodes first also cleans up after a run that stopped
+        # between writing the nodes and recording the document
+        for doc in docs:
+            self.index.delete_ref_doc(doc.doc_id, delete_from_docstore=True)
+        nodes = run_transformations(docs, self.transformations)
+        self.index.insert_nodes(nodes)
+
+    def _update_job(self, **values) -> IndexingJob:
+        with Session(self.db_engine) as session:
+            job = session.get(IndexingJob, self.job_id)
+            for key, value in values.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
@@ -0,0 +1,198 @@
+# Answers queries against the RAG service's indexes without blocking the event loop.
+#
+# Every index's PGVectorStore shares the process's engines for the pgvector database
+# (see services.db_engine_for_url), so concurrent queries draw from one bounded pool
+# instead of each index opening its own. Queries run through LlamaIndex's async path,
+# which searches over the asyncpg engine.
+#
+# A query engine is built once per (index, top_k) and kept in an LRU of
+# RAG_QUERY_ENGINES_MAX entries. When RAG_QUERY_CACHE_TTL_SECS is set, results are also
+# cached in Redis:
+#
+#   ragquery:{index}:generation                     -> bumped when the index changes
+#   ragquery:{index}:{generation}:{query sha}:{top_k} -> the JSON result
+#
+# so changing an index orphans its cached results, which then expire. Identical queries
+# that arrive while one is already running wait for its result.
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.vector_stores.postgres import PGVectorStore
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from supercog.shared.apubsub import pubsub
+from supercog.shared.logging import logger
+from supercog.shared.services import async_db_engine_for_url, config, db_engine_for_url
+
+RAG_QUERY_CACHE_TTL_SECS = int(config.get_option("RAG_QUERY_CACHE_TTL_SECS", default=0))
+RAG_QUERY_ENGINES_MAX = int(config.get_option("RAG_QUERY_ENGINES_MAX", default=128))
+
+
+class PooledPGVectorStore(PGVectorStore):
+    """ A PGVectorStore that uses the shared engines for its database rather than
+        creating a connection pool of its own. """
+
+    def _connect(self) -> Any:
+        self._engine = db_engine_for_url(self.connection_string)
+        self._session = sessionmaker(self._engine)
+        self._async_engine = async_db_engine_for_url(self.async_connection_string)
+        self._async_session = sessionmaker(self._async_engine, class_=AsyncSession)
+
+    def close(self) -> None:
+        # The engines are shared, so there is nothing of ours to close
+        pass
+
+
+def make_vector_store(db_url: str, table_name: str, embed_dim: int = 1536) -> PooledPGVectorStore:
+    url = make_url(db_url)
+    return PooledPGVectorStore.from_params(
+        # Full URLs rather than host/port, so socket and query string options are kept
+        connection_string=url.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False),
+        async_connection_string=url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False),
+        table_name=table_name,
+        hybrid_search=True,
+        embed_dim=embed_dim,
+        hnsw_kwargs={
+            "hnsw_m": 16,
+            "hnsw_ef_construction": 64,
+            "hnsw_ef_search": 40,
+            "hnsw_dist_method": "vector_cosine_ops",
+        },
+    )
+
+
+class QueryService:
+    def __init__(
+            self,
+            get_vector_store: Callable[[str], PGVectorStore],
+            get_embed_model: Callable[[], BaseEmbedding],
+            llm: Any = None,
+            get_client=pubsub.get_client,
+            cache_ttl: int = RAG_QUERY_CACHE_TTL_SECS,
+            max_engines: int = RAG_QUERY_ENGINES_MAX,
+        ):
+        self.get_vector_store = get_vector_store
+        self.get_embed_model = get_embed_model
+        # None uses LlamaIndex's default LLM
+        self.llm = llm
+        self.get_client = get_client
+        self.cache_ttl = cache_ttl
+        self.max_engines = max_engines
+        self._engines: OrderedDict[tuple[str, int], BaseQueryEngine] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def query_engine(self, index_id: str, similarity_top_k: int) -> BaseQueryEngine:
+        key = (index_id, similarity_top_k)
+        if key in self._engines:
+            self._engines.move_to_end(key)
+            return self._engines[key]
+        vector_store = self.get_vector_store(index_id)
+        index = VectorStoreIndex.from_vector_store(
+            vector_store,
+            storage_context=StorageContext.from_defaults(vector_store=vector_store),
+            embed_model=self.get_embed_model(),
+        )
+        # Use hybrid search
+        engine = index.as_query_engine(
+            vector_store_query_mode="hybrid",
+            similarity_top_k=similarity_top_k,
+            llm=self.llm,
+        )
+        self._engines[key] = engine
+        while len(self._engines) > self.max_engines:
+            self._engines.popitem(last=False)
+        return engine
+
+    async def query(self, index_id: str, query: str, similarity_top_k: int = 1) -> dict:
+        """ Answers the query from the index, returning the response and its source nodes. """
+        if not self.cache_ttl:
+            return await self._run_query(index_id, query, similarity_top_k)
+
+        cache_key = await self._cache_key(index_id, query, similarity_top_k)
+        if cache_key is not None:
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+        self.cache_misses += 1
+
+        if cache_key in self._inflight:
+            return await asyncio.shield(self._inflight[cache_key])
+        task = asyncio.ensure_future(self._run_query(index_id, query, similarity_top_k))
+        if cache_key is not None:
+            self._inflight[cache_key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if self._inflight.get(cache_key) is task:
+                del self._inflight[cache_key]
+        if cache_key is not None:
+            await self._cache_set(cache_key, result)
+        return result
+
+    async def invalidate(self, index_id: str):
+        """ Forgets the index's query engines and cached results, after it has changed. """
+        for key in [key for key in self._engines if key[0] == index_id]:
+            del self._engines[key]
+        if self.cache_ttl:
+            try:
+                client = await self.get_client()
+                await client.incr(self._generation_key(index_id))
+            except Exception as e:
+                logger.warn(f"Failed to invalidate cached queries of index {index_id}: {e}")
+
+    async def _run_query(self, index_id: str, query: str, similarity_top_k: int) -> dict:
+        response = await self.query_engine(index_id, similarity_top_k).aquery(query)
+        return {
+            "query": query,
+            "response": str(response),
+            "source_nodes": [
+                {
+                    "text": node.node.text,
+                    "score": node.score,
+                    "metadata": node.node.metadata
+                } for node in response.source_nodes
+            ]
+        }
+
+    @staticmethod
+    def _generation_key(index_id: str) -> str:
+        return f"ragquery:{index_id}:generation"
+
+    async def _cache_key(self, index_id: str, query: str, similarity_top_k: int) -> Optional[str]:
+        # The cache only saves work, so it being unavailable mustn't fail the query
+        try:
+            client = await self.get_client()
+            generation = int(await client.get(self._generation_key(index_id)) or 0)
+        except Exception as e:
+            logger.warn(f"Query cache lookup failed: {e}")
+            return None
+        digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        return f"ragquery:{index_id}:{generation}:{digest}:{similarity_top_k}"
+
+    async def _cache_get(self, cache_key: str) -> Optional[dict]:
+        try:
+            client = await self.get_client()
+            cached = await client.get(cache_key)
+        except Exception as e:
+            logger.warn(f"Query cache lookup failed: {e}")
+            return None
+        return json.loads(cached) if cached else None
+
+    async def _cache_set(self, cache_key: str, result: dict):
+        try:
+            client = await self.get_client()
+            await client.set(cache_key, json.dumps(result, default=str), ex=self.cache_ttl)
+        except Exception as e:
+            logger.warn(f"Query cache write failed: {e}")
@@ -1,6 +1,6 @@
 import asyncio
 from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
-from sqlmodel import SQLModel, Field, Session, create_engine, select, or_
+from sqlmodel import SQLModel, Field, Session, select, or_
 from typing import List
 import traceback
 import uuid
@@ -8,25 +8,80 @@ import pandas as pd
 import json
 from collections import defaultdict
 
-from supercog.shared.services import config, serve, db_connect
-from supercog.engine.db import lifespan_manager, Agent, get_session, DocSourceConfig, DocIndex, DocSource
+from supercog.shared.services import config, serve, db_connect, async_db_engine_for_url
+from supercog.engine.db import lifespan_manager, Agent, get_session, DocSourceConfig, DocIndex, IndexingJob
 from supercog.engine.doc_source_factory import DocSourceFactory
 from supercog.engine.run_context import RunContext, ContextInit
+from supercog.engine.embedding_cache import embedding_cache, embedding_namespace
+from supercog.rag.indexer import StreamingIndexer
+from supercog.rag.query import QueryService, make_vector_store
 
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Document, StorageContext
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.vector_stores.postgres import PGVectorStore
 import openai
-from sqlalchemy import make_url, text
+from sqlalchemy import text
 
 app = FastAPI(lifespan=lifespan_manager)
 SERVICE = "ragservice"
 
-# In-memory job storage (replace with a database in production)
-indexing_jobs = {}
-
 def make_index_name(index_id: str, prefix="idx_"):
     return prefix + index_id.replace("-", "_")
 
+# One vector store per index, so requests share its connection pool
+_vector_stores: dict[str, PGVectorStore] = {}
+
+def get_vector_store(index_id: str) -> PGVectorStore:
+    index_name = make_index_name(index_id)
+    if index_name not in _vector_stores:
+        _vector_stores[index_name] = make_vector_store(
+            config.get_global("PGVECTOR_DB_URL"),
+            index_name,
+            embed_dim=1536,  # openai embedding dimension
+        )
+    return _vector_stores[index_name]
+
+class CachedEmbedding(BaseEmbedding):
+    """ A LlamaIndex embedding model that looks up embeddings in the shared embedding
+        cache (see embedding_cache.py) before asking the wrapped model. """
+    inner: BaseEmbedding
+    namespace: str
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return embedding_cache.embed_with_cache(
+            self.namespace, [query], lambda texts: [self.inner.get_query_embedding(texts[0])]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def embed(texts: List[str]) -> List[List[float]]:
+            return [await self.inner.aget_query_embedding(texts[0])]
+        return (await embedding_cache.aembed_with_cache(self.namespace, [query], embed))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return embedding_cache.embed_with_cache(self.namespace, texts, self.inner.get_text_embedding_batch)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await embedding_cache.aembed_with_cache(self.namespace, texts, self.inner.aget_text_embedding_batch)
+
+_embed_model: BaseEmbedding|None = None
+
+def get_embed_model() -> BaseEmbedding:
+    global _embed_model
+    if _embed_model is None:
+        inner = OpenAIEmbedding(api_key=config.get_global("OPENAI_API_KEY"))
+        _embed_model = CachedEmbedding(
+            inner=inner,
+            # Same namespace as the engine's LangChain OpenAIEmbeddings, so they share embeddings
+            namespace=embedding_namespace(inner.model_name, getattr(inner, "dimensions", None)),
+        )
+    return _embed_model
+
+query_service = QueryService(get_vector_store, get_embed_model)
+
 @app.get("/hello")
 def hello(session: Session = Depends(get_session)):
     # Load the first agent
@@ -75,12 +130,13 @@ async def start_indexing(
     # Fetch and process documents
     docs_source: DocSourceFactory = DocSourceFactory.get_doc_factory(doc_source) 
 
-    job_id = str(uuid.uuid4())
-    indexing_jobs[job_id] = {"status": "started", "message": "Indexing job started"}
+    job = IndexingJob(index_id=doc_index.id, doc_source_config_id=doc_source_config.id, message="Indexing job started")
+    session.add(job)
+    session.commit()
 
-    background_tasks.add_task(index_documents, job_id, doc_index, doc_source_config, docs_source, run_context)
+    background_tasks.add_task(index_documents, job.id, doc_index, doc_source_config, docs_source, run_context)
 
-    return {"status": "Indexing started", "job_id": job_id}
+    return {"status": "Indexing started", "job_id": job.id}
 
 async def index_documents(
         job_id: str, 
@@ -91,59 +147,38 @@ async def index_documents(
     ):
     await asyncio.sleep(1.0)
     print("Now indexing documents")
-    with Session(db_connect("engine")) as session:
+    db_engine = db_connect("engine")
+    with Session(db_engine) as session:
         try:
-            # Initialize PostgreSQL vector store
-            db_url = make_url(config.get_global("PGVECTOR_DB_URL"))
             openai.api_key = config.get_global("OPENAI_API_KEY")
-            
-            index_name = make_index_name(doc_index.id or "")
-            vector_store = PGVectorStore.from_params(
-                database=db_url.database,
-                host=db_url.host,
-                password=db_url.password,
-                port=str(db_url.port or 5432),
-                user=db_url.username,
-                table_name=index_name,
-                hybrid_search=True,
-                embed_dim=1536,  # openai embedding dimension
-                hnsw_kwargs={
-                    "hnsw_m": 16,
-                    "hnsw_ef_construction": 64,
-                    "hnsw_ef_search": 40,
-                    "hnsw_dist_method": "vector_cosine_ops",
-                },
-            )
-
+            vector_store = get_vector_store(doc_index.id or "")
             storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            index = VectorStoreIndex.from_vector_store(
+                vector_store, storage_context=storage_context, embed_model=get_embed_model()
+            )
 
             # Initialize the document source
             docs_source.run_context = run_context
             docs_source.credentials = run_context.secrets
-            documents = []
             folders = doc_source_config.folder_ids
             if len(folders) == 0:
                 folders = [None]
-            for folder in folders:
-                async for doc in docs_source.get_documents(folder):
-                    # Add the document to the index
-                    documents.append(doc)
-
-            # Create the index
-            index = VectorStoreIndex.from_documents(
-                documents,
-                storage_context=storage_context,
-                show_progress=True,
-            )
+
+            async def source_documents():
+                for folder in folders:
+                    async for doc in docs_source.get_documents(folder):
+                        yield doc
+
+            # Index the documents in batches as the source yields them
+            await StreamingIndexer(db_engine, index, job_id).run(source_documents())
 
             # Update the DocIndex status
             doc_index.status = "indexed"
             session.add(doc_index)
             session.commit()
+            await query_service.invalidate(doc_index.id)
             print("INDEXING DONE")
 
-            indexing_jobs[job_id] = {"status": "completed", "message": f"Indexing completed for index {doc_index.id}"}
-
         except Exception as e:
             # Handle exceptions and update the DocIndex status
             traceback.print_exc()
@@ -151,13 +186,20 @@ async def index_documents(
             doc_index.error_message = str(e)
             session.add(doc_index)
             session.commit()
-            indexing_jobs[job_id] = {"status": "error", "message": f"Error during indexing: {str(e)}"}
 
 @app.get("/indexing_job/{job_id}")
-async def get_indexing_job_status(job_id: str):
-    if job_id not in indexing_jobs:
+async def get_indexing_job_status(job_id: str, session: Session = Depends(get_session)):
+    job = session.get(IndexingJob, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Indexing job not found")
-    return indexing_jobs[job_id]
+    return {
+        "status": job.status,
+        "message": job.message,
+        "docs_seen": job.docs_seen,
+        "docs_indexed": job.docs_indexed,
+        "docs_skipped": job.docs_skipped,
+        "updated_at": job.updated_at,
+    }
 
 @app.get("/indexing_job/{job_id}/tail")
 async def tail_indexing_job(job_id: str, session: Session = Depends(get_session)):
@@ -171,32 +213,15 @@ async def detach_docsource_from_index(
     session: Session = Depends(get_session)
 ):
     try:
-        # Initialize PostgreSQL vector store
-        db_url = make_url(config.get_global("PGVECTOR_DB_URL"))
-        index_name = make_index_name(index_id)
-        vector_store = PGVectorStore.from_params(
-            database=db_url.database,
-            host=db_url.host,
-            password=db_url.password,
-            port=str(db_url.port or 5432),
-            user=db_url.username,
-            table_name=index_name,
-            hybrid_search=True,
-            embed_dim=1536,
-            hnsw_kwargs={
-                    "hnsw_m": 16,
-                    "hnsw_ef_construction": 64,
-                    "hnsw_ef_search": 40,
-                    "hnsw_dist_method": "vector_cosine_ops",
-                },
-        )
-
+        vector_store = get_vector_store(index_id)
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
-
+        index = VectorStoreIndex.from_vector_store(
+            vector_store, storage_context=storage_context, embed_model=get_embed_model()
+        )
 
-        index.delete(doc_id)
 
+        await asyncio.to_thread(index.delete, doc_id)
+        await query_service.invalidate(index_id)
 
         return {"message": f"Successfully detached doc_source {doc_id} from index {index_id}"}
 
@@ -216,49 +241,8 @@ async def query_index(
     session: Session = Depends(get_session)
 ):
 
-    # Initialize PostgreSQL vector store
-    db_url = make_url(config.get_global("PGVECTOR_DB_URL"))
     openai.api_key = config.get_global("OPENAI_API_KEY")
-    
-    index_name = make_index_name(index_id) #I assume index_id will be passed to endpoint
-    vector_store = PGVectorStore.from_params(
-        database=db_url.database,
-        host=db_url.host,
-        password=db_url.password,
-        port=str(db_url.port or 5432),
-        user=db_url.username,
-        table_name=index_name,
-        hybrid_search=True,
-        embed_dim=1536,  # openai embedding dimension
-        hnsw_kwargs={
-            "hnsw_m": 16,
-            "hnsw_ef_construction": 64,
-            "hnsw_ef_search": 40,
-            "hnsw_dist_method": "vector_cosine_ops",
-        },
-    )
-
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
-
-    # Use hybrid search
-    query_engine = index.as_query_engine(
-        vector_store_query_mode="hybrid",
-        similarity_top_k=similarity_top_k,
-    )
-    response = query_engine.query(query)
-
-    return {
-        "query": query,
-        "response": str(response),
-        "source_nodes": [
-            {
-                "text": node.node.text,
-                "score": node.score,
-                "metadata": node.node.metadata
-            } for node in response.source_nodes
-        ]
-    }
+    return await query_service.query(index_id, query, similarity_top_k)
 
 @app.get("/index/{index_id}/metadata")
 async def list_index_metadata(
@@ -268,13 +252,11 @@ async def list_index_metadata(
     session: Session = Depends(get_session)
 ):
 
-    # Initialize PostgreSQL connection
-    db_url = make_url(config.get_global("PGVECTOR_DB_URL"))
     index_name = make_index_name(index_id, prefix="data_idx_") #It seems llamaindex adds "data_" in front of table name
 
-    # Connect to the database
-    engine = create_engine(db_url)
-    with engine.connect() as connection:
+    # The shared async engine, so requests reuse pooled connections
+    engine = async_db_engine_for_url(config.get_global("PGVECTOR_DB_URL"))
+    async with engine.connect() as connection:
         # Query to fetch metadata
         query = text(f"""
             SELECT DISTINCT ON (metadata_->>'file_name') metadata_
@@ -283,9 +265,16 @@ async def list_index_metadata(
             LIMIT :limit OFFSET :offset
         """)
         
-        result = connection.execute(query, {"limit": limit, "offset": offset})
+        result = await connection.execute(query, {"limit": limit, "offset": offset})
         rows = result.fetchall()
 
+        # Get total count of unique files
+        count_query = text(f"""
+            SELECT COUNT(DISTINCT metadata_->>'file_name') as count
+            FROM {index_name}
+        """)
+        total_documents = (await connection.execute(count_query)).scalar()
+
     # Process the results
     metadata_summary = []
     for row in rows:
@@ -303,14 +292,6 @@ async def list_index_metadata(
         }
         metadata_summary.append(summary)
 
-    # Get total count of unique files
-    with engine.connect() as connection:
-        count_query = text(f"""
-            SELECT COUNT(DISTINCT metadata_->>'file_name') as count
-            FROM {index_name}
-        """)
-        total_documents = connection.execute(count_query).scalar()
-
     return {
         "index_id": index_id,
         "total_documents": total_documents,
@@ -0,0 +1,61 @@
+import pytest
+from langchain_core.tools import tool
+
+from supercog.engine import agent_cache
+
+class FakeLLM:
+    instances = 0
+
+    def __init__(self, **kwargs):
+        FakeLLM.instances += 1
+        self.kwargs = kwargs
+        self.tools = []
+
+    def bind_tools(self, tools):
+        bound = FakeLLM(**self.kwargs)
+        bound.tools = tools
+        return bound
+
+def search(query: str) -> str:
+    """ Search the web for the query. """
+    return query
+
+def make_lookup(doc: str):
+    def lookup(key: str) -> str:
+        return key
+    lookup.__doc__ = doc
+    return lookup
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    agent_cache.clear()
+    yield
+    agent_cache.clear()
+
+def test_tool_args_schema_is_shared():
+    s1 = agent_cache.get_tool_args_schema(search, lambda: tool(search).args_schema)
+    s2 = agent_cache.get_tool_args_schema(search, lambda: tool(search).args_schema)
+    assert s1 is s2
+    assert agent_cache.stats()["tool_args_schemas"]["hits"] == 1
+
+    # Same function code but a different docstring is a different tool
+    f1, f2 = make_lookup("Look up a key."), make_lookup("Look up a value.")
+    assert agent_cache.get_tool_args_schema(f1, lambda: tool(f1).args_schema) is not \
+        agent_cache.get_tool_args_schema(f2, lambda: tool(f2).args_schema)
+
+def test_bound_llm_reused_until_settings_change():
+    tools = [tool(search)]
+    settings = {"model": "gpt-4o-mini", "temperature": 0, "api_key": "sk-one"}
+    llm1 = agent_cache.get_bound_llm(FakeLLM, settings, tools)
+    llm2 = agent_cache.get_bound_llm(FakeLLM, dict(settings), [tool(search)])
+    assert llm1 is llm2
+    assert llm1.tools[0]["function"]["name"] == "search"
+
+    # A new API key, model or tool set compiles a new LLM
+    assert agent_cache.get_bound_llm(FakeLLM, settings | {"api_key": "sk-two"}, tools) is not llm1
+    assert agent_cache.get_bound_llm(FakeLLM, settings | {"model": "gpt-4o"}, tools) is not llm1
+    assert agent_cache.get_bound_llm(FakeLLM, settings, tools + [tool(make_lookup("Look up."))]) is not llm1
+
+def test_api_keys_are_not_stored_in_keys():
+    agent_cache.get_bound_llm(FakeLLM, {"model": "m", "api_key": "sk-secret"}, [])
+    assert not any("sk-secret" in str(key) for key in agent_cache._bound_llms._items)
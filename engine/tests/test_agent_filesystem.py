@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import pytest
+
+from supercog.engine import filesystem
+from supercog.engine.filesystem import (
+    AgentFilesystem,
+    agent_builtins,
+    current_filesystem,
+    get_agent_filesystem,
+    unrestricted_filesystem,
+    user_working_directory,
+)
+
+@pytest.fixture
+def system_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(filesystem, "SYSTEM_ROOT_PATH", str(tmp_path))
+    return tmp_path
+
+def test_confined_to_user_directory(system_root):
+    with get_agent_filesystem("t1", "u1") as fs:
+        assert current_filesystem() is fs
+        with fs.open("notes.txt", "w") as f:
+            f.write("hello")
+        assert os.path.exists(system_root / "t1" / "u1" / "notes.txt")
+        assert fs.exists("notes.txt") and "notes.txt" in fs.listdir()
+
+        fs.makedirs("reports/2024", exist_ok=True)
+        assert fs.path("reports/2024") == str((system_root / "t1" / "u1" / "reports" / "2024").resolve())
+
+        # The tenant's shared folder is reachable through the user's "shared" link
+        with fs.open("shared/team.txt", "w") as f:
+            f.write("for everyone")
+        assert os.path.exists(system_root / "t1" / "shared" / "team.txt")
+
+        for path in ["../u2/secret.txt", str(system_root / "t1" / "u2"), "/root/.bashrc", "../u1x/file"]:
+            with pytest.raises(PermissionError):
+                fs.open(path)
+            assert not fs.exists(path)
+
+    # Outside of a run there is no filesystem, unless it is asked for
+    with pytest.raises(PermissionError):
+        current_filesystem()
+    with unrestricted_filesystem():
+        assert current_filesystem().is_allowed("/root/.bashrc")
+
+def test_symlinks_out_of_the_directory_are_refused(tmp_path):
+    user_dir = tmp_path / "user"
+    user_dir.mkdir()
+    (tmp_path / "private.txt").write_text("private")
+    os.symlink(tmp_path / "private.txt", user_dir / "link.txt")
+
+    fs = AgentFilesystem(str(user_dir))
+    with pytest.raises(PermissionError):
+        fs.open("link.txt")
+
+def test_resolved_paths_are_cached(tmp_path):
+    fs = AgentFilesystem(str(tmp_path), cache_size=2)
+    fs.path("a.txt")
+    fs.path("b.txt")
+    assert list(fs._resolved) == ["a.txt", "b.txt"]
+    fs.path("a.txt")
+    fs.path("c.txt")
+    # Least recently used entry is dropped
+    assert list(fs._resolved) == ["a.txt", "c.txt"]
+
+def test_unrestricted_keeps_the_run_directory(system_root):
+    with get_agent_filesystem("t1", "u1") as fs:
+        with unrestricted_filesystem():
+            unrestricted = current_filesystem()
+            assert unrestricted.path("out.png") == os.path.join(fs.user_dir, "out.png")
+            assert unrestricted.is_allowed("/root/.bashrc")
+        assert current_filesystem() is fs
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_are_isolated(system_root):
+    async def run(user_id: str) -> list[str]:
+        with get_agent_filesystem("t1", user_id):
+            seen = []
+            for i in range(5):
+                with current_filesystem().open(f"file{i}.txt", "w") as f:
+                    f.write(user_id)
+                # Let the other run switch in, and read from a worker thread too
+                await asyncio.sleep(0)
+                seen.append(await asyncio.to_thread(lambda: current_filesystem().user_dir))
+            return seen
+
+    dirs1, dirs2 = await asyncio.gather(run("u1"), run("u2"))
+    assert set(dirs1) == {str((system_root / "t1" / "u1").resolve())}
+    assert set(dirs2) == {str((system_root / "t1" / "u2").resolve())}
+    assert (system_root / "t1" / "u2" / "file3.txt").read_text() == "u2"
+
+def test_user_working_directory(system_root):
+    cwd = os.getcwd()
+    for user_id in ["u1", "u2"]:
+        with get_agent_filesystem("t1", user_id):
+            with user_working_directory():
+                # As the interpreter tool's code would
+                with open("out.txt", "w") as f:
+                    f.write(user_id)
+    assert os.getcwd() == cwd
+    assert (system_root / "t1" / "u1" / "out.txt").read_text() == "u1"
+    assert (system_root / "t1" / "u2" / "out.txt").read_text() == "u2"
+
+def test_agent_code_is_confined(system_root):
+    (system_root / "secret.txt").write_text("other tenant")
+    sandbox = {"__builtins__": agent_builtins()}
+    with get_agent_filesystem("t1", "u1"):
+        exec("with open('notes.txt', 'w') as f: f.write('mine')", sandbox)
+        exec("import os, io\nfrom os.path import exists\nfound = (os.listdir('.'), exists('notes.txt'), io.open('notes.txt').read())", sandbox)
+        assert "notes.txt" in sandbox["found"][0] and sandbox["found"][1:] == (True, "mine")
+
+        secret = str(system_root / "secret.txt")
+        for code in [
+            f"open({secret!r})",
+            f"import io; io.open({secret!r})",
+            f"import os; os.open({secret!r}, os.O_RDONLY)",
+            f"import os.path; os.listdir({str(system_root)!r})",
+            "open(0)",
+        ]:
+            with pytest.raises(PermissionError):
+                exec(code, sandbox)
+        exec(f"import os.path as p; hidden = not p.exists({secret!r})", sandbox)
+        assert sandbox["hidden"]
+
+    # The agent's code can't use files once the run is over
+    with pytest.raises(PermissionError):
+        exec("open('notes.txt')", sandbox)
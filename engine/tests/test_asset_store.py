@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from supercog.engine.asset_store import AssetStore, LocalBlobBackend
+
+def make_store(tmp_path, **kwargs) -> AssetStore:
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    async def get_client():
+        return client
+
+    return AssetStore(backend=LocalBlobBackend(str(tmp_path / "assets")), get_client=get_client, **kwargs)
+
+def blob_files(tmp_path) -> list[str]:
+    return [name for _, _, files in os.walk(tmp_path / "assets") for name in files]
+
+@pytest.mark.asyncio
+async def test_identical_content_is_stored_once(tmp_path):
+    store = make_store(tmp_path)
+    content = b"a,b\n" * 1000
+    d1 = await store.put("t1", "t1/u1/dataframe:sales", content, "application/pickle")
+    d2 = await store.put("t1", "t1/u2/dataframe:copy", content, "application/pickle")
+    assert d1["sha256"] == d2["sha256"] and d1["size"] == len(content)
+    assert len(blob_files(tmp_path)) == 1
+    assert await store.tenant_usage("t1") == len(content)
+
+    # Redis only holds the descriptor
+    client = await store.get_client()
+    assert len(await client.get("t1/u1/dataframe:sales")) < 200
+    assert await store.get("t1/u2/dataframe:copy") == (content, "application/pickle")
+    assert await store.get("t1/u1/missing") == (None, None)
+
+@pytest.mark.asyncio
+async def test_reads_byte_ranges(tmp_path):
+    store = make_store(tmp_path)
+    await store.put("t1", "t1/u1/preview_1", "0123456789", "text/plain")
+    descriptor = await store.get_descriptor("t1/u1/preview_1")
+    assert await store.read(descriptor, 2, 5) == b"234"
+    assert await store.read(descriptor, 7) == b"789"
+
+@pytest.mark.asyncio
+async def test_least_recently_used_blobs_are_evicted_over_quota(tmp_path):
+    store = make_store(tmp_path, quota_bytes=250)
+    for name in ["a", "b", "c"]:
+        await store.put("t1", f"t1/u1/{name}", name * 100, "text/plain")
+        # Touch "a", so "b" is the least recently used
+        await store.get("t1/u1/a")
+
+    assert await store.tenant_usage("t1") == 200
+    assert (await store.get("t1/u1/b")) == (None, None)
+    assert (await store.get("t1/u1/a"))[0] == b"a" * 100
+    assert (await store.get("t1/u1/c"))[0] == b"c" * 100
+    assert len(blob_files(tmp_path)) == 2
+
+    # Quotas are per tenant
+    await store.put("t2", "t2/u1/a", "a" * 200, "text/plain")
+    assert await store.tenant_usage("t2") == 200
+    assert await store.tenant_usage("t1") == 200
+
+def test_s3_backend_reads_ranges():
+    moto = pytest.importorskip("moto")
+    import boto3
+    from supercog.engine.asset_store import S3BlobBackend
+
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        s3.create_bucket(Bucket="assets-bucket")
+        backend = S3BlobBackend("assets-bucket", s3_client=s3)
+        backend.put("t1/ab/abc", b"0123456789")
+        assert backend.exists("t1/ab/abc") and not backend.exists("t1/ab/missing")
+        assert backend.read("t1/ab/abc", 2, 5) == b"234"
+        assert backend.read("t1/ab/abc") == b"0123456789"
+        assert backend.read("t1/ab/missing") is None
+        backend.delete("t1/ab/abc")
+        assert not backend.exists("t1/ab/abc")
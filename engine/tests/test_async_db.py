@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+from sqlmodel import SQLModel, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from supercog.shared.services import (
+    db_connect,
+    async_db_connect,
+    async_db_url,
+    metered_pool_class,
+)
+from supercog.engine.db import Agent, Run, RunLog, load_first_run_logs
+
+def test_one_engine_per_database():
+    assert db_connect("engine") is db_connect("engine")
+    assert async_db_connect("engine") is async_db_connect("engine")
+    assert async_db_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert async_db_url("postgresql+psycopg2://host/db") == "postgresql+asyncpg://host/db"
+    assert async_db_url("sqlite:////tmp/x.db") == "sqlite+aiosqlite:////tmp/x.db"
+
+def test_pool_metrics_count_waiters(tmp_path):
+    pool_class = metered_pool_class(QueuePool)
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/pool.db", poolclass=pool_class, pool_size=1, max_overflow=0, pool_timeout=0.2,
+    )
+    metrics = pool_class.metrics
+    conn = engine.connect()
+    waiting = threading.Thread(target=lambda: engine.connect().close())
+    waiting.start()
+    while metrics.waiters == 0:
+        pass
+    assert metrics.stats(engine.pool)["checked_out"] == 1
+    conn.close()
+    waiting.join()
+
+    stats = metrics.stats(engine.pool)
+    assert stats["waiters"] == 0 and stats["max_waiters"] == 1
+    assert stats["checkouts"] == 2 and stats["max_wait_ms"] > 0
+
+    conn = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    conn.close()
+    assert metrics.stats(engine.pool)["timeouts"] == 1
+
+def test_load_first_run_logs(tmp_path):
+    url = f"sqlite:///{tmp_path}/runs.db"
+    sync_engine = create_engine(url)
+    SQLModel.metadata.create_all(sync_engine, tables=[Agent.__table__, Run.__table__, RunLog.__table__])
+    with Session(sync_engine) as session:
+        session.add(Agent(id="agent1", name="Test agent", user_id="u1", tenant_id="t1"))
+        runs = [Run(agent_id="agent1", tenant_id="t1", user_id="u1") for _ in range(3)]
+        session.add_all(runs)
+        session.commit()
+        run_ids = [str(run.id) for run in runs]
+        for run_id in run_ids[:2]:
+            for content in ("first", "second"):
+                session.add(RunLog(run_id=run_id, agent_id="agent1", user_id="u1", type="input", content=content))
+        session.commit()
+
+    async def run_test():
+        engine = create_async_engine(async_db_url(url))
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            loaded = (await session.exec(select(Run))).all()
+            await load_first_run_logs(session, loaded)
+        await engine.dispose()
+        return loaded
+
+    loaded = asyncio.run(run_test())
+    first = {str(run.id): run.run_log for run in loaded}
+    assert first[run_ids[0]].content == "first"
+    assert first[run_ids[1]].content == "first"
+    assert first[run_ids[2]] is None
+    # Serializing doesn't need the (closed) session any more
+    dumped = {run["id"]: run["run_log"] for run in (r.model_dump(mode="json") for r in loaded)}
+    assert dumped[run_ids[0]]["content"] == "first"
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel, Session, select
+
+from supercog.shared.apubsub import AgentOutputEvent, TokenUsageEvent
+from supercog.engine.chat_logger import ChatLogger
+from supercog.engine.db import Agent, Run, RunLog
+
+@pytest.fixture
+def logger_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/logs.db")
+    SQLModel.metadata.create_all(engine, tables=[Agent.__table__, Run.__table__, RunLog.__table__])
+    chat_logger = ChatLogger()
+    chat_logger.engine = engine
+    return chat_logger, engine
+
+def make_run(engine) -> Run:
+    with Session(engine) as session:
+        session.add(Agent(id="agent1", name="Test agent", user_id="u1", tenant_id="t1"))
+        run = Run(agent_id="agent1", tenant_id="t1", user_id="u1")
+        session.add(run)
+        session.commit()
+        session.refresh(run)
+        return run
+
+def event_dict(event, run_id: str) -> dict:
+    return RunLog.from_agent_event(event).model_dump() | {"run_id": run_id}
+
+def test_events_are_batched_until_flush(logger_db):
+    chat_logger, engine = logger_db
+    run = make_run(engine)
+    run_id = str(run.id)
+
+    async def run_test():
+        for i in range(10):
+            event = AgentOutputEvent(agent_id="agent1", user_id="u1", run_id=run_id, str_result=f"tok{i}")
+            await chat_logger.receive_message(event.type, event_dict(event, run_id))
+        for tokens in (10, 20):
+            event = TokenUsageEvent(
+                agent_id="agent1", user_id="u1", run_id=run_id,
+                usage_metadata={"input_tokens": tokens, "output_tokens": 1},
+            )
+            await chat_logger.receive_message(event.type, event_dict(event, run_id))
+
+        assert chat_logger.stats()["queue_depth"] == 12
+        # Reading history flushes our own pending writes first
+        history = await chat_logger.retrieve_run_history(run_id)
+        assert len(history) == 12
+
+    asyncio.run(run_test())
+
+    stats = chat_logger.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["flushes"] == 1 and stats["rows_written"] == 12
+    with Session(engine) as session:
+        run = session.get(Run, run.id)
+        assert (run.input_tokens, run.output_tokens) == (30, 2)
+
+def test_failed_flush_keeps_events(logger_db):
+    chat_logger, engine = logger_db
+    run_id = str(uuid.uuid4())
+
+    async def run_test():
+        event = AgentOutputEvent(agent_id="agent1", user_id="u1", run_id=run_id, str_result="hello")
+        await chat_logger.receive_message(event.type, event_dict(event, run_id))
+        RunLog.__table__.drop(engine)
+        with pytest.raises(Exception):
+            await chat_logger.flush()
+        assert chat_logger.stats()["queue_depth"] == 1
+
+        RunLog.__table__.create(engine)
+        await chat_logger.stop()
+
+    asyncio.run(run_test())
+    with Session(engine) as session:
+        assert len(session.exec(select(RunLog)).all()) == 1
+    assert chat_logger.stats()["flush_errors"] == 1
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def any_logger_db(request, tmp_path):
+    schema = None
+    if request.param == "postgres":
+        if not os.environ.get("PGVECTOR_DB_URL"):
+            pytest.skip("PGVECTOR_DB_URL is not set")
+        # The tables go in a schema of their own, so the database's own tables are left alone
+        schema = f"test_chat_logger_{uuid.uuid4().hex}"
+        with create_engine(os.environ["PGVECTOR_DB_URL"]).begin() as conn:
+            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+        engine = create_engine(os.environ["PGVECTOR_DB_URL"], connect_args={"options": f"-csearch_path={schema}"})
+    else:
+        engine = create_engine(f"sqlite:///{tmp_path}/logs.db")
+    SQLModel.metadata.create_all(engine, tables=[Agent.__table__, Run.__table__, RunLog.__table__])
+    chat_logger = ChatLogger()
+    chat_logger.engine = engine
+    yield chat_logger, engine
+    engine.dispose()
+    if schema:
+        with create_engine(os.environ["PGVECTOR_DB_URL"]).begin() as conn:
+            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+
+def test_rejected_logs_do_not_block_the_others(any_logger_db):
+    chat_logger, engine = any_logger_db
+    run = make_run(engine)
+    run_id = str(run.id)
+
+    async def run_test():
+        for i in range(20):
+            event = AgentOutputEvent(agent_id="agent1", user_id="u1", run_id=run_id, str_result=f"tok{i}")
+            await chat_logger.receive_message(event.type, event_dict(event, run_id))
+            if i in (3, 11):
+                # A row the database won't take: NUL bytes (which COPY refuses) and no run
+                bad = event_dict(event, run_id) | {"content": "bad\x00", "run_id": None}
+                chat_logger.buffer.append({key: bad.get(key) for key in chat_logger.buffer[0]})
+        event = TokenUsageEvent(
+            agent_id="agent1", user_id="u1", run_id=run_id, usage_metadata={"input_tokens": 5, "output_tokens": 1},
+        )
+        await chat_logger.receive_message(event.type, event_dict(event, run_id))
+        await chat_logger.flush()
+
+    asyncio.run(run_test())
+    stats = chat_logger.stats()
+    assert stats["queue_depth"] == 0
+    assert (stats["flush_errors"], stats["dropped"], stats["rows_written"]) == (1, 2, 21)
+    with Session(engine) as session:
+        logs = session.exec(select(RunLog).order_by(RunLog.id)).all()
+        outputs = [log.content for log in logs if log.type == "output"]
+        assert len(outputs) == 20 and all(f'"tok{i}"' in outputs[i] for i in range(20))
+        run = session.get(Run, run.id)
+        assert (run.input_tokens, run.output_tokens) == (5, 1)
@@ -0,0 +1,77 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from supercog.engine import consumer_registry
+from supercog.engine.consumer_registry import ConsumerRegistry
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(consumer_registry, "time", clock)
+    return clock
+
+@pytest.fixture
+def registry():
+    return ConsumerRegistry(fakeredis.aioredis.FakeRedis(decode_responses=True), alive_secs=15)
+
+@pytest.mark.asyncio
+async def test_heartbeats_register_consumers_per_tenant(registry, clock):
+    await registry.heartbeat("w1", ["t1", "t2"])
+    await registry.heartbeat("w2", ["t2"])
+
+    assert await registry.live_consumers("t1") == ["w1"]
+    assert sorted(await registry.live_consumers("t2")) == ["w1", "w2"]
+    assert not await registry.has_live_consumer("t3")
+    assert await registry.worker_counts() == {
+        "live_consumers": 2, "total_registered": 2, "tenants": {"t1": 1, "t2": 2},
+    }
+
+    await registry.remove("w1", ["t1", "t2"])
+    assert not await registry.has_live_consumer("t1")
+    assert await registry.live_consumers("t2") == ["w2"]
+
+@pytest.mark.asyncio
+async def test_consumers_that_stop_heartbeating_expire(registry, clock):
+    await registry.heartbeat("w1", ["t1"])
+    await registry.heartbeat("w2", ["t1"])
+
+    clock.now += 10
+    await registry.heartbeat("w2", ["t1"])
+    assert await registry.has_live_consumer("t1")
+
+    # w1 hasn't heartbeated for 16 seconds, w2 for 6
+    clock.now += 6
+    assert await registry.live_consumers("t1") == ["w2"]
+    assert (await registry.worker_counts())["live_consumers"] == 1
+
+    clock.now += 10
+    assert not await registry.has_live_consumer("t1")
+    # Expired consumers stay registered until they're reaped
+    assert (await registry.worker_counts())["total_registered"] == 2
+
+@pytest.mark.asyncio
+async def test_reaping_removes_only_dead_consumers(registry, clock):
+    await registry.heartbeat("w1", ["t1"])
+    clock.now += 10
+    await registry.heartbeat("w2", ["t1", "t2"])
+    clock.now += 10
+
+    assert await registry.reap_dead_consumers() == 1
+    assert await registry.worker_counts() == {
+        "live_consumers": 1, "total_registered": 1, "tenants": {"t1": 1, "t2": 1},
+    }
+    assert await registry.redis.hkeys(consumer_registry.CONSUMER_STREAMS_KEY) == ["w2"]
+    assert await registry.redis.zrange(consumer_registry.tenant_consumers_key("t1"), 0, -1) == ["w2"]
+    assert await registry.reap_dead_consumers() == 0
+
+    # A consumer that heartbeats again after being reaped is live again
+    await registry.heartbeat("w1", ["t1"])
+    assert sorted(await registry.live_consumers("t1")) == ["w1", "w2"]
@@ -0,0 +1,88 @@
+import decimal
+import os
+import time
+
+import pyarrow as pa
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from supercog.engine.database_engines import EnginePool, execute_streaming, rows_to_batch, statement_timeout
+
+@pytest.fixture
+def pool():
+    pool = EnginePool(max_engines=2, idle_secs=600, pool_size=1)
+    yield pool
+    pool.dispose_all()
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def db_url(request, tmp_path):
+    if request.param == "postgres":
+        if not os.environ.get("PGVECTOR_DB_URL"):
+            pytest.skip("PGVECTOR_DB_URL is not set")
+        return os.environ["PGVECTOR_DB_URL"]
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+def test_engines_are_shared_per_url(pool, tmp_path):
+    urls = [f"sqlite:///{tmp_path / name}.db" for name in ["a", "b", "c"]]
+    engine = pool.get(urls[0])
+    assert pool.get(urls[0]) is engine
+    pool.get(urls[1])
+    pool.get(urls[0])
+    # Past max_engines the least recently used engine goes
+    pool.get(urls[2])
+    assert list(pool._engines) == [urls[0], urls[2]]
+    assert pool.stats() == {"engines": 2, "created": 3, "reused": 2}
+
+    pool.idle_secs = 0
+    time.sleep(0.01)
+    pool.get(urls[1])
+    assert list(pool._engines) == [urls[1]]
+
+def test_queries_are_streamed(pool, db_url):
+    engine = pool.get(db_url)
+    series = (
+        "SELECT i, 'row ' || i AS label FROM generate_series(1, 25000) AS s(i)"
+        if engine.dialect.name == "postgresql" else
+        "WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < 25000) SELECT i, 'row ' || i AS label FROM s"
+    )
+    with engine.begin() as connection, statement_timeout(connection, 30):
+        result = execute_streaming(connection, f"-- all the rows\n{series}", fetch_rows=10000)
+        if engine.dialect.name == "postgresql":
+            # A named, server-side cursor
+            assert result.cursor.name
+        sizes = [len(rows) for rows in result.partitions(10000)]
+        assert sizes == [10000, 10000, 5000]
+
+        # Statements that aren't queries don't get a server-side cursor
+        execute_streaming(connection, "CREATE TEMPORARY TABLE items (id integer)")
+        result = execute_streaming(connection, "INSERT INTO items VALUES (1), (2)")
+        assert not result.returns_rows and result.rowcount == 2
+
+def test_statements_time_out(pool, db_url):
+    engine = pool.get(db_url)
+    slow = (
+        "SELECT pg_sleep(5)"
+        if engine.dialect.name == "postgresql" else
+        "WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s) SELECT count(*) FROM s"
+    )
+    start = time.monotonic()
+    with pytest.raises(OperationalError):
+        with engine.begin() as connection, statement_timeout(connection, 1):
+            execute_streaming(connection, slow).fetchall()
+    assert time.monotonic() - start < 4
+
+    # The timeout doesn't outlive the block
+    with engine.begin() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+def test_rows_to_batch():
+    batch = rows_to_batch(
+        ["id", "price", "mixed", "empty", "id"],
+        [(1, decimal.Decimal("1.50"), "a", None, 10), (2, None, 3, None, 20)],
+    )
+    assert batch.schema.names == ["id", "price", "mixed", "empty", "id"]
+    assert batch.column(1).type == pa.float64() and batch.column(1).to_pylist() == [1.5, None]
+    assert batch.column(2).to_pylist() == ["a", "3"]
+    assert batch.column(3).type == pa.string()
+    assert batch.column(4).to_pylist() == [10, 20]
@@ -0,0 +1,117 @@
+import os
+import pickle
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from supercog.engine.dataframe_store import DataFrameStore, dataframe_size
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(seed, seed + rows), "value": [float(i) for i in range(rows)]})
+
+@pytest.fixture
+def frame_size():
+    return dataframe_size(make_frame(1000))
+
+def test_large_frames_are_spilled(tmp_path, frame_size):
+    store = DataFrameStore(memory_budget=10 * frame_size, spill_threshold=frame_size, spill_root=str(tmp_path))
+    store["small"] = make_frame(10)
+    store["large"] = make_frame(1000)
+    store["text"] = "not a dataframe"
+
+    assert not store.is_spilled("small") and store.is_spilled("large")
+    assert store.resident_bytes() < frame_size and store.spilled_bytes() > 0
+    assert list(store) == ["small", "large", "text"]
+
+    # A frame still over the threshold stays spilled when it's read
+    pd.testing.assert_frame_equal(store["large"], make_frame(1000))
+    assert store.is_spilled("large") and store.load_count == 1
+    assert store.too_large_to_load("large") and not store.too_large_to_load("small")
+
+def test_least_recently_used_frames_are_spilled_over_budget(tmp_path, frame_size):
+    store = DataFrameStore(memory_budget=int(2.5 * frame_size), spill_threshold=10 * frame_size,
+                           spill_root=str(tmp_path))
+    for i, key in enumerate(["a", "b", "c"]):
+        store[key] = make_frame(1000, seed=i)
+        # Touch "a", so "b" is the least recently used
+        store["a"]
+
+    assert store.is_spilled("b")
+    assert not store.is_spilled("a") and not store.is_spilled("c")
+    assert store.resident_bytes() <= store.memory_budget
+
+    # Reading a spilled frame brings it back into memory, so "c" is spilled instead
+    pd.testing.assert_frame_equal(store["b"], make_frame(1000, seed=1))
+    assert not store.is_spilled("b") and store.is_spilled("c")
+    assert not store.too_large_to_load("c")
+
+    # Replacing or deleting a spilled frame removes its file
+    store["b"] = make_frame(10)
+    del store["c"]
+    assert os.listdir(store.spill_dir) == []
+
+def test_iterating_does_not_load_spilled_frames(tmp_path, frame_size):
+    store = DataFrameStore(spill_threshold=frame_size, spill_root=str(tmp_path))
+    store["large"] = make_frame(1000)
+    values = dict(store.items())
+    pd.testing.assert_frame_equal(values["large"], make_frame(1000))
+    assert store.is_spilled("large")
+
+def test_snapshots_hand_over_spilled_files(tmp_path, frame_size):
+    store = DataFrameStore(spill_threshold=frame_size, spill_root=str(tmp_path / "spill"))
+    store["small"] = make_frame(10)
+    store["large"] = make_frame(1000)
+    with pytest.raises(TypeError):
+        pickle.dumps(store)
+
+    state = pickle.loads(pickle.dumps(store.snapshot(str(tmp_path / "snapshot"))))
+    # The spilled frame moved into the snapshot's directory without being read
+    assert store.load_count == 0 and list(store) == ["small"]
+    assert os.listdir(tmp_path / "snapshot") == [os.path.basename(state["spilled"]["large"])]
+
+    restored = DataFrameStore(spill_threshold=frame_size, spill_root=str(tmp_path / "spill"))
+    restored.restore(state)
+    assert restored.is_spilled("large") and restored.load_count == 0
+    assert not (tmp_path / "snapshot").exists()
+    pd.testing.assert_frame_equal(restored["small"], make_frame(10))
+    pd.testing.assert_frame_equal(restored["large"], make_frame(1000))
+
+def test_duckdb_queries_spilled_frames_in_place(tmp_path, frame_size):
+    store = DataFrameStore(spill_threshold=frame_size, spill_root=str(tmp_path))
+    store["sales"] = make_frame(1000)
+
+    source = store.scan_source("sales")
+    assert isinstance(source, pa.Table) and store.is_spilled("sales")
+    with duckdb.connect() as con:
+        con.register("sales", source)
+        assert con.sql("SELECT count(*), max(id) FROM sales").fetchone() == (1000, 999)
+
+def test_close_removes_scratch_space(tmp_path, frame_size):
+    store = DataFrameStore(spill_threshold=frame_size, spill_root=str(tmp_path))
+    store["large"] = make_frame(1000)
+    spill_dir = store.spill_dir
+    assert os.path.isdir(spill_dir)
+    store.close()
+    assert not os.path.exists(spill_dir) and len(store) == 0
+
+@pytest.mark.parametrize("index", ["range", "filtered", "named"])
+def test_spilled_frames_query_like_frames_in_memory(tmp_path, frame_size, index):
+    df = make_frame(1000)
+    if index == "filtered":
+        df = df[df["id"] % 2 == 0]
+    elif index == "named":
+        df = df.set_index(pd.Index([f"row{i}" for i in range(1000)], name="label"))
+    store = DataFrameStore(spill_threshold=frame_size // 4, spill_root=str(tmp_path))
+    store["sales"] = df
+    assert store.is_spilled("sales")
+
+    with duckdb.connect() as con:
+        con.register("spilled", store.scan_source("sales"))
+        con.register("resident", df)
+        assert con.sql("DESCRIBE spilled").fetchall() == con.sql("DESCRIBE resident").fetchall()
+        assert con.sql("SELECT * FROM spilled").fetchall() == con.sql("SELECT * FROM resident").fetchall()
+
+    # Loading it back restores the index
+    pd.testing.assert_frame_equal(store["sales"], df)
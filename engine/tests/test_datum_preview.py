@@ -0,0 +1,162 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from supercog.engine.dataframe_store import DataFrameStore, dataframe_size
+from supercog.engine.datum_preview import (
+    DatumPreviewService,
+    DatumSource,
+    PreviewError,
+    RowQuery,
+    parse_filter,
+    parse_page_range,
+)
+from supercog.engine.duckdb_sessions import DuckDBSessionPool
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": range(rows),
+        "city": [["Oslo", "Lima", "100%_Pure"][i % 3] for i in range(rows)],
+        "amount": [float(i % 50) for i in range(rows)],
+    })
+
+@pytest.fixture
+def service(tmp_path):
+    sessions = DuckDBSessionPool(max_sessions=2, memory_limit="256MB", threads=1, temp_directory=str(tmp_path / "tmp"))
+    service = DatumPreviewService(sessions=sessions, cache_path=str(tmp_path / "cache"), max_rows=500)
+    yield service
+    sessions.close_all()
+
+@pytest.fixture(params=["csv", "parquet", "xlsx", "jsonl"])
+def file_source(request, tmp_path):
+    path = str(tmp_path / f"orders.{request.param}")
+    df = make_frame(1200)
+    if request.param == "csv":
+        df.to_csv(path, index=False)
+    elif request.param == "parquet":
+        df.to_parquet(path, index=False)
+    elif request.param == "xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_json(path, orient="records", lines=True)
+    return DatumSource.for_file(path)
+
+def test_pages_of_files(service, file_source):
+    page = service.rows("user1", file_source, RowQuery(offset=1000, limit=100, columns=["id", "city"]))
+    assert page.columns == ["id", "city"] and page.total_rows == 1200
+    assert page.rows["id"].tolist() == list(range(1000, 1100))
+
+    # Past the end, and capped at max_rows
+    assert len(service.rows("user1", file_source, RowQuery(offset=1150)).rows) == 50
+    assert len(service.rows("user1", file_source, RowQuery(limit=100000)).rows) == 500
+
+def test_sorting_and_filters(service):
+    source = DatumSource.for_frame(make_frame(300))
+    query = RowQuery(
+        limit=5,
+        sort="amount",
+        descending=True,
+        filters=[parse_filter("city:eq:Lima"), parse_filter("id:lt:200")],
+    )
+    page = service.rows("user1", source, query)
+    assert page.total_rows == 67
+    assert page.rows["amount"].tolist() == [49.0, 49.0, 48.0, 47.0, 46.0]
+    assert set(page.rows["city"]) == {"Lima"}
+
+    # The wildcards in a contains filter match themselves
+    page = service.rows("user1", source, RowQuery(filters=[("city", "contains", "0%_p")]))
+    assert page.total_rows == 100
+    assert service.rows("user1", source, RowQuery(filters=[("city", "contains", "_")])).total_rows == 100
+
+    for query in [RowQuery(columns=["id", "nope"]), RowQuery(sort="nope"), RowQuery(filters=[("nope", "eq", "1")])]:
+        with pytest.raises(PreviewError):
+            service.rows("user1", source, query)
+
+def test_filter_values_must_fit_the_column(service):
+    source = DatumSource.for_frame(make_frame(30))
+    query = RowQuery(filters=[parse_filter("id:eq:abc")])
+    for check in [service.rows, service.validate]:
+        with pytest.raises(PreviewError, match="id"):
+            check("user1", source, query)
+    for query in [RowQuery(sort="nope"), RowQuery(filters=[("amount", "lt", "1e")])]:
+        with pytest.raises(PreviewError):
+            service.validate("user1", source, query)
+
+    query = RowQuery(filters=[parse_filter("id:ge:25"), parse_filter("amount:lt:28.5")])
+    service.validate("user1", source, query)
+    assert service.rows("user1", source, query).rows["id"].tolist() == [25, 26, 27, 28]
+
+def test_streamed_csv(service):
+    source = DatumSource.for_frame(make_frame(2500))
+    chunks = list(service.iter_csv(source, RowQuery(offset=100, limit=2000, columns=["id", "amount"]), batch_rows=128))
+    assert len(chunks) > 1 and chunks[0].startswith("id,amount\n100,0.0\n")
+    # Capped at max_rows
+    assert sum(chunk.count("\n") for chunk in chunks) == 501
+
+    # No rows still gets a header
+    chunks = list(service.iter_csv(source, RowQuery(filters=[("city", "eq", "Paris")])))
+    assert chunks == ["id,city,amount\n"]
+
+def test_streamed_csv_files(service, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    make_frame(1200).to_csv(path, index=False)
+    chunks = list(service.iter_csv(DatumSource.for_file(path), RowQuery(offset=1000, columns=["id"]), batch_rows=64))
+    assert chunks[0].startswith("id\n1000\n")
+    assert sum(chunk.count("\n") for chunk in chunks) == 201
+
+def test_summaries_are_cached_per_version(service, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    make_frame(100).to_csv(path, index=False)
+    summary = service.summary("user1", DatumSource.for_file(path))
+    assert summary["row_count"] == 100
+    assert [column["name"] for column in summary["columns"]] == ["id", "city", "amount"]
+    assert service.summary("user1", DatumSource.for_file(path)) == summary and service.summary_hits == 1
+
+    time.sleep(0.01)
+    make_frame(150).to_csv(path, index=False)
+    assert service.summary("user1", DatumSource.for_file(path))["row_count"] == 150
+
+    # Dataframes, by their DataFrameStore version, spilled or not
+    store = DataFrameStore(spill_threshold=dataframe_size(make_frame(1000)), spill_root=str(tmp_path))
+    store["orders"] = make_frame(1000)
+    version = store.version("orders")
+    assert store.is_spilled("orders")
+    source = DatumSource.for_frame(store.scan_source("orders"), ("dataframe", "orders", version))
+    summary = service.summary("user1", source)
+    assert [column["name"] for column in summary["columns"]] == ["id", "city", "amount"]
+    assert store["orders"] is not None and store.version("orders") == version
+
+    store["orders"] = make_frame(10)
+    assert store.version("orders") != version
+    source = DatumSource.for_frame(store.scan_source("orders"), ("dataframe", "orders", store.version("orders")))
+    assert service.summary("user1", source)["row_count"] == 10
+    assert service.summary_hits == 1
+
+def test_excel_files_are_converted_once_per_version(service, tmp_path):
+    path = str(tmp_path / "orders.xlsx")
+    make_frame(20).to_excel(path, index=False)
+    assert service.rows("user1", DatumSource.for_file(path), RowQuery()).total_rows == 20
+    assert service.rows("user1", DatumSource.for_file(path), RowQuery()).total_rows == 20
+    assert len(os.listdir(service.cache_path)) == 1
+
+    time.sleep(0.01)
+    make_frame(30).to_excel(path, index=False)
+    assert service.rows("user1", DatumSource.for_file(path), RowQuery()).total_rows == 30
+    assert len(os.listdir(service.cache_path)) == 1
+
+def test_parsing():
+    assert parse_filter("url:contains:https://example.com") == ("url", "contains", "https://example.com")
+    assert parse_filter("a:b:ge:09:30") == ("a:b", "ge", "09:30")
+    assert parse_filter("name:eq:") == ("name", "eq", "")
+    for spec in ["name", "name:like:x"]:
+        with pytest.raises(PreviewError):
+            parse_filter(spec)
+
+    assert parse_page_range(None, default_count=10) == (1, 10)
+    assert parse_page_range("3") == (3, 3)
+    assert parse_page_range("3-7") == (3, 7)
+    for pages in ["0", "7-3", "a-b"]:
+        with pytest.raises(PreviewError):
+            parse_page_range(pages)
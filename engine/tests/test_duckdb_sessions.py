@@ -0,0 +1,171 @@
+import os
+import subprocess
+import sys
+import threading
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from supercog.engine import filesystem
+from supercog.engine.duckdb_sessions import DuckDBSessionPool, agent_database_path
+from supercog.engine.filesystem import get_agent_filesystem
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = DuckDBSessionPool(
+        max_sessions=3,
+        memory_limit="256MB",
+        threads=1,
+        temp_directory=str(tmp_path / "tmp"),
+    )
+    yield pool
+    pool.close_all()
+
+def write_csv(path, rows: int, value: int = 1):
+    pd.DataFrame({"id": range(rows), "value": [value] * rows}).to_csv(path, index=False)
+
+def test_runs_have_their_own_frames(pool):
+    with pool.session("run1") as session:
+        session.register_frame("sales_dataframe", pd.DataFrame({"amount": [1, 2, 3]}))
+    with pool.session("run2") as session:
+        session.register_frame("sales_dataframe", pa.table({"amount": [10, 20]}))
+
+    with pool.session("run1") as session:
+        assert session.sql("SELECT sum(amount) FROM sales_dataframe").fetchone() == (6,)
+    with pool.session("run2") as session:
+        assert session.sql("SELECT sum(amount) FROM sales_dataframe").fetchone() == (30,)
+        assert session.execute(
+            "SELECT current_setting('threads'), current_setting('memory_limit')"
+        ).fetchone() == (1, "244.1 MiB")
+    assert pool.stats() == {"sessions": 2, "opened": 2, "reused": 2}
+
+def test_csv_files_are_parsed_once(pool, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    write_csv(path, 100)
+    with pool.session("run1", str(tmp_path / "agent.db")) as session:
+        session.register_file(path, "csv", "orders")
+        session.register_file(path, "csv", "orders")
+        # Another view of the same file reads the same parsed table
+        session.register_file(path, "csv", "orders_copy")
+        assert (session.scans, session.scan_hits) == (3, 2)
+        assert session.execute("SELECT count(*), sum(value) FROM orders_copy").fetchone() == (100, 100)
+
+        write_csv(path, 50, value=2)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+        session.register_file(path, "csv", "orders")
+        assert session.execute("SELECT count(*), sum(value) FROM orders").fetchone() == (50, 100)
+
+        # The views are TEMP, so they aren't saved in the database
+        session.execute("CREATE TABLE saved AS SELECT * FROM orders")
+        tables = session.execute("SELECT table_name, temporary FROM duckdb_tables() WHERE NOT internal").fetchall()
+        assert ("saved", False) in tables
+    with pool.session("run2", str(tmp_path / "agent.db")) as session:
+        views = [name for name, in session.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()]
+        assert "orders" not in views
+        assert session.execute("SELECT count(*) FROM saved").fetchone() == (50,)
+
+def test_uncached_csv_files_are_scanned_by_each_query(pool, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    write_csv(path, 100)
+    with pool.session("run1") as session:
+        session.register_file(path, "csv", "orders", cache=False)
+        assert session.execute("SELECT count(*), sum(value) FROM orders").fetchone() == (100, 100)
+        tables = session.execute("SELECT table_name FROM duckdb_tables() WHERE NOT internal").fetchall()
+        assert tables == []
+
+def test_parquet_files_are_scanned_through_views(pool, tmp_path):
+    path = str(tmp_path / "events.parquet")
+    pd.DataFrame({"kind": ["a", "b", "a"]}).to_parquet(path)
+    with pool.session("run1") as session:
+        session.register_file(path, "parquet", "events")
+        assert session.execute("SELECT count(*) FROM events WHERE kind = 'a'").fetchone() == (2,)
+
+def test_least_recently_used_sessions_are_closed(pool):
+    for run_id in ["run1", "run2", "run3"]:
+        with pool.session(run_id) as session:
+            session.register_frame("df", pd.DataFrame({"x": [1]}))
+    with pool.session("run1"):
+        pass
+    with pool.session("run4"):
+        pass
+    assert pool.stats()["sessions"] == 3
+
+    # run2 was closed, so its frame is gone
+    with pool.session("run2") as session:
+        with pytest.raises(Exception):
+            session.sql("SELECT * FROM df")
+    with pool.session("run1") as session:
+        assert session.sql("SELECT * FROM df").fetchone() == (1,)
+
+    pool.close_run("run1")
+    assert ("run1", ":memory:") not in pool._sessions
+
+def test_sessions_in_use_are_not_closed(pool):
+    pool.idle_secs = 0
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.session("busy") as session:
+            session.register_frame("df", pd.DataFrame({"x": [1]}))
+            entered.set()
+            release.wait(5)
+            assert session.sql("SELECT * FROM df").fetchone() == (1,)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait(5)
+    with pool.session("other"):
+        pass
+    assert ("busy", ":memory:") in pool._sessions
+    release.set()
+    thread.join()
+
+def test_users_have_their_own_database_files(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(filesystem, "SYSTEM_ROOT_PATH", str(tmp_path))
+    for tenant_id, user_id in [("t1", "u1"), ("t2", "u1")]:
+        with get_agent_filesystem(tenant_id, user_id) as fs:
+            database = agent_database_path()
+            assert database == os.path.join(fs.user_dir, "duckdb.db")
+            with pool.session(f"run_{tenant_id}", database) as session:
+                session.execute("CREATE TABLE owner AS SELECT ? AS tenant", [tenant_id])
+            assert agent_database_path("data/sales.db") == os.path.join(fs.user_dir, "data", "sales.db")
+            assert agent_database_path(":memory:") == ":memory:"
+            with pytest.raises(PermissionError):
+                agent_database_path("../u2/duckdb.db")
+    pool.close_all()
+
+    for tenant_id in ["t1", "t2"]:
+        with get_agent_filesystem(tenant_id, "u1"):
+            with pool.session("reader", agent_database_path()) as session:
+                assert session.execute("SELECT tenant FROM owner").fetchall() == [(tenant_id,)]
+
+def test_frames_are_registered_for_the_call(pool):
+    with pool.session("run1") as session:
+        with session.frame("sales_dataframe", pd.DataFrame({"amount": [1, 2, 3]})) as name:
+            assert session.sql(f"SELECT sum(amount) FROM {name}").fetchone() == (6,)
+        with pytest.raises(duckdb.CatalogException):
+            session.sql("SELECT * FROM sales_dataframe")
+
+def test_idle_file_sessions_release_the_database(pool, tmp_path):
+    pool.file_idle_secs = 0
+    path = str(tmp_path / "orders.csv")
+    write_csv(path, 10)
+    database = str(tmp_path / "agent.db")
+    with pool.session("run1", database) as session:
+        session.register_file(path, "csv", "orders")
+    with pool.session("run1") as session:
+        session.execute("CREATE TEMP TABLE scratch AS SELECT 1 AS x")
+
+    pool.close_idle()
+    assert list(pool._sessions) == [("run1", ":memory:")]
+    # The database file is free for another process
+    subprocess.run([sys.executable, "-c", f"import duckdb; duckdb.connect({database!r}).close()"], check=True)
+
+    # The run's views come back when it uses the database again
+    with pool.session("run1", database) as session:
+        assert session.execute("SELECT count(*) FROM orders").fetchone() == (10,)
+    pool.close_run("run1")
+    assert not pool._sessions and not pool._closed_views
@@ -0,0 +1,79 @@
+import os
+import uuid
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from supercog.engine.embedding_cache import CachedEmbeddings, EmbeddingCache, embedding_namespace
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def cache(request, tmp_path):
+    if request.param == "postgres":
+        if not os.environ.get("PGVECTOR_DB_URL"):
+            pytest.skip("PGVECTOR_DB_URL is not set")
+        return EmbeddingCache(os.environ["PGVECTOR_DB_URL"])
+    return EmbeddingCache(f"sqlite:///{tmp_path / 'cache.db'}")
+
+@pytest.fixture
+def namespace():
+    # Unique, as the postgres cache table is shared between test runs
+    return embedding_namespace(f"fake-{uuid.uuid4().hex[:8]}", 8)
+
+def test_texts_are_only_embedded_once(cache, namespace):
+    model = CountingEmbeddings(size=8, embedded=[])
+    embeddings = CachedEmbeddings(model, namespace=namespace, cache=cache)
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    assert model.embedded == ["alpha", "beta"]
+    assert first[0] == first[2] and first[0] != first[1]
+
+    second = embeddings.embed_documents(["beta", "gamma"])
+    assert model.embedded == ["alpha", "beta", "gamma"]
+    assert second[0] == pytest.approx(first[1], rel=1e-6)
+    assert embeddings.embed_query("gamma") == pytest.approx(second[1], rel=1e-6)
+    assert model.embedded == ["alpha", "beta", "gamma"]
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 4)
+    assert stats["hit_rate"] == pytest.approx(2 / 6)
+
+@pytest.mark.asyncio
+async def test_async_embeddings_use_the_cache(cache, namespace):
+    model = CountingEmbeddings(size=8, embedded=[])
+    embeddings = CachedEmbeddings(model, namespace=namespace, cache=cache)
+    vectors = await embeddings.aembed_documents(["alpha", "beta"])
+    assert await embeddings.aembed_query("beta") == pytest.approx(vectors[1], rel=1e-6)
+    assert model.embedded == ["alpha", "beta"]
+
+    # Embeddings are namespaced by model and dimensions
+    other = CachedEmbeddings(model, namespace=namespace + "-other", cache=cache)
+    other.embed_documents(["alpha"])
+    assert model.embedded == ["alpha", "beta", "alpha"]
+
+def test_least_recently_used_embeddings_are_evicted(tmp_path, namespace):
+    # Each 8 dimension float32 embedding takes 32 bytes
+    cache = EmbeddingCache(f"sqlite:///{tmp_path / 'cache.db'}", max_bytes=32 * 3, evict_every=1)
+    model = CountingEmbeddings(size=8, embedded=[])
+    embeddings = CachedEmbeddings(model, namespace=namespace, cache=cache)
+    for text in ["a", "b", "c"]:
+        embeddings.embed_query(text)
+    # Use "a", so "b" is the least recently used
+    embeddings.embed_query("a")
+    embeddings.embed_query("d")
+
+    assert cache.evicted == 1
+    model.embedded.clear()
+    embeddings.embed_documents(["a", "c", "d"])
+    assert model.embedded == []
+    embeddings.embed_query("b")
+    assert model.embedded == ["b"]
@@ -0,0 +1,100 @@
+import os
+import time
+import uuid
+
+import pandas as pd
+import pytest
+
+from supercog.engine.engine_cache import EngineCache, estimate_engine_memory
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+class FakeEngine:
+    def __init__(self, history: list[str] = [], frames: dict = {}):
+        self.id = uuid.uuid4()
+        self.generating = False
+        self.chat_history = [FakeMessage(m) for m in history]
+        self.tools_inmem_state = dict(frames)
+
+    def snapshot_state(self, files_dir: str) -> dict:
+        return {
+            "chat_history": [m.content for m in self.chat_history],
+            "tools_inmem_state": self.tools_inmem_state,
+        }
+
+@pytest.fixture
+def cache(tmp_path):
+    return EngineCache(max_engines=2, idle_secs=60, max_memory_bytes=10**9, snapshot_dir=str(tmp_path))
+
+def test_lru_eviction(cache: EngineCache):
+    e1, e2, e3 = FakeEngine(["hi"]), FakeEngine(), FakeEngine()
+    evicted = []
+    cache.on_evict = lambda engine_id, engine: evicted.append((engine_id, engine))
+    cache[e1.id] = e1
+    cache[e2.id] = e2
+    # touch e1 so e2 becomes least recently used
+    assert cache.get(e1.id) is e1
+    cache[e3.id] = e3
+
+    assert e1.id in cache
+    assert e2.id not in cache
+    assert e3.id in cache
+    assert cache.stats()["evictions"] == 1
+    assert evicted == [(e2.id, e2)]
+    assert cache.get(e2.id) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_generating_engines_are_pinned(cache: EngineCache):
+    e1, e2, e3 = FakeEngine(), FakeEngine(), FakeEngine()
+    e1.generating = True
+    cache[e1.id] = e1
+    cache[e2.id] = e2
+    cache[e3.id] = e3
+    assert e1.id in cache
+    assert e2.id not in cache
+
+def test_idle_eviction_and_rehydrate(cache: EngineCache):
+    df = pd.DataFrame({"a": range(10)})
+    e1 = FakeEngine(["question", "answer"], {"df1": df})
+    cache[e1.id] = e1
+    cache._engines[e1.id] = (e1, time.time() - 120)
+
+    assert cache.evict_idle() == 1
+    assert e1.id not in cache
+    assert cache.has_snapshot(e1.id)
+
+    state = cache.pop_snapshot(e1.id)
+    assert state["chat_history"] == ["question", "answer"]
+    assert state["tools_inmem_state"]["df1"].equals(df)
+    # snapshots are consumed on rehydration
+    assert not cache.has_snapshot(e1.id)
+    assert cache.stats()["rehydrations"] == 1
+
+def test_snapshots_are_private(tmp_path):
+    cache = EngineCache(snapshot_dir=str(tmp_path / "snapshots"))
+    e1 = FakeEngine(["question"])
+    cache.save_snapshot(e1.id, e1)
+    assert os.stat(tmp_path / "snapshots").st_mode & 0o777 == 0o700
+    assert os.stat(tmp_path / "snapshots" / f"{e1.id}.pkl").st_mode & 0o777 == 0o600
+
+    # A snapshot that someone else could have written isn't loaded
+    os.chmod(tmp_path / "snapshots", 0o777)
+    assert cache.pop_snapshot(e1.id) is None
+    assert not cache.has_snapshot(e1.id)
+
+def test_memory_budget(tmp_path):
+    cache = EngineCache(max_engines=10, idle_secs=60, max_memory_bytes=200_000, snapshot_dir=str(tmp_path))
+    big = FakeEngine(frames={"df": pd.DataFrame({"a": range(20_000)})})
+    small = FakeEngine(["hello"])
+    assert estimate_engine_memory(big) > 150_000
+
+    cache[big.id] = big
+    cache[small.id] = small
+    # Adding a second big engine pushes us over budget, so the older one goes
+    big2 = FakeEngine(frames={"df": pd.DataFrame({"a": range(20_000)})})
+    cache[big2.id] = big2
+    assert big.id not in cache
+    assert small.id in cache
+    assert big2.id in cache
@@ -0,0 +1,91 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from supercog.engine.file_changes import (
+    ChangeIndexRegistry,
+    Inotify,
+    InotifyChangeIndex,
+    ManifestChangeIndex,
+)
+
+def write(path, text="data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def make_workspace(root) -> str:
+    workspace = str(root / "workspace")
+    for i in range(20):
+        write(os.path.join(workspace, f"dir{i % 4}", f"file{i}.txt"))
+    # Written long ago
+    past = time.time() - 3600
+    for dirpath, _, files in os.walk(workspace):
+        for name in files:
+            os.utime(os.path.join(dirpath, name), (past, past))
+    return workspace
+
+MODES = ["manifest"] + (["inotify"] if Inotify.available() else [])
+
+@pytest.mark.parametrize("mode", MODES)
+def test_reports_changes_since_last_turn(tmp_path, mode):
+    workspace = make_workspace(tmp_path)
+    registry = ChangeIndexRegistry(mode=mode)
+    manifest = str(tmp_path / "manifests" / "user.json")
+    turn_start = datetime.now() - timedelta(seconds=30)
+
+    # The first turn falls back to modification times
+    write(os.path.join(workspace, "dir1", "file1.txt"), "changed")
+    first = registry.changed_files(workspace, manifest, turn_start)
+    assert first == [os.path.join(workspace, "dir1", "file1.txt")]
+    index = registry.get_index(workspace, manifest)
+    assert isinstance(index, InotifyChangeIndex if mode == "inotify" else ManifestChangeIndex)
+
+    # Next turn: a modified file, a new file in a new directory, and a deleted file
+    write(os.path.join(workspace, "dir2", "file2.txt"), "changed again")
+    write(os.path.join(workspace, "new", "sub", "report.csv"), "a,b")
+    os.remove(os.path.join(workspace, "dir3", "file3.txt"))
+    changed = registry.changed_files(workspace, manifest, datetime.now())
+    assert sorted(changed) == sorted([
+        os.path.join(workspace, "dir2", "file2.txt"),
+        os.path.join(workspace, "new", "sub", "report.csv"),
+    ])
+
+    # Nothing changed
+    assert registry.changed_files(workspace, manifest, datetime.now()) == []
+    registry.close()
+
+def test_symlinked_folders_are_not_tracked(tmp_path):
+    workspace = make_workspace(tmp_path)
+    shared = tmp_path / "shared"
+    write(str(shared / "team.txt"))
+    os.symlink(shared, os.path.join(workspace, "shared"))
+
+    index = ManifestChangeIndex(workspace, str(tmp_path / "manifest.json"))
+    assert index.changed_files(datetime.now() - timedelta(seconds=30)) == []
+
+@pytest.mark.parametrize("mode", MODES)
+def test_concurrent_runs_each_get_their_changes(tmp_path, mode):
+    workspace = make_workspace(tmp_path)
+    registry = ChangeIndexRegistry(mode=mode)
+    manifest = str(tmp_path / "manifests" / "user.json")
+    assert registry.changed_files(workspace, manifest, datetime.now()) == []
+
+    # Two runs of the same user overlap, and the second one finishes first
+    first_start = datetime.now()
+    write(os.path.join(workspace, "dir1", "first.txt"))
+    second_start = datetime.now()
+    write(os.path.join(workspace, "dir2", "second.txt"))
+    both = [os.path.join(workspace, "dir1", "first.txt"), os.path.join(workspace, "dir2", "second.txt")]
+    # Changes are dated by when the index saw them, so the second run also gets the
+    # file written just before it started
+    assert sorted(registry.changed_files(workspace, manifest, second_start)) == both
+    # ... and the first run doesn't lose its changes to the second
+    write(os.path.join(workspace, "dir3", "first.txt"))
+    assert sorted(registry.changed_files(workspace, manifest, first_start)) == both + [os.path.join(workspace, "dir3", "first.txt")]
+
+    # A run that started afterwards sees none of them
+    assert registry.changed_files(workspace, manifest, datetime.now()) == []
+    registry.close()
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import re
+
+import pandas as pd
+import pytest
+
+from supercog.engine.llm_enrichment import EnrichmentCache, LLMEnricher
+
+class FakeLLM:
+    """ Upper-cases each value. Fails the values in `fail`, and can't answer batches
+        bigger than `max_batch`. """
+
+    def __init__(self, max_batch: int = 100, fail: set = frozenset(), latency: float = 0):
+        self.max_batch = max_batch
+        self.fail = set(fail)
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, messages: list[dict], model: str) -> str:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            content = messages[-1]["content"]
+            match = re.search(r"\{.*\}", content, re.DOTALL)
+            values = json.loads(match.group(0)) if match else {"": content.split(": ", 1)[1]}
+            self.requests.append(list(values.values()))
+            if self.fail & set(values.values()):
+                raise RuntimeError("rate limited")
+            if len(values) > self.max_batch:
+                return "Sorry, that's too many"
+            if not match:
+                return values[""].upper()
+            return "```json\n" + json.dumps({key: value.upper() for key, value in values.items()}) + "\n```"
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def cache(tmp_path):
+    return EnrichmentCache(f"sqlite:///{tmp_path / 'cache.db'}")
+
+@pytest.mark.asyncio
+async def test_distinct_values_are_enriched_in_batches(cache):
+    llm = FakeLLM(latency=0.01)
+    enricher = LLMEnricher(llm, cache=cache, batch_size=10, concurrency=3, requests_per_minute=0)
+    values = [f"v{i % 50}" for i in range(200)] + [None, float("nan")]
+
+    enrichment = await enricher.enrich("Upper case this", "fake", values)
+    assert enrichment.results == [f"V{i % 50}" for i in range(200)] + [None, None]
+    assert enrichment.summary() == {
+        "distinct_values": 50, "cached": 0, "enriched": 50, "failed": 0, "llm_requests": 5,
+    }
+    assert llm.max_in_flight == 3
+
+    # Cached by prompt and model
+    again = await enricher.enrich("Upper case this", "fake", ["v1", "v60"])
+    assert again.results == ["V1", "V60"]
+    assert (again.cached, again.enriched) == (1, 1)
+    other = await enricher.enrich("Upper case this", "other-model", ["v1"])
+    assert other.cached == 0
+
+@pytest.mark.asyncio
+async def test_missing_values_of_nullable_columns_are_skipped(cache):
+    llm = FakeLLM()
+    enricher = LLMEnricher(llm, cache=cache, requests_per_minute=0)
+    values = pd.Series(["a", None], dtype="string").tolist()
+
+    enrichment = await enricher.enrich("Upper case this", "fake", values)
+    assert enrichment.results == ["A", None]
+    assert llm.requests == [["a"]]
+
+@pytest.mark.asyncio
+async def test_batches_the_model_cant_answer_are_split(cache):
+    llm = FakeLLM(max_batch=3)
+    enricher = LLMEnricher(llm, cache=cache, batch_size=8, requests_per_minute=0)
+    enrichment = await enricher.enrich("Upper case this", "fake", [f"v{i}" for i in range(8)])
+    assert enrichment.results == [f"V{i}" for i in range(8)]
+    # 8 -> 4 + 4 -> 2 + 2 + 2 + 2
+    assert [len(request) for request in llm.requests] == [8, 4, 2, 2, 4, 2, 2]
+
+@pytest.mark.asyncio
+async def test_failed_enrichments_can_be_resumed(cache):
+    llm = FakeLLM(fail={"v3"})
+    enricher = LLMEnricher(llm, cache=cache, batch_size=2, max_retries=1, retry_delay=0, requests_per_minute=0)
+    values = [f"v{i}" for i in range(6)]
+
+    enrichment = await enricher.enrich("Upper case this", "fake", values)
+    assert enrichment.results == ["V0", "V1", None, None, "V4", "V5"]
+    assert (enrichment.failed, enrichment.requests) == (2, 4)
+    assert enrichment.errors == ["rate limited"]
+
+    # Running it again only sends the values that failed
+    llm.fail.clear()
+    llm.requests.clear()
+    resumed = await enricher.enrich("Upper case this", "fake", values)
+    assert resumed.results == [f"V{i}" for i in range(6)]
+    assert llm.requests == [["v2", "v3"]]
+
+def test_least_recently_used_answers_are_evicted(cache):
+    cache.max_rows = 2
+    cache.put_many("ns", {"a": "A", "b": "B"})
+    cache.put_many("ns", {"c": "C"})
+    cache.get_many("ns", ["a"])
+    assert cache.evict() == 1
+    assert cache.get_many("ns", ["a", "b", "c"]) == {"a": "A", "c": "C"}
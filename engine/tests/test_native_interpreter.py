@@ -1,6 +1,7 @@
 import pytest
 
 from supercog.engine.all_tools import NativeInterpreterTool
+from supercog.engine.filesystem import get_agent_filesystem
 from supercog.engine.run_context import RunContext
 
 from .test_helpers import run_context
@@ -11,12 +12,18 @@ async def test_basic_tool_factory(run_context: RunContext):
     interp = NativeInterpreterTool()
     interp.run_context = run_context
 
-    print(await interp.execute_python_code("print('Hello, world!')"))
+    with get_agent_filesystem(run_context.tenant_id, run_context.user_id):
+        print(await interp.execute_python_code("print('Hello, world!')"))
 
-    await interp.execute_python_code("x = 5")
+        await interp.execute_python_code("x = 5")
 
-    await interp.execute_python_code("""
+        await interp.execute_python_code("""
 print("This is x: ", x)
 """)
+
+        # The code's files are in the user's directory, and nothing outside it
+        await interp.execute_python_code("open('hello.txt', 'w').write('hi')")
+        assert "hi" in await interp.execute_python_code("print(open('hello.txt').read())")
+        assert "PermissionError" in await interp.execute_python_code("open('/root/.bashrc')")
     #assert await interp.execute_python_code("x") == "5"
 
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from supercog.shared.apubsub import AgentOutputEvent, ToolEvent
+from supercog.engine.output_coalescer import OutputCoalescer, coalesce_events
+
+META = {"agent_id": "a1", "user_id": "u1"}
+
+def output(text: str) -> AgentOutputEvent:
+    return AgentOutputEvent(**(META | {"str_result": text}))
+
+async def token_stream(events, gap_secs=0.0):
+    for event in events:
+        await asyncio.sleep(gap_secs)
+        yield event
+
+async def collect(events, coalescer) -> list[list]:
+    return [batch async for batch in coalesce_events(events, coalescer)]
+
+def test_first_token_is_immediate_and_rest_batched():
+    coalescer = OutputCoalescer(flush_ms=10_000, max_bytes=10_000)
+    assert [e.str_result for e in coalescer.add(output("Hello"))] == ["Hello"]
+    assert coalescer.add(output(" world")) == []
+    assert coalescer.add(output("!")) == []
+    assert [e.str_result for e in coalescer.flush()] == [" world!"]
+
+def test_byte_budget_flushes():
+    coalescer = OutputCoalescer(flush_ms=10_000, max_bytes=8)
+    coalescer.add(output("a"))
+    assert coalescer.add(output("1234")) == []
+    assert [e.str_result for e in coalescer.add(output("5678"))] == ["12345678"]
+
+def test_other_events_preserve_order():
+    tool = ToolEvent(**(META | {"name": "search", "tool_params": {}}))
+    events = [output("a"), output("b"), output("c"), tool, output("d")]
+    batches = asyncio.run(collect(token_stream(events), OutputCoalescer(flush_ms=10_000)))
+    flat = [e for batch in batches for e in batch]
+    assert [type(e).__name__ for e in flat] == [
+        "AgentOutputEvent", "AgentOutputEvent", "ToolEvent", "AgentOutputEvent"
+    ]
+    assert "".join(e.str_result for e in flat if isinstance(e, AgentOutputEvent)) == "abcd"
+
+def test_stalled_stream_flushes_on_window():
+    async def stalled():
+        yield output("a")
+        yield output("b")
+        await asyncio.sleep(0.3)
+        yield output("c")
+
+    async def run():
+        batches = []
+        async for batch in coalesce_events(stalled(), OutputCoalescer(flush_ms=20)):
+            batches.append("".join(e.str_result for e in batch))
+        return batches
+
+    # "b" must not wait for "c" to arrive
+    assert asyncio.run(run()) == ["a", "b", "c"]
+
+def test_source_errors_propagate():
+    async def broken():
+        yield output("a")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect(broken(), OutputCoalescer()))
+
+def test_query_param_tuning():
+    coalescer = OutputCoalescer.from_query_params({"stream_flush_ms": "500", "stream_max_bytes": "bad"})
+    assert coalescer.flush_secs == 0.5
+    assert OutputCoalescer.from_query_params({"stream_flush_ms": "999999"}).flush_secs == 2.0
+    assert OutputCoalescer.from_query_params(None).flush_secs == OutputCoalescer().flush_secs
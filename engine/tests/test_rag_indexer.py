@@ -0,0 +1,133 @@
+import os
+import uuid
+
+import psycopg2
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from psycopg2 import sql
+
+from supercog.engine.rag_indexer import (
+    ChunkIndexer,
+    create_chunk_table,
+    ensure_vector_index,
+    keyword_search,
+    keyword_search_query,
+    vector_search,
+    vector_search_query,
+)
+
+@pytest.fixture
+def conn():
+    # Needs a Postgres with the pgvector extension
+    url = os.environ.get("PGVECTOR_DB_URL")
+    if not url:
+        pytest.skip("PGVECTOR_DB_URL is not set")
+    conn = psycopg2.connect(url)
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def table_name(conn):
+    name = f"rag_test_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cur:
+        create_chunk_table(cur, name, dimensions=8)
+    conn.commit()
+    yield name
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {name}")
+    conn.commit()
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+    fail_after: int = -1
+
+    def embed_documents(self, texts):
+        if len(self.calls) == self.fail_after:
+            raise RuntimeError("embedding service unavailable")
+        self.calls.append(len(texts))
+        return super().embed_documents(texts)
+
+def chunk_rows(conn, table_name) -> list[tuple]:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT line_number, content FROM {table_name} ORDER BY line_number")
+        return cur.fetchall()
+
+@pytest.mark.asyncio
+async def test_chunks_are_embedded_in_batches(conn, table_name):
+    embeddings = CountingEmbeddings(size=8, calls=[])
+    progress = []
+
+    async def report(done, total):
+        progress.append((done, total))
+
+    indexer = ChunkIndexer(conn, table_name, embeddings, batch_size=10, concurrency=2, progress=report)
+    chunks = [f"chunk {i}" for i in range(25)] + ["   "]
+    result = await indexer.index("report.pdf", chunks)
+
+    assert (result.added, result.skipped) == (25, 0)
+    assert sorted(embeddings.calls) == [5, 10, 10]
+    assert chunk_rows(conn, table_name) == [(i, f"chunk {i}") for i in range(25)]
+    assert sorted(progress)[-1] == (25, 25) and len(progress) == 3
+
+@pytest.mark.asyncio
+async def test_indexing_resumes_without_duplicates(conn, table_name):
+    chunks = [f"chunk {i}" for i in range(30)]
+    failing = CountingEmbeddings(size=8, calls=[], fail_after=2)
+    indexer = ChunkIndexer(conn, table_name, failing, batch_size=10, concurrency=1)
+    with pytest.raises(RuntimeError):
+        await indexer.index("report.pdf", chunks)
+    assert len(chunk_rows(conn, table_name)) == 20
+
+    embeddings = CountingEmbeddings(size=8, calls=[])
+    result = await ChunkIndexer(conn, table_name, embeddings, batch_size=10).index("report.pdf", chunks)
+    assert (result.added, result.skipped) == (10, 20)
+    assert embeddings.calls == [10]
+    assert chunk_rows(conn, table_name) == [(i, f"chunk {i}") for i in range(30)]
+
+    # The same chunks from another source are stored again
+    result = await ChunkIndexer(conn, table_name, embeddings).index("copy.pdf", chunks[:5])
+    assert result.added == 5
+
+def explain(cur, query, params) -> str:
+    cur.execute(sql.SQL("EXPLAIN ") + query, params)
+    return "\n".join(row[0] for row in cur.fetchall())
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["hnsw", "ivfflat"])
+async def test_searches_use_the_indexes(conn, table_name, method):
+    # An index from before, which cosine distance searches can't use
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE INDEX {table_name}_embedding_idx ON {table_name} USING ivfflat (embedding vector_l2_ops)")
+    conn.commit()
+
+    embeddings = DeterministicFakeEmbedding(size=8)
+    chunks = [f"quarterly revenue report {i}" if i % 50 == 0 else f"meeting notes {i}" for i in range(2000)]
+    await ChunkIndexer(conn, table_name, embeddings, batch_size=500, vector_index=method).index("notes.txt", chunks)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", (table_name,))
+        indexes = dict(cur.fetchall())
+        assert f"{table_name}_embedding_idx" not in indexes
+        assert f"USING {method} (embedding vector_cosine_ops)" in indexes[f"{table_name}_cosine_idx"]
+        assert not ensure_vector_index(cur, table_name, method)
+
+        # The table is small enough that the planner would rather scan it
+        cur.execute("SET LOCAL enable_seqscan = off")
+        query_embedding = [float(x) for x in embeddings.embed_query("meeting notes 7")]
+        plan = explain(cur, vector_search_query(table_name), (query_embedding, 5))
+        assert f"Index Scan using {table_name}_cosine_idx" in plan
+        plan = explain(cur, keyword_search_query(table_name), ("revenue", 5))
+        assert f"Bitmap Index Scan on {table_name}_tsv_idx" in plan
+
+        results = vector_search(cur, table_name, query_embedding, 5, ef_search=100, probes=2)
+        assert results[0][0] == "meeting notes 7" and results[0][3] < 1e-6
+        cur.execute("SELECT current_setting('hnsw.ef_search'), current_setting('ivfflat.probes')")
+        assert cur.fetchone() == ("100", "2")
+
+        results = keyword_search(cur, table_name, "revenue reports", 100)
+        assert len(results) == 40 and all("revenue" in content for content, *_ in results)
+    conn.rollback()
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("llama_index.vector_stores.postgres")
+fakeredis = pytest.importorskip("fakeredis")
+
+import psycopg2
+from llama_index.core import Document, StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+from supercog.rag.query import QueryService, make_vector_store
+
+# The shared asyncpg connections belong to the event loop that opened them, so the
+# tests share one loop
+pytestmark = pytest.mark.asyncio(scope="module")
+
+@pytest.fixture
+def db_url():
+    # Needs a Postgres with the pgvector extension
+    url = os.environ.get("PGVECTOR_DB_URL")
+    if not url:
+        pytest.skip("PGVECTOR_DB_URL is not set")
+    return url
+
+@pytest.fixture
+def index_ids(db_url):
+    ids = [f"query_test_{uuid.uuid4().hex[:8]}" for _ in range(2)]
+    embed_model = MockEmbedding(embed_dim=8)
+    for index_id in ids:
+        vector_store = make_vector_store(db_url, index_id, embed_dim=8)
+        VectorStoreIndex.from_documents(
+            [Document(text=f"Section {i} of the {index_id} handbook") for i in range(5)],
+            storage_context=StorageContext.from_defaults(vector_store=vector_store),
+            embed_model=embed_model,
+        )
+    yield ids
+    conn = psycopg2.connect(db_url)
+    with conn.cursor() as cur:
+        for index_id in ids:
+            cur.execute(f"DROP TABLE IF EXISTS data_{index_id}")
+    conn.commit()
+    conn.close()
+
+class CountingQueryService(QueryService):
+    queries: int = 0
+
+    async def _run_query(self, index_id, query, similarity_top_k):
+        self.queries += 1
+        return await super()._run_query(index_id, query, similarity_top_k)
+
+def make_service(db_url, **kwargs) -> CountingQueryService:
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    async def get_client():
+        return client
+
+    return CountingQueryService(
+        lambda index_id: make_vector_store(db_url, index_id, embed_dim=8),
+        lambda: MockEmbedding(embed_dim=8),
+        llm=MockLLM(),
+        get_client=get_client,
+        **kwargs,
+    )
+
+async def test_indexes_share_a_connection_pool(db_url, index_ids):
+    service = make_service(db_url)
+    results = await asyncio.gather(*[
+        service.query(index_id, "handbook", similarity_top_k=3) for index_id in index_ids * 5
+    ])
+    for index_id, result in zip(index_ids * 5, results):
+        assert len(result["source_nodes"]) >= 3
+        assert all(index_id in node["text"] for node in result["source_nodes"])
+
+    # One query engine per index and top_k, each searching over the same engines
+    assert service.query_engine(index_ids[0], 3) is service.query_engine(index_ids[0], 3)
+    stores = [service.query_engine(index_id, 3).retriever._vector_store for index_id in index_ids]
+    assert stores[0]._async_engine is stores[1]._async_engine
+    assert stores[0]._engine is stores[1]._engine
+
+async def test_results_are_cached_until_the_index_changes(db_url, index_ids):
+    service = make_service(db_url, cache_ttl=60)
+    index_id = index_ids[0]
+    first = await service.query(index_id, "handbook", similarity_top_k=2)
+    assert await service.query(index_id, "handbook", similarity_top_k=2) == first
+    assert service.queries == 1
+
+    # The cache is keyed by index, query and top_k
+    await service.query(index_id, "handbook", similarity_top_k=3)
+    await service.query(index_id, "Section 1", similarity_top_k=2)
+    await service.query(index_ids[1], "handbook", similarity_top_k=2)
+    assert service.queries == 4 and (service.cache_hits, service.cache_misses) == (1, 4)
+
+    await service.invalidate(index_id)
+    assert await service.query(index_id, "handbook", similarity_top_k=2) == first
+    assert service.queries == 5
+
+async def test_identical_concurrent_queries_run_once(db_url, index_ids):
+    service = make_service(db_url, cache_ttl=60)
+    results = await asyncio.gather(*[service.query(index_ids[0], "handbook", similarity_top_k=2) for _ in range(10)])
+    assert service.queries == 1
+    assert all(result == results[0] for result in results)
+
+async def test_queries_work_without_redis(db_url, index_ids):
+    async def get_client():
+        raise ConnectionError("redis is down")
+
+    service = make_service(db_url, cache_ttl=60)
+    service.get_client = get_client
+    result = await service.query(index_ids[0], "handbook", similarity_top_k=2)
+    assert len(result["source_nodes"]) >= 2
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from supercog.engine.db import RunLog, get_async_session
+from supercog.engine.jwt_auth import requires_jwt
+from supercog.engine.main import app
+
+START = datetime(2024, 1, 1)
+
+@pytest.fixture
+def client(tmp_path):
+    db_path = tmp_path / "run_logs.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine, tables=[RunLog.__table__])
+    # The fifth log was stored last, but with the oldest timestamp but one
+    logs = [
+        RunLog(id=1, run_id="r1", user_id="u1", type="input", created_at=START),
+        RunLog(id=2, run_id="r1", user_id="u1", type="output", created_at=START + timedelta(seconds=2)),
+        RunLog(id=3, run_id="r1", user_id="u1", type="tool", created_at=START + timedelta(seconds=3)),
+        RunLog(id=4, run_id="r1", user_id="u1", type="output", created_at=START + timedelta(seconds=4)),
+        RunLog(id=5, run_id="r1", user_id="u1", type="tool", created_at=START + timedelta(seconds=1)),
+        RunLog(id=6, run_id="r1", user_id="u2", type="output", created_at=START),
+        RunLog(id=7, run_id="r2", user_id="u1", type="output", created_at=START),
+    ]
+    with Session(engine) as session:
+        session.add_all(logs)
+        session.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+
+    async def get_test_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_test_session
+    app.dependency_overrides[requires_jwt] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+def get_logs(client, **params) -> tuple[list[int], dict]:
+    response = client.get("/runs/r1/run_logs", params={"user_id": "u1"} | params)
+    assert response.status_code == 200
+    return [log["id"] for log in response.json()], response.headers
+
+def test_pages_forward_in_stored_order(client):
+    ids, headers = get_logs(client)
+    assert ids == [1, 2, 3, 4, 5]
+
+    pages, cursor = [], None
+    while True:
+        ids, headers = get_logs(client, limit=2, **({"after": cursor} if cursor else {}))
+        if not ids:
+            # An empty page hands the cursor back, for polling for new logs
+            assert headers["X-Next-Cursor"] == cursor
+            break
+        pages.append(ids)
+        cursor = headers["X-Next-Cursor"]
+    assert pages == [[1, 2], [3, 4], [5]]
+
+def test_pages_backward_in_time_order(client):
+    _, headers = get_logs(client, limit=4)
+    ids, headers = get_logs(client, limit=2, before=headers["X-Next-Cursor"])
+    assert ids == [2, 3]
+    ids, headers = get_logs(client, limit=2, before=headers["X-Prev-Cursor"])
+    assert ids == [1, 5]
+    ids, headers = get_logs(client, limit=2, before=headers["X-Prev-Cursor"])
+    assert ids == [] and "X-Prev-Cursor" not in headers
+
+def test_filters_by_type(client):
+    ids, headers = get_logs(client, types=["tool", "input"])
+    assert ids == [1, 3, 5]
+    ids, _ = get_logs(client, types="tool", after=get_logs(client, limit=3)[1]["X-Next-Cursor"])
+    assert ids == [5]
+
+def test_bad_cursors_are_rejected(client):
+    response = client.get("/runs/r1/run_logs", params={"user_id": "u1", "after": "not-a-cursor"})
+    assert response.status_code == 400
+    response = client.get("/runs/r1/run_logs", params={"user_id": "u1", "limit": 0})
+    assert response.status_code == 422
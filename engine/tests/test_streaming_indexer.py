@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from supercog.engine.db import DocIndex, IndexedDoc, IndexingJob
+from supercog.rag.indexer import StreamingIndexer
+
+class CountingEmbedding(MockEmbedding):
+    embedded: list = []
+
+    def _get_text_embeddings(self, texts):
+        self.embedded.extend(texts)
+        return super()._get_text_embeddings(texts)
+
+@pytest.fixture
+def db_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'engine.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+def new_job(db_engine, index_id: str) -> str:
+    with Session(db_engine) as session:
+        job = IndexingJob(index_id=index_id)
+        session.add(job)
+        session.commit()
+        return job.id
+
+@pytest.fixture
+def doc_index_id(db_engine):
+    with Session(db_engine) as session:
+        doc_index = DocIndex(name="Handbook", tenant_id="t1", user_id="u1")
+        session.add(doc_index)
+        session.commit()
+        return doc_index.id
+
+async def stream(docs: list[Document], yielded: list):
+    for doc in docs:
+        yielded.append(doc.doc_id)
+        yield doc
+
+def make_docs(texts: dict[str, str]) -> list[Document]:
+    return [Document(text=text, id_=doc_id, metadata={"file_name": f"{doc_id}.md"}) for doc_id, text in texts.items()]
+
+@pytest.mark.asyncio
+async def test_documents_are_indexed_in_batches_as_they_arrive(db_engine, doc_index_id):
+    yielded = []
+    embedded_after = []
+
+    class RecordingEmbedding(CountingEmbedding):
+        def _get_text_embeddings(self, texts):
+            embedded_after.append(len(yielded))
+            return super()._get_text_embeddings(texts)
+
+    index = VectorStoreIndex([], embed_model=RecordingEmbedding(embed_dim=8, embedded=[]))
+    docs = make_docs({f"doc{i}": f"Section {i} of the handbook" for i in range(5)})
+    job_id = new_job(db_engine, doc_index_id)
+    job = await StreamingIndexer(db_engine, index, job_id, batch_size=2).run(stream(docs, yielded))
+
+    assert (job.status, job.docs_seen, job.docs_indexed, job.docs_skipped) == ("completed", 5, 5, 0)
+    # Each batch was indexed before the source produced the next one
+    assert embedded_after == [2, 4, 5]
+    with Session(db_engine) as session:
+        indexed = session.exec(select(IndexedDoc).order_by(IndexedDoc.doc_id)).all()
+        assert [(doc.doc_id, doc.name) for doc in indexed] == [(f"doc{i}", f"doc{i}.md") for i in range(5)]
+    assert len(index.as_retriever(similarity_top_k=10).retrieve("handbook")) == 5
+
+@pytest.mark.asyncio
+async def test_unchanged_documents_are_skipped(db_engine, doc_index_id):
+    embed_model = CountingEmbedding(embed_dim=8, embedded=[])
+    index = VectorStoreIndex([], embed_model=embed_model)
+    texts = {f"doc{i}": f"Section {i} of the handbook" for i in range(4)}
+    await StreamingIndexer(db_engine, index, new_job(db_engine, doc_index_id), batch_size=3).run(stream(make_docs(texts), []))
+
+    embed_model.embedded.clear()
+    texts["doc2"] = "Section 2, revised"
+    job = await StreamingIndexer(db_engine, index, new_job(db_engine, doc_index_id), batch_size=3).run(stream(make_docs(texts), []))
+
+    assert (job.docs_seen, job.docs_indexed, job.docs_skipped) == (4, 1, 3)
+    assert embed_model.embedded == ["file_name: doc2.md\n\nSection 2, revised"]
+    # The old version of the changed document is gone
+    chunks = [result.node.get_content() for result in index.as_retriever(similarity_top_k=10).retrieve("section")]
+    assert sorted(chunks) == ["Section 0 of the handbook", "Section 1 of the handbook", "Section 2, revised", "Section 3 of the handbook"]
+
+@pytest.mark.asyncio
+async def test_failures_are_recorded_on_the_job(db_engine, doc_index_id):
+    async def failing_source():
+        yield Document(text="Section 1", id_="doc1")
+        raise RuntimeError("folder not found")
+
+    index = VectorStoreIndex([], embed_model=CountingEmbedding(embed_dim=8, embedded=[]))
+    job_id = new_job(db_engine, doc_index_id)
+    with pytest.raises(RuntimeError):
+        await StreamingIndexer(db_engine, index, job_id).run(failing_source())
+    with Session(db_engine) as session:
+        job = session.get(IndexingJob, job_id)
+        assert job.status == "error" and "folder not found" in job.message
@@ -0,0 +1,88 @@
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pytest
+from openpyxl import Workbook
+
+from supercog.engine.dataframe_store import DataFrameStore
+from supercog.engine.tabular_reader import iter_record_batches, stream_to_arrow_file
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": range(rows),
+        "name": [f"item {i}" for i in range(rows)],
+        "price": [i / 4 for i in range(rows)],
+    })
+
+def write_file(path, file_format: str, df: pd.DataFrame):
+    if file_format == "csv":
+        df.to_csv(path, index=False)
+    elif file_format == "json":
+        df.to_json(path, orient="records", lines=True)
+    elif file_format == "parquet":
+        df.to_parquet(path, row_group_size=100)
+    else:
+        df.to_excel(path, index=False, engine="openpyxl")
+
+@pytest.mark.parametrize("file_format", ["csv", "json", "parquet", "excel"])
+def test_files_are_read_in_chunks(tmp_path, file_format):
+    path = str(tmp_path / ("items.xlsx" if file_format == "excel" else f"items.{file_format}"))
+    write_file(path, file_format, make_frame(1000))
+
+    batches = list(iter_record_batches(path, file_format, chunk_rows=100))
+    assert len(batches) >= 10 and max(batch.num_rows for batch in batches) <= 100
+    table = pa.Table.from_batches(batches)
+    assert table.num_rows == 1000 and table.schema.names == ["id", "name", "price"]
+    assert table["id"].to_pylist() == list(range(1000))
+    assert table["price"].to_pylist()[-1] == 999 / 4
+
+def test_stream_to_arrow_file(tmp_path):
+    path = str(tmp_path / "items.csv")
+    write_file(path, "csv", make_frame(1000))
+    dest = str(tmp_path / "items.arrow")
+
+    table_file = stream_to_arrow_file(path, "csv", dest, preview_rows=5, column_name=str.upper, chunk_rows=64)
+    assert table_file.row_count == 1000
+    assert table_file.columns == ["ID", "NAME", "PRICE"]
+    assert table_file.preview["NAME"].tolist() == [f"item {i}" for i in range(5)]
+
+    # The store keeps the file as a spilled frame, which DuckDB queries in place
+    store = DataFrameStore(spill_root=str(tmp_path / "spill"))
+    store.put_arrow_file("items", table_file.path)
+    assert store.is_spilled("items")
+    items = store.scan_source("items")
+    assert duckdb.sql("SELECT count(*), max(ID) FROM items").fetchone() == (1000, 999)
+    assert len(store["items"]) == 1000 and not store.is_spilled("items")
+
+def test_empty_files_are_rejected(tmp_path):
+    path = tmp_path / "empty.json"
+    path.write_text("")
+    with pytest.raises(Exception):
+        stream_to_arrow_file(str(path), "json", str(tmp_path / "empty.arrow"))
+    assert not (tmp_path / "empty.arrow").exists()
+    assert not (tmp_path / "empty.arrow.tmp").exists()
+
+def test_excel_columns_are_unified_across_chunks(tmp_path):
+    path = str(tmp_path / "mixed.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["title", "code", None, "code"])
+    sheet.append(["skipped"])
+    for i in range(10):
+        # "code" is a number in the first chunk and text in the second
+        sheet.append(["row", i if i < 5 else f"C{i}", i, None])
+    workbook.create_sheet("other").append(["x"])
+    workbook.save(path)
+
+    batches = list(iter_record_batches(path, "excel", chunk_rows=5, skip_rows=1))
+    table = pa.Table.from_batches(batches)
+    assert table.schema.names == ["skipped", "Unnamed: 1", "Unnamed: 2", "Unnamed: 3"]
+
+    table = pa.Table.from_batches(list(iter_record_batches(path, "excel", chunk_rows=5)))
+    assert table.schema.names == ["title", "code", "Unnamed: 2", "code.1"]
+    assert table.num_rows == 11
+    assert table["code"].type == pa.string()
+    assert table["code"].to_pylist()[1:] == ["0", "1", "2", "3", "4", "C5", "C6", "C7", "C8", "C9"]
+
+    other = pa.Table.from_batches(list(iter_record_batches(path, "excel", sheet_name="other")))
+    assert other.schema.names == ["x"] and other.num_rows == 0
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from supercog.engine import enginemgr
+from supercog.engine.enginemgr import EngineManager
+
+STREAM = "agents:t1"
+
+def make_manager(client, name: str = "worker1", max_concurrency: int = 4) -> EngineManager:
+    manager = EngineManager(["t1"], max_concurrency=max_concurrency)
+    manager.consumer_name = name
+    manager.redis = client
+    manager.processed = []
+    manager.errors = []
+
+    async def process_task(task_data):
+        manager.processed.append(("start", task_data["action"], task_data["run"]["id"]))
+        await asyncio.sleep(task_data.get("secs", 0))
+        manager.processed.append(("end", task_data["action"], task_data["run"]["id"]))
+
+    async def report_unhandled_error(task, exception):
+        manager.errors.append((task.run["id"], str(exception)))
+
+    manager._process_task = process_task
+    manager.report_unhandled_error = report_unhandled_error
+    return manager
+
+def task(action: str, run_id: str, secs: float = 0) -> dict:
+    return {"task": json.dumps({
+        "action": action, "user": {}, "run": {"id": run_id, "agent_id": "a1"}, "headers": {},
+        "query_params": {}, "secs": secs,
+    })}
+
+@pytest.fixture
+def client():
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+async def setup_stream(client, *tasks) -> list[str]:
+    await client.xgroup_create(STREAM, "consumer_group", mkstream=True)
+    return [await client.xadd(STREAM, t) for t in tasks]
+
+async def wait_for_tasks(manager: EngineManager):
+    while manager.inflight_tasks:
+        await asyncio.wait(list(manager.inflight_tasks), timeout=1)
+
+async def pending_count(client) -> int:
+    return (await client.xpending(STREAM, "consumer_group"))["pending"]
+
+async def deliver_to_dead_consumer(client, times: int = 1):
+    # Reads the entries as a consumer that never acks them, `times` times over
+    await client.xreadgroup("consumer_group", "dead", {STREAM: ">"})
+    for _ in range(times - 1):
+        ids = [entry["message_id"] for entry in await client.xpending_range(STREAM, "consumer_group", "-", "+", 100)]
+        await client.xclaim(STREAM, "consumer_group", "dead", min_idle_time=0, message_ids=ids)
+
+@pytest.mark.asyncio
+async def test_tasks_for_a_run_execute_in_order(client):
+    await setup_stream(
+        client, task("create_run", "r1", secs=0.05), task("prompt", "r1"), task("create_run", "r2"),
+    )
+    manager = make_manager(client)
+    assert await manager.read_stream_tasks()
+    await wait_for_tasks(manager)
+
+    r1 = [step for step in manager.processed if step[2] == "r1"]
+    assert r1 == [("start", "create_run", "r1"), ("end", "create_run", "r1"),
+                  ("start", "prompt", "r1"), ("end", "prompt", "r1")]
+    # Other runs don't wait for r1
+    assert manager.processed.index(("end", "create_run", "r2")) < manager.processed.index(("end", "create_run", "r1"))
+    assert await pending_count(client) == 0
+    assert manager.run_task_locks == {}
+
+@pytest.mark.asyncio
+async def test_idle_entries_of_dead_consumers_are_claimed(client, monkeypatch):
+    monkeypatch.setattr(enginemgr, "TASK_CLAIM_IDLE_MS", 50)
+    await setup_stream(client, task("prompt", "r1"))
+    await deliver_to_dead_consumer(client)
+    manager = make_manager(client)
+
+    # Not idle long enough yet
+    await manager.claim_abandoned_tasks()
+    assert manager.processed == []
+
+    await asyncio.sleep(0.1)
+    await manager.claim_abandoned_tasks()
+    await wait_for_tasks(manager)
+    assert manager.processed == [("start", "prompt", "r1"), ("end", "prompt", "r1")]
+    assert await pending_count(client) == 0
+
+@pytest.mark.asyncio
+async def test_tasks_are_abandoned_after_max_deliveries(client, monkeypatch):
+    monkeypatch.setattr(enginemgr, "TASK_CLAIM_IDLE_MS", 0)
+    await setup_stream(client, task("prompt", "r1"))
+    await deliver_to_dead_consumer(client, times=enginemgr.TASK_MAX_DELIVERIES)
+    manager = make_manager(client)
+
+    await manager.claim_abandoned_tasks()
+    await wait_for_tasks(manager)
+    assert manager.processed == []
+    assert manager.errors == [("r1", "The agent worker crashed while running this request")]
+    assert await pending_count(client) == 0
+
+@pytest.mark.asyncio
+async def test_long_tasks_keep_their_claim(client, monkeypatch):
+    monkeypatch.setattr(enginemgr, "TASK_CLAIM_IDLE_MS", 150)
+    await setup_stream(client, task("prompt", "r1", secs=0.4))
+    worker = make_manager(client)
+    other = make_manager(client, name="worker2")
+    assert await worker.read_stream_tasks()
+
+    # The running task's entry would be idle for 400ms, but the heartbeat refreshes it
+    for _ in range(4):
+        await asyncio.sleep(0.1)
+        await worker.refresh_inflight_claims()
+        await other.claim_abandoned_tasks()
+    await wait_for_tasks(worker)
+
+    assert other.processed == []
+    assert worker.processed == [("start", "prompt", "r1"), ("end", "prompt", "r1")]
+    assert await pending_count(client) == 0